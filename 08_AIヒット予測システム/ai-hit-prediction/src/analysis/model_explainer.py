@@ -3,29 +3,162 @@
 SHAPを使用してモデルの予測根拠を可視化
 """
 
-import shap
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-import plotly.express as px
 from typing import Optional, Dict, List, Any, Union
+from collections import OrderedDict
 import logging
+import threading
 import json
 import base64
 from io import BytesIO
+import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.lazy_imports import lazy_import
+from src.models import forest_export
+from src.models.tree_shap import TreeShapExplainer
+
+# SHAP・Plotlyは初回使用時に読み込む
+shap = lazy_import('shap')
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
+
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def summarize_background(data: pd.DataFrame,
+                         max_samples: int = 100,
+                         method: str = 'kmeans',
+                         random_state: int = 42) -> pd.DataFrame:
+    """
+    SHAP値計算用の背景データを要約（TreeExplainerの計算量は背景データの行数に比例する）
+    
+    Args:
+        data: 背景データ
+        max_samples: 要約後の最大行数
+        method: 'kmeans'（クラスタ中心）または 'sample'（無作為抽出）
+        random_state: 乱数シード
+        
+    Returns:
+        max_samples 行以下の背景データ
+    """
+    if data is None or len(data) <= max_samples:
+        return data
+    
+    if method == 'sample':
+        return data.sample(n=max_samples, random_state=random_state)
+    if method == 'kmeans':
+        from sklearn.cluster import KMeans
+        kmeans = KMeans(n_clusters=max_samples, n_init=3, random_state=random_state)
+        kmeans.fit(data.to_numpy(dtype=np.float64))
+        return pd.DataFrame(kmeans.cluster_centers_, columns=data.columns)
+    raise ValueError(f"Unknown background summarization method: {method}")
+
+
+class ShapValueCache:
+    """
+    行単位のSHAP値キャッシュ
+    
+    キーは（(モデルバージョン, 背景データのハッシュ), 行のハッシュ）。同じモデルバージョンを指定した
+    ModelExplainer 同士で共有でき、Streamlit の再描画で Explainer を作り直しても再利用できる。
+    """
+    
+    def __init__(self, max_rows: int = 50000):
+        """
+        初期化
+        
+        Args:
+            max_rows: 保持する行数の上限（超えた場合は古い行から削除）
+        """
+        self.max_rows = max_rows
+        self._rows: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_many(self, namespace: tuple, row_hashes: np.ndarray) -> List[Optional[np.ndarray]]:
+        """
+        複数行のSHAP値を取得
+        
+        Args:
+            namespace: (モデルバージョン, 背景データのハッシュ)
+            row_hashes: 行のハッシュ
+            
+        Returns:
+            行ごとのSHAP値（キャッシュに無い行は None）
+        """
+        with self._lock:
+            rows = []
+            for row_hash in row_hashes.tolist():
+                key = (namespace, row_hash)
+                values = self._rows.get(key)
+                if values is not None:
+                    self._rows.move_to_end(key)
+                rows.append(values)
+        found = sum(values is not None for values in rows)
+        self.hits += found
+        self.misses += len(rows) - found
+        return rows
+    
+    def put_many(self, namespace: tuple, row_hashes: np.ndarray, shap_values: np.ndarray):
+        """
+        複数行のSHAP値を保存
+        
+        Args:
+            namespace: (モデルバージョン, 背景データのハッシュ)
+            row_hashes: 行のハッシュ
+            shap_values: (行数, 特徴量数) のSHAP値
+        """
+        shap_values = np.array(shap_values, dtype=np.float64)
+        shap_values.flags.writeable = False
+        with self._lock:
+            for row_hash, values in zip(row_hashes.tolist(), shap_values):
+                self._rows[(namespace, row_hash)] = values
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+    
+    def clear(self, model_version: Optional[str] = None):
+        """キャッシュを削除（model_version を指定した場合はそのモデルバージョンの行のみ）"""
+        with self._lock:
+            if model_version is None:
+                self._rows.clear()
+            else:
+                for key in [key for key in self._rows if key[0][0] == model_version]:
+                    del self._rows[key]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """キャッシュの統計"""
+        total = self.hits + self.misses
+        return {
+            'rows': len(self._rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
 class ModelExplainer:
     """モデルの予測を説明するクラス"""
     
-    def __init__(self, model, feature_names: List[str], background_data: Optional[pd.DataFrame] = None):
+    def __init__(self, model, feature_names: List[str],
+                 background_data: Optional[pd.DataFrame] = None,
+                 model_version: Optional[str] = None,
+                 max_background: int = 100,
+                 background_method: str = 'kmeans',
+                 batch_size: int = 1000,
+                 cache: Optional[ShapValueCache] = None,
+                 backend: str = 'auto'):
         """
         初期化
         
@@ -33,17 +166,58 @@ class ModelExplainer:
             model: 学習済みモデル
             feature_names: 特徴量名のリスト
             background_data: SHAP値計算用の背景データ
+            model_version: キャッシュのキーに使うモデルバージョン（省略時はモデルオブジェクト単位）
+            max_background: 背景データの最大行数（超える場合は要約する）
+            background_method: 背景データの要約方法（'kmeans' / 'sample'）
+            batch_size: 未計算の行をまとめてSHAP値を計算する行数
+            cache: SHAP値のキャッシュ（複数のExplainerで共有する場合に指定）
+            backend: 'native'（コンパイル済みフォレストの TreeSHAP、背景データは使わない）/
+                'shap'（shap パッケージ）/ 'auto'（背景データが無いか shap が無ければ native）
         """
+        if backend not in ('auto', 'native', 'shap'):
+            raise ValueError(f"Unknown SHAP backend: {backend}")
         self.model = model
         self.feature_names = feature_names
         self.explainer = None
-        self.background_data = background_data
+        self.background_data = summarize_background(background_data, max_background,
+                                                    background_method)
+        self.model_version = model_version or f"{type(model).__name__}-{id(model):x}"
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else ShapValueCache()
+        self.cache_namespace = self._make_namespace()
+        self.backend = backend
+        self.shap_calls = 0
         
         # SHAP Explainerを初期化
         self._initialize_explainer()
+    
+    def _make_namespace(self) -> tuple:
+        """キャッシュの名前空間（SHAP値は背景データにも依存するため背景データのハッシュを含める）"""
+        if self.background_data is None:
+            return (self.model_version, None)
+        background_hash = pd.util.hash_pandas_object(self.background_data, index=False).sum()
+        return (self.model_version, int(background_hash))
         
     def _initialize_explainer(self):
         """SHAP Explainerを初期化"""
+        use_native = self.backend == 'native' or (
+            self.backend == 'auto' and (self.background_data is None or not shap.available)
+        )
+        if use_native:
+            try:
+                forest = forest_export.compile_model(self.model, self.feature_names)
+                self.explainer = TreeShapExplainer(forest)
+                logger.info("Native TreeSHAP explainer initialized successfully")
+                return
+            except ValueError as e:
+                if self.backend == 'native':
+                    raise
+                logger.info(f"Native TreeSHAP is not available for this model ({e}); using shap")
+        
+        if not shap.available:
+            logger.warning("shap is not installed; SHAP explanations are unavailable")
+            return
+        
         try:
             if self.background_data is not None:
                 # TreeExplainerを使用（ランダムフォレスト用）
@@ -63,10 +237,28 @@ class ModelExplainer:
             # フォールバック: Explainerを使用
             self.explainer = shap.Explainer(self.model)
     
+    def _compute_shap_values(self, X: pd.DataFrame) -> np.ndarray:
+        """SHAP値を計算（キャッシュを使わない）"""
+        self.shap_calls += 1
+        shap_values = self.explainer.shap_values(X)
+        
+        # 二値分類の場合、正クラスのSHAP値を返す
+        if isinstance(shap_values, list) and len(shap_values) == 2:
+            return np.asarray(shap_values[1])
+        shap_values = np.asarray(shap_values)
+        if shap_values.ndim == 3:
+            # 新しいshapは (サンプル数, 特徴量数, クラス数) を返す
+            return shap_values[:, :, -1]
+        
+        return shap_values
+    
     def explain_prediction(self, X: pd.DataFrame) -> np.ndarray:
         """
         個別予測のSHAP値を計算
         
+        計算済みの行はキャッシュから取得し、未計算の行（重複は1回）だけを
+        batch_size 行ずつまとめて計算する。
+        
         Args:
             X: 説明対象のデータ
             
@@ -76,13 +268,37 @@ class ModelExplainer:
         if self.explainer is None:
             raise ValueError("Explainer not initialized")
         
-        shap_values = self.explainer.shap_values(X)
-        
-        # 二値分類の場合、正クラスのSHAP値を返す
-        if isinstance(shap_values, list) and len(shap_values) == 2:
-            return shap_values[1]
-        
-        return shap_values
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(np.atleast_2d(X), columns=self.feature_names)
+        row_hashes = pd.util.hash_pandas_object(X, index=False).to_numpy()
+        rows = self.cache.get_many(self.cache_namespace, row_hashes)
+        
+        missing = [i for i, values in enumerate(rows) if values is None]
+        if missing:
+            # 同じ値の行は1回だけ計算する
+            _, first = np.unique(row_hashes[missing], return_index=True)
+            positions = np.asarray(missing)[np.sort(first)]
+            computed = {}
+            for start in range(0, len(positions), self.batch_size):
+                batch = positions[start:start + self.batch_size]
+                values = self._compute_shap_values(X.iloc[batch])
+                self.cache.put_many(self.cache_namespace, row_hashes[batch], values)
+                computed.update(zip(row_hashes[batch].tolist(), values))
+            rows = [values if values is not None else computed[row_hash]
+                    for values, row_hash in zip(rows, row_hashes.tolist())]
+
+        return np.vstack(rows)
+    
+    @property
+    def base_value(self) -> float:
+        """SHAP値の基準値（正クラス）"""
+        if hasattr(self.explainer, 'expected_value'):
+            expected_value = self.explainer.expected_value
+            if isinstance(expected_value, (np.ndarray, list)):
+                expected_value = np.ravel(expected_value)
+                return float(expected_value[1] if len(expected_value) > 1 else expected_value[0])
+            return float(expected_value)
+        return 0.5
     
     def create_waterfall_plot(self, 
                             X_single: pd.DataFrame,
@@ -116,13 +332,7 @@ class ModelExplainer:
         feature_importance = feature_importance.sort_values('shap_value')
         
         # 基準値と予測値
-        if hasattr(self.explainer, 'expected_value'):
-            if isinstance(self.explainer.expected_value, np.ndarray):
-                base_value = self.explainer.expected_value[1] if len(self.explainer.expected_value) > 1 else self.explainer.expected_value[0]
-            else:
-                base_value = self.explainer.expected_value
-        else:
-            base_value = 0.5
+        base_value = self.base_value
         
         prediction_value = base_value + shap_values.sum()
         
@@ -151,13 +361,7 @@ class ModelExplainer:
             shap_values = shap_values[0]
         
         # 基準値
-        if hasattr(self.explainer, 'expected_value'):
-            if isinstance(self.explainer.expected_value, np.ndarray):
-                base_value = self.explainer.expected_value[1] if len(self.explainer.expected_value) > 1 else self.explainer.expected_value[0]
-            else:
-                base_value = self.explainer.expected_value
-        else:
-            base_value = 0.5
+        base_value = self.base_value
         
         # 正と負の寄与を分離
         positive_features = []
@@ -186,45 +390,50 @@ class ModelExplainer:
             'negative_features': negative_features[:5]   # Top 5
         }
     
-    def create_summary_plot_data(self, X: pd.DataFrame, max_features: int = 20) -> Dict[str, Any]:
+    def create_summary_plot_data(self, X: pd.DataFrame, max_features: int = 20,
+                                 max_samples: Optional[int] = None,
+                                 random_state: int = 42) -> Dict[str, Any]:
         """
         サマリープロット用のデータを生成
         
+        点のデータは特徴量ごとに連続した列形式の配列（1回の行列の取り出しで作成）。
+        特徴量の重要度は常に全行から計算し、max_samples は描画する点の行数だけを間引く。
+        
         Args:
             X: 複数サンプルのデータ
             max_features: 表示する特徴量の最大数
+            max_samples: 描画する行数の上限（省略時は全行）
+            random_state: 間引きの乱数シード
             
         Returns:
             プロット用のデータ辞書
+            （features, importances, feature_index, shap_values, feature_values,
+              n_samples, n_plotted）
         """
         # SHAP値を計算
         shap_values = self.explain_prediction(X)
         
-        # 特徴量の重要度（絶対値の平均）
-        feature_importance = pd.DataFrame({
-            'feature': self.feature_names,
-            'importance': np.abs(shap_values).mean(axis=0)
-        }).nlargest(max_features, 'importance')
-        
-        # 選択された特徴量のインデックス
-        selected_indices = [self.feature_names.index(f) for f in feature_importance['feature']]
-        
-        # 各特徴量のSHAP値と実際の値
-        plot_data = []
-        for idx in selected_indices:
-            feature_name = self.feature_names[idx]
-            for i in range(len(X)):
-                plot_data.append({
-                    'feature': feature_name,
-                    'shap_value': float(shap_values[i, idx]),
-                    'feature_value': float(X.iloc[i, idx]),
-                    'importance': float(feature_importance[feature_importance['feature'] == feature_name]['importance'].iloc[0])
-                })
+        # 特徴量の重要度（絶対値の平均）の上位を選択（同値は元の順序を維持）
+        importance = np.abs(shap_values).mean(axis=0)
+        selected = np.argsort(-importance, kind='stable')[:max_features]
+        
+        # 描画する行を間引く
+        rows = np.arange(len(X))
+        if max_samples is not None and len(X) > max_samples:
+            rng = np.random.default_rng(random_state)
+            rows = np.sort(rng.choice(len(X), size=max_samples, replace=False))
+        
+        # (行, 特徴量) を取り出して特徴量ごとに並べる
+        feature_values = X.to_numpy(dtype=np.float64)[np.ix_(rows, selected)]
         
         return {
-            'data': plot_data,
-            'features': feature_importance['feature'].tolist(),
-            'importances': feature_importance['importance'].tolist()
+            'features': [self.feature_names[idx] for idx in selected],
+            'importances': importance[selected].tolist(),
+            'feature_index': np.repeat(np.arange(len(selected)), len(rows)),
+            'shap_values': shap_values[np.ix_(rows, selected)].T.ravel(),
+            'feature_values': feature_values.T.ravel(),
+            'n_samples': len(X),
+            'n_plotted': len(rows)
         }
     
     def create_dependence_plot_data(self, 
@@ -404,7 +613,7 @@ class InteractivePlotter:
     """インタラクティブなプロット生成クラス"""
     
     @staticmethod
-    def create_waterfall_plot(waterfall_data: Dict[str, Any]) -> go.Figure:
+    def create_waterfall_plot(waterfall_data: Dict[str, Any]) -> "go.Figure":
         """
         Plotlyでウォーターフォールプロットを作成
         
@@ -449,7 +658,7 @@ class InteractivePlotter:
         return fig
     
     @staticmethod
-    def create_force_plot(force_data: Dict[str, Any]) -> go.Figure:
+    def create_force_plot(force_data: Dict[str, Any]) -> "go.Figure":
         """
         Plotlyでフォースプロットを作成
         
@@ -500,32 +709,32 @@ class InteractivePlotter:
         return fig
     
     @staticmethod
-    def create_summary_plot(summary_data: Dict[str, Any]) -> go.Figure:
+    def create_summary_plot(summary_data: Dict[str, Any]) -> "go.Figure":
         """
         Plotlyでサマリープロットを作成
         
         Args:
-            summary_data: サマリープロット用データ
+            summary_data: create_summary_plot_data の列形式のデータ
             
         Returns:
             Plotlyフィギュア
         """
-        df = pd.DataFrame(summary_data['data'])
+        features = np.asarray(summary_data['features'])
         
         # プロット作成
         fig = px.scatter(
-            df, 
-            x='shap_value', 
-            y='feature',
-            color='feature_value',
+            x=summary_data['shap_values'],
+            y=features[summary_data['feature_index']],
+            color=summary_data['feature_values'],
             color_continuous_scale='RdBu',
-            labels={'shap_value': 'SHAP値', 'feature': '特徴量', 'feature_value': '特徴量の値'},
+            labels={'x': 'SHAP値', 'y': '特徴量', 'color': '特徴量の値'},
             title='特徴量の重要度と影響'
         )
         
+        # 重要度の高い特徴量を上に表示
         fig.update_layout(
             height=600,
-            yaxis={'categoryorder': 'total ascending'}
+            yaxis={'categoryorder': 'array', 'categoryarray': features[::-1].tolist()}
         )
         
         return fig
@@ -1,4 +1,16 @@
 # API Module
-from .realtime_api import app
+# 公開クラスは初回参照時に読み込む（サブモジュールだけを使う場合の起動を軽くする）
+import importlib
 
-__all__ = ['app']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'app': '.realtime_api',
+}
+
+__all__ = ['app']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+WebSocket Broadcast Hub
+チャンネル購読に基づくWebSocketの並行配信
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ClientConnection:
+    """接続中のクライアントと送信キュー"""
+
+    def __init__(self, websocket, client_id: int, queue_size: int):
+        """
+        初期化
+
+        Args:
+            websocket: send_text を持つWebSocket接続
+            client_id: 接続ID
+            queue_size: 送信キューの上限
+        """
+        self.websocket = websocket
+        self.client_id = client_id
+        self.channels: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        # 送信キューが最後に空になってから破棄したメッセージ数
+        self.drops_since_drained = 0
+        self.closed = False
+
+
+class BroadcastHub:
+    """チャンネル単位のWebSocketブロードキャストハブ"""
+
+    def __init__(self,
+                 queue_size: int = 100,
+                 max_consecutive_drops: int = 50,
+                 send_timeout: float = 5.0):
+        """
+        初期化
+
+        各クライアントは専用の送信タスクと上限付きキューを持つ。
+        配信はキューへの投入のみで完了するため、遅いクライアントが
+        他のクライアントへの配信を止めることはない。
+
+        Args:
+            queue_size: クライアントごとの送信キュー上限
+            max_consecutive_drops: 送信キューが空になるまでに破棄したメッセージ数がこれを超えたら切断
+                （ときどき送信できていても追いつけていないクライアントは切断する）
+            send_timeout: 1メッセージの送信タイムアウト（秒）
+        """
+        self.queue_size = queue_size
+        self.max_consecutive_drops = max_consecutive_drops
+        self.send_timeout = send_timeout
+
+        self.clients: Dict[int, ClientConnection] = {}
+        self.subscriptions: Dict[str, Set[ClientConnection]] = defaultdict(set)
+        self._next_id = 0
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.disconnected_slow = 0
+
+    async def connect(self, websocket, channels: Optional[Set[str]] = None) -> ClientConnection:
+        """
+        クライアントを登録して送信タスクを開始
+
+        Args:
+            websocket: 受け入れ済みのWebSocket接続
+            channels: 初期購読チャンネル
+
+        Returns:
+            ClientConnection
+        """
+        self._next_id += 1
+        connection = ClientConnection(websocket, self._next_id, self.queue_size)
+        self.clients[connection.client_id] = connection
+        for channel in channels or ():
+            self.subscribe(connection, channel)
+
+        connection.sender_task = asyncio.get_running_loop().create_task(self._sender(connection))
+        return connection
+
+    async def disconnect(self, connection: ClientConnection, close: bool = False):
+        """
+        クライアントの登録を解除
+
+        Args:
+            connection: 接続
+            close: WebSocketを閉じるか（ハブ側から切断する場合）
+        """
+        if connection.closed:
+            return
+        connection.closed = True
+
+        self.clients.pop(connection.client_id, None)
+        for channel in list(connection.channels):
+            self.unsubscribe(connection, channel)
+
+        sender_task = connection.sender_task
+        if sender_task is not None and sender_task is not asyncio.current_task():
+            sender_task.cancel()
+
+        if close:
+            try:
+                await connection.websocket.close(code=1013)
+            except Exception:
+                pass
+
+    def subscribe(self, connection: ClientConnection, channel: str):
+        """チャンネルを購読"""
+        connection.channels.add(channel)
+        self.subscriptions[channel].add(connection)
+
+    def unsubscribe(self, connection: ClientConnection, channel: str):
+        """チャンネルの購読を解除"""
+        connection.channels.discard(channel)
+        subscribers = self.subscriptions.get(channel)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.subscriptions[channel]
+
+    def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        """
+        チャンネルの購読者に配信
+
+        メッセージは1回だけシリアライズし、各クライアントのキューに投入する。
+
+        Args:
+            channel: チャンネル名
+            message: 送信メッセージ
+
+        Returns:
+            キューに投入したクライアント数
+        """
+        subscribers = self.subscriptions.get(channel)
+        if not subscribers:
+            return 0
+
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        self.published += 1
+
+        enqueued = 0
+        for connection in list(subscribers):
+            if self._enqueue(connection, text):
+                enqueued += 1
+        return enqueued
+
+    def send(self, connection: ClientConnection, message: Dict[str, Any]) -> bool:
+        """
+        特定のクライアントに送信（応答メッセージ用）
+
+        送信は常に送信タスク経由で行い、1つの接続への同時書き込みを避ける。
+        """
+        return self._enqueue(connection, json.dumps(message, ensure_ascii=False, default=str))
+
+    def _enqueue(self, connection: ClientConnection, text: str) -> bool:
+        """送信キューに投入（満杯の場合は最も古いメッセージを破棄）"""
+        if connection.closed:
+            return False
+
+        try:
+            connection.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        # 遅いクライアント: 古いメッセージを捨てて最新を優先する
+        try:
+            connection.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        connection.queue.put_nowait(text)
+        connection.dropped += 1
+        connection.drops_since_drained += 1
+        self.dropped += 1
+
+        if connection.drops_since_drained > self.max_consecutive_drops:
+            logger.warning(f"Disconnecting slow WebSocket client {connection.client_id} "
+                           f"({connection.dropped} messages dropped)")
+            self.disconnected_slow += 1
+            asyncio.get_running_loop().create_task(self.disconnect(connection, close=True))
+        return True
+
+    async def _sender(self, connection: ClientConnection):
+        """クライアントごとの送信ループ"""
+        try:
+            # wait_for は送信の完了と同時のキャンセルを握りつぶすことがあるため、切断済みかも確認する
+            while not connection.closed:
+                text = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(text), self.send_timeout)
+                connection.sent += 1
+                # 追いついた（キューが空になった）時点で破棄数を数え直す
+                if connection.queue.empty():
+                    connection.drops_since_drained = 0
+                self.delivered += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out for client {connection.client_id}")
+            self.disconnected_slow += 1
+            await self.disconnect(connection, close=True)
+        except Exception as e:
+            logger.debug(f"WebSocket client {connection.client_id} send failed: {e}")
+            await self.disconnect(connection)
+
+    async def close_all(self):
+        """全クライアントを切断"""
+        for connection in list(self.clients.values()):
+            await self.disconnect(connection, close=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """配信統計を取得"""
+        return {
+            'clients': len(self.clients),
+            'channels': {
+                channel: len(subscribers) for channel, subscribers in self.subscriptions.items()
+            },
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'disconnected_slow': self.disconnected_slow,
+            'queued': sum(connection.queue.qsize() for connection in self.clients.values())
+        }
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+"""
+Prediction Cache Module
+予測結果のLRU/TTLキャッシュ（マルチワーカー共有バックエンド対応）
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# 共有キャッシュバックエンド（オプショナル）
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 予測結果に影響する入力フィールド
+MODEL_RELEVANT_FIELDS = (
+    'name',
+    'description',
+    'keywords',
+    'price',
+    'brand_strength',
+    'ingredient_novelty',
+    'market_saturation',
+    'image_url'
+)
+
+
+def make_cache_key(product: Dict[str, Any], model_version: str) -> str:
+    """
+    正規化したキャッシュキーを生成
+
+    Args:
+        product: 製品情報
+        model_version: モデルバージョン
+
+    Returns:
+        SHA-256ハッシュのキャッシュキー
+    """
+    canonical = {field: product.get(field) for field in MODEL_RELEVANT_FIELDS}
+
+    # キーワードは順序に依存しない特徴量なので並べ替える
+    keywords = canonical.get('keywords')
+    if isinstance(keywords, (list, tuple)):
+        canonical['keywords'] = sorted(str(k) for k in keywords)
+
+    # 浮動小数点の表記揺れを吸収
+    for field in ('brand_strength', 'ingredient_novelty', 'market_saturation'):
+        if canonical.get(field) is not None:
+            canonical[field] = round(float(canonical[field]), 6)
+
+    payload = json.dumps(
+        {'model_version': model_version, 'input': canonical},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheBackend(ABC):
+    """共有キャッシュバックエンドのインターフェース"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """値を取得（存在しない・期限切れの場合None）"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        """有効期間付きで値を保存"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """値を削除"""
+
+    @abstractmethod
+    def clear(self):
+        """全ての値を削除"""
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """プロセス内共有バックエンド（テスト・単一ホスト用のスタンドイン）"""
+
+    def __init__(self):
+        """初期化"""
+        self._store: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._store.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._store[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        with self._lock:
+            self._store[key] = (value, time.monotonic() + ttl_seconds)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._store.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis共有バックエンド（マルチワーカー構成用）"""
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "ahp:prediction:"):
+        """
+        初期化
+
+        Args:
+            url: Redis接続URL（未指定時は環境変数REDIS_URL）
+            prefix: キーのプレフィックス
+        """
+        if not REDIS_AVAILABLE:
+            raise ImportError("redis package is required for RedisCacheBackend")
+
+        self.client = redis.Redis.from_url(url or os.getenv("REDIS_URL", "redis://localhost:6379"))
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        self.client.set(self.prefix + key, value, px=int(ttl_seconds * 1000))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class PredictionCache:
+    """LRU + TTL 予測キャッシュ"""
+
+    def __init__(self,
+                 max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 300,
+                 model_version: str = "unknown",
+                 backend: Optional[CacheBackend] = None,
+                 metrics: Optional[Any] = None):
+        """
+        初期化
+
+        Args:
+            max_entries: ローカルに保持する最大エントリ数
+            max_bytes: ローカルに保持する最大バイト数
+            ttl_seconds: エントリの有効期間（秒）
+            model_version: キーに含めるモデルバージョン
+            backend: 共有バックエンド（マルチワーカー用、オプション）
+            metrics: set_cache_hit_ratio を持つメトリクスコレクター
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.model_version = model_version
+        self.backend = backend
+        self.metrics = metrics
+
+        # key -> (serialized value, expires_at)
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._expiry_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(self, product: Dict[str, Any]) -> str:
+        """現在のモデルバージョンでキャッシュキーを生成"""
+        return make_cache_key(product, self.model_version)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュから取得
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            キャッシュ済みの値（存在しない・期限切れの場合None）
+        """
+        now = time.monotonic()
+        value = None
+
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[1] > now:
+                    self._entries.move_to_end(key)
+                    value = item[0]
+                else:
+                    self._remove(key)
+                    self.expirations += 1
+
+        if value is None and self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"Shared cache read failed: {e}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._store(key, value, now + self.ttl_seconds)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self._export_hit_ratio()
+
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        キャッシュに保存
+
+        Args:
+            key: キャッシュキー
+            value: 保存する値（JSONシリアライズ可能な辞書）
+        """
+        data = json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+
+        with self._lock:
+            self._store(key, data, time.monotonic() + self.ttl_seconds)
+
+        if self.backend is not None:
+            try:
+                self.backend.set(key, data, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed: {e}")
+
+    def invalidate(self, key: str):
+        """エントリを削除"""
+        with self._lock:
+            self._remove(key)
+        if self.backend is not None:
+            try:
+                self.backend.delete(key)
+            except Exception as e:
+                logger.warning(f"Shared cache delete failed: {e}")
+
+    def clear(self):
+        """ローカルキャッシュを全削除"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def set_model_version(self, model_version: str):
+        """
+        モデルバージョンを更新
+
+        旧バージョンのキーは参照されなくなるため、ローカル分は即座に破棄する。
+        共有バックエンド側はTTLで自然に失効する。
+        """
+        if model_version != self.model_version:
+            self.model_version = model_version
+            self.clear()
+
+    def expire(self) -> int:
+        """
+        期限切れエントリを削除
+
+        Returns:
+            削除したエントリ数
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    async def _expiry_loop(self, interval_seconds: float):
+        """期限切れエントリを定期的に削除するループ"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            removed = self.expire()
+            if removed:
+                logger.debug(f"Expired {removed} cached predictions")
+
+    def start_expiry_task(self, interval_seconds: float = 30) -> asyncio.Task:
+        """バックグラウンドの期限切れ削除タスクを開始（イベントループ内で呼び出す）"""
+        if self._expiry_task is None or self._expiry_task.done():
+            self._expiry_task = asyncio.get_running_loop().create_task(
+                self._expiry_loop(interval_seconds)
+            )
+        return self._expiry_task
+
+    def stop_expiry_task(self):
+        """バックグラウンドタスクを停止"""
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+
+    @property
+    def hit_ratio(self) -> float:
+        """キャッシュヒット率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キャッシュ統計を取得"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hit_ratio,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'model_version': self.model_version,
+                'shared_backend': type(self.backend).__name__ if self.backend else None
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, data: bytes, expires_at: float):
+        """エントリを保存しLRU制限を適用（ロック保持中に呼び出す）"""
+        if len(data) > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (data, expires_at)
+        self._bytes += len(data)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key, (oldest_data, _) = self._entries.popitem(last=False)
+            self._bytes -= len(oldest_data)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        """エントリを削除（ロック保持中に呼び出す）"""
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[0])
+
+    def _export_hit_ratio(self):
+        """ヒット率をメトリクスに反映"""
+        if self.metrics is not None:
+            self.metrics.set_cache_hit_ratio(self.hit_ratio)
+
+
+def create_prediction_cache(metrics: Optional[Any] = None) -> PredictionCache:
+    """
+    環境変数から予測キャッシュを生成
+
+    PREDICTION_CACHE_BACKEND=redis の場合はREDIS_URLの共有バックエンドを使用する。
+    """
+    backend = None
+    if os.getenv("PREDICTION_CACHE_BACKEND", "local").lower() == "redis":
+        try:
+            backend = RedisCacheBackend()
+        except ImportError as e:
+            logger.warning(f"Shared cache backend unavailable: {e}")
+
+    return PredictionCache(
+        max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "10000")),
+        max_bytes=int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300")),
+        backend=backend,
+        metrics=metrics
+    )
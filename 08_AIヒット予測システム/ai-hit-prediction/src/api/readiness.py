@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Model Readiness Module
+モデルの読み込み状態を管理する状態機械
+"""
+
+import threading
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+
+class ModelState(str, Enum):
+    """モデルの状態"""
+    STARTING = "starting"
+    LOADING = "loading"
+    TRAINING = "training"
+    READY = "ready"
+    FAILED = "failed"
+
+
+# 許可する状態遷移
+ALLOWED_TRANSITIONS = {
+    ModelState.STARTING: {ModelState.LOADING, ModelState.TRAINING, ModelState.FAILED},
+    ModelState.LOADING: {
+        ModelState.LOADING, ModelState.TRAINING, ModelState.READY, ModelState.FAILED
+    },
+    ModelState.TRAINING: {ModelState.READY, ModelState.FAILED},
+    # 再読み込み中も旧モデルで応答を続けられるよう READY から遷移できる
+    ModelState.READY: {ModelState.LOADING, ModelState.TRAINING},
+    # 再試行で再び失敗した場合は新しいエラー内容を記録する
+    ModelState.FAILED: {ModelState.LOADING, ModelState.TRAINING, ModelState.FAILED},
+}
+
+
+class ModelReadiness:
+    """モデルのレディネス状態機械"""
+
+    def __init__(self, history_size: int = 20):
+        """
+        初期化
+
+        Args:
+            history_size: 保持する遷移履歴の件数
+        """
+        self.state = ModelState.STARTING
+        self.detail: Optional[str] = None
+        self.since = datetime.now()
+        self.started_at = self.since
+        self.ready_at: Optional[datetime] = None
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def transition(self, state: ModelState, detail: Optional[str] = None):
+        """
+        状態を遷移
+
+        Args:
+            state: 遷移先の状態
+            detail: 補足情報（読み込み中のパス・エラー内容など）
+
+        Raises:
+            ValueError: 許可されていない遷移の場合
+        """
+        with self._lock:
+            if state not in ALLOWED_TRANSITIONS[self.state]:
+                raise ValueError(
+                    f"Invalid model state transition: {self.state.value} -> {state.value}"
+                )
+
+            now = datetime.now()
+            self.history.append({
+                'from': self.state.value,
+                'to': state.value,
+                'detail': detail,
+                'timestamp': now.isoformat()
+            })
+            self.state = state
+            self.detail = detail
+            self.since = now
+            if state == ModelState.READY and self.ready_at is None:
+                self.ready_at = now
+
+    @property
+    def is_ready(self) -> bool:
+        """推論可能か（一度READYになったモデルは再読み込み中も推論に使える）"""
+        if self.state == ModelState.READY:
+            return True
+        return self.ready_at is not None and self.state in (ModelState.LOADING, ModelState.TRAINING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """状態を辞書で取得"""
+        with self._lock:
+            return {
+                'state': self.state.value,
+                'ready': self.is_ready,
+                'detail': self.detail,
+                'since': self.since.isoformat(),
+                'startup_seconds': (
+                    (self.ready_at - self.started_at).total_seconds() if self.ready_at else None
+                ),
+                'history': list(self.history)
+            }
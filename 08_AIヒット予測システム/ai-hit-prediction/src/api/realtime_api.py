@@ -4,17 +4,24 @@ Real-time API Module
 リアルタイムデータ連携とWebSocket通信
 """
 
-from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable
 import asyncio
+import contextvars
+import functools
 import json
 import logging
+import time
+import uuid
+import weakref
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 from pathlib import Path
+import os
 import sys
 
 # プロジェクトルートをパスに追加
@@ -23,7 +30,35 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from src.preprocessing.data_pipeline import DataPipeline
 from src.preprocessing.feature_engineering import FeatureEngineer
 from src.models.basic_model import HitPredictionModel
-from src.multimodal.image_analyzer import MultimodalAnalyzer
+from src.api.prediction_cache import create_prediction_cache
+from src.api.broadcast_hub import BroadcastHub
+from src.data_collection.trend_feed import (
+    TREND_SNAPSHOT_TOPIC,
+    BASELINE_KEYWORDS,
+    TrendAggregator,
+    TrendEventBus,
+    snapshot_from_collected_data
+)
+from src.data_collection.trend_store import MAX_PERIOD_DAYS, TrendTimeSeriesStore
+from src.ml.streaming_drift import StreamingDriftDetector, baseline_path as drift_baseline_path
+from src.ml.retraining_worker import JobStatus, RetrainingWorker
+from src.ml.model_registry import ModelRegistry
+from src.api.shadow_evaluation import AB_TESTING_AVAILABLE, ShadowEvaluator
+from src.api.readiness import ModelReadiness, ModelState
+from src.api.request_timing import TimedAPIRoute, TimingMiddleware, stage
+from src.lazy_imports import LazyInstance
+
+# モニタリング（オプショナル）
+try:
+    from src.monitoring.logger import metrics_collector, performance_monitor, PROMETHEUS_AVAILABLE
+    from src.monitoring.logger import logger as structured_logger
+    MONITORING_AVAILABLE = True
+except ImportError:
+    metrics_collector = None
+    performance_monitor = None
+    structured_logger = None
+    PROMETHEUS_AVAILABLE = False
+    MONITORING_AVAILABLE = False
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -35,6 +70,8 @@ app = FastAPI(
     description="リアルタイム化粧品ヒット予測API",
     version="4.0.0"
 )
+# エンドポイント関数の終了を記録し、レスポンスのシリアライズ時間を計測する
+app.router.route_class = TimedAPIRoute
 
 # CORS設定
 app.add_middleware(
@@ -45,13 +82,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# リクエスト単位のレイテンシ計測（ステージ別スパン・Server-Timing・Prometheus）
+app.add_middleware(
+    TimingMiddleware,
+    metrics=metrics_collector,
+    monitor=performance_monitor,
+    server_timing=os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+)
+
 # グローバル変数
-connected_clients = []
-prediction_cache = {}
+broadcast_hub = BroadcastHub(
+    queue_size=int(os.getenv("WEBSOCKET_QUEUE_SIZE", "100")),
+    send_timeout=float(os.getenv("WEBSOCKET_SEND_TIMEOUT", "5"))
+)
+prediction_cache = create_prediction_cache(metrics=metrics_collector)
+# 予測ごとの TreeSHAP による要因分析（1行あたり数ミリ秒かかるため既定では無効）
+PREDICTION_FACTORS_ENABLED = os.getenv("PREDICTION_FACTORS_ENABLED", "false").lower() == "true"
 model_instance = None
+model_artifact_path: Optional[Path] = None
+# 昇格済みモデルのインデックス（複数のAPIワーカーで共有、ファイルは最初の登録時に作成）
+model_registry = ModelRegistry(os.getenv("MODEL_REGISTRY_DIR", "models/registry"))
+MODEL_SEGMENT = os.getenv("MODEL_SEGMENT", "default")
+# 読み込み済みモデルのレジストリ世代（レジストリ以外から読み込んだ場合はNone）
+model_generation: Optional[int] = None
+model_readiness = ModelReadiness()
+# 初期化とホットスワップの排他（起動時にイベントループ上で作り直す）
+model_swap_lock = asyncio.Lock()
+# 起動時に開始したバックグラウンドタスク（参照を保持し、停止時にキャンセルする）
+background_task_set: set = set()
+model_init_task: Optional[asyncio.Task] = None
+trend_bus = TrendEventBus()
+trend_aggregator = TrendAggregator()
+trend_aggregator.seed(BASELINE_KEYWORDS)
+trend_store = TrendTimeSeriesStore()
+# トレンド時系列の保存先（再起動後も過去の系列を返せるように定期的に保存する）
+trend_store_path = Path(os.getenv("TREND_STORE_PATH", "data/trends/trend_store.json"))
+trend_store_saved_observations = 0
+drift_monitor = StreamingDriftDetector(window_size=int(os.getenv("DRIFT_WINDOW_SIZE", "1000")))
 pipeline_instance = None
 engineer_instance = None
-multimodal_instance = None
+# 学習・評価は別プロセスで行い、昇格時は推論中のモデルを差し替える
+retraining_worker = RetrainingWorker(
+    model_dir=os.getenv("RETRAIN_MODEL_DIR", "models/candidates"),
+    max_workers=int(os.getenv("RETRAIN_MAX_WORKERS", "2")),
+    cpu_limit=int(os.getenv("RETRAIN_CPU_LIMIT", "0")) or None,
+    nice=int(os.getenv("RETRAIN_NICE", "10")),
+    min_improvement=float(os.getenv("RETRAIN_MIN_IMPROVEMENT", "0.0")),
+    production_path=lambda: model_artifact_path,
+    on_promote=lambda path, job: promote_candidate(path, job)
+)
+# 再学習した候補の昇格方法（direct: ホールドアウト評価のみで昇格 / shadow: シャドー評価を経て昇格）
+RETRAIN_PROMOTION = os.getenv("RETRAIN_PROMOTION", "direct")
+# 候補モデルのシャドー評価（本番と候補の正解率はA/Bテストとして記録する）
+shadow_evaluator: Optional[ShadowEvaluator] = None
+# シャドー評価のA/Bテスト管理（最初のシャドー評価の開始時に生成する）
+ab_test_manager = None
+
+
+def _create_multimodal_analyzer():
+    """マルチモーダル分析器を生成（torch/transformersはここで初めて読み込む）"""
+    from src.multimodal.image_analyzer import MultimodalAnalyzer
+    return MultimodalAnalyzer()
+
+
+# 画像付きリクエストの初回、またはウォームアップ時に初期化する
+multimodal_instance = LazyInstance(_create_multimodal_analyzer, name="MultimodalAnalyzer")
+
+# トレンド時系列のカテゴリ（カテゴリ指定の無いスナップショットはキーワードごとに振り分ける）
+DEFAULT_TREND_CATEGORIES = ['スキンケア', 'メイクアップ', 'ヘアケア']
 
 
 # Pydanticモデル
@@ -76,55 +174,579 @@ class PredictionResponse(BaseModel):
     factors: Dict[str, float]
     recommendations: List[str]
     timestamp: str
+    prediction_id: Optional[str] = None
 
 
 class MarketTrendRequest(BaseModel):
     """市場トレンドリクエストモデル"""
     category: str = Field(..., description="カテゴリ")
-    period_days: int = Field(30, description="期間（日数）")
+    period_days: int = Field(30, ge=1, le=MAX_PERIOD_DAYS, description="期間（日数）")
     keywords: Optional[List[str]] = Field(None, description="追跡キーワード")
 
 
+class TrendSnapshotRequest(BaseModel):
+    """トレンドスナップショットモデル"""
+    source: str = Field("external", description="データソース")
+    category: Optional[str] = Field(None, description="カテゴリ")
+    timestamp: Optional[str] = Field(None, description="観測時刻")
+    keywords: Dict[str, Dict[str, float]] = Field(
+        ..., description="キーワードごとのscore/buzz_score/mentions"
+    )
+
+
 class BatchPredictionRequest(BaseModel):
     """バッチ予測リクエストモデル"""
     products: List[ProductRequest]
     include_analysis: bool = Field(True, description="詳細分析を含むか")
 
 
+class ShadowStartRequest(BaseModel):
+    """シャドー評価の開始リクエストモデル（version_id か job_id のどちらかを指定）"""
+    version_id: Optional[str] = Field(None, description="レジストリに登録済みの候補バージョン")
+    job_id: Optional[str] = Field(None, description="候補を作成した再学習ジョブ")
+    sample_rate: float = Field(0.1, gt=0, le=1, description="シャドー採点するリクエストの割合")
+    min_samples: int = Field(200, ge=1, description="判定に必要な採点件数")
+    min_labeled: int = Field(50, ge=1, description="キャリブレーションで判定するのに必要な正解ラベル数")
+    min_agreement: float = Field(0.9, ge=0, le=1, description="ラベル無しで昇格するのに必要な一致率")
+    require_outcomes: bool = Field(False, description="正解ラベルによる判定を必須にするか")
+    auto_promote: bool = Field(False, description="判定が promote / reject になったら自動で昇格・終了するか")
+    evaluation_interval: float = Field(5.0, ge=0, description="自動判定の最短間隔（秒）")
+
+
+class ShadowOutcome(BaseModel):
+    """予測の実際の結果"""
+    prediction_id: str
+    label: int = Field(..., ge=0, le=1, description="0: 非ヒット, 1: ヒット")
+
+
+class ShadowOutcomesRequest(BaseModel):
+    """実際の結果の登録リクエストモデル"""
+    outcomes: List[ShadowOutcome]
+
+
+class RetrainRequest(BaseModel):
+    """再学習リクエストモデル"""
+    products: List[ProductRequest] = Field(..., min_length=10, description="学習に使う製品")
+    labels: List[int] = Field(..., description="製品ごとのラベル（0: 非ヒット, 1: ヒット）")
+    holdout_fraction: float = Field(0.2, gt=0, lt=0.5, description="評価に使うホールドアウトの割合")
+    promote: bool = Field(True, description="本番モデルより良ければ昇格するか")
+    n_estimators: Optional[int] = Field(None, ge=1, le=1000, description="決定木の本数")
+
+
 # 初期化関数
+def _build_feature_matrix(products: List[Dict[str, Any]]) -> pd.DataFrame:
+    """推論時と同じパイプラインで学習用の特徴量行列を作成"""
+    base_features = pd.concat(
+        [pipeline_instance.extract_features(product) for product in products], ignore_index=True
+    )
+    return engineer_instance.create_advanced_features(base_features)
+
+
+def _load_model_artifact(model_path: Path) -> HitPredictionModel:
+    """保存済みモデルを推論用に読み込み"""
+    model = HitPredictionModel()
+    # コンパイル済みフォレストをメモリマップしてワーカー間で共有
+    model.load_serving_model(str(model_path))
+    _prepare_explainer(model)
+    return model
+
+
+# TreeSHAP で説明できないと警告済みのモデル（要因分析のたびに警告しない）
+_unexplained_models: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _warn_unexplained(model: Any, error: Exception):
+    """要因分析ができないモデルを警告（モデルごとに1回）"""
+    if model in _unexplained_models:
+        return
+    _unexplained_models.add(model)
+    logger.warning("Per-prediction factors are disabled for this model, "
+                   f"factors will be empty: {error}")
+
+
+def _prepare_explainer(model: HitPredictionModel):
+    """要因分析用の TreeSHAP の表を推論の受付前に作成"""
+    if not PREDICTION_FACTORS_ENABLED:
+        return
+    try:
+        model.get_shap_explainer()
+    except ValueError as e:
+        _warn_unexplained(model, e)
+
+
+def _train_fallback_model(fallback_path: Path, n_samples: int = 200) -> HitPredictionModel:
+    """
+    モデル成果物が無い場合の暫定モデルを学習して保存
+    
+    推論時と同じ特徴量パイプラインで学習し、次回起動時は保存済みの
+    暫定モデルを読み込むことで学習を繰り返さない。
+    """
+    rng = np.random.default_rng()
+    products = [
+        {
+            'name': f'Fallback Product {i}',
+            'description': '',
+            'keywords': list(rng.choice(['serum', 'vitamin c', 'retinol', 'ceramide', 'cica'],
+                                        2, replace=False)),
+            'price': int(rng.integers(1000, 20000)),
+            'brand_strength': float(rng.uniform(0, 1)),
+            'ingredient_novelty': float(rng.uniform(0, 1)),
+            'market_saturation': float(rng.uniform(0, 1)),
+        }
+        for i in range(n_samples)
+    ]
+    X = _build_feature_matrix(products)
+    y = rng.choice([0, 1], n_samples, p=[0.7, 0.3])
+    
+    model = HitPredictionModel(model_dir=str(fallback_path.parent))
+    model.train(X, y, validate=False)
+    # 推論データのドリフト監視用の学習データの分布も save_model が書き出す
+    model.save_model(fallback_path.name)
+    _prepare_explainer(model)
+    return model
+
+
+def _load_drift_baseline(model_path: Path) -> StreamingDriftDetector:
+    """
+    モデル成果物と一緒に保存されたドリフトベースラインを読み込み
+    
+    ベースラインの無い成果物（学習データを持たずに書き出したモデルなど）は、
+    最初の DRIFT_REFERENCE_ROWS 行の推論データをベースラインにして監視する。
+    """
+    detector = StreamingDriftDetector(window_size=drift_monitor.window_size)
+    baseline_path = drift_baseline_path(model_path)
+    if baseline_path.exists():
+        try:
+            detector.load_baseline(baseline_path)
+            return detector
+        except Exception as e:
+            logger.warning(f"Failed to load drift baseline from {baseline_path}: {e}")
+    logger.warning(f"No drift baseline for {model_path}, "
+                   "building one from the first served requests")
+    reference_rows = int(os.getenv("DRIFT_REFERENCE_ROWS", str(drift_monitor.window_size)))
+    detector.start_reference(reference_rows)
+    return detector
+
+
+def _save_reference_baseline(detector: StreamingDriftDetector, model_path: Optional[Path]):
+    """推論データから作ったベースラインをモデル成果物の隣に保存（再起動後も同じ基準で監視する）"""
+    if model_path is None:
+        return
+    try:
+        detector.save_baseline(drift_baseline_path(model_path))
+    except OSError as e:
+        logger.warning(f"Failed to save drift baseline for {model_path}: {e}")
+
+
+async def initialize_model():
+    """
+    モデルをバックグラウンドで読み込み（無ければ暫定モデルを学習）
+    
+    レジストリの本番モデル → 本番モデル → キャッシュ済みの暫定モデル → 暫定モデルの学習
+    の順に試し、準備が完了した時点で推論を受け付ける。
+    """
+    model_path = Path(os.getenv("MODEL_PATH", "models/best_model.pkl"))
+    fallback_path = Path(os.getenv("MODEL_FALLBACK_PATH", "models/fallback_model.pkl"))
+    
+    async with model_swap_lock:
+        await _initialize_model_locked(model_path, fallback_path)
+
+
+async def initialize_model_with_retry(max_attempts: Optional[int] = None,
+                                     backoff_seconds: Optional[float] = None,
+                                     max_backoff_seconds: float = 60.0):
+    """
+    モデルの初期化が失敗（FAILED）した場合は間隔を倍にしながら再試行
+    
+    Args:
+        max_attempts: 最大試行回数（省略時は環境変数 MODEL_INIT_MAX_ATTEMPTS）
+        backoff_seconds: 最初の再試行までの秒数（省略時は環境変数 MODEL_INIT_BACKOFF_SECONDS）
+        max_backoff_seconds: 再試行間隔の上限（秒）
+    """
+    max_attempts = max_attempts or int(os.getenv("MODEL_INIT_MAX_ATTEMPTS", "5"))
+    delay = backoff_seconds
+    if delay is None:
+        delay = float(os.getenv("MODEL_INIT_BACKOFF_SECONDS", "2"))
+    
+    for attempt in range(1, max_attempts + 1):
+        await initialize_model()
+        if model_readiness.state != ModelState.FAILED:
+            return
+        if attempt == max_attempts:
+            logger.error(
+                f"Model initialization failed after {attempt} attempts: {model_readiness.detail}"
+            )
+            return
+        logger.warning(f"Model initialization attempt {attempt} failed, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_backoff_seconds)
+
+
+async def run_in_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    同期関数を既定のスレッドプールで実行（asyncio.to_thread 相当、Python 3.8 でも使える）
+    
+    asyncio.to_thread と同じくコンテキストをコピーして実行するため、
+    スレッド内のステージ計測も呼び出し元のリクエストに記録される。
+    
+    Args:
+        func: 実行する関数
+        *args: 位置引数
+        **kwargs: キーワード引数
+    
+    Returns:
+        関数の戻り値
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def _on_background_task_done(task: asyncio.Task):
+    """バックグラウンドタスクの終了時に参照を外し、例外をログに残す"""
+    background_task_set.discard(task)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Background task {task.get_name()} failed: {error!r}")
+
+
+def spawn_background_task(coro, name: str) -> asyncio.Task:
+    """
+    参照を保持したバックグラウンドタスクを開始（ガベージコレクションで消えず、例外も記録される）
+    
+    Args:
+        coro: 実行するコルーチン
+        name: タスク名
+    
+    Returns:
+        開始したタスク
+    """
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    background_task_set.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+async def _initialize_model_locked(model_path: Path, fallback_path: Path):
+    """initialize_model の本体（model_swap_lock を保持して呼ぶ）"""
+    global model_instance, model_artifact_path, model_generation, drift_monitor
+    
+    try:
+        model = None
+        artifact_path = fallback_path
+        generation = None
+        registered = None
+        if model_registry.exists:
+            registered = await run_in_thread(model_registry.current, MODEL_SEGMENT)
+        candidates = [(model_path, None), (fallback_path, None)]
+        if registered is not None:
+            candidates.insert(0, (Path(registered['model_file']), registered['generation']))
+        
+        for path, path_generation in candidates:
+            if not path.exists():
+                continue
+            model_readiness.transition(ModelState.LOADING, str(path))
+            try:
+                model = await run_in_thread(_load_model_artifact, path)
+                artifact_path = path
+                generation = path_generation
+                logger.info(f"Model loaded from {path}")
+                break
+            except Exception as e:
+                logger.warning(f"Failed to load model from {path}: {e}")
+        
+        if model is None:
+            model_readiness.transition(
+                ModelState.TRAINING, f"no usable model artifact, training {fallback_path}"
+            )
+            logger.info("Training fallback model in background...")
+            model = await run_in_thread(_train_fallback_model, fallback_path)
+        
+        model_instance = model
+        model_artifact_path = artifact_path
+        model_generation = generation
+        drift_monitor = _load_drift_baseline(artifact_path)
+        # キャッシュキーにモデルバージョンを反映
+        prediction_cache.set_model_version(model_instance.model_version or "unknown")
+        model_readiness.transition(ModelState.READY, model_instance.model_version)
+        logger.info("Model ready")
+        
+    except Exception as e:
+        logger.error(f"Model initialization failed: {e}")
+        model_readiness.transition(ModelState.FAILED, str(e))
+
+
+async def hot_swap_model(model_path: str, generation: Optional[int] = None):
+    """
+    推論中のモデルを再起動せずに差し替え
+    
+    新しいモデルをスレッドで読み込み終えてから参照を1回で付け替える。
+    処理中のリクエストは取得済みの旧モデルで完了し、差し替え中も推論は止まらない。
+    
+    Args:
+        model_path: 昇格したモデルファイルのパス
+        generation: 昇格時のレジストリ世代
+    """
+    global model_instance, model_artifact_path, model_generation, drift_monitor
+    
+    path = Path(model_path)
+    async with model_swap_lock:
+        previous = model_instance
+        model_readiness.transition(ModelState.LOADING, f"hot swap to {path}")
+        try:
+            model = await run_in_thread(_load_model_artifact, path)
+            baseline = await run_in_thread(_load_drift_baseline, path)
+        except Exception as e:
+            logger.error(f"Hot swap to {path} failed: {e}")
+            if previous is not None:
+                model_readiness.transition(ModelState.READY, previous.model_version)
+            else:
+                model_readiness.transition(ModelState.FAILED, str(e))
+            raise
+        
+        model_instance = model
+        model_artifact_path = path
+        model_generation = generation
+        drift_monitor = baseline
+        prediction_cache.set_model_version(model.model_version or "unknown")
+        model_readiness.transition(ModelState.READY, model.model_version)
+    
+    logger.info(f"Model hot-swapped to {model.model_version} from {path}")
+    await notify_clients({
+        "type": "model_promoted",
+        "data": {"model_version": model.model_version, "timestamp": datetime.now().isoformat()}
+    }, "predictions")
+
+
+async def _register_candidate(model_path: str, job: Any) -> str:
+    """再学習ジョブの候補をレジストリに登録してバージョンIDを返す"""
+    metadata = {
+        "job_id": job.job_id,
+        "reason": job.reason,
+        "training_samples": job.n_samples,
+        "training_time": job.training_time,
+        "production_metrics": job.production_metrics
+    }
+    return await run_in_thread(
+        model_registry.register, model_path, job.candidate_metrics, metadata, MODEL_SEGMENT
+    )
+
+
+async def promote_candidate(model_path: str, job: Any):
+    """
+    再学習ジョブの候補をレジストリに登録・昇格し、このワーカーのモデルを差し替え
+    
+    RETRAIN_PROMOTION=shadow の場合はすぐには昇格せず、シャドー評価の判定で昇格する。
+    他のAPIワーカーはレジストリの世代番号の変化で昇格に気付く（registry_watch_task）。
+    
+    Args:
+        model_path: 候補モデルのファイルパス
+        job: 再学習ジョブ
+    
+    Returns:
+        シャドー評価を開始した場合は JobStatus.SHADOWING（ジョブは判定後に終了する）
+    """
+    version_id = await _register_candidate(model_path, job)
+    if RETRAIN_PROMOTION == "shadow":
+        await start_shadow(
+            version_id,
+            job_id=job.job_id,
+            sample_rate=float(os.getenv("SHADOW_SAMPLE_RATE", "0.1")),
+            min_samples=int(os.getenv("SHADOW_MIN_SAMPLES", "200")),
+            evaluation_interval=float(os.getenv("SHADOW_EVALUATION_INTERVAL_SECONDS", "5")),
+            auto_promote=True
+        )
+        return JobStatus.SHADOWING
+    promoted = await run_in_thread(model_registry.promote, version_id, MODEL_SEGMENT)
+    await hot_swap_model(promoted['model_file'], promoted['generation'])
+
+
+async def start_shadow(version_id: str, **options) -> ShadowEvaluator:
+    """
+    レジストリの候補バージョンのシャドー評価を開始（実行中の評価は停止する）
+    
+    Args:
+        version_id: 候補のバージョンID
+        **options: ShadowEvaluator の設定
+    
+    Returns:
+        ShadowEvaluator
+    
+    Raises:
+        KeyError: バージョンが登録されていない場合
+    """
+    global shadow_evaluator, ab_test_manager
+    
+    info = await run_in_thread(model_registry.get, version_id)
+    if info is None:
+        raise KeyError(f"Version {version_id} not found")
+    if shadow_evaluator is not None:
+        previous, shadow_evaluator = shadow_evaluator, None
+        await previous.stop()
+        _finish_shadow_job(previous, JobStatus.REJECTED,
+                           f"shadow evaluation replaced by {version_id}")
+    if ab_test_manager is None and AB_TESTING_AVAILABLE:
+        from src.business.ab_testing import ABTestManager
+        ab_test_manager = ABTestManager()
+    
+    evaluator = ShadowEvaluator(
+        candidate_version=version_id,
+        production_version=model_instance.model_version if model_instance is not None else None,
+        ab_test_manager=ab_test_manager,
+        structured_logger=structured_logger,
+        on_promote=_promote_shadow_candidate,
+        on_reject=_reject_shadow_candidate,
+        **options
+    )
+    await evaluator.start(model_path=info['model_file'])
+    shadow_evaluator = evaluator
+    return evaluator
+
+
+async def _promote_shadow_candidate(evaluator: ShadowEvaluator):
+    """シャドー評価を通過した候補を昇格して差し替え"""
+    promoted = await run_in_thread(model_registry.promote, evaluator.candidate_version,
+                                   MODEL_SEGMENT)
+    await hot_swap_model(promoted['model_file'], promoted['generation'])
+    _end_shadow(evaluator, JobStatus.PROMOTED)
+
+
+async def _reject_shadow_candidate(evaluator: ShadowEvaluator):
+    """シャドー評価で不採用になった候補の評価を終了"""
+    _end_shadow(evaluator, JobStatus.REJECTED)
+
+
+def _end_shadow(evaluator: ShadowEvaluator, status: JobStatus):
+    """判定の出たシャドー評価を停止し、候補を学習したジョブを終了"""
+    global shadow_evaluator
+    
+    if shadow_evaluator is evaluator:
+        shadow_evaluator = None
+    evaluation = evaluator.evaluate()
+    _finish_shadow_job(evaluator, status,
+                       f"shadow {evaluation['decision']}: " + "; ".join(evaluation['reasons']))
+    # 判定は採点タスク内から呼ばれることがあるため、停止は別タスクで行う
+    spawn_background_task(evaluator.stop(), "shadow_stop")
+
+
+def _finish_shadow_job(evaluator: ShadowEvaluator, status: JobStatus, decision: str):
+    """シャドー評価した候補の再学習ジョブを終了（ジョブから開始した評価のみ）"""
+    if evaluator.job_id is not None:
+        retraining_worker.complete_job(evaluator.job_id, status, decision=decision)
+
+
+async def sync_registry_model() -> bool:
+    """
+    レジストリの本番モデルが読み込み済みのものと異なれば差し替え
+    
+    変更カウンター（世代番号）の比較だけで判定し、成果物は変更があった場合のみ読み込む。
+    
+    Returns:
+        差し替えた場合True
+    """
+    if not model_registry.exists or model_registry.generation() == model_generation:
+        return False
+    current = model_registry.current(MODEL_SEGMENT)
+    if current is None or current['generation'] == model_generation:
+        return False
+    logger.info(f"Registry promotion detected: {current['version_id']} "
+                f"(generation {current['generation']})")
+    await hot_swap_model(current['model_file'], current['generation'])
+    return True
+
+
+async def registry_watch_task(interval_seconds: float):
+    """他のワーカーによる昇格を監視"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        # 起動時のモデル準備中は差し替えない
+        if not model_readiness.is_ready:
+            continue
+        try:
+            await sync_registry_model()
+        except Exception as e:
+            logger.error(f"Registry sync failed: {e}")
+
+
+def require_model_ready():
+    """モデルの準備ができていない場合は503を返す"""
+    if not model_readiness.is_ready or model_instance is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model is not ready (state: {model_readiness.state.value})",
+            headers={"Retry-After": "5"}
+        )
+
+
 @app.on_event("startup")
 async def startup_event():
     """APIサーバー起動時の初期化"""
-    global model_instance, pipeline_instance, engineer_instance, multimodal_instance
+    global pipeline_instance, engineer_instance, model_swap_lock, model_init_task
     
     logger.info("Initializing AI models and pipelines...")
     
     try:
-        # モデルとパイプラインの初期化
-        pipeline_instance = DataPipeline()
+        # パイプラインの初期化（モデルはバックグラウンドで準備する）
+        model_swap_lock = asyncio.Lock()
+        trend_bus.attach_loop(asyncio.get_running_loop())
+        pipeline_instance = DataPipeline(event_bus=trend_bus)
         engineer_instance = FeatureEngineer()
-        model_instance = HitPredictionModel()
-        multimodal_instance = MultimodalAnalyzer()
+        model_init_task = spawn_background_task(
+            initialize_model_with_retry(), "model_initialization"
+        )
         
-        # モデルの事前読み込み（存在する場合）
-        model_path = Path("models/best_model.pkl")
-        if model_path.exists():
-            model_instance.load_model(str(model_path))
-            logger.info("Pre-trained model loaded successfully")
-        else:
-            # ダミーデータで簡易学習
-            logger.info("Training model with dummy data...")
-            X_dummy = pd.DataFrame(np.random.rand(100, 10))
-            y_dummy = np.random.choice([0, 1], 100)
-            model_instance.train(X_dummy, y_dummy, validate=False)
+        # 保存済みのトレンド時系列を復元し、保存済みの最新収集データでトレンドを初期化
+        # （時系列が保存されていない場合のみ最新収集データを時系列にも記録する）
+        restored = _load_trend_store()
+        latest_data = pipeline_instance.load_latest_data("all")
+        if latest_data:
+            latest_snapshot = snapshot_from_collected_data(latest_data)
+            trend_aggregator.apply_snapshot(latest_snapshot)
+            if not restored:
+                trend_store.record_snapshot(latest_snapshot)
         
-        logger.info("API server initialized successfully")
+        logger.info("API server started, model initialization running in background")
         
         # バックグラウンドタスクの開始
-        asyncio.create_task(market_monitoring_task())
+        prediction_cache.start_expiry_task()
+        await retraining_worker.start()
+        registry_poll_interval = float(os.getenv("REGISTRY_POLL_SECONDS", "5"))
+        if registry_poll_interval > 0:
+            spawn_background_task(registry_watch_task(registry_poll_interval), "registry_watch")
+        collection_interval = float(os.getenv("TREND_COLLECTION_INTERVAL_SECONDS", "0"))
+        if collection_interval > 0:
+            spawn_background_task(trend_collection_task(collection_interval), "trend_collection")
+        trend_save_interval = float(os.getenv("TREND_STORE_SAVE_SECONDS", "300"))
+        if trend_save_interval > 0:
+            spawn_background_task(trend_store_save_task(trend_save_interval), "trend_store_save")
+        
+        # マルチモーダルモデルの事前初期化（指定時のみ、起動はブロックしない）
+        if os.getenv("MULTIMODAL_WARMUP", "false").lower() == "true":
+            spawn_background_task(run_in_thread(multimodal_instance.warm_up), "multimodal_warmup")
         
     except Exception as e:
         logger.error(f"Initialization failed: {e}")
+        model_readiness.transition(ModelState.FAILED, str(e))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """APIサーバー停止時の後処理"""
+    for task in list(background_task_set):
+        task.cancel()
+    await asyncio.gather(*background_task_set, return_exceptions=True)
+    try:
+        _save_trend_store()
+    except Exception as e:
+        logger.error(f"Trend store save failed: {e}")
+    await broadcast_hub.close_all()
+    prediction_cache.stop_expiry_task()
+    await retraining_worker.stop()
+    if shadow_evaluator is not None:
+        await shadow_evaluator.stop()
+        _finish_shadow_job(shadow_evaluator, JobStatus.FAILED,
+                           "shadow evaluation stopped at shutdown")
 
 
 # エンドポイント
@@ -139,7 +761,66 @@ async def root():
             "predict": "/api/v1/predict",
             "batch_predict": "/api/v1/batch-predict",
             "trends": "/api/v1/trends",
-            "websocket": "/ws"
+            "drift": "/api/v1/drift",
+            "retrain": "/api/v1/retrain",
+            "retrain_jobs": "/api/v1/retrain/jobs",
+            "models": "/api/v1/models",
+            "shadow": "/api/v1/shadow",
+            "websocket": "/ws",
+            "health": "/health",
+            "readiness": "/health/ready",
+            "metrics": "/metrics"
+        }
+    }
+
+
+@app.get("/health")
+async def health():
+    """ライブネスチェック（プロセスが応答できれば常に200）"""
+    return {
+        "status": "alive",
+        "model_state": model_readiness.state.value,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """レディネスチェック（モデルの準備完了まで503）"""
+    status = model_readiness.to_dict()
+    status["model_version"] = model_instance.model_version if model_instance is not None else None
+    
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheusメトリクスのエクスポート"""
+    if not PROMETHEUS_AVAILABLE:
+        return JSONResponse(status_code=503,
+                            content={"detail": "prometheus_client is not installed"})
+    
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post("/api/v1/warmup")
+async def warm_up_models():
+    """
+    遅延初期化しているモデルを事前に読み込む
+    
+    Returns:
+        各コンポーネントの初期化状態
+    """
+    warmed = await run_in_thread(multimodal_instance.warm_up)
+    
+    return {
+        "multimodal": {
+            "initialized": multimodal_instance.is_initialized,
+            "success": warmed,
+            "init_seconds": multimodal_instance.init_seconds
         }
     }
 
@@ -156,28 +837,37 @@ async def predict_single(product: ProductRequest, background_tasks: BackgroundTa
     Returns:
         予測結果
     """
+    require_model_ready()
+    # 処理中にホットスワップされても1リクエスト内では同じモデルを使う
+    model = model_instance
+    artifact_path = model_artifact_path
+    
     try:
         # キャッシュチェック
-        cache_key = f"{product.name}_{product.price}_{hash(str(product.keywords))}"
-        if cache_key in prediction_cache:
-            cached = prediction_cache[cache_key]
-            if datetime.fromisoformat(cached['timestamp']) > datetime.now() - timedelta(minutes=5):
-                logger.info(f"Returning cached prediction for {product.name}")
-                return PredictionResponse(**cached)
+        product_dict = product.dict()
+        with stage("cache"):
+            cache_key = prediction_cache.make_key(product_dict)
+            cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Returning cached prediction for {product.name}")
+            # 予測IDは正解ラベルとの突き合わせに使うため、キャッシュから返す場合も毎回発行する
+            return PredictionResponse(**{**cached, "prediction_id": uuid.uuid4().hex})
         
         # 特徴量抽出
-        product_dict = product.dict()
-        features = pipeline_instance.extract_features(product_dict)
-        enhanced_features = engineer_instance.create_advanced_features(features)
+        with stage("feature_extraction"):
+            features = pipeline_instance.extract_features(product_dict)
+            enhanced_features = engineer_instance.create_advanced_features(features)
         
         # マルチモーダル分析（画像がある場合）
         if product.image_url:
-            multimodal_analysis = multimodal_instance.analyze_product(
-                product.name,
-                product.description,
-                image_path=None,  # URLからの画像処理は簡略化
-                keywords=product.keywords
-            )
+            with stage("multimodal"):
+                multimodal_analyzer = await run_in_thread(multimodal_instance.get)
+                multimodal_analysis = multimodal_analyzer.analyze_product(
+                    product.name,
+                    product.description,
+                    image_path=None,  # URLからの画像処理は簡略化
+                    keywords=product.keywords
+                )
             
             # マルチモーダル特徴量を追加
             if 'multimodal_features' in multimodal_analysis:
@@ -185,12 +875,33 @@ async def predict_single(product: ProductRequest, background_tasks: BackgroundTa
                 enhanced_features = pd.concat([enhanced_features, mm_features], axis=1)
         
         # 予測実行
-        prediction = model_instance.predict_with_confidence(enhanced_features)
+        inference_start = time.perf_counter()
+        with stage("inference"):
+            prediction = model.predict_with_confidence(enhanced_features)
+        inference_seconds = time.perf_counter() - inference_start
+        if metrics_collector is not None:
+            metrics_collector.record_prediction(type(model).__name__, "success", inference_seconds)
+        # 推論データの分布をドリフト監視に取り込む（特徴量数に比例するコストのみ）
+        monitor = drift_monitor
+        if monitor.is_fitted or monitor.collecting_reference:
+            with stage("drift"):
+                collecting = monitor.collecting_reference
+                monitor.update(enhanced_features)
+            if collecting and monitor.is_fitted:
+                # 同期関数のタスクは応答後にスレッドプールで実行される
+                background_tasks.add_task(_save_reference_baseline, monitor, artifact_path)
         
         # 結果の構築
+        prediction_id = uuid.uuid4().hex
         hit_prob = float(prediction['hit_probability'].iloc[0])
         confidence = float(prediction['confidence'].iloc[0])
         
+        # 候補モデルのシャドー評価（サンプリングしてキューに積むだけで、採点は別プロセス）
+        evaluator = shadow_evaluator
+        if evaluator is not None:
+            with stage("shadow"):
+                evaluator.submit(prediction_id, enhanced_features, hit_prob, inference_seconds)
+        
         # リスクレベル判定
         if hit_prob > 0.7:
             risk_level = "低"
@@ -199,13 +910,11 @@ async def predict_single(product: ProductRequest, background_tasks: BackgroundTa
         else:
             risk_level = "高"
         
-        # 要因分析
-        factors = {
-            'price_impact': np.random.uniform(0.1, 0.3),
-            'brand_impact': product.brand_strength * 0.8,
-            'innovation_impact': product.ingredient_novelty * 0.7,
-            'market_impact': (1 - product.market_saturation) * 0.6
-        }
+        # 要因分析（特徴量ごとの SHAP 値を要因ごとに集計、無効の場合は空）
+        factors = {}
+        if PREDICTION_FACTORS_ENABLED:
+            with stage("explanation"):
+                factors = explain_factors(model, enhanced_features)
         
         # 推奨事項生成
         recommendations = generate_recommendations(hit_prob, factors)
@@ -218,42 +927,48 @@ async def predict_single(product: ProductRequest, background_tasks: BackgroundTa
             risk_level=risk_level,
             factors=factors,
             recommendations=recommendations,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            prediction_id=prediction_id
         )
         
         # キャッシュ更新
-        prediction_cache[cache_key] = response.dict()
+        prediction_cache.set(cache_key, response.dict(exclude={"prediction_id"}))
         
         # WebSocketで接続クライアントに通知
         background_tasks.add_task(notify_clients, {
             "type": "new_prediction",
             "data": response.dict()
-        })
+        }, "predictions")
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/v1/batch-predict")
-async def predict_batch(request: BatchPredictionRequest):
+async def predict_batch(request: BatchPredictionRequest, background_tasks: BackgroundTasks):
     """
     バッチ予測処理
     
     Args:
         request: バッチリクエスト
+        background_tasks: バックグラウンドタスク（ドリフトのベースライン保存など、応答後に実行する）
     
     Returns:
         バッチ予測結果
     """
+    require_model_ready()
+    
     try:
         results = []
         
         for product in request.products:
             # 各製品の予測（簡略化のため単一予測を再利用）
-            prediction = await predict_single(product, BackgroundTasks())
+            prediction = await predict_single(product, background_tasks)
             results.append(prediction.dict())
         
         # 統計情報の追加
@@ -272,49 +987,255 @@ async def predict_batch(request: BatchPredictionRequest):
             'timestamp': datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Batch prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/drift")
+async def get_drift_status():
+    """
+    推論データのドリフト状況
+    
+    Returns:
+        監視状況と現在のウィンドウの判定結果
+    """
+    status = drift_monitor.get_status()
+    status["current_window"] = drift_monitor.check() if drift_monitor.window_rows else None
+    return status
+
+
+@app.post("/api/v1/retrain", status_code=202)
+async def submit_retrain(request: RetrainRequest):
+    """
+    再学習ジョブを投入（学習はバックグラウンドのワーカープロセスで実行）
+    
+    Args:
+        request: 学習データと昇格設定
+    
+    Returns:
+        投入したジョブ
+    """
+    if len(request.products) != len(request.labels):
+        raise HTTPException(status_code=422, detail="products and labels must have the same length")
+    if set(request.labels) != {0, 1}:
+        raise HTTPException(status_code=422, detail="labels must contain both 0 and 1")
+    if not retraining_worker.is_running:
+        raise HTTPException(status_code=503, detail="Retraining worker is not running")
+    
+    X = await run_in_thread(_build_feature_matrix, [product.dict() for product in request.products])
+    estimator_params = {"n_estimators": request.n_estimators} if request.n_estimators else None
+    try:
+        job = retraining_worker.submit(
+            X, request.labels,
+            holdout_fraction=request.holdout_fraction,
+            promote=request.promote,
+            reason="api",
+            estimator_params=estimator_params
+        )
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many retraining jobs queued",
+                            headers={"Retry-After": "60"})
+    
+    return job.to_dict()
+
+
+@app.get("/api/v1/retrain/jobs")
+async def list_retrain_jobs(status: Optional[str] = None, limit: int = 20):
+    """
+    再学習ジョブの一覧（新しい順）
+    
+    Args:
+        status: 状態で絞り込む（queued / training / evaluating / promoted / rejected など）
+        limit: 最大件数
+    """
+    return {
+        "jobs": retraining_worker.list_jobs(status=status, limit=limit),
+        "worker": retraining_worker.get_stats()
+    }
+
+
+@app.get("/api/v1/retrain/jobs/{job_id}")
+async def get_retrain_job(job_id: str):
+    """再学習ジョブの状態"""
+    job = retraining_worker.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Retraining job not found: {job_id}")
+    return job
+
+
+@app.get("/api/v1/models")
+async def list_models(segment: Optional[str] = None, status: Optional[str] = None, limit: int = 20):
+    """
+    登録済みモデルの一覧（新しい順）
+    
+    Args:
+        segment: セグメントで絞り込む
+        status: 状態で絞り込む（staged / production / archived）
+        limit: 最大件数
+    """
+    versions = await run_in_thread(model_registry.list_versions, segment, status, limit)
+    return {
+        "versions": versions,
+        "registry": await run_in_thread(model_registry.get_stats),
+        "serving": {
+            "model_version": model_instance.model_version if model_instance is not None else None,
+            "artifact_path": str(model_artifact_path) if model_artifact_path else None,
+            "generation": model_generation
+        }
+    }
+
+
+@app.get("/api/v1/models/current")
+async def get_current_model(segment: str = MODEL_SEGMENT):
+    """セグメントの本番モデル"""
+    current = await run_in_thread(model_registry.current, segment)
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"No production model for segment: {segment}")
+    return current
+
+
+@app.post("/api/v1/shadow")
+async def start_shadow_evaluation(request: ShadowStartRequest):
+    """
+    候補モデルのシャドー評価を開始
+    
+    Args:
+        request: 候補（バージョンIDまたは再学習ジョブ）と判定条件
+    
+    Returns:
+        評価の状態
+    """
+    version_id = request.version_id
+    if version_id is None:
+        job = retraining_worker.jobs.get(request.job_id) if request.job_id else None
+        if job is None or job.candidate_path is None or not job.is_finished:
+            raise HTTPException(status_code=404,
+                                detail="version_id or a finished retraining job_id is required")
+        version_id = await _register_candidate(job.candidate_path, job)
+    
+    options = request.dict(exclude={"version_id", "job_id"})
+    try:
+        evaluator = await start_shadow(version_id, **options)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return evaluator.evaluate()
+
+
+@app.get("/api/v1/shadow")
+async def get_shadow_evaluation():
+    """シャドー評価のオンライン指標と昇格判定"""
+    if shadow_evaluator is None:
+        raise HTTPException(status_code=404, detail="No shadow evaluation running")
+    return shadow_evaluator.evaluate()
+
+
+@app.get("/api/v1/shadow/log")
+async def get_shadow_log(limit: int = 50):
+    """本番と候補の予測・レイテンシを並べた直近の比較ログ"""
+    if shadow_evaluator is None:
+        raise HTTPException(status_code=404, detail="No shadow evaluation running")
+    return {"records": shadow_evaluator.recent(limit)}
+
+
+@app.post("/api/v1/shadow/outcomes")
+async def record_shadow_outcomes(request: ShadowOutcomesRequest):
+    """シャドー採点した予測の実際の結果を登録（キャリブレーションとA/Bテストに反映）"""
+    if shadow_evaluator is None:
+        raise HTTPException(status_code=404, detail="No shadow evaluation running")
+    recorded = sum(
+        shadow_evaluator.record_outcome(outcome.prediction_id, outcome.label)
+        for outcome in request.outcomes
+    )
+    return {"recorded": recorded, "unmatched": len(request.outcomes) - recorded}
+
+
+@app.post("/api/v1/shadow/promote")
+async def promote_shadow_candidate(force: bool = False):
+    """
+    シャドー評価中の候補を昇格
+    
+    Args:
+        force: 判定が promote でなくても昇格する
+    """
+    evaluator = shadow_evaluator
+    if evaluator is None:
+        raise HTTPException(status_code=404, detail="No shadow evaluation running")
+    evaluation = evaluator.evaluate()
+    if evaluation["decision"] != "promote" and not force:
+        raise HTTPException(status_code=409, detail=evaluation)
+    
+    await evaluator.promote()
+    return {
+        "promoted": evaluator.candidate_version,
+        "model_version": model_instance.model_version if model_instance is not None else None,
+        "generation": model_generation,
+        "evaluation": evaluation
+    }
+
+
+@app.delete("/api/v1/shadow")
+async def stop_shadow_evaluation():
+    """シャドー評価を停止（候補は昇格しない）"""
+    global shadow_evaluator
+    
+    evaluator = shadow_evaluator
+    if evaluator is None:
+        raise HTTPException(status_code=404, detail="No shadow evaluation running")
+    shadow_evaluator = None
+    await evaluator.stop()
+    _finish_shadow_job(evaluator, JobStatus.REJECTED, "shadow evaluation stopped")
+    return evaluator.evaluate()
+
+
 @app.get("/api/v1/trends")
-async def get_market_trends(category: str = "all", period_days: int = 30):
+async def get_market_trends(category: str = "all",
+                            period_days: int = Query(30, ge=1, le=MAX_PERIOD_DAYS),
+                            keyword: Optional[str] = None,
+                            resolution: Optional[str] = None):
     """
     市場トレンド取得
     
+    時系列ストアのロールアップから期間に応じた解像度で列指向の配列を返す。
+    
     Args:
         category: カテゴリ
-        period_days: 期間
+        period_days: 期間（1〜MAX_PERIOD_DAYS 日）
+        keyword: キーワード（省略時はカテゴリ全体）
+        resolution: 'daily' / 'weekly' / 'monthly'（省略時は期間から自動選択）
     
     Returns:
         トレンドデータ
     """
+    if resolution is not None and resolution not in trend_store.capacities:
+        raise HTTPException(status_code=422, detail=f"Unknown resolution: {resolution}")
+    
     try:
-        # モックトレンドデータ生成
+        if category == "all":
+            categories = DEFAULT_TREND_CATEGORIES + [
+                c for c in trend_store.categories() if c not in DEFAULT_TREND_CATEGORIES
+            ]
+        else:
+            categories = [category]
+        
         end_date = datetime.now()
         start_date = end_date - timedelta(days=period_days)
-        
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        
-        trends = []
-        categories = ['スキンケア', 'メイクアップ', 'ヘアケア'] if category == "all" else [category]
-        
-        for cat in categories:
-            trend_values = np.cumsum(np.random.randn(len(dates)) * 2) + 50
-            for date, value in zip(dates, trend_values):
-                trends.append({
-                    'date': date.isoformat(),
-                    'category': cat,
-                    'trend_score': float(max(0, value)),
-                    'buzz_score': float(np.random.uniform(0.3, 0.9))
-                })
+        series = trend_store.query(categories, period_days, keyword=keyword,
+                                   resolution=resolution, end=end_date.date())
         
         # トップトレンドキーワード
         keywords = get_trending_keywords()
         
         return {
-            'trends': trends,
+            'trends': {
+                'resolution': series['resolution'],
+                'dates': series['dates'],
+                'categories': series['series']
+            },
             'trending_keywords': keywords,
+            'trend_sequence': trend_aggregator.sequence,
             'period': {
                 'start': start_date.isoformat(),
                 'end': end_date.isoformat(),
@@ -327,16 +1248,36 @@ async def get_market_trends(category: str = "all", period_days: int = 30):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/trends/events")
+async def publish_trend_snapshot(snapshot: TrendSnapshotRequest):
+    """
+    外部の収集ジョブからトレンドスナップショットを受け付ける
+    
+    Args:
+        snapshot: キーワードごとのスコア
+    
+    Returns:
+        反映後のシーケンス番号
+    """
+    event = snapshot.dict()
+    event['timestamp'] = event['timestamp'] or datetime.now().isoformat()
+    trend_bus.publish(TREND_SNAPSHOT_TOPIC, event)
+    
+    return {"status": "accepted", "sequence": trend_aggregator.sequence}
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocketエンドポイント（リアルタイム通信）
     
+    購読したチャンネル（predictions / trends など）のメッセージのみ配信する。
+    
     Args:
         websocket: WebSocket接続
     """
     await websocket.accept()
-    connected_clients.append(websocket)
+    connection = await broadcast_hub.connect(websocket)
     
     try:
         while True:
@@ -346,23 +1287,93 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # メッセージタイプに応じた処理
             if message['type'] == 'subscribe':
-                # トレンド購読
-                await websocket.send_json({
+                # チャンネル購読
+                channel = message.get('channel', 'default')
+                broadcast_hub.subscribe(connection, channel)
+                broadcast_hub.send(connection, {
                     "type": "subscription_confirmed",
-                    "channel": message.get('channel', 'default')
+                    "channel": channel
+                })
+                # トレンドは現在のスナップショットを送り、以降は差分のみ配信
+                if channel == "trends":
+                    broadcast_hub.send(connection, trend_aggregator.snapshot_message())
+            
+            elif message['type'] == 'resync':
+                # 受信済みシーケンス以降の差分（古すぎる場合はスナップショット）
+                for update in trend_aggregator.resync(int(message.get('last_seq', -1))):
+                    broadcast_hub.send(connection, update)
+            
+            elif message['type'] == 'unsubscribe':
+                channel = message.get('channel', 'default')
+                broadcast_hub.unsubscribe(connection, channel)
+                broadcast_hub.send(connection, {
+                    "type": "unsubscribed",
+                    "channel": channel
                 })
             
             elif message['type'] == 'ping':
                 # ハートビート
-                await websocket.send_json({"type": "pong"})
+                broadcast_hub.send(connection, {"type": "pong"})
             
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        connected_clients.remove(websocket)
+        await broadcast_hub.disconnect(connection)
 
 
 # ヘルパー関数
+# 要因分析で SHAP 値をまとめる特徴量（特徴量名に含まれるキーワード、先に一致した要因に入れる）
+FACTOR_KEYWORDS = {
+    'price_impact': ('price', 'premium'),
+    'brand_impact': ('brand',),
+    'innovation_impact': ('novelty', 'innovation'),
+    'market_impact': ('market', 'competit', 'saturation')
+}
+
+
+def _factor_of(feature_name: str) -> str:
+    """特徴量が属する要因（どのキーワードにも一致しなければ other_impact）"""
+    name = feature_name.lower()
+    for factor, keywords in FACTOR_KEYWORDS.items():
+        if any(keyword in name for keyword in keywords):
+            return factor
+    return 'other_impact'
+
+
+def explain_factors(model: Any, features: pd.DataFrame) -> Dict[str, float]:
+    """
+    予測の要因分析
+    
+    コンパイル済みフォレストの TreeSHAP で特徴量ごとの寄与を求め、要因ごとに合計する。
+    値はヒット確率（ブースティングは対数オッズ）への寄与で、全要因の和が予測値と基準値の差になる。
+    
+    Args:
+        model: 推論中のモデル
+        features: 1行の特徴量
+    
+    Returns:
+        要因 -> 寄与（説明できないモデルの場合は空）
+    """
+    get_explainer = getattr(model, 'get_shap_explainer', None)
+    if get_explainer is None:
+        return {}
+    try:
+        explainer = get_explainer()
+    except ValueError as e:
+        _warn_unexplained(model, e)
+        return {}
+    
+    shap_values = explainer.shap_values(features)[0]
+    names = explainer.feature_names or list(features.columns)
+    factors = {factor: 0.0 for factor in FACTOR_KEYWORDS}
+    factors['other_impact'] = 0.0
+    for name, value in zip(names, shap_values.tolist()):
+        factors[_factor_of(name)] += value
+    return factors
+
+
 def generate_recommendations(hit_probability: float, factors: Dict[str, float]) -> List[str]:
     """
     推奨事項を生成
@@ -389,77 +1400,105 @@ def generate_recommendations(hit_probability: float, factors: Dict[str, float])
         recommendations.append("価格戦略の見直しを検討")
         recommendations.append("差別化要素の強化が必要")
     
-    # 要因別の推奨
-    if factors.get('price_impact', 0) < 0.2:
+    # 要因別の推奨（ヒット確率を下げている要因）
+    if factors.get('price_impact', 0) < 0:
         recommendations.append("価格競争力の改善を検討")
     
-    if factors.get('innovation_impact', 0) < 0.3:
+    if factors.get('innovation_impact', 0) < 0:
         recommendations.append("製品の革新性を高める必要あり")
     
     return recommendations
 
 
 def get_trending_keywords() -> List[Dict[str, Any]]:
-    """トレンドキーワード取得"""
-    keywords = [
-        {"keyword": "ビタミンC", "score": 0.92, "growth": 0.15},
-        {"keyword": "レチノール", "score": 0.88, "growth": 0.12},
-        {"keyword": "ナイアシンアミド", "score": 0.85, "growth": 0.18},
-        {"keyword": "CICA", "score": 0.82, "growth": 0.25},
-        {"keyword": "CBD", "score": 0.78, "growth": 0.30}
-    ]
-    
-    # ランダムな変動を追加
-    for kw in keywords:
-        kw['score'] = min(1.0, kw['score'] + np.random.uniform(-0.05, 0.05))
-        kw['growth'] = kw['growth'] + np.random.uniform(-0.02, 0.02)
+    """トレンドキーワード取得（最新の集約結果をメモリから返す）"""
+    return trend_aggregator.top_keywords(5)
+
+
+def on_trend_snapshot(snapshot: Dict[str, Any]):
+    """
+    収集データのスナップショットを時系列ストアと集約に反映し、変化分を購読クライアントに配信
     
-    return keywords
+    Args:
+        snapshot: トレンドスナップショット
+    """
+    trend_store.record_snapshot(snapshot)
+    delta = trend_aggregator.apply_snapshot(snapshot)
+    if delta is not None:
+        broadcast_hub.publish("trends", delta)
+        logger.info(f"Trend delta #{delta['seq']} broadcasted ({len(delta['changes'])} keywords)")
 
 
-async def notify_clients(message: Dict):
+trend_bus.subscribe(TREND_SNAPSHOT_TOPIC, on_trend_snapshot)
+
+
+async def notify_clients(message: Dict, channel: str):
     """
-    接続中のクライアントに通知
+    チャンネルの購読クライアントに通知
     
     Args:
         message: 送信メッセージ
+        channel: 配信チャンネル
+    """
+    broadcast_hub.publish(channel, message)
+
+
+async def trend_collection_task(interval_seconds: float):
     """
-    disconnected = []
+    データ収集の定期実行タスク
     
-    for client in connected_clients:
-        try:
-            await client.send_json(message)
-        except:
-            disconnected.append(client)
+    収集結果はイベントバスに発行され、on_trend_snapshot で即座に配信される。
     
-    # 切断されたクライアントを削除
-    for client in disconnected:
-        connected_clients.remove(client)
+    Args:
+        interval_seconds: 収集間隔（秒）
+    """
+    keywords = list(trend_aggregator.keywords)
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_thread(pipeline_instance.collect_all_data, keywords)
+        except Exception as e:
+            logger.error(f"Trend collection error: {e}")
+
+
+def _load_trend_store() -> bool:
+    """保存済みのトレンド時系列を読み込み（読み込めた場合True）"""
+    global trend_store_saved_observations
+    try:
+        restored = trend_store.load(trend_store_path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Trend store load failed: {e}")
+        return False
+    if restored:
+        logger.info(f"Trend store restored from {trend_store_path} "
+                    f"({trend_store.observations} observations)")
+    trend_store_saved_observations = trend_store.observations
+    return restored
+
 
+def _save_trend_store():
+    """トレンド時系列を保存（前回の保存以降に記録がある場合のみ）"""
+    global trend_store_saved_observations
+    observations = trend_store.observations
+    if observations == trend_store_saved_observations:
+        return
+    trend_store.save(trend_store_path)
+    trend_store_saved_observations = observations
 
-async def market_monitoring_task():
-    """市場監視バックグラウンドタスク"""
+
+async def trend_store_save_task(interval_seconds: float):
+    """
+    トレンド時系列の定期保存タスク
+    
+    Args:
+        interval_seconds: 保存間隔（秒）
+    """
     while True:
+        await asyncio.sleep(interval_seconds)
         try:
-            # 5分ごとに市場データを更新
-            await asyncio.sleep(300)
-            
-            # トレンドデータの更新（実際にはAPIから取得）
-            trend_update = {
-                "type": "trend_update",
-                "data": {
-                    "keywords": get_trending_keywords(),
-                    "timestamp": datetime.now().isoformat()
-                }
-            }
-            
-            # 全クライアントに通知
-            await notify_clients(trend_update)
-            
-            logger.info("Market data updated and broadcasted")
-            
+            await run_in_thread(_save_trend_store)
         except Exception as e:
-            logger.error(f"Market monitoring error: {e}")
+            logger.error(f"Trend store save failed: {e}")
 
 
 # エラーハンドラ
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Request Timing Module
+リクエスト単位のレイテンシ計測（ステージ別スパン・Server-Timingヘッダー・Prometheus連携）
+"""
+
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# 現在処理中のリクエストの計測コンテキスト
+# run_in_thread はコンテキストをコピーしてスレッドで実行するため、
+# スレッド内のスパンも同じリクエストに記録される
+_current_timing: ContextVar[Optional['RequestTiming']] = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """1リクエスト分のステージ別処理時間"""
+
+    def __init__(self):
+        """初期化"""
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.handler_end: Optional[float] = None
+        self.response_start: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        """ステージの処理時間を加算（バッチ処理では同じステージが複数回計測される）"""
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        """ステージの処理時間を計測するコンテキスト"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def mark_handler_end(self):
+        """エンドポイント関数の終了を記録（以降レスポンス開始までをシリアライズとみなす）"""
+        self.handler_end = time.perf_counter()
+
+    def mark_response_start(self):
+        """レスポンスヘッダー送信時刻を記録"""
+        self.response_start = time.perf_counter()
+        if self.handler_end is not None:
+            self.add('serialization', self.response_start - self.handler_end)
+
+    @property
+    def elapsed(self) -> float:
+        """リクエスト開始からの経過秒数（レスポンス開始済みならそこまで）"""
+        end = self.response_start if self.response_start is not None else time.perf_counter()
+        return end - self.start
+
+    def server_timing_header(self) -> str:
+        """
+        Server-Timingヘッダー値を作成
+
+        Returns:
+            例: 'feature_extraction;dur=1.23, inference;dur=4.56, total;dur=7.89'
+        """
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.spans.items()]
+        entries.append(f"total;dur={self.elapsed * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """処理中のリクエストの計測コンテキストを取得（リクエスト外ではNone）"""
+    return _current_timing.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    処理中のリクエストにステージのスパンを記録
+
+    リクエスト外（バッチ処理・テストなど）から呼ばれた場合は何もしない。
+
+    Args:
+        name: ステージ名（feature_extraction / multimodal / inference など）
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    with timing.span(name):
+        yield
+
+
+def _wrap_endpoint(endpoint: Callable) -> Callable:
+    """エンドポイント関数の終了時刻を記録するラッパー（シグネチャは保持する）"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timing = _current_timing.get()
+                if timing is not None:
+                    timing.mark_handler_end()
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def sync_wrapper(*args, **kwargs):
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            timing = _current_timing.get()
+            if timing is not None:
+                timing.mark_handler_end()
+    return sync_wrapper
+
+
+class TimedAPIRoute(APIRoute):
+    """
+    エンドポイント関数の終了を記録するルート
+
+    FastAPIはエンドポイントの戻り値をルート内でレスポンスモデルの検証とJSON化に通すため、
+    関数の終了からレスポンス開始までを serialization スパンとして計測できる。
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _wrap_endpoint(endpoint), **kwargs)
+
+
+class TimingMiddleware:
+    """
+    リクエストごとの処理時間を計測するASGIミドルウェア
+
+    ステージ別スパンをServer-Timingヘッダーに付与し、メトリクスコレクターに記録する。
+    """
+
+    def __init__(self,
+                 app,
+                 metrics: Optional[Any] = None,
+                 monitor: Optional[Any] = None,
+                 exclude_paths: Iterable[str] = ('/metrics',),
+                 server_timing: bool = True):
+        """
+        初期化
+
+        Args:
+            app: ASGIアプリケーション
+            metrics: record_request_timing を持つメトリクスコレクター
+            monitor: monitor_response_time を持つパフォーマンスモニター
+            exclude_paths: 計測しないパス
+            server_timing: Server-Timingヘッダーを付与するか
+        """
+        self.app = app
+        self.metrics = metrics
+        self.monitor = monitor
+        self.exclude_paths = set(exclude_paths)
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope.get('path') in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                timing.mark_response_start()
+                if self.server_timing:
+                    headers = list(message.get('headers', []))
+                    header = timing.server_timing_header().encode('latin-1')
+                    headers.append((b'server-timing', header))
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timing.reset(token)
+            self._record(scope, status_code, timing, time.perf_counter() - timing.start)
+
+    def _record(self, scope, status_code: int, timing: RequestTiming, duration: float):
+        """メトリクスとパフォーマンスモニターに記録"""
+        route = scope.get('route')
+        # ラベルの種類が増えすぎないよう、パスではなくルートのテンプレートを使う
+        endpoint = getattr(route, 'path', None) or 'unmatched'
+
+        try:
+            if self.metrics is not None:
+                self.metrics.record_request_timing(
+                    scope.get('method', ''), endpoint, status_code, duration, timing.spans
+                )
+            if self.monitor is not None:
+                self.monitor.monitor_response_time(endpoint, duration)
+        except Exception as e:
+            logger.debug(f"Failed to record request timing: {e}")
@@ -0,0 +1,579 @@
+#!/usr/bin/env python
+"""
+Shadow Evaluation Module
+候補モデルのシャドー評価（本番トラフィックの一部を非同期に採点し、一致率・キャリブレーションで昇格を判定）
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.ml.streaming_stats import DDSketch
+from src.ml.retraining_worker import limit_worker_resources, shutdown_worker_pool
+
+# A/Bテスト（オプショナル）
+try:
+    from src.business.ab_testing import ABTestConfig
+    AB_TESTING_AVAILABLE = True
+except ImportError:
+    AB_TESTING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# レポートに含めるレイテンシの分位点
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+# シャドーワーカープロセスで読み込んだ候補モデル
+_shadow_model = None
+
+
+# ---------------------------------------------------------------------------
+# 候補モデルの採点（別プロセスまたは専用スレッドで実行）
+# ---------------------------------------------------------------------------
+
+def _init_shadow_worker(model_path: str, nice: int):
+    """シャドーワーカープロセスの初期化（優先度を下げて候補モデルを読み込む）"""
+    global _shadow_model
+    from src.models.basic_model import HitPredictionModel
+
+    limit_worker_resources(nice, None, 1)
+    model = HitPredictionModel(model_dir=str(Path(model_path).parent))
+    model.load_serving_model(model_path)
+    _shadow_model = model
+
+
+def score_rows(rows: Sequence[pd.DataFrame], model: Any = None) -> List[Tuple[float, float]]:
+    """
+    候補モデルで1リクエストずつ採点
+
+    IPCはバッチ単位で行うが、レイテンシを本番と比較できるよう推論は1行ずつ計測する。
+
+    Args:
+        rows: リクエストごとの特徴量
+        model: 候補モデル（省略時はワーカープロセスで読み込んだモデル）
+
+    Returns:
+        (ヒット確率, 推論秒数) のリスト
+    """
+    model = model if model is not None else _shadow_model
+    results = []
+    for features in rows:
+        start = time.perf_counter()
+        prediction = model.predict_with_confidence(features)
+        results.append((float(prediction['hit_probability'].iloc[0]), time.perf_counter() - start))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# オンライン指標
+# ---------------------------------------------------------------------------
+
+class CalibrationStats:
+    """確率予測のキャリブレーション指標（ビンごとの件数・予測和・正例数のみを保持）"""
+
+    def __init__(self, n_bins: int = 10):
+        """
+        初期化
+
+        Args:
+            n_bins: 信頼度ビンの数
+        """
+        self.n_bins = n_bins
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.prob_sums = np.zeros(n_bins, dtype=np.float64)
+        self.label_sums = np.zeros(n_bins, dtype=np.float64)
+        self.squared_error_sum = 0.0
+        self.correct = 0
+
+    def update(self, probability: float, label: int):
+        """予測確率と実際のラベルを1件追加"""
+        index = min(int(probability * self.n_bins), self.n_bins - 1)
+        self.counts[index] += 1
+        self.prob_sums[index] += probability
+        self.label_sums[index] += label
+        self.squared_error_sum += (probability - label) ** 2
+        self.correct += int((probability >= 0.5) == bool(label))
+
+    @property
+    def count(self) -> int:
+        """件数"""
+        return int(self.counts.sum())
+
+    @property
+    def brier(self) -> Optional[float]:
+        """ブライアスコア（小さいほど良い）"""
+        return self.squared_error_sum / self.count if self.count else None
+
+    @property
+    def ece(self) -> Optional[float]:
+        """期待キャリブレーション誤差（ビンごとの |平均予測 - 正例率| の件数加重平均）"""
+        if not self.count:
+            return None
+        filled = self.counts > 0
+        gaps = np.abs(self.prob_sums[filled] - self.label_sums[filled]) / self.counts[filled]
+        return float(np.sum(gaps * self.counts[filled]) / self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """指標の辞書"""
+        return {
+            'count': self.count,
+            'accuracy': self.correct / self.count if self.count else None,
+            'brier': self.brier,
+            'ece': self.ece,
+            'mean_probability': float(self.prob_sums.sum() / self.count) if self.count else None,
+            'positive_rate': float(self.label_sums.sum() / self.count) if self.count else None
+        }
+
+
+class ShadowEvaluator:
+    """
+    候補モデルのシャドー評価
+
+    推論リクエストのうち sample_rate の割合を上限付きキューに積むだけで応答を返し、
+    候補モデルの採点は別プロセス（または専用スレッド）でまとめて行う。
+    本番と候補の予測・レイテンシを並べて記録し、一致率・平均予測のずれ・
+    （正解ラベルが届いた分の）キャリブレーションとA/Bテストの結果で昇格を判定する。
+    """
+
+    def __init__(self,
+                 candidate_version: str,
+                 production_version: Optional[str] = None,
+                 sample_rate: float = 0.1,
+                 queue_size: int = 1000,
+                 batch_size: int = 32,
+                 min_samples: int = 200,
+                 min_labeled: int = 50,
+                 min_agreement: float = 0.9,
+                 max_mean_shift: float = 0.05,
+                 calibration_tolerance: float = 0.02,
+                 require_outcomes: bool = False,
+                 auto_promote: bool = False,
+                 evaluation_interval: float = 5.0,
+                 log_size: int = 1000,
+                 pending_size: int = 10000,
+                 nice: int = 10,
+                 ab_test_manager: Optional[Any] = None,
+                 structured_logger: Optional[Any] = None,
+                 job_id: Optional[str] = None,
+                 on_promote: Optional[Callable[['ShadowEvaluator'], Awaitable[Any]]] = None,
+                 on_reject: Optional[Callable[['ShadowEvaluator'], Awaitable[Any]]] = None):
+        """
+        初期化
+
+        Args:
+            candidate_version: 候補モデルのバージョン
+            production_version: 本番モデルのバージョン
+            sample_rate: シャドー採点するリクエストの割合
+            queue_size: 採点待ちキューの上限（超過分は採点しない）
+            batch_size: 1回のIPCで採点する件数の上限
+            min_samples: 判定に必要な採点件数
+            min_labeled: キャリブレーションで判定するのに必要な正解ラベル数
+            min_agreement: ラベル無しで昇格するのに必要な一致率
+            max_mean_shift: ラベル無しで昇格できる平均予測確率のずれ
+            calibration_tolerance: 候補のECE・ブライアスコアが本番より悪くてもよい幅
+            require_outcomes: 正解ラベルによる判定を必須にするか
+            auto_promote: 判定が promote / reject になった時点で on_promote / on_reject を呼ぶか
+            evaluation_interval: 自動判定の最短間隔（秒）
+            log_size: 保持する比較ログの件数
+            pending_size: 正解ラベル待ちで保持する件数
+            nice: シャドーワーカープロセスの優先度を下げる量
+            ab_test_manager: 本番(A)と候補(B)の正解率を記録するA/Bテスト管理
+            structured_logger: 比較ログを出力する構造化ロガー
+            job_id: 候補を学習した再学習ジョブのID
+            on_promote: 昇格時に呼ぶコルーチン関数（成功した場合のみ昇格済みになる）
+            on_reject: 自動判定で不採用になった時に呼ぶコルーチン関数
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        if min_labeled < 1:
+            # 正解ラベルが無いとキャリブレーション指標（ECE・Brier）を計算できない
+            raise ValueError("min_labeled must be at least 1")
+        self.candidate_version = candidate_version
+        self.production_version = production_version
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.min_samples = min_samples
+        self.min_labeled = min_labeled
+        self.min_agreement = min_agreement
+        self.max_mean_shift = max_mean_shift
+        self.calibration_tolerance = calibration_tolerance
+        self.require_outcomes = require_outcomes
+        self.auto_promote = auto_promote
+        self.evaluation_interval = evaluation_interval
+        self.nice = nice
+        self.structured_logger = structured_logger
+        self.job_id = job_id
+        self.on_promote = on_promote
+        self.on_reject = on_reject
+
+        self.started_at: Optional[str] = None
+        self.promoted = False
+        self.rejected = False
+        self._promoting = False
+        self._last_evaluation = float('-inf')
+        self.requests = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.samples = 0
+        self.agreements = 0
+        self.abs_diff_sum = 0.0
+        self.production_prob_sum = 0.0
+        self.candidate_prob_sum = 0.0
+        self.production_latency = DDSketch()
+        self.candidate_latency = DDSketch()
+        self.production_calibration = CalibrationStats()
+        self.candidate_calibration = CalibrationStats()
+        self.log: deque = deque(maxlen=log_size)
+        self.pending_size = pending_size
+        self._pending: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+        self.ab_test_manager = ab_test_manager
+        self.ab_test_id: Optional[str] = None
+        # 最後のA/Bテスト分析（正解ラベル数, 結果）。ラベルが増えた時だけ分析し直す
+        self._ab_result: Optional[Tuple[int, Dict[str, Any]]] = None
+
+        self._rng = random.Random()
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._executor: Optional[Executor] = None
+        self._model = None
+
+    @property
+    def is_running(self) -> bool:
+        """採点を受け付けているか"""
+        return self._consumer is not None and not (self.promoted or self.rejected)
+
+    async def start(self, model_path: Optional[str] = None, model: Any = None):
+        """
+        シャドー評価を開始
+
+        Args:
+            model_path: 候補モデルのファイルパス（別プロセスで読み込んで採点する）
+            model: 候補モデルのオブジェクト（専用スレッドで採点する）
+        """
+        if model_path is None and model is None:
+            raise ValueError("model_path or model is required")
+        if model_path is not None:
+            # 推論プロセスとGILを共有しないよう、候補モデルは優先度を下げた別プロセスで動かす
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_shadow_worker,
+                initargs=(str(model_path), self.nice)
+            )
+        else:
+            self._model = model
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+
+        if self.ab_test_manager is not None and AB_TESTING_AVAILABLE:
+            self.ab_test_id = self.ab_test_manager.create_test(ABTestConfig(
+                test_name=f"shadow_{self.candidate_version}",
+                variant_a={'model_version': self.production_version},
+                variant_b={'model_version': self.candidate_version},
+                sample_size=self.min_labeled,
+                primary_metric="accuracy"
+            ))
+            self.ab_test_manager.start_test(self.ab_test_id)
+
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._consumer = asyncio.get_running_loop().create_task(self._consume())
+        self.started_at = datetime.now().isoformat()
+        logger.info(f"Shadow evaluation started: {self.candidate_version} "
+                    f"(sample_rate={self.sample_rate}, isolated={model_path is not None})")
+
+    async def stop(self):
+        """シャドー評価を停止"""
+        consumer, self._consumer = self._consumer, None
+        if consumer is not None and consumer is not asyncio.current_task():
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, shutdown_worker_pool, executor)
+        if self.ab_test_id is not None:
+            # 最終結果を残してA/Bテストを終了する（記録データは管理側から破棄される）
+            self._ab_analysis()
+            test_id, self.ab_test_id = self.ab_test_id, None
+            self.ab_test_manager.complete_test(test_id)
+
+    def submit(self, prediction_id: str, features: pd.DataFrame,
+               production_probability: float, production_latency: float) -> bool:
+        """
+        本番の推論結果を渡し、サンプリングされた場合のみ採点キューに積む（イベントループ内から呼ぶ）
+
+        呼び出し側のコストは乱数1回とキューへの投入のみ。
+
+        Args:
+            prediction_id: 予測ID（正解ラベルとの突き合わせに使う）
+            features: 本番モデルに入力した特徴量
+            production_probability: 本番モデルのヒット確率
+            production_latency: 本番モデルの推論秒数
+
+        Returns:
+            採点キューに積んだ場合True
+        """
+        if not self.is_running:
+            return False
+        self.requests += 1
+        if self._rng.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((prediction_id, features, production_probability,
+                                    production_latency, time.time()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.sampled += 1
+        return True
+
+    async def drain(self, timeout: float = 30.0):
+        """採点キューが空になるまで待機"""
+        await asyncio.wait_for(self._queue.join(), timeout)
+
+    async def _consume(self):
+        """採点キューをバッチで処理"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, score_rows, [item[1] for item in batch], self._model
+                )
+                for item, (probability, seconds) in zip(batch, results):
+                    self._record(item, probability, seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += len(batch)
+                logger.warning(f"Shadow scoring failed for {len(batch)} requests: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if self.auto_promote and self._evaluation_due():
+                decision = self.evaluate()['decision']
+                try:
+                    if decision == 'promote':
+                        await self.promote()
+                    elif decision == 'reject':
+                        await self.reject()
+                except Exception as e:
+                    logger.error(f"Shadow {decision} of {self.candidate_version} failed: {e}")
+
+    def _evaluation_due(self) -> bool:
+        """自動判定を行うか（判定に必要な件数が揃った後、evaluation_interval 秒ごと）"""
+        if self.promoted or self.rejected or self.samples < self.min_samples:
+            return False
+        now = time.monotonic()
+        if now - self._last_evaluation < self.evaluation_interval:
+            return False
+        self._last_evaluation = now
+        return True
+
+    async def promote(self):
+        """候補モデルを昇格（on_promote が成功した時点で昇格済みとし、以降の採点を止める）"""
+        if self.promoted or self.rejected or self._promoting:
+            return
+        self._promoting = True
+        try:
+            if self.on_promote is not None:
+                await self.on_promote(self)
+        finally:
+            self._promoting = False
+        self.promoted = True
+        logger.info(f"Shadow candidate {self.candidate_version} promoted")
+
+    async def reject(self):
+        """候補モデルを不採用にする（以降の採点を止め、on_reject を呼ぶ）"""
+        if self.promoted or self.rejected:
+            return
+        self.rejected = True
+        logger.info(f"Shadow candidate {self.candidate_version} rejected")
+        if self.on_reject is not None:
+            await self.on_reject(self)
+
+    def _record(self, item: Tuple, candidate_probability: float, candidate_latency: float):
+        """本番と候補の予測を並べて記録"""
+        prediction_id, _, production_probability, production_latency, timestamp = item
+        agree = (production_probability >= 0.5) == (candidate_probability >= 0.5)
+
+        self.samples += 1
+        self.agreements += int(agree)
+        self.abs_diff_sum += abs(candidate_probability - production_probability)
+        self.production_prob_sum += production_probability
+        self.candidate_prob_sum += candidate_probability
+        self.production_latency.add(production_latency)
+        self.candidate_latency.add(candidate_latency)
+
+        self._pending[prediction_id] = (production_probability, candidate_probability)
+        if len(self._pending) > self.pending_size:
+            self._pending.popitem(last=False)
+
+        record = {
+            'prediction_id': prediction_id,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+            'production': {
+                'model_version': self.production_version,
+                'hit_probability': production_probability,
+                'latency_ms': production_latency * 1000
+            },
+            'candidate': {
+                'model_version': self.candidate_version,
+                'hit_probability': candidate_probability,
+                'latency_ms': candidate_latency * 1000
+            },
+            'agree': agree
+        }
+        self.log.append(record)
+        if self.structured_logger is not None:
+            self.structured_logger.info("Shadow prediction", **record)
+
+    def record_outcome(self, prediction_id: str, label: int) -> bool:
+        """
+        シャドー採点したリクエストの正解ラベルを記録
+
+        Args:
+            prediction_id: 予測ID
+            label: 実際の結果（0: 非ヒット, 1: ヒット）
+
+        Returns:
+            対応するシャドー採点があった場合True
+        """
+        probabilities = self._pending.pop(prediction_id, None)
+        if probabilities is None:
+            return False
+        production_probability, candidate_probability = probabilities
+        label = int(label)
+        self.production_calibration.update(production_probability, label)
+        self.candidate_calibration.update(candidate_probability, label)
+
+        if self.ab_test_id is not None:
+            # 正解した予測を「コンバージョン」として本番(A)と候補(B)の正解率を比較する
+            self.ab_test_manager.record_conversion(
+                self.ab_test_id, 'a', prediction_id, (production_probability >= 0.5) == bool(label)
+            )
+            self.ab_test_manager.record_conversion(
+                self.ab_test_id, 'b', prediction_id, (candidate_probability >= 0.5) == bool(label)
+            )
+        return True
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """直近の比較ログ（新しい順）"""
+        return list(self.log)[-limit:][::-1]
+
+    def _ab_analysis(self) -> Optional[Dict[str, Any]]:
+        labeled = self.production_calibration.count
+        labels_changed = self._ab_result is None or self._ab_result[0] != labeled
+        if self.ab_test_id is not None and labeled and labels_changed:
+            # 分析は記録件数に比例するため、正解ラベルが増えた時だけ行う
+            try:
+                result = self.ab_test_manager.analyze_test(self.ab_test_id)
+            except ValueError as e:
+                # 両群とも全問正解の場合など、分割表が検定できない
+                result = {'error': str(e)}
+            self._ab_result = (labeled, result)
+        return self._ab_result[1] if self._ab_result is not None else None
+
+    def evaluate(self) -> Dict[str, Any]:
+        """
+        オンライン指標と昇格判定
+
+        Returns:
+            一致率・平均予測・レイテンシ・キャリブレーション・A/Bテスト結果と
+            decision（collecting / awaiting_outcomes / promote / reject）
+        """
+        samples = self.samples
+        production_mean = self.production_prob_sum / samples if samples else None
+        candidate_mean = self.candidate_prob_sum / samples if samples else None
+        metrics = {
+            'job_id': self.job_id,
+            'candidate_version': self.candidate_version,
+            'production_version': self.production_version,
+            'started_at': self.started_at,
+            'sample_rate': self.sample_rate,
+            'requests': self.requests,
+            'sampled': self.sampled,
+            'samples': samples,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'agreement_rate': self.agreements / samples if samples else None,
+            'mean_abs_difference': self.abs_diff_sum / samples if samples else None,
+            'mean_probability': {'production': production_mean, 'candidate': candidate_mean},
+            'latency_seconds': {
+                'production': self.production_latency.quantiles(LATENCY_QUANTILES),
+                'candidate': self.candidate_latency.quantiles(LATENCY_QUANTILES)
+            },
+            'labeled': self.production_calibration.count,
+            'calibration': {
+                'production': self.production_calibration.to_dict(),
+                'candidate': self.candidate_calibration.to_dict()
+            },
+            'ab_test': self._ab_analysis(),
+            'promoted': self.promoted,
+            'rejected': self.rejected
+        }
+        metrics['decision'], metrics['reasons'] = self._decide(metrics)
+        return metrics
+
+    def _decide(self, metrics: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """昇格判定（判定と理由）"""
+        if metrics['samples'] < self.min_samples:
+            return 'collecting', [f"{metrics['samples']}/{self.min_samples} shadow samples"]
+
+        if metrics['labeled'] >= self.min_labeled:
+            production = metrics['calibration']['production']
+            candidate = metrics['calibration']['candidate']
+            reasons = []
+            if candidate['ece'] > production['ece'] + self.calibration_tolerance:
+                reasons.append(f"ECE {candidate['ece']:.4f} worse than production "
+                               f"{production['ece']:.4f}")
+            if candidate['brier'] > production['brier'] + self.calibration_tolerance:
+                reasons.append(f"Brier {candidate['brier']:.4f} worse than production "
+                               f"{production['brier']:.4f}")
+            ab_test = metrics['ab_test'] or {}
+            if (ab_test.get('is_significant') and ab_test['variant_b']['conversion_rate']
+                    < ab_test['variant_a']['conversion_rate']):
+                reasons.append(f"accuracy significantly lower (p={ab_test['p_value']:.4f})")
+            if reasons:
+                return 'reject', reasons
+            return 'promote', [
+                f"ECE {candidate['ece']:.4f} vs {production['ece']:.4f}",
+                f"Brier {candidate['brier']:.4f} vs {production['brier']:.4f}"
+            ]
+
+        if self.require_outcomes:
+            return 'awaiting_outcomes', [
+                f"{metrics['labeled']}/{self.min_labeled} labeled outcomes"
+            ]
+
+        # 正解ラベルが揃うまでは、本番とほぼ同じ判断をし平均予測もずれていない場合のみ昇格する
+        mean_probability = metrics['mean_probability']
+        shift = abs(mean_probability['candidate'] - mean_probability['production'])
+        reasons = [f"agreement {metrics['agreement_rate']:.3f} (required {self.min_agreement})",
+                   f"mean probability shift {shift:.4f} (allowed {self.max_mean_shift})"]
+        if metrics['agreement_rate'] >= self.min_agreement and shift <= self.max_mean_shift:
+            return 'promote', reasons
+        return 'awaiting_outcomes', reasons
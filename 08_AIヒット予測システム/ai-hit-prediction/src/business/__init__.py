@@ -1,5 +1,17 @@
 # Business Module
-from .report_generator import ReportGenerator
-from .ab_testing import ABTestManager
+# 公開クラスは初回参照時に読み込む（サブモジュールだけを使う場合の起動を軽くする）
+import importlib
 
-__all__ = ['ReportGenerator', 'ABTestManager']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'ReportGenerator': '.report_generator',
+    'ABTestManager': '.ab_testing',
+}
+
+__all__ = ['ReportGenerator', 'ABTestManager']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
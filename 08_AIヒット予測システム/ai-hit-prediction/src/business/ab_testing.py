@@ -191,6 +191,38 @@ class ABTestManager:
         else:
             logger.error(f"Invalid variant: {variant}")
     
+    def complete_test(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """
+        テスト終了（記録データを破棄し、最後の分析結果のみ履歴に残す）
+        
+        Args:
+            test_id: テストID
+        
+        Returns:
+            最後の分析結果（分析していない場合はNone）
+        """
+        test = self.active_tests.pop(test_id, None)
+        if test is None:
+            logger.error(f"Test {test_id} not found")
+            return None
+        
+        self.test_results[test_id] = test['results']
+        self.test_history.append({
+            'test_id': test_id,
+            'test_name': test['config'].test_name,
+            'status': TestStatus.COMPLETED.value,
+            'start_date': test['start_date'],
+            'end_date': datetime.now().isoformat(),
+            'sample_sizes': {
+                'variant_a': len(test['data']['variant_a']),
+                'variant_b': len(test['data']['variant_b'])
+            }
+        })
+        
+        logger.info(f"Completed test {test_id}")
+        
+        return test['results']
+    
     def analyze_test(self, test_id: str) -> Dict[str, Any]:
         """
         テスト結果分析
@@ -5,6 +5,7 @@ KPIダッシュボードとROI測定システム
 """
 
 import os
+import sys
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
@@ -13,14 +14,16 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 
-# 可視化ライブラリ
-try:
-    import plotly.graph_objects as go
-    import plotly.express as px
-    from plotly.subplots import make_subplots
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import, is_available
+
+# 可視化ライブラリ（初回のグラフ作成時に読み込む）
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
+subplots = lazy_import('plotly.subplots')
+PLOTLY_AVAILABLE = is_available('plotly')
 
 # データベース接続
 try:
@@ -467,7 +470,7 @@ class DashboardGenerator:
             return None
         
         # KPIゲージチャート
-        fig = make_subplots(
+        fig = subplots.make_subplots(
             rows=2, cols=2,
             subplot_titles=(
                 "Revenue Impact", "Prediction Accuracy",
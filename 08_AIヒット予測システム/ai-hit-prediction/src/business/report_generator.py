@@ -14,20 +14,26 @@ import logging
 
 # レポート生成ライブラリ
 from jinja2 import Template, Environment, FileSystemLoader
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
+import sys
 
-# PDFとExcel出力
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4, letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import, is_available
+
+# グラフ作成（初回使用時に読み込む）
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
+subplots = lazy_import('plotly.subplots')
+
+# PDFとExcel出力（ReportLabはPDF作成時に読み込む）
+colors = lazy_import('reportlab.lib.colors')
+pagesizes = lazy_import('reportlab.lib.pagesizes')
+platypus = lazy_import('reportlab.platypus')
+rl_styles = lazy_import('reportlab.lib.styles')
+units = lazy_import('reportlab.lib.units')
+REPORTLAB_AVAILABLE = is_available('reportlab')
+if not REPORTLAB_AVAILABLE:
     logging.warning("ReportLab not available. PDF export disabled.")
 
 import xlsxwriter
@@ -48,10 +54,17 @@ class ReportGenerator:
             template_dir: テンプレートディレクトリ
         """
         self.template_dir = template_dir or "templates"
-        self.styles = getSampleStyleSheet() if REPORTLAB_AVAILABLE else None
+        self._styles = None
         self.report_data = {}
         self.charts = {}
     
+    @property
+    def styles(self):
+        """PDF用のスタイルシート（初回参照時にReportLabを読み込む）"""
+        if self._styles is None and REPORTLAB_AVAILABLE:
+            self._styles = rl_styles.getSampleStyleSheet()
+        return self._styles
+    
     def generate_executive_summary(self, 
                                   predictions: pd.DataFrame,
                                   market_trends: Dict[str, Any],
@@ -211,7 +224,7 @@ class ReportGenerator:
         self.report_data['product_performance'] = performance
         return performance
     
-    def create_visualization_charts(self, data: Dict[str, Any]) -> Dict[str, go.Figure]:
+    def create_visualization_charts(self, data: Dict[str, Any]) -> Dict[str, "go.Figure"]:
         """
         ビジュアライゼーションチャート作成
         
@@ -258,11 +271,11 @@ class ReportGenerator:
             logger.error("ReportLab not available. Cannot export to PDF.")
             return
         
-        doc = SimpleDocTemplate(filename, pagesize=A4)
+        doc = platypus.SimpleDocTemplate(filename, pagesize=pagesizes.A4)
         story = []
         
         # タイトルページ
-        title_style = ParagraphStyle(
+        title_style = rl_styles.ParagraphStyle(
             'CustomTitle',
             parent=self.styles['Title'],
             fontSize=24,
@@ -270,24 +283,24 @@ class ReportGenerator:
             spaceAfter=30
         )
         
-        title = Paragraph("AI化粧品ヒット予測システム<br/>ビジネスレポート", title_style)
+        title = platypus.Paragraph("AI化粧品ヒット予測システム<br/>ビジネスレポート", title_style)
         story.append(title)
-        story.append(Spacer(1, 0.5*inch))
+        story.append(platypus.Spacer(1, 0.5*units.inch))
         
         # 日付
         date_text = f"作成日: {datetime.now().strftime('%Y年%m月%d日')}"
-        story.append(Paragraph(date_text, self.styles['Normal']))
-        story.append(PageBreak())
+        story.append(platypus.Paragraph(date_text, self.styles['Normal']))
+        story.append(platypus.PageBreak())
         
         # エグゼクティブサマリー
         if 'executive_summary' in self.report_data:
             story.extend(self._create_summary_section())
-            story.append(PageBreak())
+            story.append(platypus.PageBreak())
         
         # 市場分析
         if 'market_analysis' in self.report_data:
             story.extend(self._create_market_section())
-            story.append(PageBreak())
+            story.append(platypus.PageBreak())
         
         # 製品パフォーマンス
         if 'product_performance' in self.report_data:
@@ -562,7 +575,7 @@ class ReportGenerator:
     def _create_summary_section(self) -> List:
         """サマリーセクション作成"""
         story = []
-        story.append(Paragraph("エグゼクティブサマリー", self.styles['Heading1']))
+        story.append(platypus.Paragraph("エグゼクティブサマリー", self.styles['Heading1']))
         
         summary = self.report_data['executive_summary']
         
@@ -571,8 +584,8 @@ class ReportGenerator:
         for key, value in summary['key_metrics'].items():
             metrics_data.append([key, str(value)])
         
-        metrics_table = Table(metrics_data)
-        metrics_table.setStyle(TableStyle([
+        metrics_table = platypus.Table(metrics_data)
+        metrics_table.setStyle(platypus.TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -584,14 +597,14 @@ class ReportGenerator:
         ]))
         
         story.append(metrics_table)
-        story.append(Spacer(1, 0.2*inch))
+        story.append(platypus.Spacer(1, 0.2*units.inch))
         
         return story
     
     def _create_market_section(self) -> List:
         """市場分析セクション作成"""
         story = []
-        story.append(Paragraph("市場分析", self.styles['Heading1']))
+        story.append(platypus.Paragraph("市場分析", self.styles['Heading1']))
         
         # 市場概要
         market = self.report_data['market_analysis']
@@ -599,31 +612,31 @@ class ReportGenerator:
         市場規模: {market['market_overview'].get('total_market_size', 'N/A')}<br/>
         成長率: {market['market_overview'].get('growth_rate', 'N/A')}<br/>
         """
-        story.append(Paragraph(overview_text, self.styles['Normal']))
+        story.append(platypus.Paragraph(overview_text, self.styles['Normal']))
         
         return story
     
     def _create_performance_section(self) -> List:
         """パフォーマンスセクション作成"""
         story = []
-        story.append(Paragraph("製品パフォーマンス", self.styles['Heading1']))
+        story.append(platypus.Paragraph("製品パフォーマンス", self.styles['Heading1']))
         
         perf = self.report_data['product_performance']
         
         # トップパフォーマー
         if perf['top_performers']:
-            story.append(Paragraph("トップパフォーマー", self.styles['Heading2']))
+            story.append(platypus.Paragraph("トップパフォーマー", self.styles['Heading2']))
             top_data = [['製品名', 'ヒット確率']]
             for product in perf['top_performers'][:5]:
                 top_data.append([product['name'], f"{product['hit_probability']:.2%}"])
             
-            top_table = Table(top_data)
+            top_table = platypus.Table(top_data)
             story.append(top_table)
         
         return story
     
     # チャート作成メソッド
-    def _create_probability_distribution(self, predictions: pd.DataFrame) -> go.Figure:
+    def _create_probability_distribution(self, predictions: pd.DataFrame) -> "go.Figure":
         """確率分布チャート作成"""
         fig = go.Figure(data=[
             go.Histogram(x=predictions['hit_probability'], nbinsx=20)
@@ -635,7 +648,7 @@ class ReportGenerator:
         )
         return fig
     
-    def _create_category_chart(self, category_data: Dict) -> go.Figure:
+    def _create_category_chart(self, category_data: Dict) -> "go.Figure":
         """カテゴリチャート作成"""
         categories = list(category_data.keys())
         scores = [data['trend_score'] for data in category_data.values()]
@@ -650,7 +663,7 @@ class ReportGenerator:
         )
         return fig
     
-    def _create_trend_chart(self, trends: pd.DataFrame) -> go.Figure:
+    def _create_trend_chart(self, trends: pd.DataFrame) -> "go.Figure":
         """トレンドチャート作成"""
         fig = go.Figure()
         
@@ -669,7 +682,7 @@ class ReportGenerator:
         )
         return fig
     
-    def _create_risk_matrix(self, predictions: pd.DataFrame) -> go.Figure:
+    def _create_risk_matrix(self, predictions: pd.DataFrame) -> "go.Figure":
         """リスクマトリックス作成"""
         fig = go.Figure(data=[
             go.Scatter(
@@ -693,7 +706,7 @@ class ReportGenerator:
         )
         return fig
     
-    def _create_competitor_chart(self, competitor_data: pd.DataFrame) -> go.Figure:
+    def _create_competitor_chart(self, competitor_data: pd.DataFrame) -> "go.Figure":
         """競合比較チャート作成"""
         fig = go.Figure()
         
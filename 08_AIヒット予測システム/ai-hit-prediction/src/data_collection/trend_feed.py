@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+Trend Feed Module
+収集データのイベント駆動トレンド配信（プロセス内Pub/Sub・差分計算）
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 収集データから作成したトレンドスナップショットのトピック
+TREND_SNAPSHOT_TOPIC = "trend_snapshot"
+
+# 初期状態のトレンドキーワード（収集データが届くまでの値）
+BASELINE_KEYWORDS = {
+    "ビタミンC": {"score": 0.92, "growth": 0.15},
+    "レチノール": {"score": 0.88, "growth": 0.12},
+    "ナイアシンアミド": {"score": 0.85, "growth": 0.18},
+    "CICA": {"score": 0.82, "growth": 0.25},
+    "CBD": {"score": 0.78, "growth": 0.30}
+}
+
+
+class TrendEventBus:
+    """プロセス内のPub/Subイベントバス"""
+
+    def __init__(self):
+        """初期化"""
+        self._handlers: Dict[str, List[Callable[[Dict[str, Any]], Any]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """
+        ハンドラを実行するイベントループを設定
+
+        別スレッド（収集ジョブ等）からの publish はこのループに渡して実行する。
+        """
+        self._loop = loop
+
+    def subscribe(self, topic: str, handler: Callable[[Dict[str, Any]], Any]):
+        """
+        トピックを購読
+
+        Args:
+            topic: トピック名
+            handler: イベントを受け取る関数（コルーチン関数も可）
+        """
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def unsubscribe(self, topic: str, handler: Callable[[Dict[str, Any]], Any]):
+        """購読を解除"""
+        handlers = self._handlers.get(topic, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def publish(self, topic: str, event: Dict[str, Any]):
+        """
+        イベントを発行
+
+        Args:
+            topic: トピック名
+            event: イベント内容
+        """
+        self.published += 1
+        loop = self._loop
+        if loop is not None and loop.is_running() and not self._in_loop(loop):
+            loop.call_soon_threadsafe(self._dispatch, topic, event)
+        else:
+            self._dispatch(topic, event)
+
+    @staticmethod
+    def _in_loop(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _dispatch(self, topic: str, event: Dict[str, Any]):
+        """購読ハンドラを呼び出し"""
+        for handler in list(self._handlers.get(topic, [])):
+            try:
+                result = handler(event)
+                if asyncio.iscoroutine(result):
+                    asyncio.get_running_loop().create_task(result)
+            except Exception as e:
+                logger.error(f"Event handler for {topic} failed: {e}")
+
+
+def snapshot_from_collected_data(collected_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    DataPipeline.collect_all_data の結果からトレンドスナップショットを作成
+
+    Args:
+        collected_data: 収集データ（academic / news を含む辞書）
+
+    Returns:
+        キーワードごとのスコアを含むスナップショット
+    """
+    keywords = list(collected_data.get('keywords') or [])
+    academic = collected_data.get('academic') or {}
+    articles = (collected_data.get('news') or {}).get('articles', [])
+
+    mentions = {keyword: 0 for keyword in keywords}
+    for article in articles:
+        keyword = article.get('search_keyword')
+        if keyword is not None:
+            mentions[keyword] = mentions.get(keyword, 0) + 1
+    for keyword in academic:
+        mentions.setdefault(keyword, 0)
+
+    max_mentions = max(mentions.values()) if mentions else 0
+    snapshot_keywords = {}
+    for keyword, count in mentions.items():
+        papers = academic.get(keyword) or []
+        recent = sum(1 for p in papers if (p.get('year') or 0) >= 2020)
+        recent_ratio = recent / len(papers) if papers else 0
+        academic_score = min(len(papers) / 10, 1.0) * 0.5 + recent_ratio * 0.5
+        buzz_score = count / max_mentions if max_mentions else 0.0
+
+        snapshot_keywords[keyword] = {
+            'score': round(0.6 * buzz_score + 0.4 * academic_score, 4),
+            'buzz_score': round(buzz_score, 4),
+            'mentions': count
+        }
+
+    snapshot = {
+        'source': 'collector',
+        'timestamp': collected_data.get('timestamp', datetime.now().isoformat()),
+        'keywords': snapshot_keywords
+    }
+    if collected_data.get('category'):
+        snapshot['category'] = collected_data['category']
+    return snapshot
+
+
+class TrendAggregator:
+    """トレンドスナップショットを逐次集約し、差分とシーケンス番号を管理"""
+
+    def __init__(self,
+                 smoothing: float = 0.5,
+                 min_change: float = 1e-3,
+                 history_size: int = 1000):
+        """
+        初期化
+
+        Args:
+            smoothing: 新しい観測値の重み（指数移動平均）
+            min_change: 差分として配信する最小のスコア変化
+            history_size: 再同期用に保持する差分の件数
+        """
+        self.smoothing = smoothing
+        self.min_change = min_change
+        self.keywords: Dict[str, Dict[str, Any]] = {}
+        self.sequence = 0
+        self.updated_at: Optional[str] = None
+        self._deltas = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def seed(self, keywords: Dict[str, Dict[str, float]]):
+        """初期状態を設定（差分は発行しない）"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            for keyword, values in keywords.items():
+                self.keywords[keyword] = {
+                    'keyword': keyword,
+                    'score': float(values.get('score', 0.0)),
+                    'growth': float(values.get('growth', 0.0)),
+                    'buzz_score': float(values.get('buzz_score', 0.0)),
+                    'mentions': int(values.get('mentions', 0)),
+                    'updated_at': now
+                }
+            self.updated_at = now
+
+    def apply_snapshot(self, snapshot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        スナップショットを反映して差分を計算
+
+        変化したキーワードのみを再計算し、変化量が min_change 未満なら差分を発行しない。
+
+        Args:
+            snapshot: snapshot_from_collected_data 形式のスナップショット
+
+        Returns:
+            差分メッセージ（変化が無い場合None）
+        """
+        timestamp = snapshot.get('timestamp') or datetime.now().isoformat()
+        changes = {}
+
+        with self._lock:
+            for keyword, observed in (snapshot.get('keywords') or {}).items():
+                current = self.keywords.get(keyword)
+                observed_score = float(observed.get('score', 0.0))
+
+                if current is None:
+                    score, growth = observed_score, 0.0
+                else:
+                    previous = current['score']
+                    score = self.smoothing * observed_score + (1 - self.smoothing) * previous
+                    growth = (score - previous) / previous if previous > 0 else 0.0
+                    if abs(score - previous) < self.min_change:
+                        continue
+
+                entry = {
+                    'keyword': keyword,
+                    'score': round(score, 4),
+                    'growth': round(growth, 4),
+                    'buzz_score': float(observed.get('buzz_score', 0.0)),
+                    'mentions': int(observed.get('mentions', 0)),
+                    'updated_at': timestamp
+                }
+                self.keywords[keyword] = entry
+                changes[keyword] = entry
+
+            if not changes:
+                return None
+
+            self.sequence += 1
+            self.updated_at = timestamp
+            delta = {
+                'type': 'trend_delta',
+                'seq': self.sequence,
+                'prev_seq': self.sequence - 1,
+                'changes': changes,
+                'timestamp': timestamp
+            }
+            self._deltas.append(delta)
+            return delta
+
+    def top_keywords(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """スコア上位のキーワード"""
+        with self._lock:
+            ranked = sorted(self.keywords.values(), key=lambda k: k['score'], reverse=True)
+            return [
+                {'keyword': k['keyword'], 'score': k['score'], 'growth': k['growth']}
+                for k in ranked[:limit]
+            ]
+
+    def snapshot_message(self) -> Dict[str, Any]:
+        """全状態のスナップショットメッセージ（購読開始・再同期用）"""
+        with self._lock:
+            return {
+                'type': 'trend_snapshot',
+                'seq': self.sequence,
+                'keywords': {keyword: dict(entry) for keyword, entry in self.keywords.items()},
+                'timestamp': self.updated_at
+            }
+
+    def resync(self, last_seq: int) -> List[Dict[str, Any]]:
+        """
+        クライアントが受信済みのシーケンス以降のメッセージを取得
+
+        保持している差分で埋められない場合はスナップショットを返す。
+
+        Args:
+            last_seq: クライアントが最後に受信したシーケンス番号
+
+        Returns:
+            送信するメッセージのリスト
+        """
+        with self._lock:
+            if last_seq == self.sequence:
+                return []
+            oldest = self._deltas[0]['prev_seq'] if self._deltas else self.sequence
+            if oldest <= last_seq < self.sequence:
+                return [delta for delta in self._deltas if delta['seq'] > last_seq]
+        return [self.snapshot_message()]
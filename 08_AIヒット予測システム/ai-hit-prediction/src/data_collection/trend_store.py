@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+"""
+Trend Time-Series Store
+カテゴリ・キーワード別トレンドスコアのローリング時系列ストア（日次・週次・月次ロールアップ）
+"""
+
+import json
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# カテゴリ全体の集約系列に使うキーワード名
+CATEGORY_AGGREGATE = "*"
+
+# カテゴリを判定できないキーワードのカテゴリ
+UNCATEGORIZED = "その他"
+
+# カテゴリ指定の無いスナップショットのキーワードを振り分ける語（小文字で部分一致、先に一致したカテゴリ）
+KEYWORD_CATEGORY_TERMS = {
+    'ヘアケア': (
+        'hair', 'shampoo', 'conditioner', 'scalp', 'ヘア', '髪', 'シャンプー', 'コンディショナー',
+        'トリートメント', '頭皮'
+    ),
+    'メイクアップ': (
+        'makeup', 'make-up', 'lipstick', 'lip', 'tint', 'foundation', 'mascara', 'eyeshadow',
+        'eyeliner', 'concealer', 'blush', 'cushion', 'primer', 'メイク', 'リップ', 'ティント',
+        'ファンデ', 'マスカラ',
+        'アイシャドウ', 'アイライナー', 'コンシーラー', 'チーク', 'クッション'
+    ),
+    'スキンケア': (
+        'skin', 'serum', 'vitamin c', 'retinol', 'niacinamide', 'ceramide', 'cica', 'hyaluronic',
+        'peptide', 'cbd', 'toner', 'moisturi', 'cleans', 'sunscreen', 'spf', 'essence', 'スキン',
+        '美容液', '化粧水',
+        '乳液', 'ビタミンc', 'レチノール', 'ナイアシンアミド', 'セラミド', 'ヒアルロン', 'ペプチド',
+        '日焼け止め', '保湿', '洗顔'
+    ),
+}
+
+
+def classify_keyword(keyword: str) -> str:
+    """
+    キーワードのカテゴリを判定
+
+    Args:
+        keyword: トレンドキーワード
+
+    Returns:
+        カテゴリ（どの語にも一致しなければ UNCATEGORIZED）
+    """
+    name = keyword.lower()
+    for category, terms in KEYWORD_CATEGORY_TERMS.items():
+        if any(term in name for term in terms):
+            return category
+    return UNCATEGORIZED
+
+
+# 解像度ごとの保持バケット数
+RESOLUTION_CAPACITY = {
+    'daily': 730,
+    'weekly': 260,
+    'monthly': 120
+}
+
+
+# 解像度ごとのバケットの最大日数（保持バケット数から保持期間の上限を求める）
+RESOLUTION_DAYS = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 31
+}
+
+# 問い合わせ期間の上限（既定の保持期間のうち最長のもの）
+MAX_PERIOD_DAYS = max(RESOLUTION_CAPACITY[r] * RESOLUTION_DAYS[r] for r in RESOLUTION_CAPACITY)
+
+
+def bucket_index(day: date, resolution: str) -> int:
+    """
+    日付をバケット番号に変換
+
+    Args:
+        day: 日付
+        resolution: 'daily' / 'weekly'（月曜始まり） / 'monthly'
+
+    Returns:
+        バケット番号
+    """
+    if resolution == 'daily':
+        return day.toordinal()
+    if resolution == 'weekly':
+        # 序数1（0001-01-01）は月曜日
+        return (day.toordinal() - 1) // 7
+    if resolution == 'monthly':
+        return day.year * 12 + day.month - 1
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def bucket_start(index: int, resolution: str) -> date:
+    """バケット番号から開始日を取得"""
+    if resolution == 'daily':
+        return date.fromordinal(index)
+    if resolution == 'weekly':
+        return date.fromordinal(index * 7 + 1)
+    if resolution == 'monthly':
+        return date(index // 12, index % 12 + 1, 1)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def choose_resolution(period_days: int) -> str:
+    """期間に応じた解像度を選択（返す点数を数十〜百程度に抑える）"""
+    if period_days <= 90:
+        return 'daily'
+    if period_days <= 730:
+        return 'weekly'
+    return 'monthly'
+
+
+class RollingSeries:
+    """固定長リングバッファによる1解像度分の時系列（合計と件数を保持）"""
+
+    def __init__(self, capacity: int):
+        """
+        初期化
+
+        Args:
+            capacity: 保持するバケット数
+        """
+        self.capacity = capacity
+        self.trend_sum = np.zeros(capacity, dtype=np.float64)
+        self.buzz_sum = np.zeros(capacity, dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int32)
+        self.last_index: Optional[int] = None
+
+    def add(self, index: int, trend_score: float, buzz_score: float, count: int = 1) -> bool:
+        """
+        観測値をバケットに加算
+
+        Args:
+            index: バケット番号
+            trend_score: トレンドスコア（count 件分の合計）
+            buzz_score: バズスコア（count 件分の合計）
+            count: 観測件数（保存済みのバケットを復元する場合）
+
+        Returns:
+            保持期間内で加算できた場合True
+        """
+        if self.last_index is None:
+            self.last_index = index
+        elif index > self.last_index:
+            # 進んだ分のバケットを空にする
+            last_skipped = min(index, self.last_index + self.capacity)
+            for skipped in range(self.last_index + 1, last_skipped + 1):
+                slot = skipped % self.capacity
+                self.trend_sum[slot] = 0.0
+                self.buzz_sum[slot] = 0.0
+                self.counts[slot] = 0
+            self.last_index = index
+        elif index <= self.last_index - self.capacity:
+            return False
+
+        slot = index % self.capacity
+        self.trend_sum[slot] += trend_score
+        self.buzz_sum[slot] += buzz_score
+        self.counts[slot] += count
+        return True
+
+    def buckets(self) -> List[List[float]]:
+        """観測のあるバケットを古い順に [バケット番号, trend 合計, buzz 合計, 件数] で取得"""
+        if self.last_index is None:
+            return []
+        slots = np.flatnonzero(self.counts)
+        indices = self.last_index - (self.last_index - slots) % self.capacity
+        order = np.argsort(indices)
+        return [
+            [int(indices[i]), float(self.trend_sum[slots[i]]), float(self.buzz_sum[slots[i]]),
+             int(self.counts[slots[i]])]
+            for i in order
+        ]
+
+    def query(self, start_index: int, end_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        期間内のバケット平均を取得
+
+        Args:
+            start_index: 開始バケット番号
+            end_index: 終了バケット番号（含む）
+
+        Returns:
+            (trend_score, buzz_score) の配列（観測の無いバケットはNaN）
+        """
+        indices = np.arange(start_index, end_index + 1)
+        trend = np.full(len(indices), np.nan)
+        buzz = np.full(len(indices), np.nan)
+        if self.last_index is None:
+            return trend, buzz
+
+        valid = (indices <= self.last_index) & (indices > self.last_index - self.capacity)
+        slots = indices[valid] % self.capacity
+        counts = self.counts[slots]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trend[valid] = np.where(counts > 0, self.trend_sum[slots] / counts, np.nan)
+            buzz[valid] = np.where(counts > 0, self.buzz_sum[slots] / counts, np.nan)
+        return trend, buzz
+
+
+class TrendTimeSeriesStore:
+    """カテゴリ・キーワード別のトレンド時系列ストア"""
+
+    def __init__(self, capacities: Optional[Dict[str, int]] = None):
+        """
+        初期化
+
+        Args:
+            capacities: 解像度ごとの保持バケット数
+        """
+        self.capacities = dict(capacities or RESOLUTION_CAPACITY)
+        # (category, keyword) -> resolution -> RollingSeries
+        self._series: Dict[Tuple[str, str], Dict[str, RollingSeries]] = {}
+        self._lock = threading.Lock()
+        self.observations = 0
+
+    def _get_series(self, category: str, keyword: str) -> Dict[str, RollingSeries]:
+        key = (category, keyword)
+        if key not in self._series:
+            self._series[key] = {
+                resolution: RollingSeries(capacity)
+                for resolution, capacity in self.capacities.items()
+            }
+        return self._series[key]
+
+    def record(self, category: str, keyword: str, trend_score: float, buzz_score: float,
+               timestamp: Optional[datetime] = None):
+        """
+        観測値を記録（全解像度のロールアップを同時に更新）
+
+        キーワード系列とカテゴリ集約系列の両方に加算する。
+
+        Args:
+            category: カテゴリ
+            keyword: キーワード
+            trend_score: トレンドスコア
+            buzz_score: バズスコア
+            timestamp: 観測時刻（省略時は現在）
+        """
+        day = (timestamp or datetime.now()).date()
+        with self._lock:
+            for series_keyword in (keyword, CATEGORY_AGGREGATE):
+                series = self._get_series(category, series_keyword)
+                for resolution, rolling in series.items():
+                    rolling.add(bucket_index(day, resolution), trend_score, buzz_score)
+            self.observations += 1
+
+    def record_snapshot(self, snapshot: Dict[str, Any], default_category: Optional[str] = None):
+        """
+        トレンドスナップショットを記録
+
+        Args:
+            snapshot: キーワードごとの score / buzz_score を含むスナップショット
+            default_category: スナップショットにカテゴリが無い場合のカテゴリ
+                （省略時はキーワードごとに classify_keyword で判定）
+        """
+        category = snapshot.get('category') or default_category
+        timestamp = snapshot.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+        for keyword, values in (snapshot.get('keywords') or {}).items():
+            self.record(
+                category or classify_keyword(keyword),
+                keyword,
+                float(values.get('score', 0.0)),
+                float(values.get('buzz_score', 0.0)),
+                timestamp
+            )
+
+    def categories(self) -> List[str]:
+        """記録済みのカテゴリ"""
+        with self._lock:
+            return sorted({category for category, _ in self._series})
+
+    def keywords(self, category: str) -> List[str]:
+        """カテゴリ内の記録済みキーワード"""
+        with self._lock:
+            return sorted(k for c, k in self._series if c == category and k != CATEGORY_AGGREGATE)
+
+    def query(self,
+              categories: List[str],
+              period_days: int,
+              keyword: Optional[str] = None,
+              resolution: Optional[str] = None,
+              end: Optional[date] = None) -> Dict[str, Any]:
+        """
+        期間内の時系列を列指向で取得
+
+        Args:
+            categories: 対象カテゴリ
+            period_days: 期間（日数）
+            keyword: キーワード（省略時はカテゴリ集約系列）
+            resolution: 解像度（省略時は期間から自動選択）
+            end: 期間の終了日（省略時は今日）
+
+        Returns:
+            {'resolution', 'dates',
+             'series': {category: {'trend_score': [...], 'buzz_score': [...]}}}
+        """
+        resolution = resolution or choose_resolution(period_days)
+        end = end or date.today()
+        # 保持期間より前のバケットは常に空のため、期間をリングバッファの長さに収める
+        capacity = self.capacities[resolution]
+        period_days = min(period_days, capacity * RESOLUTION_DAYS[resolution])
+        start = end - timedelta(days=period_days)
+        end_index = bucket_index(end, resolution)
+        start_index = max(bucket_index(start, resolution), end_index - capacity + 1)
+
+        series_keyword = keyword or CATEGORY_AGGREGATE
+        result = {}
+        with self._lock:
+            for category in categories:
+                series = self._series.get((category, series_keyword))
+                if series is None:
+                    empty = [None] * (end_index - start_index + 1)
+                    result[category] = {'trend_score': empty, 'buzz_score': list(empty)}
+                    continue
+                trend, buzz = series[resolution].query(start_index, end_index)
+                result[category] = {
+                    'trend_score': _to_json_list(trend),
+                    'buzz_score': _to_json_list(buzz)
+                }
+
+        return {
+            'resolution': resolution,
+            'dates': [
+                bucket_start(index, resolution).isoformat()
+                for index in range(start_index, end_index + 1)
+            ],
+            'series': result
+        }
+
+
+    def save(self, filepath: Union[str, Path]):
+        """
+        ロールアップをJSONで保存（観測のあるバケットのみ）
+
+        Args:
+            filepath: 保存先
+        """
+        with self._lock:
+            data = {
+                'observations': self.observations,
+                'series': [
+                    {'category': category, 'keyword': keyword, 'resolution': resolution,
+                     'buckets': rolling.buckets()}
+                    for (category, keyword), series in self._series.items()
+                    for resolution, rolling in series.items()
+                ]
+            }
+        path = Path(filepath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        temp_path.replace(path)
+
+    def load(self, filepath: Union[str, Path]) -> bool:
+        """
+        保存済みのロールアップを読み込み（記録済みの系列に加算する）
+
+        保存時と保持バケット数が異なる解像度は、現在の保持期間に収まるバケットだけを復元する。
+
+        Args:
+            filepath: 保存先
+
+        Returns:
+            読み込んだ場合True（ファイルが無い場合False）
+        """
+        path = Path(filepath)
+        if not path.exists():
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        with self._lock:
+            for entry in data['series']:
+                if entry['resolution'] not in self.capacities:
+                    continue
+                rolling = self._get_series(entry['category'], entry['keyword'])[entry['resolution']]
+                for index, trend_sum, buzz_sum, count in entry['buckets']:
+                    rolling.add(index, trend_sum, buzz_sum, count)
+            self.observations += data['observations']
+        return True
+
+
+def _to_json_list(values: np.ndarray) -> List[Optional[float]]:
+    """NaNをNoneにしたJSON用のリスト"""
+    rounded = np.round(values, 4)
+    return [None if np.isnan(v) else float(v) for v in rounded]
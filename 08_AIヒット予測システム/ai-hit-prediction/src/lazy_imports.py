@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Lazy Import Registry
+重い依存ライブラリとモデルを初回使用時に読み込む遅延ロード機構
+"""
+
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 遅延読み込みの対象とする重いオプショナル依存
+HEAVY_OPTIONAL_MODULES = (
+    'shap',
+    'optuna',
+    'torch',
+    'torchvision',
+    'transformers',
+    'reportlab',
+    'plotly'
+)
+
+# モジュール名 -> 読み込みに要した秒数
+_import_times: Dict[str, float] = {}
+_registry: Dict[str, 'LazyModule'] = {}
+_registry_lock = threading.Lock()
+
+
+def is_available(name: str) -> bool:
+    """
+    モジュールを読み込まずにインストール済みか判定
+
+    Args:
+        name: モジュール名（例: 'plotly.graph_objects'）
+
+    Returns:
+        インストール済みの場合True
+    """
+    try:
+        return importlib.util.find_spec(name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """属性への初回アクセス時に実際のモジュールを読み込むプロキシ"""
+
+    def __init__(self, name: str):
+        """
+        初期化
+
+        Args:
+            name: 読み込むモジュール名
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """モジュールが利用可能か（読み込みは行わない）"""
+        return self._module is not None or is_available(self._name)
+
+    @property
+    def loaded(self) -> bool:
+        """既に読み込み済みか"""
+        return self._module is not None
+
+    def load(self):
+        """モジュールを読み込んで返す"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    _import_times[self._name] = time.perf_counter() - start
+                    logger.debug(f"Lazily imported {self._name} "
+                                 f"in {_import_times[self._name] * 1000:.1f}ms")
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyModule '{self._name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    遅延読み込みモジュールを取得（同じ名前には同じプロキシを返す）
+
+    Args:
+        name: モジュール名
+
+    Returns:
+        LazyModule
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def get_import_profile() -> Dict[str, Any]:
+    """
+    遅延読み込みの状況を取得
+
+    Returns:
+        登録済みモジュールの読み込み状態と所要時間
+    """
+    return {
+        'registered': sorted(_registry),
+        'loaded': {name: round(seconds * 1000, 2) for name, seconds in _import_times.items()},
+        'total_ms': round(sum(_import_times.values()) * 1000, 2)
+    }
+
+
+class LazyInstance:
+    """初回使用時（またはウォームアップ時）に生成されるオブジェクトのホルダー"""
+
+    def __init__(self, factory: Callable[[], Any], name: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            factory: インスタンスを生成する関数（重いimportは関数内で行う）
+            name: ログ表示用の名前
+        """
+        self.factory = factory
+        self.name = name or getattr(factory, '__name__', 'instance')
+        self.init_seconds = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_initialized(self) -> bool:
+        """生成済みか"""
+        return self._instance is not None
+
+    def get(self) -> Any:
+        """インスタンスを取得（未生成の場合は生成する）"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    instance = self.factory()
+                    self.init_seconds = time.perf_counter() - start
+                    logger.info(f"{self.name} initialized in {self.init_seconds:.2f}s")
+                    self._instance = instance
+        return self._instance
+
+    def warm_up(self) -> bool:
+        """
+        事前に生成しておく（起動後のバックグラウンド実行用）
+
+        Returns:
+            生成に成功した場合True
+        """
+        try:
+            self.get()
+            return True
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.name} failed: {e}")
+            return False
+
+    def reset(self):
+        """生成済みインスタンスを破棄"""
+        with self._lock:
+            self._instance = None
+            self.init_seconds = None
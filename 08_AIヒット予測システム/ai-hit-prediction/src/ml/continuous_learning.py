@@ -5,15 +5,18 @@ Continuous Learning Pipeline
 """
 
 import os
+import sys
 import json
-import pickle
-import hashlib
+import tempfile
+import warnings
+import joblib
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 import logging
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from collections import deque
 
 # MLライブラリ
 try:
@@ -26,9 +29,19 @@ try:
 except ImportError:
     ADVANCED_ML_AVAILABLE = False
 
+# 予測履歴の統計
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from src.ml.streaming_stats import DDSketch, RingBuffer, WindowedDDSketch
+from src.ml.streaming_drift import StreamingDriftDetector
+
+# モデルレジストリ
+from src.ml.model_registry import DEFAULT_SEGMENT, ModelRegistry
+
 # 並列処理
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
 import asyncio
+from src.ml.retraining_worker import create_worker_pool, shutdown_worker_pool, worker_threads
 
 # モニタリング
 try:
@@ -40,21 +53,62 @@ except ImportError:
 
 
 class ModelVersionManager:
-    """モデルバージョン管理クラス"""
+    """モデルバージョン管理クラス（SQLiteインデックスのモデルレジストリを使用）"""
     
-    def __init__(self, model_dir: str = "models/"):
-        """初期化"""
+    def __init__(self, model_dir: str = "models/", segment: str = DEFAULT_SEGMENT):
+        """
+        初期化
+        
+        Args:
+            model_dir: モデル保存先ディレクトリ（registry/ 以下にレジストリを作成）
+            segment: 既定のセグメント
+        """
         self.model_dir = Path(model_dir)
         self.model_dir.mkdir(parents=True, exist_ok=True)
-        self.versions_file = self.model_dir / "versions.json"
-        self.versions = self._load_versions()
+        self.segment = segment
+        self.registry = ModelRegistry(self.model_dir / "registry")
+        self._import_legacy_versions(self.model_dir / "versions.json")
     
-    def _load_versions(self) -> Dict:
-        """バージョン情報読み込み"""
-        if self.versions_file.exists():
-            with open(self.versions_file, 'r') as f:
-                return json.load(f)
-        return {"models": [], "current": None}
+    def _import_legacy_versions(self, versions_file: Path):
+        """
+        旧形式の versions.json をレジストリに取り込む（取り込み後はリネーム）
+        
+        昇格済みのバージョンは昇格日時の順に昇格し直し、昇格履歴（ロールバック先）と
+        本番モデルを引き継ぐ。
+        """
+        if not versions_file.exists() or self.registry.count() > 0:
+            return
+        
+        with open(versions_file, 'r') as f:
+            legacy = json.load(f)
+        imported = []
+        for version in legacy.get("models", []):
+            if not Path(version["model_file"]).exists():
+                logging.warning(f"Skipping missing legacy model file: {version['model_file']}")
+                continue
+            # 本番・アーカイブの状態は下の昇格で付け直す
+            status = version.get("status", "staged")
+            self.registry.register(
+                version["model_file"], version.get("metrics"), version.get("metadata"),
+                segment=self.segment, version_id=version["version_id"],
+                status="staged" if status == "production" else status,
+                created_at=version.get("timestamp")
+            )
+            imported.append(version)
+        
+        promoted = sorted((v for v in imported if v.get("promoted_at")),
+                          key=lambda v: v["promoted_at"])
+        for version in promoted:
+            self.registry.promote(version["version_id"], self.segment,
+                                  promoted_at=version["promoted_at"])
+        current = legacy.get("current")
+        if (current and self.registry.get(current)
+                and self.registry.current_version(self.segment) != current):
+            self.registry.promote(current, self.segment)
+        
+        versions_file.rename(versions_file.with_suffix(".json.migrated"))
+        logging.info(f"Imported {len(imported)} legacy versions into the model registry "
+                     f"({len(promoted)} promotions)")
     
     def save_model(self, model: Any, metrics: Dict, metadata: Dict) -> str:
         """
@@ -63,60 +117,46 @@ class ModelVersionManager:
         Args:
             model: 保存するモデル
             metrics: 評価メトリクス
-            metadata: メタデータ
+            metadata: メタデータ（segment を含めるとそのセグメントに登録）
         
         Returns:
             バージョンID
         """
-        # バージョンID生成
-        version_id = self._generate_version_id()
-        timestamp = datetime.now().isoformat()
-        
-        # モデルファイル保存
-        model_file = self.model_dir / f"model_{version_id}.pkl"
-        with open(model_file, 'wb') as f:
-            pickle.dump(model, f)
-        
-        # バージョン情報更新
-        version_info = {
-            "version_id": version_id,
-            "timestamp": timestamp,
-            "model_file": str(model_file),
-            "metrics": metrics,
-            "metadata": metadata,
-            "status": "staged"
-        }
-        
-        self.versions["models"].append(version_info)
-        self._save_versions()
+        # 非圧縮で一時ファイルに書き出し、内容のハッシュでレジストリに保存する
+        # （読み込み時に数値配列をメモリマップできる）
+        with tempfile.TemporaryDirectory(dir=self.model_dir) as tmp_dir:
+            model_file = Path(tmp_dir) / "model.pkl"
+            joblib.dump(model, model_file)
+            version_id = self.registry.register(
+                model_file, metrics, metadata, segment=metadata.get("segment", self.segment)
+            )
         
         logging.info(f"Model saved: {version_id}")
         return version_id
     
-    def load_model(self, version_id: Optional[str] = None) -> Tuple[Any, Dict]:
+    def load_model(self, version_id: Optional[str] = None,
+                   mmap_mode: Optional[str] = None) -> Tuple[Any, Dict]:
         """
         モデル読み込み
         
         Args:
-            version_id: バージョンID（Noneの場合は最新）
+            version_id: バージョンID（Noneの場合は本番モデル）
+            mmap_mode: joblib.load に渡すメモリマップモード（'r' で読み取り専用共有）
         
         Returns:
             モデルとメタデータ
         """
         if version_id is None:
-            version_id = self.versions.get("current")
-        
-        if not version_id:
-            raise ValueError("No model version specified or set as current")
-        
-        # バージョン情報取得
-        version_info = self._get_version_info(version_id)
-        if not version_info:
-            raise ValueError(f"Version {version_id} not found")
+            version_info = self.registry.current(self.segment)
+            if version_info is None:
+                raise ValueError("No model version specified or set as current")
+        else:
+            version_info = self.registry.get(version_id)
+            if version_info is None:
+                raise ValueError(f"Version {version_id} not found")
         
-        # モデル読み込み
-        with open(version_info["model_file"], 'rb') as f:
-            model = pickle.load(f)
+        # joblibは従来のpickle形式のファイルも読み込める
+        model = joblib.load(version_info["model_file"], mmap_mode=mmap_mode)
         
         return model, version_info
     
@@ -130,23 +170,10 @@ class ModelVersionManager:
         Returns:
             成功フラグ
         """
-        version_info = self._get_version_info(version_id)
-        if not version_info:
+        try:
+            self.registry.promote(version_id)
+        except KeyError:
             return False
-        
-        # 既存の本番モデルをアーカイブ
-        if self.versions["current"]:
-            old_version = self._get_version_info(self.versions["current"])
-            if old_version:
-                old_version["status"] = "archived"
-        
-        # 新モデルを本番に設定
-        version_info["status"] = "production"
-        version_info["promoted_at"] = datetime.now().isoformat()
-        self.versions["current"] = version_id
-        
-        self._save_versions()
-        logging.info(f"Model {version_id} promoted to production")
         return True
     
     def rollback_model(self, steps: int = 1) -> bool:
@@ -159,73 +186,74 @@ class ModelVersionManager:
         Returns:
             成功フラグ
         """
-        production_models = [
-            m for m in self.versions["models"] 
-            if m.get("promoted_at")
-        ]
-        
-        if len(production_models) <= steps:
-            logging.error("Not enough versions to rollback")
-            return False
-        
-        # ソート（昇格日時順）
-        production_models.sort(key=lambda x: x["promoted_at"], reverse=True)
-        
-        # ロールバック先を設定
-        target_version = production_models[steps]
-        return self.promote_model(target_version["version_id"])
-    
-    def _generate_version_id(self) -> str:
-        """バージョンID生成"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        random_suffix = hashlib.md5(
-            f"{timestamp}_{np.random.rand()}".encode()
-        ).hexdigest()[:8]
-        return f"v_{timestamp}_{random_suffix}"
-    
-    def _get_version_info(self, version_id: str) -> Optional[Dict]:
-        """バージョン情報取得"""
-        for version in self.versions["models"]:
-            if version["version_id"] == version_id:
-                return version
-        return None
-    
-    def _save_versions(self):
-        """バージョン情報保存"""
-        with open(self.versions_file, 'w') as f:
-            json.dump(self.versions, f, indent=2)
+        return self.registry.rollback(self.segment, steps) is not None
+    
+    @property
+    def current_version(self) -> Optional[str]:
+        """本番モデルのバージョンID"""
+        return self.registry.current_version(self.segment)
+    
+    def list_versions(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """バージョン一覧を新しい順に取得"""
+        return self.registry.list_versions(segment=self.segment, status=status, limit=limit)
 
 
 class DataDriftDetector:
     """データドリフト検出クラス"""
     
-    def __init__(self, baseline_stats: Optional[Dict] = None):
-        """初期化"""
+    def __init__(self, baseline_stats: Optional[Dict] = None,
+                 window_size: int = 1000, n_bins: int = 20):
+        """
+        初期化
+        
+        Args:
+            baseline_stats: ベースラインの統計情報
+            window_size: ストリーミング判定の1ウィンドウの行数
+            n_bins: 分布比較に使うヒストグラムのビン数
+        """
         self.baseline_stats = baseline_stats or {}
-        self.drift_history = []
+        self.drift_history = deque(maxlen=1000)
+        # 推論データを逐次取り込む分布ベースの検出器（ベースライン設定時に学習）
+        self.streaming = StreamingDriftDetector(n_bins=n_bins, window_size=window_size)
     
     def calculate_statistics(self, data: pd.DataFrame) -> Dict:
         """
         統計情報計算
         
+        数値列をまとめて1つの配列にし、全列の統計量を一括で計算する。
+        
         Args:
             data: データフレーム
         
         Returns:
             統計情報
         """
-        stats = {}
+        numeric = data.select_dtypes(include=[np.number])
+        if numeric.shape[1] == 0 or len(numeric) == 0:
+            return {}
+        
+        values = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+        with warnings.catch_warnings():
+            # 全て欠損の列はNaNとして扱う
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            means = np.nanmean(values, axis=0)
+            stds = np.nanstd(values, axis=0, ddof=1)
+            mins = np.nanmin(values, axis=0)
+            maxs = np.nanmax(values, axis=0)
+            q25, q50, q75 = np.nanquantile(values, [0.25, 0.50, 0.75], axis=0)
+        null_rates = np.isnan(values).mean(axis=0)
         
-        for column in data.select_dtypes(include=[np.number]).columns:
+        stats = {}
+        for i, column in enumerate(numeric.columns):
             stats[column] = {
-                "mean": data[column].mean(),
-                "std": data[column].std(),
-                "min": data[column].min(),
-                "max": data[column].max(),
-                "q25": data[column].quantile(0.25),
-                "q50": data[column].quantile(0.50),
-                "q75": data[column].quantile(0.75),
-                "null_rate": data[column].isnull().mean()
+                "mean": means[i],
+                "std": stds[i],
+                "min": mins[i],
+                "max": maxs[i],
+                "q25": q25[i],
+                "q50": q50[i],
+                "q75": q75[i],
+                "null_rate": null_rates[i]
             }
         
         return stats
@@ -235,15 +263,18 @@ class DataDriftDetector:
         """
         データドリフト検出
         
+        平均・標準偏差の変化率に加え、ベースラインのヒストグラムとの
+        PSI / KS / Jensen-Shannon で分布の変化を判定する。
+        
         Args:
             new_data: 新しいデータ
-            threshold: ドリフト閾値
+            threshold: ドリフト閾値（平均・標準偏差の変化率）
         
         Returns:
             ドリフト検出結果
         """
         if not self.baseline_stats:
-            self.baseline_stats = self.calculate_statistics(new_data)
+            self.update_baseline(new_data)
             return {"drift_detected": False, "message": "Baseline established"}
         
         new_stats = self.calculate_statistics(new_data)
@@ -251,7 +282,6 @@ class DataDriftDetector:
         
         for column in new_stats:
             if column in self.baseline_stats:
-                # KLダイバージェンス計算（簡易版）
                 baseline = self.baseline_stats[column]
                 current = new_stats[column]
                 
@@ -276,29 +306,154 @@ class DataDriftDetector:
             "timestamp": datetime.now().isoformat()
         }
         
+        # 分布ベースの判定
+        if self.streaming.is_fitted:
+            distribution = self.streaming.check_data(new_data)
+            result["distribution_scores"] = distribution["scores"]
+            result["drifted_features"] = distribution["drifted_features"]
+            result["drift_detected"] = drift_detected or distribution["drift_detected"]
+        
         self.drift_history.append(result)
         
-        if drift_detected:
+        if result["drift_detected"]:
             logging.warning(f"Data drift detected: {max_drift:.3f}")
         
         return result
     
+    def observe(self, features: Union[pd.DataFrame, Dict[str, Any], np.ndarray]
+                ) -> Optional[Dict[str, Any]]:
+        """
+        推論時の特徴量をストリーミング検出器に取り込む
+        
+        Args:
+            features: 推論に使った特徴量
+        
+        Returns:
+            ウィンドウが満たされた場合はドリフト判定結果
+        """
+        result = self.streaming.update(features)
+        if result is not None:
+            self.drift_history.append(result)
+        return result
+    
     def update_baseline(self, new_data: pd.DataFrame):
         """ベースライン更新"""
         self.baseline_stats = self.calculate_statistics(new_data)
+        self.streaming.fit_baseline(new_data)
         logging.info("Baseline statistics updated")
 
 
+def _classification_metrics(y_test: np.ndarray, y_pred: np.ndarray) -> Dict:
+    """評価メトリクスを計算（二値分類の場合は適合率・再現率・F1も含める）"""
+    if len(np.unique(y_test)) == 2:
+        return {
+            "accuracy": accuracy_score(y_test, y_pred),
+            "precision": precision_score(y_test, y_pred),
+            "recall": recall_score(y_test, y_pred),
+            "f1": f1_score(y_test, y_pred)
+        }
+    return {
+        "accuracy": accuracy_score(y_test, y_pred)
+    }
+
+
+def _build_estimator(model_type: str, n_jobs: int) -> Any:
+    """モデルタイプに対応する推定器を作成"""
+    if model_type == "random_forest":
+        return RandomForestClassifier(
+            n_estimators=100,
+            max_depth=10,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if model_type == "xgboost" and ADVANCED_ML_AVAILABLE:
+        return xgb.XGBClassifier(
+            n_estimators=100,
+            max_depth=6,
+            learning_rate=0.1,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if model_type == "lightgbm" and ADVANCED_ML_AVAILABLE:
+        return lgb.LGBMClassifier(
+            n_estimators=100,
+            max_depth=10,
+            learning_rate=0.1,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    return RandomForestClassifier(n_estimators=50, random_state=42, n_jobs=n_jobs)
+
+
+def _fit_and_evaluate(X_train: np.ndarray, y_train: np.ndarray,
+                      model_type: str) -> Tuple[Any, Dict, float]:
+    """
+    学習・検証・交差検証を実行（CPU制限付きのワーカープロセスで実行）
+    
+    Returns:
+        学習済みモデル、評価メトリクス、学習時間（秒）
+    """
+    start_time = datetime.now()
+    
+    # データ分割
+    X_train_split, X_val_split, y_train_split, y_val_split = train_test_split(
+        X_train, y_train, test_size=0.2, random_state=42
+    )
+    
+    # 学習実行
+    model = _build_estimator(model_type, worker_threads())
+    model.fit(X_train_split, y_train_split)
+    
+    # 評価
+    metrics = _classification_metrics(y_val_split, model.predict(X_val_split))
+    
+    # クロスバリデーション
+    cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy')
+    metrics['cv_mean'] = cv_scores.mean()
+    metrics['cv_std'] = cv_scores.std()
+    
+    return model, metrics, (datetime.now() - start_time).total_seconds()
+
+
 class AutoRetrainer:
     """自動再学習クラス"""
     
     def __init__(self, 
                  model_manager: ModelVersionManager,
-                 drift_detector: DataDriftDetector):
-        """初期化"""
+                 drift_detector: DataDriftDetector,
+                 max_workers: int = 1,
+                 cpu_limit: Optional[int] = None):
+        """
+        初期化
+        
+        Args:
+            model_manager: モデルバージョン管理
+            drift_detector: ドリフト検出器
+            max_workers: 再学習に使うワーカープロセス数
+            cpu_limit: 再学習に使うCPU数（省略時は利用可能なCPUの半分）
+        """
         self.model_manager = model_manager
         self.drift_detector = drift_detector
         self.retraining_history = []
+        self.max_workers = max_workers
+        self.cpu_limit = cpu_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """学習用のプロセスプール（初回使用時に作成）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = create_worker_pool(self.max_workers, self.cpu_limit)
+            return self._executor
+    
+    def close(self):
+        """プロセスプールを終了"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            shutdown_worker_pool(executor)
     
     def evaluate_model(self, model: Any, X_test: np.ndarray, 
                       y_test: np.ndarray) -> Dict:
@@ -313,22 +468,7 @@ class AutoRetrainer:
         Returns:
             評価メトリクス
         """
-        y_pred = model.predict(X_test)
-        
-        # 二値分類の場合
-        if len(np.unique(y_test)) == 2:
-            metrics = {
-                "accuracy": accuracy_score(y_test, y_pred),
-                "precision": precision_score(y_test, y_pred),
-                "recall": recall_score(y_test, y_pred),
-                "f1": f1_score(y_test, y_pred)
-            }
-        else:
-            metrics = {
-                "accuracy": accuracy_score(y_test, y_pred)
-            }
-        
-        return metrics
+        return _classification_metrics(y_test, model.predict(X_test))
     
     def should_retrain(self, 
                        performance_drop: float,
@@ -354,6 +494,58 @@ class AutoRetrainer:
         
         return any(conditions)
     
+    def submit_retrain(self,
+                       X_train: np.ndarray,
+                       y_train: np.ndarray,
+                       model_type: str = "random_forest",
+                       reason: str = "scheduled") -> Future:
+        """
+        再学習をプロセスプールに投入（呼び出し元はブロックしない）
+        
+        学習が終わるとプールの管理スレッドでモデルを保存し、再学習結果で完了するFutureを返す。
+        
+        Args:
+            X_train: 訓練データ
+            y_train: 訓練ラベル
+            model_type: モデルタイプ
+            reason: 再学習の理由
+        
+        Returns:
+            再学習結果（version_id / metrics / metadata / status）で完了するFuture
+        """
+        result_future: Future = Future()
+        training_future = self.executor.submit(_fit_and_evaluate, X_train, y_train, model_type)
+        
+        def on_trained(future: Future):
+            try:
+                model, metrics, training_time = future.result()
+                metadata = {
+                    "model_type": model_type,
+                    "training_samples": len(X_train),
+                    "training_time": training_time,
+                    "feature_count": X_train.shape[1],
+                    "retrain_reason": reason
+                }
+                result_future.set_result(self._record_result(model, metrics, metadata))
+            except BaseException as e:
+                result_future.set_exception(e)
+        
+        training_future.add_done_callback(on_trained)
+        return result_future
+    
+    def _record_result(self, model: Any, metrics: Dict, metadata: Dict) -> Dict:
+        """学習済みモデルを保存して履歴に追加"""
+        with self._lock:
+            version_id = self.model_manager.save_model(model, metrics, metadata)
+            result = {
+                "version_id": version_id,
+                "metrics": metrics,
+                "metadata": metadata,
+                "status": "completed"
+            }
+            self.retraining_history.append(result)
+        return result
+    
     async def retrain_model_async(self, 
                                   X_train: np.ndarray,
                                   y_train: np.ndarray,
@@ -361,6 +553,8 @@ class AutoRetrainer:
         """
         非同期モデル再学習
         
+        学習と交差検証はワーカープロセスで行い、イベントループはブロックしない。
+        
         Args:
             X_train: 訓練データ
             y_train: 訓練ラベル
@@ -369,87 +563,29 @@ class AutoRetrainer:
         Returns:
             再学習結果
         """
-        start_time = datetime.now()
-        
-        # データ分割
-        X_train_split, X_val_split, y_train_split, y_val_split = train_test_split(
-            X_train, y_train, test_size=0.2, random_state=42
+        return await asyncio.wrap_future(
+            self.submit_retrain(X_train, y_train, model_type, reason="scheduled")
         )
-        
-        # モデル学習
-        if model_type == "random_forest":
-            model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42,
-                n_jobs=-1
-            )
-        elif model_type == "xgboost" and ADVANCED_ML_AVAILABLE:
-            model = xgb.XGBClassifier(
-                n_estimators=100,
-                max_depth=6,
-                learning_rate=0.1,
-                random_state=42
-            )
-        elif model_type == "lightgbm" and ADVANCED_ML_AVAILABLE:
-            model = lgb.LGBMClassifier(
-                n_estimators=100,
-                max_depth=10,
-                learning_rate=0.1,
-                random_state=42
-            )
-        else:
-            model = RandomForestClassifier(n_estimators=50, random_state=42)
-        
-        # 学習実行
-        model.fit(X_train_split, y_train_split)
-        
-        # 評価
-        metrics = self.evaluate_model(model, X_val_split, y_val_split)
-        
-        # クロスバリデーション
-        cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='accuracy')
-        metrics['cv_mean'] = cv_scores.mean()
-        metrics['cv_std'] = cv_scores.std()
-        
-        # 学習時間
-        training_time = (datetime.now() - start_time).total_seconds()
-        
-        # メタデータ
-        metadata = {
-            "model_type": model_type,
-            "training_samples": len(X_train),
-            "training_time": training_time,
-            "feature_count": X_train.shape[1],
-            "retrain_reason": "scheduled"
-        }
-        
-        # モデル保存
-        version_id = self.model_manager.save_model(model, metrics, metadata)
-        
-        result = {
-            "version_id": version_id,
-            "metrics": metrics,
-            "metadata": metadata,
-            "status": "completed"
-        }
-        
-        self.retraining_history.append(result)
-        
-        return result
     
     def schedule_retrain(self, X: np.ndarray, y: np.ndarray, 
                         interval_hours: int = 24) -> None:
         """
         定期再学習スケジューリング
         
+        ジョブはドリフト判定と再学習の投入のみを行い、学習の完了を待たない。
+        
         Args:
             X: 訓練データ
             y: 訓練ラベル
             interval_hours: 再学習間隔（時間）
         """
         import schedule
-        import time
+        
+        def log_result(future: Future):
+            if future.exception() is not None:
+                logging.error(f"Scheduled retraining failed: {future.exception()}")
+            else:
+                logging.info(f"Retraining completed: {future.result()['version_id']}")
         
         def retrain_job():
             logging.info("Starting scheduled retraining...")
@@ -460,12 +596,7 @@ class AutoRetrainer:
             
             # 再学習実施
             if drift_result["drift_detected"]:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(
-                    self.retrain_model_async(X, y)
-                )
-                logging.info(f"Retraining completed: {result['version_id']}")
+                self.submit_retrain(X, y, reason="drift").add_done_callback(log_result)
         
         # スケジュール設定
         schedule.every(interval_hours).hours.do(retrain_job)
@@ -476,10 +607,37 @@ class AutoRetrainer:
 class ModelMonitor:
     """モデルモニタリングクラス"""
     
-    def __init__(self):
-        """初期化"""
-        self.performance_history = []
-        self.prediction_history = []
+    # サマリーに含める分位点
+    SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self,
+                 history_size: int = 10000,
+                 performance_history_size: int = 1000,
+                 recent_window: int = 100,
+                 relative_accuracy: float = 0.01,
+                 latency_window_seconds: float = 300.0):
+        """
+        初期化
+        
+        予測履歴は固定長のリングバッファ、分位点はDDSketchで保持するため、
+        稼働期間に関わらずメモリとサマリー計算のコストは一定になる。
+        レイテンシの分位点は直近 latency_window_seconds 秒の窓で求め、現在の遅延に追従させる。
+        
+        Args:
+            history_size: 保持する予測履歴の件数
+            performance_history_size: 保持する性能評価の件数
+            recent_window: サマリーで直近として扱う件数
+            relative_accuracy: 分位点スケッチの相対誤差
+            latency_window_seconds: レイテンシの分位点を求める時間窓（秒、5区間で入れ替える）
+        """
+        self.performance_history = deque(maxlen=performance_history_size)
+        self.prediction_history = RingBuffer(history_size, ("latency", "confidence", "prediction"))
+        self.recent_window = recent_window
+        self.latency_sketch = WindowedDDSketch(relative_accuracy,
+                                               interval_seconds=latency_window_seconds / 5,
+                                               n_intervals=5)
+        self.confidence_sketch = DDSketch(relative_accuracy)
+        self.prediction_sketch = DDSketch(relative_accuracy)
         self.alert_thresholds = {
             "accuracy_min": 0.8,
             "latency_max": 1.0,  # seconds
@@ -495,22 +653,17 @@ class ModelMonitor:
         予測ログ記録
         
         Args:
-            input_data: 入力データ
+            input_data: 入力データ（履歴には数値のみを残すため保持しない）
             prediction: 予測値
             confidence: 信頼度
             latency: レイテンシ
         """
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "input_hash": hashlib.md5(
-                json.dumps(input_data, sort_keys=True).encode()
-            ).hexdigest(),
-            "prediction": prediction,
-            "confidence": confidence,
-            "latency": latency
-        }
-        
-        self.prediction_history.append(log_entry)
+        self.prediction_history.append(
+            latency=latency, confidence=confidence, prediction=prediction
+        )
+        self.latency_sketch.add(latency)
+        self.confidence_sketch.add(confidence)
+        self.prediction_sketch.add(prediction)
         
         # MLflow記録（可能な場合）
         if MLFLOW_AVAILABLE:
@@ -558,25 +711,33 @@ class ModelMonitor:
         """
         モニタリングサマリー取得
         
+        分位点はスケッチ、直近の統計はリングバッファの末尾から求めるため、
+        履歴の件数に依存しない。
+        
         Returns:
             サマリー情報
         """
-        if not self.prediction_history:
+        if self.prediction_history.total == 0:
             return {"status": "No predictions logged"}
         
-        recent_predictions = self.prediction_history[-100:]  # 直近100件
-        
-        latencies = [p["latency"] for p in recent_predictions]
-        confidences = [p["confidence"] for p in recent_predictions]
+        latencies = self.prediction_history.values("latency", last=self.recent_window)
+        confidences = self.prediction_history.values("confidence", last=self.recent_window)
+        latency_percentiles = self.latency_sketch.quantiles(self.SUMMARY_QUANTILES)
         
         summary = {
-            "total_predictions": len(self.prediction_history),
-            "recent_predictions": len(recent_predictions),
-            "avg_latency": np.mean(latencies),
-            "p95_latency": np.percentile(latencies, 95),
-            "avg_confidence": np.mean(confidences),
-            "min_confidence": np.min(confidences),
-            "last_update": self.prediction_history[-1]["timestamp"]
+            "total_predictions": self.prediction_history.total,
+            "recent_predictions": len(latencies),
+            "avg_latency": float(np.mean(latencies)),
+            "p95_latency": latency_percentiles["p95"],
+            "avg_confidence": float(np.mean(confidences)),
+            "min_confidence": float(np.min(confidences)),
+            "latency_percentiles": latency_percentiles,
+            "latency_window_seconds": self.latency_sketch.window_seconds,
+            "confidence_percentiles": self.confidence_sketch.quantiles(self.SUMMARY_QUANTILES),
+            "prediction_percentiles": self.prediction_sketch.quantiles(self.SUMMARY_QUANTILES),
+            "last_update": datetime.fromtimestamp(
+                self.prediction_history.last_timestamp
+            ).isoformat()
         }
         
         if self.performance_history:
@@ -644,27 +805,25 @@ class ContinuousLearningPipeline:
             
             # 3. ベースライン統計設定
             df_train = pd.DataFrame(X_train)
-            self.drift_detector.baseline_stats = \
-                self.drift_detector.calculate_statistics(df_train)
+            self.drift_detector.update_baseline(df_train)
             
             # 4. 新規データがある場合の処理
             if X_new is not None and y_new is not None:
                 logging.info("Processing new data...")
                 
-                # ドリフト検出
+                # ドリフト検出と現行モデルの性能評価を並行して実行
                 df_new = pd.DataFrame(X_new)
-                drift_result = self.drift_detector.detect_drift(df_new)
-                
-                # 現行モデルの性能評価
                 current_model, _ = self.model_manager.load_model()
-                metrics_new = self.auto_retrainer.evaluate_model(
-                    current_model, X_new, y_new
+                loop = asyncio.get_running_loop()
+                drift_result, metrics_new, y_pred_new = await asyncio.gather(
+                    loop.run_in_executor(None, self.drift_detector.detect_drift, df_new),
+                    loop.run_in_executor(None, self.auto_retrainer.evaluate_model,
+                                         current_model, X_new, y_new),
+                    loop.run_in_executor(None, current_model.predict, X_new)
                 )
                 
                 # モニタリング記録
-                self.monitor.calculate_performance_metrics(
-                    y_new, current_model.predict(X_new)
-                )
+                self.monitor.calculate_performance_metrics(y_new, y_pred_new)
                 
                 # 再学習判定
                 baseline_metrics = result["metrics"]
@@ -703,9 +862,9 @@ class ContinuousLearningPipeline:
             summary = {
                 "pipeline_status": "completed",
                 "baseline_version": baseline_version,
-                "current_version": self.model_manager.versions["current"],
+                "current_version": self.model_manager.current_version,
                 "monitoring_summary": self.monitor.get_monitoring_summary(),
-                "drift_history": self.drift_detector.drift_history[-5:]
+                "drift_history": list(self.drift_detector.drift_history)[-5:]
             }
             
             return summary
@@ -717,10 +876,14 @@ class ContinuousLearningPipeline:
         """パイプラインステータス取得"""
         return {
             "is_running": self.is_running,
-            "current_model": self.model_manager.versions.get("current"),
-            "total_versions": len(self.model_manager.versions["models"]),
+            "current_model": self.model_manager.current_version,
+            "total_versions": self.model_manager.registry.count(),
             "monitoring": self.monitor.get_monitoring_summary()
         }
+    
+    def close(self):
+        """再学習用のプロセスプールを終了"""
+        self.auto_retrainer.close()
 
 
 # 使用例
@@ -759,4 +922,7 @@ if __name__ == "__main__":
         print("\nPipeline Result:")
         print(json.dumps(result, indent=2, default=str))
     
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        pipeline.close()
\ No newline at end of file
@@ -0,0 +1,500 @@
+#!/usr/bin/env python
+"""
+Model Registry Module
+SQLiteインデックスによるモデルレジストリ（コンテンツハッシュ・重複排除・アトミックな昇格・変更カウンター）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# セグメント指定の無いモデルのセグメント名
+DEFAULT_SEGMENT = "default"
+
+# モデルファイルと一緒に保存する付随成果物（コンパイル済みフォレスト・ドリフトベースライン）
+SIDECAR_SUFFIXES = ('.forest', '.drift.json')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    hash TEXT PRIMARY KEY,
+    relpath TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    version_id TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    artifact_hash TEXT NOT NULL REFERENCES artifacts(hash),
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    promoted_at TEXT,
+    metrics TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_versions_segment ON versions(segment, created_at);
+CREATE INDEX IF NOT EXISTS idx_versions_hash ON versions(artifact_hash);
+CREATE TABLE IF NOT EXISTS current_models (
+    segment TEXT PRIMARY KEY,
+    version_id TEXT NOT NULL REFERENCES versions(version_id),
+    generation INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    segment TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    previous_version_id TEXT,
+    promoted_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registry_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO registry_state (key, value) VALUES ('generation', 0);
+"""
+
+_VERSION_COLUMNS = """
+    v.version_id, v.segment, v.artifact_hash, v.status, v.created_at, v.promoted_at,
+    v.metrics, v.metadata, a.relpath, a.size_bytes
+"""
+
+
+def _json_default(value: Any) -> Any:
+    """NumPyの値をJSONに変換"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def bundle_files(model_path: Union[str, Path]) -> List[Tuple[str, Path]]:
+    """
+    モデルファイルと付随成果物を列挙
+
+    Args:
+        model_path: モデルファイルのパス
+
+    Returns:
+        (成果物内の相対パス, 元のパス) のリスト（相対パス順）
+    """
+    model_path = Path(model_path)
+    if not model_path.is_file():
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    # 成果物内では名前を model.<拡張子> にそろえ、同じ内容なら同じハッシュになるようにする
+    entries = [(model_path, Path("model" + model_path.suffix))]
+    for suffix in SIDECAR_SUFFIXES:
+        sidecar = model_path.with_suffix(suffix)
+        if sidecar.exists():
+            entries.append((sidecar, Path("model" + suffix)))
+
+    files = []
+    for source, target in entries:
+        if source.is_dir():
+            for path in sorted(p for p in source.rglob('*') if p.is_file()):
+                files.append(((target / path.relative_to(source)).as_posix(), path))
+        else:
+            files.append((target.as_posix(), source))
+    return sorted(files)
+
+
+def remove_bundle(model_path: Union[str, Path]):
+    """
+    モデルファイルと付随成果物を削除（存在しないものは無視）
+
+    Args:
+        model_path: モデルファイルのパス
+    """
+    model_path = Path(model_path)
+    for path in [model_path] + [model_path.with_suffix(suffix) for suffix in SIDECAR_SUFFIXES]:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+
+
+def content_hash(files: List[Tuple[str, Path]]) -> str:
+    """相対パスと内容から成果物のSHA-256を計算"""
+    digest = hashlib.sha256()
+    for relpath, path in files:
+        digest.update(relpath.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    SQLiteをインデックスとするモデルレジストリ
+
+    成果物はコンテンツハッシュのディレクトリに一度だけ保存し（同じ内容は重複排除）、
+    一時ディレクトリからのリネームで公開する。バージョン情報・セグメントごとの本番モデル・
+    昇格履歴はSQLiteのトランザクションで更新するため、複数プロセスから同時に書き込んでも
+    壊れない。昇格のたびに世代番号（変更カウンター）を増やし、APIワーカーはこの整数を
+    比較するだけで昇格に気付ける。
+    """
+
+    def __init__(self, root_dir: Union[str, Path] = "models/registry", timeout: float = 30.0):
+        """
+        初期化
+
+        Args:
+            root_dir: レジストリのディレクトリ（registry.db と artifacts/ を置く）
+            timeout: 書き込みロックの待ち時間（秒）
+        """
+        self.root_dir = Path(root_dir)
+        self.artifacts_dir = self.root_dir / "artifacts"
+        self.db_path = self.root_dir / "registry.db"
+        self.timeout = timeout
+        # sqlite3の接続はスレッド間で共有しない
+        self._local = threading.local()
+        self._schema_ready = False
+
+    @property
+    def exists(self) -> bool:
+        """レジストリが作成済みか（ディレクトリとDBは最初の接続で作成する）"""
+        return self.db_path.exists()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # 読み取りは書き込みをブロックしない
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            if not self._schema_ready:
+                # スキーマ作成は冪等（executescript は自身でコミットする）
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクション（開始時に書き込みロックを取得）"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------------------
+    # 登録
+    # ------------------------------------------------------------------
+
+    def _store_artifact(self, model_path: Union[str, Path]) -> Tuple[str, str, int, bool]:
+        """
+        成果物をハッシュのディレクトリに保存
+
+        Returns:
+            (ハッシュ, レジストリ内の相対パス, サイズ, 新規に保存したか)
+        """
+        files = bundle_files(model_path)
+        digest = content_hash(files)
+        size = sum(path.stat().st_size for _, path in files)
+        relpath = f"artifacts/{digest}/model{Path(model_path).suffix}"
+        final_dir = self.artifacts_dir / digest
+        if final_dir.exists():
+            return digest, relpath, size, False
+
+        # 一時ディレクトリに書き込んでからリネームで公開する（読み手は途中の状態を見ない）
+        staging = self.artifacts_dir / f".staging-{uuid.uuid4().hex}"
+        try:
+            for bundle_relpath, source in files:
+                target = staging / bundle_relpath
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(source, target)
+            try:
+                os.replace(staging, final_dir)
+            except OSError:
+                # 同じ内容を別プロセスが先に公開した
+                if not final_dir.exists():
+                    raise
+                return digest, relpath, size, False
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+        return digest, relpath, size, True
+
+    def register(self,
+                 model_path: Union[str, Path],
+                 metrics: Optional[Dict[str, Any]] = None,
+                 metadata: Optional[Dict[str, Any]] = None,
+                 segment: str = DEFAULT_SEGMENT,
+                 version_id: Optional[str] = None,
+                 status: str = "staged",
+                 created_at: Optional[str] = None) -> str:
+        """
+        モデルを登録
+
+        付随成果物（<モデル名>.forest / <モデル名>.drift.json）があれば一緒に保存する。
+
+        Args:
+            model_path: モデルファイルのパス
+            metrics: 評価メトリクス
+            metadata: メタデータ
+            segment: セグメント（カテゴリなど）
+            version_id: バージョンID（省略時は生成）
+            status: 登録時の状態
+            created_at: 登録日時（ISO形式、旧形式からの取り込み用。省略時は現在時刻）
+
+        Returns:
+            バージョンID
+        """
+        digest, relpath, size, created = self._store_artifact(model_path)
+        version_id = version_id or self.generate_version_id()
+        now = created_at or datetime.now().isoformat()
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO artifacts (hash, relpath, size_bytes, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (digest, relpath, size, now)
+            )
+            conn.execute(
+                "INSERT INTO versions "
+                "(version_id, segment, artifact_hash, status, created_at, metrics, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (version_id, segment, digest, status, now,
+                 json.dumps(metrics or {}, default=_json_default),
+                 json.dumps(metadata or {}, default=_json_default))
+            )
+
+        logger.info(f"Model registered: {version_id} (segment={segment}, "
+                    f"artifact={digest[:12]}{'' if created else ', deduplicated'})")
+        return version_id
+
+    @staticmethod
+    def generate_version_id() -> str:
+        """バージョンID生成"""
+        return f"v_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    # ------------------------------------------------------------------
+    # 昇格
+    # ------------------------------------------------------------------
+
+    def promote(self, version_id: str, segment: Optional[str] = None,
+                promoted_at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        モデルを本番に昇格（1トランザクションで切り替え、世代番号を増やす）
+
+        Args:
+            version_id: バージョンID
+            segment: 昇格先のセグメント（省略時は登録時のセグメント）
+            promoted_at: 昇格日時（ISO形式、旧形式からの取り込み用。省略時は現在時刻）
+
+        Returns:
+            昇格後のバージョン情報（generation を含む）
+
+        Raises:
+            KeyError: バージョンが存在しない場合
+        """
+        now = promoted_at or datetime.now().isoformat()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT segment FROM versions WHERE version_id = ?", (version_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Version {version_id} not found")
+            segment = segment or row['segment']
+
+            previous = conn.execute(
+                "SELECT version_id FROM current_models WHERE segment = ?", (segment,)
+            ).fetchone()
+            previous_id = previous['version_id'] if previous else None
+            if previous_id and previous_id != version_id:
+                conn.execute("UPDATE versions SET status = 'archived' WHERE version_id = ?",
+                             (previous_id,))
+
+            conn.execute("UPDATE registry_state SET value = value + 1 WHERE key = 'generation'")
+            generation = conn.execute(
+                "SELECT value FROM registry_state WHERE key = 'generation'"
+            ).fetchone()['value']
+
+            conn.execute(
+                "UPDATE versions SET status = 'production', promoted_at = ? WHERE version_id = ?",
+                (now, version_id)
+            )
+            conn.execute(
+                "INSERT INTO current_models (segment, version_id, generation, updated_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(segment) DO UPDATE SET version_id = excluded.version_id, "
+                "generation = excluded.generation, updated_at = excluded.updated_at",
+                (segment, version_id, generation, now)
+            )
+            conn.execute(
+                "INSERT INTO promotions (segment, version_id, previous_version_id, promoted_at) "
+                "VALUES (?, ?, ?, ?)",
+                (segment, version_id, previous_id, now)
+            )
+
+        logger.info(f"Model {version_id} promoted to production "
+                    f"(segment={segment}, generation={generation})")
+        info = self.get(version_id)
+        info['generation'] = generation
+        return info
+
+    def rollback(self, segment: str = DEFAULT_SEGMENT, steps: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        昇格履歴をさかのぼって以前の本番モデルに戻す
+
+        Args:
+            segment: セグメント
+            steps: さかのぼる昇格の数
+
+        Returns:
+            昇格後のバージョン情報（戻り先が無い場合はNone）
+        """
+        rows = self._connection().execute(
+            "SELECT version_id FROM promotions WHERE segment = ? ORDER BY id DESC", (segment,)
+        ).fetchall()
+        history = list(dict.fromkeys(row['version_id'] for row in rows))
+        if len(history) <= steps:
+            logger.error("Not enough versions to rollback")
+            return None
+        return self.promote(history[steps], segment)
+
+    # ------------------------------------------------------------------
+    # 参照
+    # ------------------------------------------------------------------
+
+    def generation(self) -> int:
+        """変更カウンター（昇格のたびに増える）"""
+        return self._connection().execute(
+            "SELECT value FROM registry_state WHERE key = 'generation'"
+        ).fetchone()['value']
+
+    def _to_info(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'version_id': row['version_id'],
+            'segment': row['segment'],
+            'status': row['status'],
+            'timestamp': row['created_at'],
+            'promoted_at': row['promoted_at'],
+            'artifact_hash': row['artifact_hash'],
+            'size_bytes': row['size_bytes'],
+            'model_file': str(self.root_dir / row['relpath']),
+            'metrics': json.loads(row['metrics']),
+            'metadata': json.loads(row['metadata'])
+        }
+
+    def get(self, version_id: str) -> Optional[Dict[str, Any]]:
+        """バージョン情報を取得"""
+        row = self._connection().execute(
+            f"SELECT {_VERSION_COLUMNS} FROM versions v "
+            "JOIN artifacts a ON a.hash = v.artifact_hash WHERE v.version_id = ?", (version_id,)
+        ).fetchone()
+        return self._to_info(row) if row else None
+
+    def current(self, segment: str = DEFAULT_SEGMENT) -> Optional[Dict[str, Any]]:
+        """
+        セグメントの本番モデル
+
+        Returns:
+            バージョン情報（generation を含む、未昇格ならNone）
+        """
+        row = self._connection().execute(
+            f"SELECT {_VERSION_COLUMNS}, c.generation FROM current_models c "
+            "JOIN versions v ON v.version_id = c.version_id "
+            "JOIN artifacts a ON a.hash = v.artifact_hash WHERE c.segment = ?", (segment,)
+        ).fetchone()
+        if row is None:
+            return None
+        info = self._to_info(row)
+        info['generation'] = row['generation']
+        return info
+
+    def current_version(self, segment: str = DEFAULT_SEGMENT) -> Optional[str]:
+        """セグメントの本番モデルのバージョンID"""
+        row = self._connection().execute(
+            "SELECT version_id FROM current_models WHERE segment = ?", (segment,)
+        ).fetchone()
+        return row['version_id'] if row else None
+
+    def segments(self) -> Dict[str, str]:
+        """セグメント -> 本番バージョンID"""
+        rows = self._connection().execute(
+            "SELECT segment, version_id FROM current_models ORDER BY segment"
+        )
+        return {row['segment']: row['version_id'] for row in rows}
+
+    def list_versions(self,
+                      segment: Optional[str] = None,
+                      status: Optional[str] = None,
+                      limit: int = 50,
+                      offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        バージョン一覧を新しい順に取得
+
+        Args:
+            segment: セグメントで絞り込む
+            status: 状態で絞り込む（staged / production / archived）
+            limit: 最大件数
+            offset: 読み飛ばす件数
+        """
+        conditions, params = [], []
+        if segment is not None:
+            conditions.append("v.segment = ?")
+            params.append(segment)
+        if status is not None:
+            conditions.append("v.status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT {_VERSION_COLUMNS} FROM versions v "
+            f"JOIN artifacts a ON a.hash = v.artifact_hash "
+            f"{where} ORDER BY v.created_at DESC, v.rowid DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [self._to_info(row) for row in rows]
+
+    def count(self, segment: Optional[str] = None) -> int:
+        """登録済みのバージョン数"""
+        if segment is None:
+            return self._connection().execute("SELECT COUNT(*) FROM versions").fetchone()[0]
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM versions WHERE segment = ?", (segment,)
+        ).fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """レジストリの統計"""
+        conn = self._connection()
+        artifacts = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM artifacts"
+        ).fetchone()
+        return {
+            'versions': self.count(),
+            'artifacts': artifacts[0],
+            'artifact_bytes': artifacts[1],
+            'generation': self.generation(),
+            'segments': self.segments()
+        }
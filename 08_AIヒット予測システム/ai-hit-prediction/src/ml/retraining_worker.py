@@ -0,0 +1,646 @@
+#!/usr/bin/env python
+"""
+Retraining Worker Module
+推論を止めないバックグラウンド再学習（CPU制限付きプロセスプール・ジョブキュー・ホールドアウト評価）
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.models.basic_model import HitPredictionModel
+from src.ml.model_registry import remove_bundle
+
+# BLASスレッド数の制限（オプショナル）
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    THREADPOOLCTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# ワーカープロセス内で使うスレッド数（プール初期化時に設定）
+_worker_threads = 1
+_thread_limiter = None
+
+
+# ---------------------------------------------------------------------------
+# ワーカープロセス側の処理（spawnで起動するためモジュールレベルの関数にする）
+# ---------------------------------------------------------------------------
+
+def limit_worker_resources(nice: int, cpu_ids: Optional[Sequence[int]], threads: int):
+    """
+    ワーカープロセスのCPU使用を制限（プールの initializer）
+
+    Args:
+        nice: 優先度を下げる量（推論プロセスより後回しにする）
+        cpu_ids: 使用を許可するCPU（Linuxのみ）
+        threads: 学習・BLASに使うスレッド数
+    """
+    global _worker_threads, _thread_limiter
+
+    _worker_threads = max(1, threads)
+    if nice and hasattr(os, 'nice'):
+        try:
+            os.nice(nice)
+        except OSError as e:
+            logger.debug(f"Failed to lower worker priority: {e}")
+    if cpu_ids and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, set(cpu_ids))
+        except OSError as e:
+            logger.debug(f"Failed to set worker CPU affinity: {e}")
+    if THREADPOOLCTL_AVAILABLE:
+        # 参照を保持している間だけ制限が有効
+        _thread_limiter = threadpool_limits(limits=_worker_threads)
+
+
+def worker_threads() -> int:
+    """ワーカープロセスで使うスレッド数（推定器の n_jobs に渡す）"""
+    return _worker_threads
+
+
+def train_candidate(X: pd.DataFrame, y: np.ndarray, output_path: str,
+                    estimator_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    候補モデルを学習して保存（ワーカープロセスで実行）
+
+    推論時と同じ形式（コンパイル済みフォレスト・ドリフトベースライン）で保存するため、
+    昇格時はAPIが読み込むだけで切り替えられる。
+
+    Args:
+        X: 特徴量
+        y: ラベル
+        output_path: 保存先のモデルファイルパス
+        estimator_params: RandomForestClassifier に渡す追加パラメータ
+
+    Returns:
+        path / model_version / metrics / training_time
+    """
+    start = time.perf_counter()
+    output_path = Path(output_path)
+
+    model = HitPredictionModel(model_dir=str(output_path.parent))
+    model.model.set_params(**{**(estimator_params or {}), 'n_jobs': worker_threads()})
+    metrics = model.train(X, y, validate=False)
+    # ドリフトベースラインは save_model がモデルと一緒に書き出す
+    path = model.save_model(output_path.name)
+
+    return {
+        'path': path,
+        'model_version': model.model_version,
+        'metrics': _to_builtin(metrics),
+        'training_time': time.perf_counter() - start
+    }
+
+
+def evaluate_artifact(model_path: str, X: pd.DataFrame, y: np.ndarray) -> Dict[str, Any]:
+    """
+    保存済みモデルをホールドアウトデータで評価（ワーカープロセスで実行）
+
+    Args:
+        model_path: モデルファイルパス
+        X: ホールドアウトの特徴量
+        y: ホールドアウトのラベル
+
+    Returns:
+        accuracy / f1 / auc / brier / log_loss などの評価指標
+    """
+    from sklearn.metrics import accuracy_score, brier_score_loss, f1_score, log_loss, roc_auc_score
+
+    model = HitPredictionModel(model_dir=str(Path(model_path).parent))
+    model.load_serving_model(str(model_path))
+    proba = np.clip(model.predict(X), 1e-6, 1 - 1e-6)
+    y = np.asarray(y)
+    predicted = (proba >= 0.5).astype(int)
+
+    metrics = {
+        'model_version': model.model_version,
+        'n_samples': int(len(y)),
+        'accuracy': float(accuracy_score(y, predicted)),
+        'f1': float(f1_score(y, predicted, zero_division=0)),
+        'brier': float(brier_score_loss(y, proba)),
+        'log_loss': float(log_loss(y, proba, labels=[0, 1])),
+        # 片方のクラスしか無い場合AUCは定義できない
+        'auc': float(roc_auc_score(y, proba)) if len(np.unique(y)) == 2 else None
+    }
+    return metrics
+
+
+def _to_builtin(value: Any) -> Any:
+    """NumPyの値をJSONに変換できる型に変換"""
+    if isinstance(value, dict):
+        return {key: _to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def create_worker_pool(max_workers: int = 2,
+                       cpu_limit: Optional[int] = None,
+                       nice: int = 10) -> ProcessPoolExecutor:
+    """
+    CPU制限付きのプロセスプールを作成
+
+    学習はGILを持つ推論プロセスから切り離し、優先度を下げたワーカーで実行する。
+    Linuxでは割り当てCPUの末尾 cpu_limit 個に固定し、先頭側を推論用に残す。
+
+    Args:
+        max_workers: ワーカープロセス数
+        cpu_limit: プール全体で使うCPU数（省略時は利用可能なCPUの半分）
+        nice: ワーカーの優先度を下げる量
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+
+    cpu_limit = max(1, min(cpu_limit or len(available) // 2, len(available)))
+    max_workers = max(1, max_workers)
+    threads = max(1, cpu_limit // max_workers)
+    cpu_ids = available[-cpu_limit:] if cpu_limit < len(available) else None
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        # fork はスレッドを持つ推論プロセスから安全に使えないため spawn で起動する
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=limit_worker_resources,
+        initargs=(nice, cpu_ids, threads)
+    )
+
+
+def cancel_pending_futures(executor: Executor) -> int:
+    """
+    プールの開始前のタスクを取り消す（実行中のタスクはそのまま）
+
+    Python 3.8 の shutdown には cancel_futures が無いため、待ち行列の Future を直接取り消す。
+
+    Args:
+        executor: ProcessPoolExecutor / ThreadPoolExecutor
+
+    Returns:
+        取り消したタスク数
+    """
+    futures = []
+    # ProcessPoolExecutor: 投入済みで結果を待っている作業（実行中のものは取り消せない）
+    pending = getattr(executor, '_pending_work_items', None)
+    if pending is not None:
+        futures.extend(item.future for item in list(pending.values()))
+    # ThreadPoolExecutor: スレッドに渡る前の待ち行列
+    work_queue = getattr(executor, '_work_queue', None)
+    if work_queue is not None and hasattr(work_queue, 'get_nowait'):
+        while True:
+            try:
+                item = work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                futures.append(item.future)
+    return sum(1 for future in futures if future.cancel())
+
+
+def shutdown_worker_pool(executor: Executor):
+    """
+    開始前のタスクを取り消してプールを終了（実行中のタスクは終了を待つ）
+
+    Args:
+        executor: ProcessPoolExecutor / ThreadPoolExecutor
+    """
+    if sys.version_info >= (3, 9):
+        executor.shutdown(wait=True, cancel_futures=True)
+        return
+    cancel_pending_futures(executor)
+    executor.shutdown(wait=True)
+
+
+# ---------------------------------------------------------------------------
+# ジョブ管理（推論プロセス側）
+# ---------------------------------------------------------------------------
+
+class JobStatus(str, Enum):
+    """再学習ジョブの状態"""
+    QUEUED = "queued"
+    TRAINING = "training"
+    EVALUATING = "evaluating"
+    PROMOTING = "promoting"
+    SHADOWING = "shadowing"  # 候補をシャドー評価中（判定後に complete_job で終了する）
+    PROMOTED = "promoted"
+    REJECTED = "rejected"
+    COMPLETED = "completed"  # 昇格を要求しなかったジョブ
+    FAILED = "failed"
+
+
+# 終了状態
+TERMINAL_STATUSES = {JobStatus.PROMOTED, JobStatus.REJECTED, JobStatus.COMPLETED, JobStatus.FAILED}
+
+
+@dataclass
+class RetrainJob:
+    """再学習ジョブ"""
+    job_id: str
+    status: JobStatus
+    created_at: str
+    reason: str
+    n_samples: int
+    holdout_fraction: float
+    promote: bool
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    candidate_path: Optional[str] = None
+    candidate_version: Optional[str] = None
+    training_time: Optional[float] = None
+    candidate_metrics: Optional[Dict[str, Any]] = None
+    production_metrics: Optional[Dict[str, Any]] = None
+    decision: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def is_finished(self) -> bool:
+        """終了状態か"""
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """APIレスポンス用の辞書"""
+        data = asdict(self)
+        data['status'] = self.status.value
+        return data
+
+
+class RetrainingWorker:
+    """
+    再学習ジョブのキューとワーカー
+
+    学習と評価はプロセスプールで実行し、イベントループ側はジョブの状態管理と
+    昇格コールバックの呼び出しだけを行う。推論リクエストの処理は学習中も止まらない。
+    """
+
+    def __init__(self,
+                 model_dir: str = "models/candidates",
+                 max_workers: int = 2,
+                 cpu_limit: Optional[int] = None,
+                 nice: int = 10,
+                 max_concurrent_jobs: int = 1,
+                 queue_size: int = 16,
+                 metric: str = "auc",
+                 min_improvement: float = 0.0,
+                 history_size: int = 100,
+                 production_path: Optional[Callable[[], Optional[Any]]] = None,
+                 on_promote: Optional[Callable[[str, RetrainJob], Awaitable[Any]]] = None):
+        """
+        初期化
+
+        Args:
+            model_dir: 候補モデルの保存先
+            max_workers: プロセスプールのワーカー数（候補と本番の評価を並列に行うため2以上を推奨）
+            cpu_limit: プール全体で使うCPU数
+            nice: ワーカーの優先度を下げる量
+            max_concurrent_jobs: 同時に実行するジョブ数
+            queue_size: 待機できるジョブ数の上限
+            metric: 昇格判定に使う指標（値が大きいほど良いもの）
+            min_improvement: 昇格に必要な本番モデルからの改善幅
+            history_size: 保持する終了済みジョブ数
+            production_path: 現在の本番モデルファイルのパスを返す関数
+            on_promote: 昇格時に呼ぶコルーチン関数 (candidate_path, job)。
+                JobStatus.SHADOWING を返すとジョブは判定待ちになり、complete_job で終了する
+        """
+        self.model_dir = Path(model_dir)
+        self.max_workers = max_workers
+        self.cpu_limit = cpu_limit
+        self.nice = nice
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.queue_size = queue_size
+        self.metric = metric
+        self.min_improvement = min_improvement
+        self.history_size = history_size
+        self.production_path = production_path
+        self.on_promote = on_promote
+
+        self.jobs: 'OrderedDict[str, RetrainJob]' = OrderedDict()
+        self._payloads: Dict[str, Tuple[pd.DataFrame, np.ndarray, Dict[str, Any]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Task] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def is_running(self) -> bool:
+        """ジョブを受け付けているか"""
+        return bool(self._consumers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = create_worker_pool(self.max_workers, self.cpu_limit, self.nice)
+        return self._executor
+
+    async def start(self):
+        """ジョブの処理を開始（ワーカープロセスは最初のジョブで起動する）"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+        self._consumers = [
+            loop.create_task(self._consume()) for _ in range(self.max_concurrent_jobs)
+        ]
+        logger.info(
+            f"Retraining worker started (workers={self.max_workers}, cpu_limit={self.cpu_limit})"
+        )
+
+    async def stop(self):
+        """ジョブの処理を停止してプロセスプールを終了"""
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+
+        # 実行中の学習が候補を書き終えてから片付けるため、先にプールを終了する
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, shutdown_worker_pool, executor)
+
+        for job_id in list(self._payloads):
+            job = self.jobs[job_id]
+            if not job.is_finished:
+                self._finish(job, JobStatus.FAILED, error="worker stopped")
+
+    def submit(self,
+               X: pd.DataFrame,
+               y: Sequence[int],
+               holdout_fraction: float = 0.2,
+               promote: bool = True,
+               reason: str = "manual",
+               estimator_params: Optional[Dict[str, Any]] = None) -> RetrainJob:
+        """
+        再学習ジョブを投入（イベントループ内から呼ぶ）
+
+        Args:
+            X: 特徴量
+            y: ラベル
+            holdout_fraction: 評価に使うホールドアウトの割合
+            promote: 評価結果が良ければ本番に昇格するか
+            reason: 再学習の理由（manual / drift / scheduled など）
+            estimator_params: 推定器に渡す追加パラメータ
+
+        Returns:
+            投入したジョブ
+
+        Raises:
+            RuntimeError: ワーカーが起動していない場合
+            asyncio.QueueFull: 待機中のジョブが上限に達している場合
+        """
+        if not self.is_running:
+            raise RuntimeError("Retraining worker is not running")
+        if not 0 < holdout_fraction < 1:
+            raise ValueError("holdout_fraction must be in (0, 1)")
+
+        y = np.asarray(y)
+        if len(X) != len(y):
+            raise ValueError(f"X and y have different lengths: {len(X)} != {len(y)}")
+
+        job = RetrainJob(
+            job_id=uuid.uuid4().hex[:12],
+            status=JobStatus.QUEUED,
+            created_at=datetime.now().isoformat(),
+            reason=reason,
+            n_samples=len(y),
+            holdout_fraction=holdout_fraction,
+            promote=promote
+        )
+        self._queue.put_nowait(job)
+        self.jobs[job.job_id] = job
+        self._payloads[job.job_id] = (X, y, estimator_params or {})
+        self._trim_history()
+        logger.info(
+            f"Retraining job {job.job_id} queued ({job.n_samples} samples, reason={reason})"
+        )
+        return job
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None,
+                   poll_interval: float = 0.05) -> RetrainJob:
+        """ジョブの終了を待機"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.jobs[job_id]
+        while not job.is_finished:
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"Retraining job {job_id} did not finish in {timeout}s")
+            await asyncio.sleep(poll_interval)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態を取得"""
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        ジョブ一覧を新しい順に取得
+
+        Args:
+            status: 状態で絞り込む
+            limit: 最大件数
+        """
+        jobs = [job for job in reversed(self.jobs.values())
+                if status is None or job.status.value == status]
+        return [job.to_dict() for job in jobs[:limit]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ワーカーの統計"""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status.value] = counts.get(job.status.value, 0) + 1
+        return {
+            'running': self.is_running,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_workers': self.max_workers,
+            'cpu_limit': self.cpu_limit,
+            'metric': self.metric,
+            'min_improvement': self.min_improvement,
+            'jobs': counts
+        }
+
+    def _trim_history(self):
+        """古い終了済みジョブを破棄"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.history_size)]:
+            del self.jobs[job_id]
+
+    def complete_job(self, job_id: str, status: JobStatus, decision: Optional[str] = None,
+                     error: Optional[str] = None) -> bool:
+        """
+        シャドー評価中のジョブを判定結果で終了
+
+        Args:
+            job_id: ジョブID
+            status: 終了状態
+            decision: シャドー評価の判定理由（ホールドアウト評価の判定理由の後に追加）
+            error: エラー内容
+
+        Returns:
+            シャドー評価中のジョブを終了した場合True
+        """
+        if status not in TERMINAL_STATUSES:
+            raise ValueError(f"{status.value} is not a terminal status")
+        job = self.jobs.get(job_id)
+        if job is None or job.status != JobStatus.SHADOWING:
+            return False
+        decision = "; ".join(part for part in (job.decision, decision) if part) or None
+        self._finish(job, status, decision=decision, error=error)
+        logger.info(f"Retraining job {job_id} finished after shadow evaluation: {status.value}")
+        return True
+
+    def _finish(self, job: RetrainJob, status: JobStatus, decision: Optional[str] = None,
+                error: Optional[str] = None):
+        job.status = status
+        job.decision = decision
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+        # 学習データはジョブの終了後に解放する
+        self._payloads.pop(job.job_id, None)
+        # 採用されなかった候補（モデル・コンパイル済みフォレスト・ドリフトベースライン）は残さない
+        if status in (JobStatus.REJECTED, JobStatus.FAILED):
+            self._remove_candidate(job)
+
+    def _candidate_output_path(self, job: RetrainJob) -> Path:
+        """ジョブの候補モデルの保存先"""
+        return self.model_dir / f"candidate_{job.job_id}.pkl"
+
+    def _remove_candidate(self, job: RetrainJob):
+        """候補モデルの成果物を削除"""
+        try:
+            remove_bundle(job.candidate_path or self._candidate_output_path(job))
+        except OSError as e:
+            logger.warning(f"Failed to remove candidate artifacts of job {job.job_id}: {e}")
+
+    async def _consume(self):
+        """キューからジョブを取り出して実行"""
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except BrokenProcessPool as e:
+                # ワーカーが異常終了（メモリ不足など）した場合はプールを作り直す
+                logger.error(f"Retraining worker pool broken during job {job.job_id}: {e}")
+                self._executor = None
+                self._finish(job, JobStatus.FAILED, error=f"worker process died: {e}")
+            except Exception as e:
+                logger.error(f"Retraining job {job.job_id} failed: {e}")
+                self._finish(job, JobStatus.FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: RetrainJob):
+        """1ジョブを実行（学習 → 候補と本番の並列評価 → 昇格判定）"""
+        from sklearn.model_selection import train_test_split
+
+        payload = self._payloads.get(job.job_id)
+        if payload is None:
+            return
+        X, y, estimator_params = payload
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+
+        job.status = JobStatus.TRAINING
+        job.started_at = datetime.now().isoformat()
+        stratify = y if np.min(np.bincount(y.astype(int))) >= 2 else None
+        X_train, X_holdout, y_train, y_holdout = train_test_split(
+            X, y, test_size=job.holdout_fraction, random_state=42, stratify=stratify
+        )
+
+        output_path = self._candidate_output_path(job)
+        candidate = await loop.run_in_executor(
+            executor, train_candidate, X_train, y_train, str(output_path), estimator_params
+        )
+        job.candidate_path = candidate['path']
+        job.candidate_version = candidate['model_version']
+        job.training_time = candidate['training_time']
+
+        # 候補と現在の本番モデルを同じホールドアウトで並列に評価
+        job.status = JobStatus.EVALUATING
+        production_path = self.production_path() if self.production_path is not None else None
+        evaluations = [loop.run_in_executor(executor, evaluate_artifact, job.candidate_path,
+                                            X_holdout, y_holdout)]
+        if production_path is not None and Path(production_path).exists():
+            evaluations.append(loop.run_in_executor(executor, evaluate_artifact,
+                                                    str(production_path), X_holdout, y_holdout))
+        results = await asyncio.gather(*evaluations, return_exceptions=True)
+        if isinstance(results[0], BaseException):
+            raise results[0]
+        job.candidate_metrics = results[0]
+        if len(results) > 1:
+            if isinstance(results[1], BaseException):
+                # 特徴量が変わった場合など、本番モデルで評価できない場合は昇格しない
+                job.production_metrics = {'error': str(results[1])}
+            else:
+                job.production_metrics = results[1]
+
+        should_promote, decision = self._decide(job.candidate_metrics, job.production_metrics,
+                                                has_production=production_path is not None)
+        if not job.promote:
+            self._finish(job, JobStatus.COMPLETED, decision=decision)
+            return
+        if not should_promote:
+            logger.info(f"Retraining job {job.job_id} rejected: {decision}")
+            self._finish(job, JobStatus.REJECTED, decision=decision)
+            return
+
+        job.status = JobStatus.PROMOTING
+        result = None
+        if self.on_promote is not None:
+            result = await self.on_promote(job.candidate_path, job)
+        if result == JobStatus.SHADOWING:
+            job.status = JobStatus.SHADOWING
+            job.decision = decision
+            self._payloads.pop(job.job_id, None)
+            logger.info(f"Retraining job {job.job_id} candidate {job.candidate_version} "
+                        "is in shadow evaluation")
+            return
+        logger.info(f"Retraining job {job.job_id} promoted {job.candidate_version}: {decision}")
+        self._finish(job, JobStatus.PROMOTED, decision=decision)
+
+    def _decide(self, candidate: Dict[str, Any], production: Optional[Dict[str, Any]],
+                has_production: bool) -> Tuple[bool, str]:
+        """
+        昇格判定
+
+        Returns:
+            (昇格するか, 判定理由)
+        """
+        if production is None:
+            if has_production:
+                return False, "production model artifact not found"
+            return True, "no production model"
+        if 'error' in production:
+            return False, f"production model could not be evaluated: {production['error']}"
+
+        metric = self.metric
+        if candidate.get(metric) is None or production.get(metric) is None:
+            metric = 'accuracy'
+        improvement = candidate[metric] - production[metric]
+        summary = (f"{metric} {candidate[metric]:.4f} vs {production[metric]:.4f} "
+                   f"(improvement {improvement:+.4f}, required {self.min_improvement:+.4f})")
+        return improvement >= self.min_improvement, summary
@@ -0,0 +1,531 @@
+#!/usr/bin/env python
+"""
+Streaming Drift Detection Module
+特徴量ごとのマージ可能なヒストグラムによるストリーミングのデータドリフト検出（PSI / KS / JS）
+"""
+
+import json
+import logging
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 比率が0のビンで対数が発散しないための下限
+_EPSILON = 1e-6
+
+
+class FeatureHistogram:
+    """固定ビン境界のヒストグラム（同じ境界同士はマージ可能）"""
+
+    def __init__(self, edges: np.ndarray):
+        """
+        初期化
+
+        Args:
+            edges: 昇順のビン内部境界（両端の外側には下限・上限ビンを持つ）
+        """
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.null_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        """値をまとめて加算"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        nulls = np.isnan(values)
+        self.null_count += int(nulls.sum())
+        values = values[~nulls]
+        if len(values) == 0:
+            return
+
+        bins = np.searchsorted(self.edges, values, side='right')
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.sum_sq += float(np.dot(values, values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: 'FeatureHistogram'):
+        """同じ境界のヒストグラムを統合"""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bin edges")
+        self.counts += other.counts
+        self.null_count += other.null_count
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def proportions(self) -> np.ndarray:
+        """ビンごとの比率"""
+        if self.count == 0:
+            return np.zeros(len(self.counts))
+        return self.counts / self.count
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def std(self) -> Optional[float]:
+        if self.count < 2:
+            return None
+        variance = (self.sum_sq - self.sum * self.sum / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    @property
+    def null_rate(self) -> float:
+        total = self.count + self.null_count
+        return self.null_count / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """永続化用の辞書"""
+        return {
+            'edges': self.edges.tolist(),
+            'counts': self.counts.tolist(),
+            'null_count': self.null_count,
+            'count': self.count,
+            'sum': self.sum,
+            'sum_sq': self.sum_sq,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FeatureHistogram':
+        """to_dict の結果から復元"""
+        histogram = cls(np.asarray(data['edges']))
+        histogram.counts = np.asarray(data['counts'], dtype=np.int64)
+        histogram.null_count = data['null_count']
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.sum_sq = data['sum_sq']
+        histogram.min = data['min'] if data['min'] is not None else np.inf
+        histogram.max = data['max'] if data['max'] is not None else -np.inf
+        return histogram
+
+
+class HistogramSet:
+    """
+    全特徴量のヒストグラムを1つの配列で保持するアキュムレータ
+
+    ビン境界を +inf で揃えた2次元配列にしておくことで、1行の取り込みも
+    特徴量ごとのループ無しに数回の配列演算で済む。
+    """
+
+    # 一括比較で作る中間配列の要素数の上限（超える場合は特徴量ごとに searchsorted）
+    _BROADCAST_LIMIT = 1_000_000
+
+    def __init__(self, edges: Sequence[np.ndarray]):
+        """
+        初期化
+
+        Args:
+            edges: 特徴量ごとのビン内部境界
+        """
+        self.n_features = len(edges)
+        n_edges = max((len(e) for e in edges), default=0)
+        self.edges = np.full((self.n_features, n_edges), np.inf)
+        self.edge_counts = np.array([len(e) for e in edges], dtype=np.int64)
+        for i, feature_edges in enumerate(edges):
+            self.edges[i, :len(feature_edges)] = feature_edges
+
+        self.n_bins = n_edges + 1
+        self.counts = np.zeros((self.n_features, self.n_bins), dtype=np.int64)
+        self.null_count = np.zeros(self.n_features, dtype=np.int64)
+        self.count = np.zeros(self.n_features, dtype=np.int64)
+        self.sum = np.zeros(self.n_features)
+        self.sum_sq = np.zeros(self.n_features)
+        self.min = np.full(self.n_features, np.inf)
+        self.max = np.full(self.n_features, -np.inf)
+        self.rows = 0
+
+    def update(self, matrix: np.ndarray):
+        """
+        行列（行 × 特徴量）をまとめて加算
+
+        Args:
+            matrix: 特徴量の列順に並んだ2次元配列（欠損はNaN）
+        """
+        n_rows = len(matrix)
+        if n_rows == 0:
+            return
+
+        nulls = np.isnan(matrix)
+        if n_rows * self.edges.size <= self._BROADCAST_LIMIT:
+            # 各値以下の境界の数 = searchsorted(side='right') と同じビン番号
+            bins = (matrix[:, :, None] >= self.edges[None, :, :]).sum(axis=2)
+        else:
+            bins = np.empty(matrix.shape, dtype=np.int64)
+            for i in range(self.n_features):
+                feature_edges = self.edges[i, :self.edge_counts[i]]
+                bins[:, i] = np.searchsorted(feature_edges, matrix[:, i], side='right')
+
+        flat = (np.arange(self.n_features)[None, :] * self.n_bins + bins)[~nulls]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+        valid = np.where(nulls, 0.0, matrix)
+        self.null_count += nulls.sum(axis=0)
+        self.count += n_rows - nulls.sum(axis=0)
+        self.sum += valid.sum(axis=0)
+        self.sum_sq += (valid * valid).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            self.min = np.fmin(self.min, np.nanmin(np.where(nulls, np.inf, matrix), axis=0))
+            self.max = np.fmax(self.max, np.nanmax(np.where(nulls, -np.inf, matrix), axis=0))
+        self.rows += n_rows
+
+    def empty_like(self) -> 'HistogramSet':
+        """同じビン境界の空のアキュムレータを作成"""
+        return HistogramSet([self.edges[i, :self.edge_counts[i]] for i in range(self.n_features)])
+
+    def merge(self, other: 'HistogramSet'):
+        """同じ境界のアキュムレータを統合"""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histogram sets with different bin edges")
+        self.counts += other.counts
+        self.null_count += other.null_count
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.rows += other.rows
+
+    def proportions(self) -> np.ndarray:
+        """特徴量 × ビンの比率"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.nan_to_num(self.counts / self.count[:, None])
+
+    def null_rates(self) -> np.ndarray:
+        """特徴量ごとの欠損率"""
+        total = self.count + self.null_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.nan_to_num(self.null_count / total)
+
+    def histogram(self, i: int) -> FeatureHistogram:
+        """i番目の特徴量を FeatureHistogram として取り出す"""
+        histogram = FeatureHistogram(self.edges[i, :self.edge_counts[i]])
+        histogram.counts = self.counts[i, :self.edge_counts[i] + 1].copy()
+        histogram.null_count = int(self.null_count[i])
+        histogram.count = int(self.count[i])
+        histogram.sum = float(self.sum[i])
+        histogram.sum_sq = float(self.sum_sq[i])
+        histogram.min = float(self.min[i])
+        histogram.max = float(self.max[i])
+        return histogram
+
+    @classmethod
+    def from_histograms(cls, histograms: Sequence[FeatureHistogram]) -> 'HistogramSet':
+        """FeatureHistogram のリストから作成"""
+        histogram_set = cls([h.edges for h in histograms])
+        for i, h in enumerate(histograms):
+            histogram_set.counts[i, :len(h.counts)] = h.counts
+            histogram_set.null_count[i] = h.null_count
+            histogram_set.count[i] = h.count
+            histogram_set.sum[i] = h.sum
+            histogram_set.sum_sq[i] = h.sum_sq
+            histogram_set.min[i] = h.min
+            histogram_set.max[i] = h.max
+        histogram_set.rows = int(max((h.count + h.null_count for h in histograms), default=0))
+        return histogram_set
+
+
+def drift_scores(expected: np.ndarray, actual: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    ビン比率（特徴量 × ビン）から特徴量ごとのPSI / KS / JSを一括計算
+
+    Args:
+        expected: ベースラインの比率
+        actual: 比較対象の比率
+
+    Returns:
+        psi / ks / js の配列
+    """
+    p = np.clip(expected, _EPSILON, None)
+    q = np.clip(actual, _EPSILON, None)
+    psi = np.sum((q - p) * np.log(q / p), axis=-1)
+
+    ks = np.max(np.abs(np.cumsum(expected, axis=-1) - np.cumsum(actual, axis=-1)), axis=-1)
+
+    m = (expected + actual) / 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kl_p = np.where(expected > 0, expected * np.log2(expected / m), 0.0).sum(axis=-1)
+        kl_q = np.where(actual > 0, actual * np.log2(actual / m), 0.0).sum(axis=-1)
+    js = np.clip((kl_p + kl_q) / 2, 0.0, 1.0)
+
+    return {'psi': psi, 'ks': ks, 'js': js}
+
+
+def compare_histograms(baseline: FeatureHistogram, current: FeatureHistogram) -> Dict[str, float]:
+    """
+    2つのヒストグラムのドリフトスコアを計算
+
+    Args:
+        baseline: ベースラインのヒストグラム
+        current: 比較対象のヒストグラム（同じ境界）
+
+    Returns:
+        psi / ks / js / null_rate_change
+    """
+    scores = drift_scores(baseline.proportions(), current.proportions())
+    result = {metric: float(value) for metric, value in scores.items()}
+    result['null_rate_change'] = current.null_rate - baseline.null_rate
+    return result
+
+
+def baseline_path(model_path: Union[str, Path]) -> Path:
+    """モデル成果物と一緒に保存するドリフトベースラインのパス（<モデル名>.drift.json）"""
+    return Path(model_path).with_suffix('.drift.json')
+
+
+class StreamingDriftDetector:
+    """ベースラインと直近ウィンドウのヒストグラムを比較するストリーミングドリフト検出器"""
+
+    # ドリフト判定の既定閾値（PSI 0.2 は一般的な「大きな変化」の目安）
+    DEFAULT_THRESHOLDS = {'psi': 0.2, 'ks': 0.2, 'js': 0.1}
+
+    def __init__(self,
+                 n_bins: int = 20,
+                 window_size: int = 1000,
+                 history_size: int = 100,
+                 thresholds: Optional[Dict[str, float]] = None):
+        """
+        初期化
+
+        Args:
+            n_bins: ベースラインの分位点から作るビン数
+            window_size: 1ウィンドウの行数（満たした時点でドリフトを判定して次のウィンドウへ）
+            history_size: 保持するウィンドウ判定結果の件数
+            thresholds: psi / ks / js の閾値
+        """
+        self.n_bins = n_bins
+        self.window_size = window_size
+        self.thresholds = dict(self.DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.features: List[Any] = []
+        self.baseline: Optional[HistogramSet] = None
+        self.window: Optional[HistogramSet] = None
+        self.total_rows = 0
+        self.history = deque(maxlen=history_size)
+        # ベースラインの無いモデル用に、最初の推論データから作るベースラインの行数と収集中の行
+        self.reference_size = 0
+        self._reference: List[pd.DataFrame] = []
+
+    @property
+    def is_fitted(self) -> bool:
+        """ベースラインが設定済みか"""
+        return self.baseline is not None
+
+    @property
+    def collecting_reference(self) -> bool:
+        """推論データからベースラインを作るために行を集めているか"""
+        return not self.is_fitted and self.reference_size > 0
+
+    def start_reference(self, n_rows: int):
+        """
+        学習データのベースラインが無いモデル用に、最初の n_rows 行の推論データをベースラインにする
+
+        以降のドリフトは学習データではなく、稼働開始直後の推論データからの変化として判定される。
+
+        Args:
+            n_rows: ベースラインにする行数
+        """
+        self.reference_size = n_rows
+        self._reference = []
+
+    @property
+    def window_rows(self) -> int:
+        """現在のウィンドウの行数"""
+        return self.window.rows if self.window is not None else 0
+
+    def _new_histograms(self) -> HistogramSet:
+        return self.baseline.empty_like()
+
+    def _to_matrix(self, data: Union[pd.DataFrame, Dict[str, Any], np.ndarray]) -> np.ndarray:
+        """入力を features の列順の2次元配列に変換"""
+        if isinstance(data, dict):
+            row = [data.get(feature, np.nan) for feature in self.features]
+            return np.array([row], dtype=np.float64)
+        if isinstance(data, pd.DataFrame):
+            return data.reindex(columns=self.features).to_numpy(dtype=np.float64, na_value=np.nan)
+        matrix = np.asarray(data, dtype=np.float64)
+        return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+    def fit_baseline(self, data: Union[pd.DataFrame, np.ndarray],
+                     feature_names: Optional[Sequence[str]] = None):
+        """
+        ベースラインのヒストグラムを作成
+
+        ビン境界はベースラインの分位点とし、各ビンにほぼ同数の行が入るようにする。
+
+        Args:
+            data: 学習データ（数値列のみ使用）
+            feature_names: ndarrayの場合の列名
+        """
+        if isinstance(data, pd.DataFrame):
+            numeric = data.select_dtypes(include=[np.number])
+            self.features = list(numeric.columns)
+            matrix = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            matrix = np.asarray(data, dtype=np.float64)
+            self.features = list(feature_names) if feature_names is not None else \
+                [str(i) for i in range(matrix.shape[1])]
+
+        quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        edges = []
+        for i in range(len(self.features)):
+            finite = matrix[:, i][~np.isnan(matrix[:, i])]
+            edges.append(np.unique(np.quantile(finite, quantiles)) if len(finite) else np.array([]))
+
+        self.baseline = HistogramSet(edges)
+        self.baseline.update(matrix)
+        self.reset_window()
+        logger.info(f"Drift baseline fitted on {len(matrix)} rows, {len(self.features)} features")
+
+    def reset_window(self):
+        """現在のウィンドウを空にする"""
+        self.window = self._new_histograms()
+
+    def update(self, data: Union[pd.DataFrame, Dict[str, Any], np.ndarray]
+               ) -> Optional[Dict[str, Any]]:
+        """
+        推論データを現在のウィンドウに加算
+
+        1行あたりのコストは特徴量数に比例し、過去の行は保持しない。
+
+        Args:
+            data: 特徴量（1行の辞書、DataFrame、または2次元配列）
+
+        Returns:
+            ウィンドウが満たされた場合はその判定結果、それ以外はNone
+        """
+        if not self.is_fitted:
+            if self.collecting_reference:
+                self._collect_reference(data)
+            return None
+
+        matrix = self._to_matrix(data)
+        self.window.update(matrix)
+        self.total_rows += len(matrix)
+
+        if self.window.rows >= self.window_size:
+            result = self.check()
+            self.history.append(result)
+            if result['drift_detected']:
+                logger.warning(f"Streaming drift detected in {result['drifted_features']}")
+            self.reset_window()
+            return result
+        return None
+
+    def _collect_reference(self, data: Union[pd.DataFrame, Dict[str, Any], np.ndarray]):
+        """ベースライン用の推論データを集め、reference_size 行に達したらベースラインを作成"""
+        frame = pd.DataFrame([data]) if isinstance(data, dict) else pd.DataFrame(data)
+        self._reference.append(frame)
+        if sum(len(frame) for frame in self._reference) >= self.reference_size:
+            reference = pd.concat(self._reference, ignore_index=True)
+            self._reference = []
+            self.fit_baseline(reference)
+            logger.warning(f"Drift baseline built from the first {len(reference)} served rows "
+                           "(model artifact has no training baseline)")
+
+    def check(self, histograms: Optional[HistogramSet] = None) -> Dict[str, Any]:
+        """
+        ベースラインとのドリフトを判定（特徴量数に比例するコスト）
+
+        Args:
+            histograms: 比較対象（省略時は現在のウィンドウ）
+
+        Returns:
+            特徴量ごとのスコアと判定結果
+        """
+        if not self.is_fitted:
+            return {"drift_detected": False, "message": "Baseline not fitted"}
+
+        histograms = histograms if histograms is not None else self.window
+        metrics = drift_scores(self.baseline.proportions(), histograms.proportions())
+        null_rate_change = histograms.null_rates() - self.baseline.null_rates()
+        observed = histograms.count > 0
+
+        drifted_mask = observed & np.any(
+            [metrics[metric] > threshold for metric, threshold in self.thresholds.items()], axis=0
+        )
+        scores = {
+            feature: {
+                'psi': float(metrics['psi'][i]),
+                'ks': float(metrics['ks'][i]),
+                'js': float(metrics['js'][i]),
+                'null_rate_change': float(null_rate_change[i])
+            }
+            for i, feature in enumerate(self.features) if observed[i]
+        }
+
+        return {
+            "drift_detected": bool(drifted_mask.any()),
+            "drifted_features": [
+                feature for i, feature in enumerate(self.features) if drifted_mask[i]
+            ],
+            "max_psi": float(metrics['psi'][observed].max()) if observed.any() else 0.0,
+            "scores": scores,
+            "rows": histograms.rows,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def check_data(self, data: Union[pd.DataFrame, np.ndarray]) -> Dict[str, Any]:
+        """ウィンドウとは別にデータセットをベースラインと比較"""
+        histograms = self._new_histograms()
+        histograms.update(self._to_matrix(data))
+        return self.check(histograms)
+
+    def baseline_histogram(self, feature: Any) -> FeatureHistogram:
+        """特徴量のベースラインヒストグラムを取得"""
+        return self.baseline.histogram(self.features.index(feature))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ベースラインを永続化用の辞書に変換"""
+        return {
+            'n_bins': self.n_bins,
+            'features': self.features,
+            # 列名が数値の場合もあるため、特徴量の順に並べたリストで保存する
+            'baseline': [self.baseline.histogram(i).to_dict() for i in range(len(self.features))]
+        }
+
+    def save_baseline(self, filepath: Union[str, Path]):
+        """ベースラインをJSONで保存"""
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    def load_baseline(self, filepath: Union[str, Path]):
+        """保存済みのベースラインを読み込み"""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.n_bins = data['n_bins']
+        self.features = data['features']
+        self.baseline = HistogramSet.from_histograms(
+            [FeatureHistogram.from_dict(histogram) for histogram in data['baseline']]
+        )
+        self.reset_window()
+
+    def get_status(self) -> Dict[str, Any]:
+        """監視状況を取得"""
+        return {
+            "fitted": self.is_fitted,
+            "reference_rows": (sum(len(frame) for frame in self._reference)
+                               if self.collecting_reference else None),
+            "features": len(self.features),
+            "window_rows": self.window_rows,
+            "window_size": self.window_size,
+            "total_rows": self.total_rows,
+            "windows_checked": len(self.history),
+            "last_result": self.history[-1] if self.history else None
+        }
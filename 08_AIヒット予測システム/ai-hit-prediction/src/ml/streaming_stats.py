@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Streaming Statistics Module
+固定長リングバッファとストリーミング分位点スケッチ（DDSketch・時間窓付きDDSketch）
+"""
+
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+class DDSketch:
+    """
+    相対誤差保証付きの分位点スケッチ（DDSketch）
+
+    値を対数スケールのバケットに数えるだけなので、追加はO(1)、
+    メモリはバケット数の上限で一定になる。同じ精度のスケッチ同士はマージできる。
+    非負の値（レイテンシ・確率・スコアなど）を対象とする。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048,
+                 min_value: float = 1e-9):
+        """
+        初期化
+
+        Args:
+            relative_accuracy: 分位点の相対誤差
+            max_buckets: バケット数の上限（超えた場合は最小側のバケットをまとめる）
+            min_value: これ未満の値は0として数える
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float):
+        """値を追加"""
+        value = float(value)
+        if value < 0 or math.isnan(value):
+            raise ValueError(f"DDSketch accepts non-negative values only: {value}")
+
+        if value < self.min_value:
+            self.zero_count += 1
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0) + 1
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values: Iterable[float]):
+        """複数の値をまとめて追加（NumPyでバケットを一括集計）"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        if np.any(values < 0) or np.any(np.isnan(values)):
+            raise ValueError("DDSketch accepts non-negative values only")
+
+        positive = values[values >= self.min_value]
+        self.zero_count += int(len(values) - len(positive))
+        if len(positive):
+            keys, counts = np.unique(
+                np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True
+            )
+            for key, n in zip(keys.tolist(), counts.tolist()):
+                self.bins[key] = self.bins.get(key, 0) + n
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _collapse(self):
+        """最小側のバケットをまとめてバケット数を上限以下に保つ（高分位点の精度を優先）"""
+        keys = sorted(self.bins)
+        overflow = keys[:len(keys) - self.max_buckets + 1]
+        merged = sum(self.bins.pop(key) for key in overflow)
+        target = keys[len(overflow)]
+        self.bins[target] = self.bins.get(target, 0) + merged
+
+    def merge(self, other: 'DDSketch'):
+        """
+        別のスケッチを統合
+
+        Args:
+            other: 同じ relative_accuracy のスケッチ
+        """
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        if len(self.bins) > self.max_buckets:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        分位点を推定
+
+        Args:
+            q: 0〜1の分位
+
+        Returns:
+            推定値（値が無い場合はNone）
+        """
+        if self.count == 0:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        cumulative = self.zero_count
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                # バケット (gamma^(k-1), gamma^k] の中央（相対誤差が最小になる点）
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs: Sequence[float]) -> Dict[str, Optional[float]]:
+        """複数の分位点を 'p50' 形式のキーで取得"""
+        return {f"p{int(round(q * 100))}": self.quantile(q) for q in qs}
+
+    @property
+    def mean(self) -> Optional[float]:
+        """平均値"""
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict:
+        """永続化用の辞書"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'min_value': self.min_value,
+            'bins': {str(key): n for key, n in self.bins.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DDSketch':
+        """to_dict の結果から復元"""
+        sketch = cls(data['relative_accuracy'], data['max_buckets'], data['min_value'])
+        sketch.bins = {int(key): n for key, n in data['bins'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        sketch.min = data['min'] if data['min'] is not None else math.inf
+        sketch.max = data['max'] if data['max'] is not None else -math.inf
+        return sketch
+
+
+class WindowedDDSketch:
+    """
+    直近の一定時間の分位点スケッチ
+
+    時間を interval_seconds ごとの区間に分け、区間ごとの DDSketch を n_intervals 個のリングで持つ。
+    古い区間は丸ごと捨てるため、分位点は直近 n_intervals 区間（最新の区間は途中まで）の値だけから求まり、
+    稼働期間が延びても現在のレイテンシの変化に追従する。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 interval_seconds: float = 60.0,
+                 n_intervals: int = 5,
+                 max_buckets: int = 2048,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初期化
+
+        Args:
+            relative_accuracy: 分位点の相対誤差
+            interval_seconds: 1区間の長さ（秒）
+            n_intervals: 保持する区間数（窓の長さは interval_seconds × n_intervals）
+            max_buckets: 区間ごとのスケッチのバケット数の上限
+            clock: 現在時刻（秒）を返す関数
+        """
+        if interval_seconds <= 0 or n_intervals <= 0:
+            raise ValueError("interval_seconds and n_intervals must be positive")
+        self.relative_accuracy = relative_accuracy
+        self.interval_seconds = interval_seconds
+        self.n_intervals = n_intervals
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._sketches: List[DDSketch] = [self._new_sketch() for _ in range(n_intervals)]
+        self._epochs: List[Optional[int]] = [None] * n_intervals
+
+    def _new_sketch(self) -> DDSketch:
+        return DDSketch(self.relative_accuracy, self.max_buckets)
+
+    def _epoch(self) -> int:
+        return int(self.clock() // self.interval_seconds)
+
+    def _current(self) -> DDSketch:
+        """現在の区間のスケッチ（区間が変わったスロットは空にする）"""
+        epoch = self._epoch()
+        slot = epoch % self.n_intervals
+        if self._epochs[slot] != epoch:
+            self._sketches[slot] = self._new_sketch()
+            self._epochs[slot] = epoch
+        return self._sketches[slot]
+
+    @property
+    def window_seconds(self) -> float:
+        """窓の長さ（秒）"""
+        return self.interval_seconds * self.n_intervals
+
+    def add(self, value: float):
+        """値を追加"""
+        self._current().add(value)
+
+    def add_many(self, values: Iterable[float]):
+        """複数の値をまとめて追加"""
+        self._current().add_many(values)
+
+    def merged(self) -> DDSketch:
+        """窓内の区間をマージしたスケッチ"""
+        epoch = self._epoch()
+        result = self._new_sketch()
+        for sketch, sketch_epoch in zip(self._sketches, self._epochs):
+            if sketch_epoch is None or not sketch.count:
+                continue
+            if 0 <= epoch - sketch_epoch < self.n_intervals:
+                result.merge(sketch)
+        return result
+
+    @property
+    def count(self) -> int:
+        """窓内の値の件数"""
+        return self.merged().count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """窓内の分位点を推定（値が無い場合はNone）"""
+        return self.merged().quantile(q)
+
+    def quantiles(self, qs: Sequence[float]) -> Dict[str, Optional[float]]:
+        """窓内の複数の分位点を 'p50' 形式のキーで取得"""
+        return self.merged().quantiles(qs)
+
+
+class RingBuffer:
+    """NumPy配列による固定長リングバッファ（数値列ごとに1本の配列を持つ）"""
+
+    def __init__(self, capacity: int, fields: Sequence[str]):
+        """
+        初期化
+
+        Args:
+            capacity: 保持する件数
+            fields: 数値列の名前
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._data = {field: np.zeros(capacity, dtype=np.float64) for field in self.fields}
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self.total = 0
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp: Optional[float] = None, **values: float):
+        """
+        1件追加（満杯の場合は最も古い値を上書き）
+
+        Args:
+            timestamp: UNIX時刻（省略時は現在）
+            **values: 列名 -> 値
+        """
+        slot = self.total % self.capacity
+        for field in self.fields:
+            self._data[field][slot] = values[field]
+        self._timestamps[slot] = time.time() if timestamp is None else timestamp
+        self.total += 1
+
+    def _order(self, last: Optional[int]) -> np.ndarray:
+        size = len(self)
+        n = size if last is None else min(last, size)
+        end = self.total % self.capacity if self.total >= self.capacity else size
+        return (np.arange(end - n, end)) % self.capacity
+
+    def values(self, field: str, last: Optional[int] = None) -> np.ndarray:
+        """
+        古い順に値を取得
+
+        Args:
+            field: 列名
+            last: 直近何件を返すか（省略時は保持している全件）
+        """
+        return self._data[field][self._order(last)]
+
+    def timestamps(self, last: Optional[int] = None) -> np.ndarray:
+        """古い順にUNIX時刻を取得"""
+        return self._timestamps[self._order(last)]
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """最新の時刻"""
+        if self.total == 0:
+            return None
+        return float(self._timestamps[(self.total - 1) % self.capacity])
+
+    @property
+    def nbytes(self) -> int:
+        """確保済みの配列サイズ（バイト）"""
+        return sum(array.nbytes for array in self._data.values()) + self._timestamps.nbytes
@@ -14,6 +14,15 @@ import logging
 from typing import Optional, Tuple, Dict
 from datetime import datetime
 
+# プロジェクトルートをパスに追加
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.compiled_forest import CompiledForest
+from src.models.tree_shap import TreeShapExplainer
+from src.models import forest_export
+from src.ml.streaming_drift import StreamingDriftDetector, baseline_path
+
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +38,7 @@ class HitPredictionModel:
         Args:
             model_dir: モデル保存先ディレクトリ
         """
+        self._serving_path = None
         self.model = RandomForestClassifier(
             n_estimators=100,
             max_depth=10,
@@ -38,11 +48,40 @@ class HitPredictionModel:
             n_jobs=-1  # 全CPUコアを使用
         )
         self.is_trained = False
+        self.model_version = None
+        self.compiled_forest = None
+        self.shap_explainer = None
+        # 学習データの分布（保存時にドリフト監視用のベースラインとして書き出す）
+        self.drift_baseline = None
         self.model_dir = model_dir
         self.feature_names = None
         self.model_metrics = {}
         self._ensure_model_dir()
         
+    @property
+    def model(self) -> RandomForestClassifier:
+        """
+        学習済みのscikit-learnモデル
+        
+        推論専用に読み込んだ場合（load_serving_model）は、特徴量の重要度や再学習など
+        scikit-learnのモデルが必要になった時点でモデルファイルから復元する。
+        """
+        if self._model is None and self._serving_path is not None:
+            if not os.path.exists(self._serving_path):
+                raise FileNotFoundError(
+                    "Model was loaded for serving only and its model file is gone: "
+                    f"{self._serving_path}"
+                )
+            logger.info(f"Restoring scikit-learn model from: {self._serving_path}")
+            self._model = joblib.load(self._serving_path)['model']
+            self._serving_path = None
+        return self._model
+    
+    @model.setter
+    def model(self, estimator):
+        self._model = estimator
+        self._serving_path = None
+    
     def _ensure_model_dir(self):
         """モデルディレクトリが存在することを確認"""
         os.makedirs(self.model_dir, exist_ok=True)
@@ -114,6 +153,10 @@ class HitPredictionModel:
         # モデル学習
         self.model.fit(X_train, y_train)
         self.is_trained = True
+        self.compiled_forest = None
+        self.drift_baseline = StreamingDriftDetector()
+        self.drift_baseline.fit_baseline(X)
+        self.model_version = f"1.0_{datetime.now().isoformat()}"
         
         # 予測
         y_train_pred = self.model.predict(X_train)
@@ -193,7 +236,7 @@ class HitPredictionModel:
         if not self.is_trained:
             raise Exception("Model not trained yet. Please train the model first.")
         
-        probabilities = self.model.predict_proba(X)[:, 1]
+        probabilities = self.get_compiled_forest().predict_proba(X)[:, 1]
         return probabilities
     
     def predict_with_confidence(self, X: pd.DataFrame) -> pd.DataFrame:
@@ -209,13 +252,8 @@ class HitPredictionModel:
         if not self.is_trained:
             raise Exception("Model not trained yet")
         
-        # 各決定木の予測を取得
-        predictions = np.array([tree.predict_proba(X)[:, 1] 
-                               for tree in self.model.estimators_])
-        
-        # 平均と標準偏差を計算
-        mean_prob = predictions.mean(axis=0)
-        std_prob = predictions.std(axis=0)
+        # 確率と予測のばらつき（各決定木またはベースモデルの標準偏差）を1回のベクトル化パスで取得
+        mean_prob, std_prob = self.get_compiled_forest().predict_with_spread(X)
         
         results = pd.DataFrame({
             'hit_probability': mean_prob,
@@ -228,6 +266,29 @@ class HitPredictionModel:
         
         return results
     
+    def get_compiled_forest(self) -> CompiledForest:
+        """
+        推論用のコンパイル済みフォレストを取得（初回呼び出し時に変換）
+        
+        Returns:
+            CompiledForest
+        """
+        if self.compiled_forest is None:
+            self.compiled_forest = forest_export.compile_model(self.model, self.feature_names)
+        return self.compiled_forest
+    
+    def get_shap_explainer(self) -> TreeShapExplainer:
+        """
+        予測の要因分析用の TreeSHAP を取得（コンパイル済みフォレストが変わった場合は作り直す）
+        
+        Returns:
+            TreeShapExplainer
+        """
+        forest = self.get_compiled_forest()
+        if self.shap_explainer is None or self.shap_explainer.forest is not forest:
+            self.shap_explainer = TreeShapExplainer(forest)
+        return self.shap_explainer
+    
     def save_model(self, filename: Optional[str] = None) -> str:
         """
         モデルを保存
@@ -257,28 +318,91 @@ class HitPredictionModel:
         }
         
         joblib.dump(model_data, filepath)
+        # 読み込み時と同じバージョン文字列にそろえる（昇格・キャッシュキーで比較するため）
+        self.model_version = f"{model_data['version']}_{model_data['trained_at']}"
+        
+        # 推論用のフォレストをメモリマップ可能な形式で併せて保存
+        self.get_compiled_forest().metadata = {
+            key: model_data[key] for key in ('feature_names', 'metrics', 'version', 'trained_at')
+        }
+        self.get_compiled_forest().save(self.get_forest_path(filepath))
+        # 推論データのドリフト監視用に学習データの分布を保存
+        if self.drift_baseline is not None:
+            self.drift_baseline.save_baseline(baseline_path(filepath))
         logger.info(f"Model saved to: {filepath}")
         
         return filepath
     
-    def load_model(self, filepath: str):
+    @staticmethod
+    def get_forest_path(filepath: str) -> str:
+        """モデルファイルに対応するコンパイル済みフォレストのディレクトリ"""
+        return forest_export.forest_path(filepath)
+    
+    def load_model(self, filepath: str, mmap_mode: Optional[str] = None):
         """
         モデルを読み込み
         
         Args:
             filepath: 読み込むモデルファイルのパス
+            mmap_mode: joblib.load に渡すメモリマップモード（'r' で数値配列を共有読み込み）
         """
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Model file not found: {filepath}")
         
-        model_data = joblib.load(filepath)
+        model_data = joblib.load(filepath, mmap_mode=mmap_mode)
         self.model = model_data['model']
         self.feature_names = model_data.get('feature_names')
         self.model_metrics = model_data.get('metrics', {})
+        self.compiled_forest = None
+        self.model_version = (
+            f"{model_data.get('version', '1.0')}_{model_data.get('trained_at', 'unknown')}"
+        )
         self.is_trained = True
         
+        # 別名で保存し直してもドリフトベースラインが引き継がれるようにする
+        self.drift_baseline = None
+        if baseline_path(filepath).exists():
+            self.drift_baseline = StreamingDriftDetector()
+            self.drift_baseline.load_baseline(baseline_path(filepath))
+        
+        forest_path = self.get_forest_path(filepath)
+        if CompiledForest.exists(forest_path):
+            self.compiled_forest = CompiledForest.load(forest_path, mmap_mode='r')
+        
         logger.info(f"Model loaded from: {filepath}")
         logger.info(f"Model trained at: {model_data.get('trained_at', 'Unknown')}")
+    
+    def load_serving_model(self, filepath: str):
+        """
+        推論専用にモデルを読み込み（ウォームスタート）
+        
+        scikit-learnのオブジェクトを復元せず、コンパイル済みフォレストの
+        .npy をメモリマップするだけで推論可能にする。配列はOSのページキャッシュ上で
+        複数のワーカープロセスに共有される。フォレストが存在しない場合は
+        通常の読み込みにフォールバックする。
+        
+        Args:
+            filepath: 読み込むモデルファイルのパス
+        """
+        forest_path = self.get_forest_path(filepath)
+        if not CompiledForest.exists(forest_path):
+            logger.info(f"Compiled forest not found, falling back to full load: {filepath}")
+            self.load_model(filepath)
+            return
+        
+        self.compiled_forest = CompiledForest.load(forest_path, mmap_mode='r')
+        metadata = self.compiled_forest.metadata
+        self.feature_names = metadata.get('feature_names') or self.compiled_forest.feature_names
+        self.model_metrics = metadata.get('metrics', {})
+        self.model_version = (
+            f"{metadata.get('version', '1.0')}_{metadata.get('trained_at', 'unknown')}"
+        )
+        self.is_trained = True
+        # scikit-learnのモデルは参照された時点で復元する
+        self._model = None
+        self._serving_path = filepath
+        
+        logger.info(f"Serving model memory-mapped from: {forest_path}")
 
 
 def generate_dummy_data(n_samples: int = 1000) -> Tuple[pd.DataFrame, np.ndarray]:
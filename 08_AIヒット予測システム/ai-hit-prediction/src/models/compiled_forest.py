@@ -0,0 +1,733 @@
+"""
+コンパイル済みフォレスト
+学習済み決定木アンサンブルをフラットなノード配列に変換し、ベクトル化推論を行う
+
+ランダムフォレスト・勾配ブースティング（scikit-learn / XGBoost / LightGBM）の木を
+1つのノード配列に連結し、木のグループ（元のモデル）ごとの集約方法と
+グループ間の結合方法（重み付き投票・メタ学習器）を配列とマニフェストで表す。
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import json
+import logging
+
+# Numba（オプショナル）
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# ロギング設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 木のグループの集約方法
+MEAN = 'mean'    # 葉の確率の平均（ランダムフォレスト）
+LOGIT = 'logit'  # 葉の値の和 + 初期値 をシグモイド変換（勾配ブースティング）
+
+# グループ間の結合方法
+SINGLE = 'single'        # グループが1つ
+SOFT_VOTE = 'soft_vote'  # 確率の重み付き平均
+HARD_VOTE = 'hard_vote'  # クラス予測の重み付き多数決（確率は重み付き平均）
+META = 'meta'            # ロジスティック回帰のメタ学習器
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _logit(p: float) -> float:
+    p = min(max(float(p), 1e-15), 1 - 1e-15)
+    return float(np.log(p / (1 - p)))
+
+
+if NUMBA_AVAILABLE:
+    @numba.njit(nogil=True, cache=True)
+    def _apply_numba(X, feature, threshold, children, missing_left, roots, leaves):
+        """行ごとに各木を葉まで辿る（葉に着いた時点で打ち切るため浅い木が多いほど速い）"""
+        for i in range(X.shape[0]):
+            for t in range(roots.shape[0]):
+                node = roots[t]
+                while children[2 * node] != node:
+                    x = X[i, feature[node]]
+                    if np.isnan(x):
+                        go_right = 0 if missing_left[node] else 1
+                    else:
+                        go_right = 1 if x > threshold[node] else 0
+                    node = children[2 * node + go_right]
+                leaves[t, i] = node
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """ローカルな子インデックス（葉は-1）で表した木の深さ"""
+    depth = np.zeros(len(left), dtype=np.int64)
+    max_depth = 0
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        if left[node] >= 0:
+            for child in (left[node], right[node]):
+                depth[child] = depth[node] + 1
+                max_depth = max(max_depth, int(depth[child]))
+                stack.append(child)
+    return max_depth
+
+
+class CompiledForest:
+    """フラットなノード配列で表現した決定木アンサンブル"""
+
+    # 成果物として .npy で保存する配列
+    ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'children',
+                    'value', 'cover', 'missing_left', 'roots', 'tree_group')
+    # 旧形式の成果物に無い配列
+    OPTIONAL_ARRAY_FIELDS = ('tree_group',)
+    MANIFEST_FILE = 'forest.json'
+    FORMAT_VERSION = 2
+
+    def __init__(self,
+                 feature: np.ndarray,
+                 threshold: np.ndarray,
+                 left: np.ndarray,
+                 right: np.ndarray,
+                 value: np.ndarray,
+                 cover: np.ndarray,
+                 missing_left: np.ndarray,
+                 roots: np.ndarray,
+                 max_depth: int,
+                 n_features: int,
+                 feature_names: Optional[List[str]] = None,
+                 children: Optional[np.ndarray] = None,
+                 metadata: Optional[Dict[str, Any]] = None,
+                 tree_group: Optional[np.ndarray] = None,
+                 groups: Optional[List[Dict[str, Any]]] = None,
+                 combiner: Optional[Dict[str, Any]] = None):
+        """
+        初期化
+
+        全ての木のノードを1つの配列に連結して保持する。
+        葉ノードは左右の子を自分自身に向けているため、
+        max_depth 回の遷移で全ての行が葉に到達する。
+
+        Args:
+            feature: 各ノードの分岐特徴量インデックス（葉は0）
+            threshold: 各ノードの分岐閾値（x <= threshold で左へ）
+            left: 左の子ノードの絶対インデックス
+            right: 右の子ノードの絶対インデックス
+            value: 各ノードの値（MEAN グループは正クラス確率、LOGIT グループは対数オッズへの寄与）
+            cover: 各ノードの学習サンプル重み（TreeSHAP用）
+            missing_left: 欠損値を左に送るか
+            roots: 各木のルートノードの絶対インデックス
+            max_depth: 全木の最大深さ
+            n_features: 特徴量数
+            feature_names: 特徴量名
+            children: [左, 右] を交互に並べた子ノード配列（省略時は left/right から生成）
+            metadata: マニフェストに保存するモデル情報（バージョン・メトリクス等）
+            tree_group: 各木が属するグループ（グループ順に並んでいること、省略時は全て0）
+            groups: グループごとの {'name', 'kind', 'base_score'}（省略時は MEAN のグループ1つ）
+            combiner: グループ間の結合方法 {'method', 'weights' / 'coef', 'intercept'}
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.cover = cover
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.metadata = metadata or {}
+
+        # 分岐結果から1回のgatherで次のノードを引けるようにする
+        if children is None:
+            children = np.stack([left, right], axis=1).ravel().astype(np.int32)
+        self.children = children
+
+        if tree_group is None:
+            tree_group = np.zeros(len(roots), dtype=np.int32)
+        self.tree_group = tree_group
+        self.groups = groups or [{'name': 'forest', 'kind': MEAN, 'base_score': 0.0}]
+        self.combiner = combiner or {'method': SINGLE}
+        if len(self.groups) > 1 and self.combiner['method'] == SINGLE:
+            raise ValueError("A combiner is required for forests with multiple groups")
+        # グループごとの先頭の木（np.add.reduceat で集約する）
+        self._group_starts = np.searchsorted(np.asarray(tree_group), np.arange(len(self.groups)))
+        self._group_sizes = np.diff(np.append(self._group_starts, len(roots)))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.groups)
+
+    # -----------------------------------------------------------------------
+    # 変換
+    # -----------------------------------------------------------------------
+
+    @classmethod
+    def _from_trees(cls, trees: Sequence[Dict[str, np.ndarray]], kind: str, base_score: float,
+                    n_features: int, feature_names: Optional[List[str]],
+                    name: str) -> 'CompiledForest':
+        """
+        ローカルなノード配列の木のリストから作成
+
+        Args:
+            trees: 木ごとの feature, threshold, left, right（葉は-1）, value, cover, missing_left
+            kind: グループの集約方法（MEAN / LOGIT）
+            base_score: LOGIT グループの初期値（対数オッズ）
+            n_features: 特徴量数
+            feature_names: 特徴量名
+            name: グループ名
+        """
+        features, thresholds, lefts, rights = [], [], [], []
+        values, covers, missing, roots = [], [], [], []
+        max_depth = 0
+        offset = 0
+
+        for tree in trees:
+            n_nodes = len(tree['feature'])
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree['left'] < 0
+
+            # 葉ノードは自分自身を指す
+            lefts.append(np.where(is_leaf, node_ids, tree['left']) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree['right']) + offset)
+            features.append(np.where(is_leaf, 0, tree['feature']))
+            thresholds.append(np.where(is_leaf, 0.0, tree['threshold']))
+            values.append(tree['value'])
+            covers.append(tree['cover'])
+            missing.append(np.asarray(tree['missing_left'], dtype=bool))
+            roots.append(offset)
+            tree_depth = tree.get('max_depth')
+            if tree_depth is None:
+                tree_depth = _tree_depth(tree['left'], tree['right'])
+            max_depth = max(max_depth, tree_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            cover=np.concatenate(covers).astype(np.float64),
+            missing_left=np.concatenate(missing),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=n_features,
+            feature_names=feature_names,
+            groups=[{'name': name, 'kind': kind, 'base_score': float(base_score)}]
+        )
+
+    @classmethod
+    def from_sklearn(cls, forest, positive_class: int = 1,
+                     feature_names: Optional[List[str]] = None) -> 'CompiledForest':
+        """
+        scikit-learnのランダムフォレストから変換
+
+        Args:
+            forest: 学習済みRandomForestClassifier（estimators_を持つモデル）
+            positive_class: 正クラスの列インデックス
+            feature_names: 特徴量名
+
+        Returns:
+            CompiledForest
+        """
+        trees = []
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+
+            # クラス確率に正規化（バージョンにより件数または割合で保持されるため）
+            node_values = tree.value[:, 0, :]
+            totals = node_values.sum(axis=1)
+            totals[totals == 0] = 1.0
+            column = positive_class if node_values.shape[1] > positive_class else 0
+            trees.append(cls._sklearn_tree(tree, node_values[:, column] / totals))
+
+        if feature_names is None and hasattr(forest, 'feature_names_in_'):
+            feature_names = list(forest.feature_names_in_)
+
+        return cls._from_trees(trees, MEAN, 0.0, forest.n_features_in_, feature_names,
+                               'random_forest')
+
+    @staticmethod
+    def _sklearn_tree(tree, values: np.ndarray) -> Dict[str, np.ndarray]:
+        """scikit-learnの決定木（tree_）をローカルなノード配列に変換"""
+        if hasattr(tree, 'missing_go_to_left'):
+            missing_left = tree.missing_go_to_left.astype(bool)
+        else:
+            missing_left = np.zeros(tree.node_count, dtype=bool)
+        return {
+            'feature': tree.feature,
+            'threshold': tree.threshold,
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'value': values,
+            'cover': tree.weighted_n_node_samples,
+            'missing_left': missing_left,
+            'max_depth': tree.max_depth
+        }
+
+    @classmethod
+    def from_sklearn_gbm(cls, model, feature_names: Optional[List[str]] = None) -> 'CompiledForest':
+        """
+        scikit-learnの GradientBoostingClassifier（2値分類・log_loss）から変換
+
+        Args:
+            model: 学習済みの GradientBoostingClassifier
+            feature_names: 特徴量名
+        """
+        if getattr(model, 'n_classes_', 2) != 2 or model.estimators_.shape[1] != 1:
+            raise ValueError("Only binary GradientBoostingClassifier can be compiled")
+        if model.loss not in ('log_loss', 'deviance'):
+            raise ValueError(f"Unsupported GradientBoosting loss: {model.loss}")
+
+        # 初期値（事前確率の対数オッズ）
+        if model.init_ == 'zero':
+            base_score = 0.0
+        else:
+            prior = model.init_.predict_proba(np.zeros((1, model.n_features_in_)))[0, 1]
+            base_score = _logit(prior)
+
+        trees = [
+            cls._sklearn_tree(estimator.tree_, estimator.tree_.value[:, 0, 0] * model.learning_rate)
+            for estimator in model.estimators_[:, 0]
+        ]
+        if feature_names is None and hasattr(model, 'feature_names_in_'):
+            feature_names = list(model.feature_names_in_)
+        return cls._from_trees(trees, LOGIT, base_score, model.n_features_in_, feature_names,
+                               'gradient_boosting')
+
+    @classmethod
+    def from_xgboost(cls, model, feature_names: Optional[List[str]] = None) -> 'CompiledForest':
+        """
+        XGBoost（binary:logistic）から変換
+
+        XGBoost は float32 の x < split で左に進むため、閾値を1つ下の float32 に
+        丸めて x <= threshold の比較にそろえる。
+
+        Args:
+            model: 学習済みの XGBClassifier または Booster
+            feature_names: 特徴量名
+        """
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        config = json.loads(booster.save_config())
+        objective = config['learner']['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Unsupported XGBoost objective: {objective}")
+        base_score = float(str(config['learner']['learner_model_param']['base_score']).strip('[]'))
+
+        booster_features = booster.feature_names
+        n_features = int(config['learner']['learner_model_param']['num_feature'])
+        if feature_names is None and booster_features is not None:
+            feature_names = list(booster_features)
+        feature_index = {name: i for i, name in enumerate(booster_features or [])}
+
+        def to_index(name: str) -> int:
+            if name in feature_index:
+                return feature_index[name]
+            return int(name[1:])  # 'f12' 形式
+
+        frame = booster.trees_to_dataframe()
+        trees = []
+        for _, nodes in frame.groupby('Tree', sort=True):
+            local = {node_id: i for i, node_id in enumerate(nodes['ID'])}
+            is_leaf = (nodes['Feature'] == 'Leaf').to_numpy()
+            split = nodes['Split'].to_numpy(dtype=np.float64)
+            threshold = np.where(
+                is_leaf, 0.0,
+                np.nextafter(split.astype(np.float32), np.float32(-np.inf)).astype(np.float64)
+            )
+            trees.append({
+                'feature': np.array([0 if leaf else to_index(f)
+                                     for f, leaf in zip(nodes['Feature'], is_leaf)]),
+                'threshold': threshold,
+                'left': np.array([-1 if leaf else local[n]
+                                  for n, leaf in zip(nodes['Yes'], is_leaf)]),
+                'right': np.array([-1 if leaf else local[n]
+                                   for n, leaf in zip(nodes['No'], is_leaf)]),
+                'value': np.where(is_leaf, nodes['Gain'].to_numpy(dtype=np.float64), 0.0),
+                'cover': nodes['Cover'].to_numpy(dtype=np.float64),
+                'missing_left': np.array([(not leaf) and m == yes for m, yes, leaf
+                                          in zip(nodes['Missing'], nodes['Yes'], is_leaf)])
+            })
+
+        return cls._from_trees(trees, LOGIT, _logit(base_score), n_features, feature_names,
+                               'xgboost')
+
+    @classmethod
+    def from_lightgbm(cls, model, feature_names: Optional[List[str]] = None) -> 'CompiledForest':
+        """
+        LightGBM（binary）から変換（カテゴリ分岐には未対応）
+
+        Args:
+            model: 学習済みの LGBMClassifier または Booster
+            feature_names: 特徴量名
+        """
+        booster = model.booster_ if hasattr(model, 'booster_') else model
+        dump = booster.dump_model()
+        objective = str(dump.get('objective', ''))
+        if not objective.startswith('binary') or dump.get('num_tree_per_iteration', 1) != 1:
+            raise ValueError(f"Unsupported LightGBM objective: {objective}")
+        sigmoid = 1.0
+        for token in objective.split():
+            if token.startswith('sigmoid:'):
+                sigmoid = float(token.split(':', 1)[1])
+        # random forest モードは木の出力の平均
+        scale = sigmoid / len(dump['tree_info']) if dump.get('average_output') else sigmoid
+
+        trees = []
+        for info in dump['tree_info']:
+            nodes = []
+            stack = [(info['tree_structure'], -1, False)]
+            while stack:
+                node, parent, is_right = stack.pop()
+                index = len(nodes)
+                nodes.append(node)
+                if parent >= 0:
+                    nodes[parent]['_right' if is_right else '_left'] = index
+                if 'leaf_value' not in node:
+                    if node.get('decision_type', '<=') != '<=':
+                        raise ValueError("Categorical splits are not supported")
+                    stack.append((node['right_child'], index, True))
+                    stack.append((node['left_child'], index, False))
+
+            is_leaf = np.array(['leaf_value' in node for node in nodes])
+            trees.append({
+                'feature': np.array([0 if leaf else node['split_feature']
+                                     for node, leaf in zip(nodes, is_leaf)]),
+                'threshold': np.array([0.0 if leaf else node['threshold']
+                                       for node, leaf in zip(nodes, is_leaf)]),
+                'left': np.array([-1 if leaf else node['_left']
+                                  for node, leaf in zip(nodes, is_leaf)]),
+                'right': np.array([-1 if leaf else node['_right']
+                                   for node, leaf in zip(nodes, is_leaf)]),
+                'value': np.array([node['leaf_value'] * scale if leaf else 0.0
+                                   for node, leaf in zip(nodes, is_leaf)]),
+                'cover': np.array([node.get('leaf_count' if leaf else 'internal_count', 0)
+                                   for node, leaf in zip(nodes, is_leaf)], dtype=np.float64),
+                # missing_type=None の場合、欠損値は0として比較される
+                'missing_left': np.array([
+                    False if leaf else (
+                        node.get('default_left', True) if node.get('missing_type') == 'NaN'
+                        else 0.0 <= node['threshold']
+                    )
+                    for node, leaf in zip(nodes, is_leaf)
+                ])
+            })
+            for node in nodes:
+                node.pop('_left', None)
+                node.pop('_right', None)
+
+        if feature_names is None:
+            feature_names = list(dump.get('feature_names') or []) or None
+        return cls._from_trees(trees, LOGIT, 0.0, dump['max_feature_idx'] + 1, feature_names,
+                               'lightgbm')
+
+    @classmethod
+    def concatenate(cls, forests: Sequence[Tuple[str, 'CompiledForest']],
+                    combiner: Dict[str, Any]) -> 'CompiledForest':
+        """
+        複数のフォレストを1つのノード配列に連結
+
+        Args:
+            forests: (名前, 単一グループのフォレスト) のリスト
+            combiner: グループ間の結合方法
+
+        Returns:
+            CompiledForest
+        """
+        n_features = {forest.n_features for _, forest in forests}
+        if len(n_features) != 1:
+            raise ValueError("All forests must use the same features")
+
+        arrays = {field: [] for field in ('feature', 'threshold', 'left', 'right', 'value',
+                                          'cover', 'missing_left', 'roots', 'tree_group')}
+        groups = []
+        offset = 0
+        for name, forest in forests:
+            if forest.n_groups != 1:
+                raise ValueError("Only single-group forests can be concatenated")
+            arrays['feature'].append(np.asarray(forest.feature))
+            arrays['threshold'].append(np.asarray(forest.threshold))
+            arrays['left'].append(np.asarray(forest.left) + offset)
+            arrays['right'].append(np.asarray(forest.right) + offset)
+            arrays['value'].append(np.asarray(forest.value))
+            arrays['cover'].append(np.asarray(forest.cover))
+            arrays['missing_left'].append(np.asarray(forest.missing_left))
+            arrays['roots'].append(np.asarray(forest.roots) + offset)
+            arrays['tree_group'].append(np.full(forest.n_trees, len(groups), dtype=np.int32))
+            groups.append({**forest.groups[0], 'name': name})
+            offset += forest.n_nodes
+
+        feature_names = next((f.feature_names for _, f in forests if f.feature_names), None)
+        return cls(
+            feature=np.concatenate(arrays['feature']).astype(np.int32),
+            threshold=np.concatenate(arrays['threshold']).astype(np.float64),
+            left=np.concatenate(arrays['left']).astype(np.int32),
+            right=np.concatenate(arrays['right']).astype(np.int32),
+            value=np.concatenate(arrays['value']).astype(np.float64),
+            cover=np.concatenate(arrays['cover']).astype(np.float64),
+            missing_left=np.concatenate(arrays['missing_left']),
+            roots=np.concatenate(arrays['roots']).astype(np.int32),
+            max_depth=max(forest.max_depth for _, forest in forests),
+            n_features=n_features.pop(),
+            feature_names=feature_names,
+            tree_group=np.concatenate(arrays['tree_group']),
+            groups=groups,
+            combiner=combiner
+        )
+
+    # -----------------------------------------------------------------------
+    # 保存・読み込み
+    # -----------------------------------------------------------------------
+
+    def save(self, directory: str) -> str:
+        """
+        配列ごとの .npy ファイルとマニフェストで保存
+
+        .npy は非圧縮のため、読み込み時にメモリマップでき、
+        複数のワーカープロセス間でページキャッシュを共有できる。
+
+        Args:
+            directory: 保存先ディレクトリ
+
+        Returns:
+            保存先ディレクトリのパス
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+
+        for field in self.ARRAY_FIELDS:
+            np.save(path / f"{field}.npy", np.ascontiguousarray(getattr(self, field)))
+
+        manifest = {
+            'format_version': self.FORMAT_VERSION,
+            'n_trees': self.n_trees,
+            'n_nodes': self.n_nodes,
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'feature_names': self.feature_names,
+            'groups': self.groups,
+            'combiner': self.combiner,
+            'metadata': self.metadata
+        }
+        with open(path / self.MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+
+        logger.info(f"Compiled forest saved to: {path}")
+        return str(path)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'CompiledForest':
+        """
+        保存済みのコンパイル済みフォレストを読み込み
+
+        Args:
+            directory: 保存先ディレクトリ
+            mmap_mode: np.load のメモリマップモード（None で通常読み込み）
+
+        Returns:
+            CompiledForest
+        """
+        path = Path(directory)
+        with open(path / cls.MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        arrays = {
+            field: np.load(path / f"{field}.npy", mmap_mode=mmap_mode)
+            for field in cls.ARRAY_FIELDS
+            if field not in cls.OPTIONAL_ARRAY_FIELDS or (path / f"{field}.npy").exists()
+        }
+
+        return cls(
+            max_depth=manifest['max_depth'],
+            n_features=manifest['n_features'],
+            feature_names=manifest.get('feature_names'),
+            metadata=manifest.get('metadata'),
+            groups=manifest.get('groups'),
+            combiner=manifest.get('combiner'),
+            **arrays
+        )
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """保存済みのフォレストが存在するか"""
+        return (Path(directory) / cls.MANIFEST_FILE).exists()
+
+    # -----------------------------------------------------------------------
+    # 推論
+    # -----------------------------------------------------------------------
+
+    def _to_array(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """入力を学習時の列順のfloat32配列に変換"""
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None and list(X.columns) != self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy()
+
+        # scikit-learnの決定木と同じくfloat32で比較する
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but the forest expects {self.n_features}"
+            )
+        return X
+
+    def apply(self, X: Union[pd.DataFrame, np.ndarray], chunk_size: int = 256,
+              evaluator: str = 'numpy') -> np.ndarray:
+        """
+        全ての木について到達する葉ノードを求める
+
+        Args:
+            X: 特徴量データ
+            chunk_size: 一度に処理する行数（キャッシュに収まる大きさに分割する）
+            evaluator: 'numpy'（全木を max_depth 段まとめて進める）/ 'numba' / 'auto'
+
+        Returns:
+            葉ノードの絶対インデックス (n_trees, n_samples)
+        """
+        X = self._to_array(X)
+        n_samples = X.shape[0]
+        leaves = np.empty((self.n_trees, n_samples), dtype=np.int32)
+
+        if evaluator == 'numba' and not NUMBA_AVAILABLE:
+            raise ImportError("numba is not installed")
+        if evaluator in ('numba', 'auto') and NUMBA_AVAILABLE:
+            # メモリマップ配列は ndarray のビューとして渡す（コピーしない）
+            _apply_numba(X, np.asarray(self.feature), np.asarray(self.threshold),
+                         np.asarray(self.children), np.asarray(self.missing_left),
+                         np.asarray(self.roots), leaves)
+            return leaves
+
+        has_missing = bool(np.isnan(X).any())
+
+        for start in range(0, n_samples, chunk_size):
+            X_chunk = np.ascontiguousarray(X[start:start + chunk_size])
+            n_rows = X_chunk.shape[0]
+            flat = X_chunk.ravel()
+            row_offset = (np.arange(n_rows, dtype=np.int64) * self.n_features)[np.newaxis, :]
+            node = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1)
+
+            for _ in range(self.max_depth):
+                x = np.take(flat, row_offset + np.take(self.feature, node))
+                threshold = np.take(self.threshold, node)
+                if has_missing:
+                    go_right = ~((x <= threshold) |
+                                 (np.isnan(x) & np.take(self.missing_left, node)))
+                else:
+                    go_right = x > threshold
+                node = np.take(self.children, node * 2 + go_right)
+
+            leaves[:, start:start + n_rows] = node
+
+        return leaves
+
+    def predict_tree_proba(self, X: Union[pd.DataFrame, np.ndarray],
+                           evaluator: str = 'numpy') -> np.ndarray:
+        """
+        木ごとの正クラス確率を1回のベクトル化パスで計算
+
+        LOGIT グループの木は確率ではなく対数オッズへの寄与を返す。
+
+        Args:
+            X: 特徴量データ
+            evaluator: apply の評価方法
+
+        Returns:
+            木ごとの確率行列 (n_trees, n_samples)
+        """
+        return self.value[self.apply(X, evaluator=evaluator)]
+
+    def _group_proba(self, tree_values: np.ndarray) -> np.ndarray:
+        """木ごとの値からグループごとの正クラス確率 (n_groups, n_samples) を求める"""
+        sums = np.add.reduceat(tree_values, self._group_starts, axis=0)
+        proba = np.empty_like(sums)
+        for g, group in enumerate(self.groups):
+            if group['kind'] == MEAN:
+                proba[g] = sums[g] / self._group_sizes[g]
+            else:
+                proba[g] = _sigmoid(sums[g] + group['base_score'])
+        return proba
+
+    def predict_group_proba(self, X: Union[pd.DataFrame, np.ndarray],
+                            evaluator: str = 'numpy') -> np.ndarray:
+        """
+        グループ（元のモデル）ごとの正クラス確率
+
+        Args:
+            X: 特徴量データ
+            evaluator: apply の評価方法
+
+        Returns:
+            (n_groups, n_samples) の確率
+        """
+        return self._group_proba(self.predict_tree_proba(X, evaluator=evaluator))
+
+    def _combine(self, group_proba: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """グループごとの確率から (クラス予測, 正クラス確率) を求める"""
+        method = self.combiner['method']
+        if method == SINGLE:
+            proba = group_proba[0]
+        elif method == META:
+            coef = np.asarray(self.combiner['coef'], dtype=np.float64)
+            proba = _sigmoid(coef @ group_proba + self.combiner['intercept'])
+        else:
+            weights = np.asarray(self.combiner['weights'], dtype=np.float64)
+            proba = weights @ group_proba
+            if method == HARD_VOTE:
+                return ((weights @ (group_proba > 0.5)) > 0.5).astype(int), proba
+        return (proba > 0.5).astype(int), proba
+
+    def predict_proba(self, X: Union[pd.DataFrame, np.ndarray],
+                      evaluator: str = 'numpy') -> np.ndarray:
+        """
+        確率予測（scikit-learn互換の2列形式）
+
+        Args:
+            X: 特徴量データ
+            evaluator: apply の評価方法
+
+        Returns:
+            予測確率 (n_samples, 2)
+        """
+        proba = self._combine(self.predict_group_proba(X, evaluator=evaluator))[1]
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X: Union[pd.DataFrame, np.ndarray], evaluator: str = 'numpy') -> np.ndarray:
+        """クラス予測"""
+        return self._combine(self.predict_group_proba(X, evaluator=evaluator))[0]
+
+    def predict_with_spread(self, X: Union[pd.DataFrame, np.ndarray],
+                            evaluator: str = 'numpy') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        正クラス確率と予測のばらつき
+
+        ランダムフォレスト単体では木ごとの確率の標準偏差、複数モデルの場合は
+        モデルごとの確率の標準偏差（ブースティング単体では0）を返す。
+
+        Args:
+            X: 特徴量データ
+            evaluator: apply の評価方法
+
+        Returns:
+            (正クラス確率, 標準偏差)
+        """
+        tree_values = self.predict_tree_proba(X, evaluator=evaluator)
+        if self.n_groups == 1 and self.groups[0]['kind'] == MEAN:
+            return tree_values.mean(axis=0), tree_values.std(axis=0)
+        group_proba = self._group_proba(tree_values)
+        return self._combine(group_proba)[1], group_proba.std(axis=0)
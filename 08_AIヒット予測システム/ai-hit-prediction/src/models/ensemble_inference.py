@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Ensemble Inference Engine
+ベースモデルをバッチごとに1回だけ呼び出し、確率行列から重み付き投票・確率・メタ学習器の予測を行列演算で求める
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 結合方法
+HARD_VOTE = 'hard_vote'   # 各モデルのクラス予測の重み付き多数決（advanced）
+SOFT_VOTE = 'soft_vote'   # 確率の重み付き平均（voting）
+META = 'meta'             # 確率行列をメタ学習器に入力（stacking / blending）
+
+
+class EnsemblePredictor:
+    """
+    アンサンブルの推論エンジン
+
+    ベースモデルの陽性確率を (サンプル数, モデル数) の行列にまとめ、同じ入力に対する
+    predict と predict_proba では行列をキャッシュから再利用する。
+    ベースモデルの呼び出しはスレッドで並行実行できる（推論はGILを解放するネイティブコードが中心）。
+    """
+
+    def __init__(self, base_models: Dict[str, Any],
+                 weights: Optional[Dict[str, float]] = None,
+                 meta_model: Optional[Any] = None,
+                 method: Optional[str] = None,
+                 max_workers: int = 0,
+                 cache_size: int = 4):
+        """
+        初期化
+
+        Args:
+            base_models: 名前 -> 学習済みのベースモデル
+            weights: 名前 -> 重み（投票で使う）
+            meta_model: メタ学習器（確率行列を入力とする）
+            method: 結合方法（省略時は meta_model があれば META、無ければ SOFT_VOTE）
+            max_workers: ベースモデルを並行に呼び出すスレッド数（0 の場合は逐次）
+            cache_size: 確率行列をキャッシュする入力の数
+        """
+        self.names = list(base_models)
+        self.models = [base_models[name] for name in self.names]
+        self.meta_model = meta_model
+        self.method = method or (META if meta_model is not None else SOFT_VOTE)
+        if self.method == META and meta_model is None:
+            raise ValueError("meta_model is required for the meta method")
+
+        if weights is not None:
+            weight_vector = np.array([weights[name] for name in self.names], dtype=np.float64)
+        else:
+            weight_vector = np.ones(len(self.names))
+        # 正規化しておけば投票・平均が1回の行列積で済む
+        self.weights = weight_vector / weight_vector.sum()
+
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.model_calls = 0
+
+    @classmethod
+    def from_ensemble(cls, ensemble_model: Dict[str, Any], **kwargs) -> 'EnsemblePredictor':
+        """
+        EnsembleModel のカスタムアンサンブル（辞書形式）から作成
+
+        Args:
+            ensemble_model: {'type', 'base_models', 'weights' または 'meta_model'}
+            **kwargs: max_workers などのエンジン設定
+        """
+        ensemble_type = ensemble_model['type']
+        if ensemble_type in ('blending', 'stacking'):
+            return cls(ensemble_model['base_models'], meta_model=ensemble_model['meta_model'],
+                       method=META, **kwargs)
+        method = HARD_VOTE if ensemble_type == 'advanced' else SOFT_VOTE
+        return cls(ensemble_model['base_models'], weights=ensemble_model.get('weights'),
+                   method=method, **kwargs)
+
+    @staticmethod
+    def _input_key(X: pd.DataFrame) -> str:
+        """入力のハッシュ（同じ値のDataFrameなら同じキー）"""
+        digest = hashlib.sha1(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+        digest.update(repr(list(X.columns)).encode())
+        return digest.hexdigest()
+
+    def _call_models(self, X: pd.DataFrame) -> np.ndarray:
+        """全ベースモデルの陽性確率を1回ずつ計算"""
+        self.model_calls += len(self.models)
+        if self.max_workers and len(self.models) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="ensemble")
+            columns = list(self._executor.map(lambda model: model.predict_proba(X)[:, 1],
+                                              self.models))
+        else:
+            columns = [model.predict_proba(X)[:, 1] for model in self.models]
+        return np.column_stack(columns)
+
+    def base_probabilities(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        ベースモデルの陽性確率の行列
+
+        Args:
+            X: 入力
+
+        Returns:
+            (サンプル数, モデル数) の配列
+        """
+        if not self.cache_size:
+            return self._call_models(X)
+
+        key = self._input_key(X)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        probabilities = self._call_models(X)
+        probabilities.flags.writeable = False
+        with self._lock:
+            self._cache[key] = probabilities
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return probabilities
+
+    def _combine(self, probabilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """確率行列からクラス予測と陽性確率を求める"""
+        if self.method == META:
+            positive = self.meta_model.predict_proba(probabilities)[:, 1]
+            labels = self.meta_model.classes_[(positive > 0.5).astype(int)]
+            return labels, positive
+
+        positive = probabilities @ self.weights
+        if self.method == HARD_VOTE:
+            # 各モデルのクラス予測（確率 > 0.5）の重み付き多数決
+            votes = (probabilities > 0.5) @ self.weights
+            labels = (votes > 0.5).astype(int)
+        else:
+            labels = (positive > 0.5).astype(int)
+        return labels, positive
+
+    def predict_with_proba(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        クラス予測と確率を1回のベースモデル呼び出しで計算
+
+        Args:
+            X: 入力
+
+        Returns:
+            (クラス予測, (サンプル数, 2) の確率)
+        """
+        labels, positive = self._combine(self.base_probabilities(X))
+        return labels, np.column_stack([1 - positive, positive])
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """クラス予測"""
+        return self._combine(self.base_probabilities(X))[0]
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """(サンプル数, 2) の確率"""
+        return self.predict_with_proba(X)[1]
+
+    def clear_cache(self):
+        """確率行列のキャッシュを削除"""
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        """スレッドプールを停止"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -9,12 +9,9 @@ import pandas as pd
 from typing import Dict, List, Optional, Tuple, Any
 from sklearn.ensemble import (
     RandomForestClassifier,
-    GradientBoostingClassifier,
-    VotingClassifier,
-    StackingClassifier
+    GradientBoostingClassifier
 )
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import cross_val_score, StratifiedKFold
 from sklearn.metrics import (
     accuracy_score, 
     precision_score, 
@@ -43,6 +40,10 @@ import joblib
 import logging
 from datetime import datetime
 
+from src.models.ensemble_inference import EnsemblePredictor
+from src.models.ensemble_training import EnsembleFitResult, EnsembleTrainer
+from src.models.oof_cache import OOFCache
+
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -51,12 +52,20 @@ logger = logging.getLogger(__name__)
 class EnsembleModel:
     """アンサンブルモデルクラス"""
     
-    def __init__(self, ensemble_type: str = 'voting'):
+    def __init__(self, ensemble_type: str = 'voting',
+                 cpu_limit: Optional[int] = None,
+                 n_splits: int = 5,
+                 oof_cache: Optional[OOFCache] = None,
+                 inference_workers: int = 0):
         """
         初期化
         
         Args:
             ensemble_type: アンサンブルタイプ ('voting', 'stacking', 'blending', 'advanced')
+            cpu_limit: ベースモデルの学習に使うCPU数の上限（省略時は全CPU）
+            n_splits: out-of-fold予測のフォールド数
+            oof_cache: out-of-fold キャッシュ（複数のモデルで共有すると戦略の比較で再学習しない）
+            inference_workers: 推論時にベースモデルを並行に呼び出すスレッド数（0 の場合は逐次）
         """
         self.ensemble_type = ensemble_type
         self.base_models = {}
@@ -64,6 +73,13 @@ class EnsembleModel:
         self.model_weights = None
         self.feature_importance = None
         self.performance_metrics = {}
+        self.trainer = EnsembleTrainer(n_splits=n_splits, cpu_limit=cpu_limit)
+        self.oof_predictions: Optional[pd.DataFrame] = None
+        # ensemble_type を変えて再学習する場合はベースモデルを学習し直さない
+        self.oof_cache = oof_cache if oof_cache is not None else OOFCache()
+        self.inference_workers = inference_workers
+        self._predictor: Optional[EnsemblePredictor] = None
+        self._predictor_source = None
         
         self._initialize_base_models()
     
@@ -128,6 +144,37 @@ class EnsembleModel:
         
         logger.info(f"Initialized {len(self.base_models)} base models")
     
+    def _fit_base_models(self, X_train: pd.DataFrame, y_train: np.ndarray) -> EnsembleFitResult:
+        """
+        ベースモデルを全データとフォールドごとに並列学習
+        
+        フォールドの学習結果は out-of-fold 予測として重み付け・スタッキングに再利用する。
+        同じデータ・パラメータ・フォールド分割の結果はキャッシュから取り出す。
+        
+        Args:
+            X_train: 訓練データの特徴量
+            y_train: 訓練データのターゲット
+        
+        Returns:
+            学習結果
+        """
+        result = self.trainer.fit(self.base_models, X_train, np.asarray(y_train),
+                                  cache=self.oof_cache)
+        self.base_models = result.full_models
+        self.oof_predictions = result.oof_frame(X_train.index)
+        return result
+    
+    @staticmethod
+    def _training_summary(fit_result: EnsembleFitResult) -> Dict[str, Any]:
+        """ベースモデル学習の所要時間とキャッシュ利用状況"""
+        return {
+            'wall_time': fit_result.wall_time,
+            'sequential_time': fit_result.total_fit_time,
+            'workers': fit_result.workers,
+            'threads_per_task': fit_result.threads_per_task,
+            'cached_models': fit_result.cached_models
+        }
+    
     def train(self, X_train: pd.DataFrame, y_train: np.ndarray,
              X_val: Optional[pd.DataFrame] = None, 
              y_val: Optional[np.ndarray] = None) -> Dict[str, Any]:
@@ -161,20 +208,13 @@ class EnsembleModel:
                               y_val: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Voting Ensembleの学習"""
         
-        # 個別モデルの学習と評価
+        # 個別モデルの学習と評価（クロスバリデーションはフォールドの学習結果から計算）
         model_performances = {}
+        fit_result = self._fit_base_models(X_train, y_train)
+        fold_scores = fit_result.fold_scores(y_train)
         
         for name, model in self.base_models.items():
-            logger.info(f"Training {name}...")
-            
-            # 学習
-            model.fit(X_train, y_train)
-            
-            # クロスバリデーション評価
-            cv_scores = cross_val_score(
-                model, X_train, y_train,
-                cv=5, scoring='f1', n_jobs=-1
-            )
+            cv_scores = np.array(fold_scores[name])
             
             model_performances[name] = {
                 'cv_mean': cv_scores.mean(),
@@ -197,22 +237,18 @@ class EnsembleModel:
         weights = weights / weights.sum()
         self.model_weights = dict(zip(self.base_models.keys(), weights))
         
-        # Voting Classifierの作成
-        estimators = [(name, model) for name, model in self.base_models.items()]
-        
-        self.ensemble_model = VotingClassifier(
-            estimators=estimators,
-            voting='soft',
-            weights=weights
-        )
-        
-        # アンサンブルモデルの学習
-        self.ensemble_model.fit(X_train, y_train)
+        # 学習済みのベースモデルによる重み付きソフト投票（VotingClassifier と違い再学習しない）
+        self.ensemble_model = {
+            'base_models': self.base_models,
+            'weights': self.model_weights,
+            'type': 'voting'
+        }
         
         # 評価
         results = self._evaluate_ensemble(X_train, y_train, X_val, y_val)
         results['individual_performances'] = model_performances
         results['model_weights'] = self.model_weights
+        results['training_time'] = self._training_summary(fit_result)
         
         return results
     
@@ -221,6 +257,9 @@ class EnsembleModel:
                                 y_val: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Stacking Ensembleの学習"""
         
+        # ベースモデルの out-of-fold 予測（StackingClassifier の cv=5 と同じ役割）
+        fit_result = self._fit_base_models(X_train, y_train)
+        
         # メタ学習器
         meta_learner = LogisticRegression(
             C=1.0,
@@ -228,26 +267,22 @@ class EnsembleModel:
             random_state=42
         )
         
-        # Stacking Classifierの作成
-        estimators = [(name, model) for name, model in self.base_models.items()]
-        
-        self.ensemble_model = StackingClassifier(
-            estimators=estimators,
-            final_estimator=meta_learner,
-            cv=5,  # クロスバリデーション
-            stack_method='predict_proba',
-            n_jobs=-1
-        )
-        
-        # 学習
+        # 学習（メタ学習器のみ）
         logger.info("Training stacking ensemble...")
-        self.ensemble_model.fit(X_train, y_train)
+        meta_learner.fit(fit_result.oof_proba, y_train)
+        
+        self.ensemble_model = {
+            'base_models': self.base_models,
+            'meta_model': meta_learner,
+            'type': 'stacking'
+        }
         
         # 評価
         results = self._evaluate_ensemble(X_train, y_train, X_val, y_val)
         
         # 各レベルのモデルの寄与度分析
         results['layer_contributions'] = self._analyze_layer_contributions(X_val, y_val)
+        results['training_time'] = self._training_summary(fit_result)
         
         return results
     
@@ -256,37 +291,18 @@ class EnsembleModel:
                                 y_val: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Blending Ensembleの学習"""
         
-        # データ分割（ブレンド用）
-        blend_split = int(len(X_train) * 0.8)
-        X_blend_train = X_train[:blend_split]
-        y_blend_train = y_train[:blend_split]
-        X_blend_val = X_train[blend_split:]
-        y_blend_val = y_train[blend_split:]
-        
-        # ベースモデルの学習と予測
-        blend_features = []
-        
-        for name, model in self.base_models.items():
-            logger.info(f"Training {name} for blending...")
-            
-            # 学習
-            model.fit(X_blend_train, y_blend_train)
-            
-            # ブレンド用特徴量の生成
-            blend_pred = model.predict_proba(X_blend_val)[:, 1]
-            blend_features.append(blend_pred)
+        # ベースモデルの学習（全データのモデルと out-of-fold 予測）
+        fit_result = self._fit_base_models(X_train, y_train)
         
-        # ブレンド特徴量の結合
-        blend_features = np.column_stack(blend_features)
+        # データ分割（ブレンド用）: 末尾20%の out-of-fold 予測はその行を学習していないモデルの予測
+        blend_split = int(len(X_train) * 0.8)
+        y_blend_val = np.asarray(y_train)[blend_split:]
+        blend_features = fit_result.oof_proba[blend_split:]
         
         # メタモデルの学習
         meta_model = LogisticRegression(C=1.0, max_iter=1000, random_state=42)
         meta_model.fit(blend_features, y_blend_val)
         
-        # 全データで再学習
-        for name, model in self.base_models.items():
-            model.fit(X_train, y_train)
-        
         # カスタムアンサンブルモデルの保存
         self.ensemble_model = {
             'base_models': self.base_models,
@@ -296,6 +312,7 @@ class EnsembleModel:
         
         # 評価
         results = self._evaluate_blending(X_train, y_train, X_val, y_val)
+        results['training_time'] = self._training_summary(fit_result)
         
         return results
     
@@ -308,33 +325,19 @@ class EnsembleModel:
         feature_importances = {}
         model_specializations = {}
         
+        # 全データとフォールドごとの学習をまとめて並列実行
+        fit_result = self._fit_base_models(X_train, y_train)
+        fold_scores = fit_result.fold_scores(y_train)
+        
         for name, model in self.base_models.items():
             logger.info(f"Analyzing {name} specialization...")
             
-            # 学習
-            model.fit(X_train, y_train)
-            
             # 特徴量重要度
             if hasattr(model, 'feature_importances_'):
                 feature_importances[name] = model.feature_importances_
             
-            # モデルの得意分野を分析
-            cv_folds = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-            fold_performances = []
-            
-            for train_idx, val_idx in cv_folds.split(X_train, y_train):
-                X_fold_train = X_train.iloc[train_idx]
-                y_fold_train = y_train[train_idx]
-                X_fold_val = X_train.iloc[val_idx]
-                y_fold_val = y_train[val_idx]
-                
-                # サブセットでの学習と評価
-                temp_model = model.__class__(**model.get_params())
-                temp_model.fit(X_fold_train, y_fold_train)
-                
-                fold_pred = temp_model.predict(X_fold_val)
-                fold_f1 = f1_score(y_fold_val, fold_pred)
-                fold_performances.append(fold_f1)
+            # モデルの得意分野を分析（フォールドごとのF1）
+            fold_performances = fold_scores[name]
             
             model_specializations[name] = {
                 'mean_performance': np.mean(fold_performances),
@@ -356,9 +359,39 @@ class EnsembleModel:
         # 評価
         results = self._evaluate_advanced(X_train, y_train, X_val, y_val)
         results['model_specializations'] = model_specializations
+        results['training_time'] = self._training_summary(fit_result)
         
         return results
     
+    def compare_strategies(self, X_train: pd.DataFrame, y_train: np.ndarray,
+                           X_val: Optional[pd.DataFrame] = None,
+                           y_val: Optional[np.ndarray] = None,
+                           strategies: Tuple[str, ...] = ('voting', 'stacking', 'blending',
+                                                          'advanced')
+                           ) -> Dict[str, Dict[str, Any]]:
+        """
+        同じデータで複数のアンサンブル戦略を比較
+        
+        ベースモデルは最初の戦略で1回だけ学習し、以降は out-of-fold キャッシュから
+        メタ特徴量・重みを組み立てるため、各戦略の追加コストはメタ学習器の学習のみ。
+        最後に学習した戦略のモデルが残る。
+        
+        Args:
+            X_train: 訓練データの特徴量
+            y_train: 訓練データのターゲット
+            X_val: 検証データの特徴量
+            y_val: 検証データのターゲット
+            strategies: 比較するアンサンブルタイプ
+        
+        Returns:
+            アンサンブルタイプ -> 学習結果
+        """
+        results = {}
+        for strategy in strategies:
+            self.ensemble_type = strategy
+            results[strategy] = self.train(X_train, y_train, X_val, y_val)
+        return results
+    
     def _calculate_dynamic_weights(self, specializations: Dict) -> Dict[str, float]:
         """動的重み計算"""
         weights = {}
@@ -374,6 +407,20 @@ class EnsembleModel:
         
         return weights
     
+    @property
+    def predictor(self) -> Optional[EnsemblePredictor]:
+        """カスタムアンサンブルの推論エンジン（ensemble_model が変わると作り直す）"""
+        if not isinstance(self.ensemble_model, dict):
+            return None
+        if self._predictor is None or self._predictor_source is not self.ensemble_model:
+            if self._predictor is not None:
+                self._predictor.close()
+            self._predictor = EnsemblePredictor.from_ensemble(
+                self.ensemble_model, max_workers=self.inference_workers
+            )
+            self._predictor_source = self.ensemble_model
+        return self._predictor
+    
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """
         予測実行
@@ -389,10 +436,7 @@ class EnsembleModel:
         
         if isinstance(self.ensemble_model, dict):
             # カスタムアンサンブルの場合
-            if self.ensemble_model['type'] == 'blending':
-                return self._predict_blending(X)
-            elif self.ensemble_model['type'] == 'advanced':
-                return self._predict_advanced(X)
+            return self.predictor.predict(X)
         else:
             # scikit-learnのアンサンブルモデル
             return self.ensemble_model.predict(X)
@@ -412,75 +456,27 @@ class EnsembleModel:
         
         if isinstance(self.ensemble_model, dict):
             # カスタムアンサンブルの場合
-            if self.ensemble_model['type'] == 'blending':
-                return self._predict_proba_blending(X)
-            elif self.ensemble_model['type'] == 'advanced':
-                return self._predict_proba_advanced(X)
+            return self.predictor.predict_proba(X)
         else:
             # scikit-learnのアンサンブルモデル
             return self.ensemble_model.predict_proba(X)
     
-    def _predict_blending(self, X: pd.DataFrame) -> np.ndarray:
-        """Blendingでの予測"""
-        blend_features = []
-        
-        for name, model in self.ensemble_model['base_models'].items():
-            pred = model.predict_proba(X)[:, 1]
-            blend_features.append(pred)
-        
-        blend_features = np.column_stack(blend_features)
-        return self.ensemble_model['meta_model'].predict(blend_features)
-    
-    def _predict_proba_blending(self, X: pd.DataFrame) -> np.ndarray:
-        """Blendingでの確率予測"""
-        blend_features = []
-        
-        for name, model in self.ensemble_model['base_models'].items():
-            pred = model.predict_proba(X)[:, 1]
-            blend_features.append(pred)
-        
-        blend_features = np.column_stack(blend_features)
-        return self.ensemble_model['meta_model'].predict_proba(blend_features)
-    
-    def _predict_advanced(self, X: pd.DataFrame) -> np.ndarray:
-        """高度なアンサンブルでの予測"""
-        predictions = []
-        weights = []
-        
-        for name, model in self.ensemble_model['base_models'].items():
-            pred = model.predict(X)
-            predictions.append(pred)
-            weights.append(self.ensemble_model['weights'][name])
-        
-        # 重み付き多数決
-        predictions = np.array(predictions).T
-        weights = np.array(weights)
-        
-        weighted_predictions = []
-        for row in predictions:
-            weighted_sum = np.sum(row * weights)
-            weighted_predictions.append(1 if weighted_sum > 0.5 else 0)
+    def predict_with_proba(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        予測結果と予測確率（ベースモデルはバッチごとに1回だけ呼び出す）
         
-        return np.array(weighted_predictions)
-    
-    def _predict_proba_advanced(self, X: pd.DataFrame) -> np.ndarray:
-        """高度なアンサンブルでの確率予測"""
-        probabilities = []
-        weights = []
-        
-        for name, model in self.ensemble_model['base_models'].items():
-            proba = model.predict_proba(X)[:, 1]
-            probabilities.append(proba)
-            weights.append(self.ensemble_model['weights'][name])
-        
-        # 重み付き平均
-        probabilities = np.array(probabilities).T
-        weights = np.array(weights)
+        Args:
+            X: 予測データ
         
-        weighted_proba = np.average(probabilities, axis=1, weights=weights)
+        Returns:
+            (予測結果, 予測確率)
+        """
+        if self.ensemble_model is None:
+            raise ValueError("Model not trained yet")
         
-        # 2クラス分類用の確率配列に変換
-        return np.column_stack([1 - weighted_proba, weighted_proba])
+        if isinstance(self.ensemble_model, dict):
+            return self.predictor.predict_with_proba(X)
+        return self.ensemble_model.predict(X), self.ensemble_model.predict_proba(X)
     
     def _evaluate_ensemble(self, X_train: pd.DataFrame, y_train: np.ndarray,
                           X_val: Optional[pd.DataFrame] = None,
@@ -489,8 +485,8 @@ class EnsembleModel:
         results = {}
         
         # 訓練データでの評価
-        train_pred = self.predict(X_train)
-        train_proba = self.predict_proba(X_train)[:, 1]
+        train_pred, train_proba = self.predict_with_proba(X_train)
+        train_proba = train_proba[:, 1]
         
         results['train'] = {
             'accuracy': accuracy_score(y_train, train_pred),
@@ -502,8 +498,8 @@ class EnsembleModel:
         
         # 検証データでの評価
         if X_val is not None and y_val is not None:
-            val_pred = self.predict(X_val)
-            val_proba = self.predict_proba(X_val)[:, 1]
+            val_pred, val_proba = self.predict_with_proba(X_val)
+            val_proba = val_proba[:, 1]
             
             results['validation'] = {
                 'accuracy': accuracy_score(y_val, val_pred),
@@ -530,15 +526,15 @@ class EnsembleModel:
     
     def _analyze_layer_contributions(self, X: pd.DataFrame, y: np.ndarray) -> Dict:
         """レイヤー寄与度分析（Stacking用）"""
-        if not hasattr(self.ensemble_model, 'transform'):
+        if X is None or y is None:
             return {}
         
-        # 第1層の出力を取得
-        first_layer_output = self.ensemble_model.transform(X)
+        # 第1層の出力を取得（評価時に計算した確率行列を再利用）
+        first_layer_output = self.predictor.base_probabilities(X)
         
         # 各ベースモデルの寄与度を計算
         contributions = {}
-        for i, (name, _) in enumerate(self.ensemble_model.estimators):
+        for i, name in enumerate(self.predictor.names):
             correlation = np.corrcoef(first_layer_output[:, i], y)[0, 1]
             contributions[name] = abs(correlation)
         
@@ -591,9 +587,15 @@ class EnsembleModel:
         
         logger.info(f"Ensemble model saved to {filepath}")
     
-    def load_model(self, filepath: str):
-        """モデル読み込み"""
-        data = joblib.load(filepath)
+    def load_model(self, filepath: str, mmap_mode: Optional[str] = None):
+        """
+        モデル読み込み
+        
+        Args:
+            filepath: モデルファイルのパス
+            mmap_mode: joblib.load に渡すメモリマップモード（'r' で数値配列を共有読み込み）
+        """
+        data = joblib.load(filepath, mmap_mode=mmap_mode)
         
         self.ensemble_type = data['ensemble_type']
         self.ensemble_model = data['ensemble_model']
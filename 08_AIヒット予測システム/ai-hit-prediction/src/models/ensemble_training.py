@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+"""
+Ensemble Training Scheduler
+ベースモデル × フォールドの学習をCPU予算内でプロセスプールに分散し、
+フォールドの学習結果をそのまま out-of-fold 予測として再利用する
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.ml.retraining_worker import limit_worker_resources
+from src.models.oof_cache import OOFCache, OOFEntry, dataset_fingerprint, fold_scheme
+
+logger = logging.getLogger(__name__)
+
+# 推定器のスレッド数を指定するパラメータ名
+THREAD_PARAMS = ('n_jobs', 'thread_count')
+
+# ワーカープロセスで共有する学習データ（プール初期化時に1回だけ受け取る）
+_X: Optional[pd.DataFrame] = None
+_y: Optional[np.ndarray] = None
+
+
+def cpu_budget(cpu_limit: Optional[int] = None) -> int:
+    """
+    学習に使えるCPU数
+
+    Args:
+        cpu_limit: 上限（省略時はこのプロセスが使えるCPU数）
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        available = len(os.sched_getaffinity(0))
+    else:
+        available = os.cpu_count() or 1
+    return max(1, min(available, cpu_limit) if cpu_limit else available)
+
+
+def thread_params(estimator: Any) -> Dict[str, Any]:
+    """推定器のスレッド数パラメータ（n_jobs など）の現在値"""
+    params = estimator.get_params(deep=False)
+    return {name: params[name] for name in THREAD_PARAMS if name in params}
+
+
+def set_estimator_threads(estimator: Any, n_threads: int) -> Any:
+    """
+    推定器のスレッド数を設定（-1 のままだと並列タスクごとに全コアを使い過剰並列になる）
+
+    Args:
+        estimator: scikit-learn 互換の推定器
+        n_threads: スレッド数
+
+    Returns:
+        同じ推定器
+    """
+    params = {name: n_threads for name in thread_params(estimator)}
+    if params:
+        estimator.set_params(**params)
+    return estimator
+
+
+# ---------------------------------------------------------------------------
+# ワーカープロセス側の処理（spawnで起動するためモジュールレベルの関数にする）
+# ---------------------------------------------------------------------------
+
+def _init_training_worker(X: pd.DataFrame, y: np.ndarray, threads: int):
+    """学習ワーカーの初期化（学習データの受け取りとスレッド数の制限）"""
+    global _X, _y
+    limit_worker_resources(0, None, threads)
+    _X, _y = X, y
+
+
+@dataclass
+class FitTask:
+    """1つのベースモデルを1つのフォールド（または全データ）で学習するタスク"""
+    name: str
+    estimator: Any
+    fold: Optional[int] = None
+    train_idx: Optional[np.ndarray] = None
+    val_idx: Optional[np.ndarray] = None
+    cost: float = 0.0
+
+    @property
+    def is_full_fit(self) -> bool:
+        """全データでの学習か"""
+        return self.fold is None
+
+
+def fit_task(task: FitTask, X: Optional[pd.DataFrame] = None,
+             y: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    タスクを実行（フォールドの場合は検証側の確率も返す）
+
+    Args:
+        task: 学習タスク
+        X: 特徴量（省略時はワーカープロセスで共有しているデータ）
+        y: ラベル
+
+    Returns:
+        name, fold, model, proba, fit_time
+    """
+    X = _X if X is None else X
+    y = _y if y is None else y
+    estimator = task.estimator
+
+    start = time.perf_counter()
+    if task.is_full_fit:
+        estimator.fit(X, y)
+        proba = None
+    else:
+        estimator.fit(X.iloc[task.train_idx], y[task.train_idx])
+        proba = estimator.predict_proba(X.iloc[task.val_idx])[:, 1]
+
+    return {
+        'name': task.name,
+        'fold': task.fold,
+        'model': estimator,
+        'proba': proba,
+        'fit_time': time.perf_counter() - start
+    }
+
+
+# ---------------------------------------------------------------------------
+# 学習結果
+# ---------------------------------------------------------------------------
+
+@dataclass
+class EnsembleFitResult:
+    """ベースモデルの学習結果（全データのモデル・フォールドごとのモデル・out-of-fold確率）"""
+    model_names: List[str]
+    folds: List[Tuple[np.ndarray, np.ndarray]]
+    oof_proba: np.ndarray
+    full_models: Dict[str, Any] = field(default_factory=dict)
+    fold_models: Dict[str, List[Any]] = field(default_factory=dict)
+    fit_times: Dict[str, float] = field(default_factory=dict)
+    wall_time: float = 0.0
+    workers: int = 1
+    threads_per_task: int = 1
+    cached_models: List[str] = field(default_factory=list)
+
+    def oof_frame(self, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """out-of-fold確率（行: サンプル, 列: ベースモデル）"""
+        return pd.DataFrame(self.oof_proba, columns=self.model_names, index=index)
+
+    def fold_scores(self, y: np.ndarray,
+                    metric: Callable[[np.ndarray, np.ndarray], float] = f1_score,
+                    threshold: float = 0.5) -> Dict[str, List[float]]:
+        """
+        ベースモデルごとのフォールド別スコア（out-of-fold予測から計算するので再学習しない）
+
+        Args:
+            y: ラベル
+            metric: (y_true, y_pred) を受け取る評価関数
+            threshold: クラス判定の閾値
+        """
+        y = np.asarray(y)
+        scores = {}
+        for column, name in enumerate(self.model_names):
+            predicted = (self.oof_proba[:, column] >= threshold).astype(int)
+            scores[name] = [float(metric(y[val_idx], predicted[val_idx]))
+                            for _, val_idx in self.folds]
+        return scores
+
+    @property
+    def total_fit_time(self) -> float:
+        """タスクの学習時間の合計（逐次実行した場合の目安）"""
+        return float(sum(self.fit_times.values()))
+
+
+# ---------------------------------------------------------------------------
+# スケジューラ
+# ---------------------------------------------------------------------------
+
+class EnsembleTrainer:
+    """
+    ベースモデル × フォールドの学習スケジューラ
+
+    全データでの学習とフォールドごとの学習を1つのタスク列にまとめ、CPU予算を
+    ワーカー数 × タスクあたりスレッド数に割り当てて並列に実行する。
+    GradientBoosting のようにスレッド並列できないモデルを先に投入し、終了時刻を揃える。
+    """
+
+    def __init__(self, n_splits: int = 5, random_state: int = 42,
+                 cpu_limit: Optional[int] = None, max_workers: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            n_splits: フォールド数
+            random_state: フォールド分割の乱数シード
+            cpu_limit: 使用するCPU数の上限（省略時は使用可能な全CPU）
+            max_workers: ワーカープロセス数（省略時はCPU予算とタスク数から決める）
+        """
+        self.n_splits = n_splits
+        self.random_state = random_state
+        self.cpu_limit = cpu_limit
+        self.max_workers = max_workers
+
+    def make_folds(self, X: pd.DataFrame, y: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """層化K分割のインデックス"""
+        cv = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state)
+        return [(train_idx, val_idx) for train_idx, val_idx in cv.split(X, y)]
+
+    def plan(self, n_tasks: int) -> Tuple[int, int]:
+        """
+        CPU予算の割り当て
+
+        Args:
+            n_tasks: タスク数
+
+        Returns:
+            (ワーカープロセス数, タスクあたりスレッド数)
+        """
+        budget = cpu_budget(self.cpu_limit)
+        workers = self.max_workers or min(budget, n_tasks)
+        workers = max(1, min(workers, n_tasks))
+        return workers, max(1, budget // workers)
+
+    def _build_tasks(self, base_models: Dict[str, Any], n_samples: int,
+                     folds: List[Tuple[np.ndarray, np.ndarray]], full_fit: bool,
+                     threads: int) -> List[FitTask]:
+        tasks = []
+        for name, model in base_models.items():
+            # スレッド並列できないモデルは実質 threads 倍のコストになる
+            scale = 1 if thread_params(model) else threads
+            if full_fit:
+                tasks.append(FitTask(name, set_estimator_threads(clone(model), threads),
+                                     cost=n_samples * scale))
+            for fold, (train_idx, val_idx) in enumerate(folds):
+                tasks.append(FitTask(name, set_estimator_threads(clone(model), threads), fold,
+                                     train_idx, val_idx, cost=len(train_idx) * scale))
+        # 重いタスクから投入（LPTスケジューリング）
+        return sorted(tasks, key=lambda task: -task.cost)
+
+    def fit(self, base_models: Dict[str, Any], X: pd.DataFrame, y: np.ndarray,
+            folds: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None,
+            full_fit: bool = True,
+            cache: Optional[OOFCache] = None) -> EnsembleFitResult:
+        """
+        ベースモデルを全データとフォールドごとに学習
+
+        Args:
+            base_models: 名前 -> 未学習の推定器（渡した推定器自体は変更しない）
+            X: 特徴量
+            y: ラベル
+            folds: フォールド分割（省略時は make_folds）
+            full_fit: 全データでも学習するか
+            cache: out-of-fold キャッシュ（キャッシュ済みのモデルは学習しない）
+
+        Returns:
+            EnsembleFitResult
+        """
+        y = np.asarray(y)
+        folds = folds if folds is not None else self.make_folds(X, y)
+        names = list(base_models)
+
+        # キャッシュ済みのモデルは学習タスクから除く
+        cached: Dict[str, OOFEntry] = {}
+        keys = {}
+        if cache is not None:
+            dataset, scheme = dataset_fingerprint(X, y), fold_scheme(folds)
+            for name, model in base_models.items():
+                keys[name] = cache.key(dataset, model, scheme)
+                entry = cache.get(keys[name], require_full_model=full_fit)
+                if entry is not None:
+                    cached[name] = entry
+        pending = {name: model for name, model in base_models.items() if name not in cached}
+
+        n_tasks = len(pending) * (len(folds) + int(full_fit))
+        workers, threads = self.plan(max(1, n_tasks))
+        tasks = self._build_tasks(pending, len(X), folds, full_fit, threads)
+
+        start = time.perf_counter()
+        if not tasks:
+            outputs = []
+        elif workers == 1:
+            outputs = [fit_task(task, X, y) for task in tasks]
+        else:
+            outputs = []
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_training_worker,
+                initargs=(X, y, threads)
+            ) as executor:
+                futures = [executor.submit(fit_task, task) for task in tasks]
+                for future in as_completed(futures):
+                    outputs.append(future.result())
+        wall_time = time.perf_counter() - start
+
+        result = EnsembleFitResult(
+            model_names=names,
+            folds=folds,
+            oof_proba=np.zeros((len(X), len(names))),
+            fold_models={name: [None] * len(folds) for name in names},
+            wall_time=wall_time,
+            workers=workers,
+            threads_per_task=threads,
+            cached_models=list(cached)
+        )
+        for name, entry in cached.items():
+            column = names.index(name)
+            result.oof_proba[:, column] = entry.oof_proba
+            result.fold_models[name] = list(entry.fold_models)
+            if entry.full_model is not None:
+                result.full_models[name] = entry.full_model
+
+        for output in outputs:
+            name = output['name']
+            # 推論時は元の設定（n_jobs=-1 など）で動かす
+            model = output['model']
+            model.set_params(**thread_params(base_models[name]))
+            key = name if output['fold'] is None else f"{name}/fold{output['fold']}"
+            result.fit_times[key] = output['fit_time']
+            if output['fold'] is None:
+                result.full_models[name] = model
+            else:
+                result.fold_models[name][output['fold']] = model
+                result.oof_proba[folds[output['fold']][1], names.index(name)] = output['proba']
+
+        if cache is not None:
+            for name in pending:
+                cache.put(keys[name], OOFEntry(
+                    oof_proba=result.oof_proba[:, names.index(name)].copy(),
+                    fold_models=result.fold_models[name],
+                    full_model=result.full_models.get(name),
+                    fit_times={key: value for key, value in result.fit_times.items()
+                               if key.split('/')[0] == name}
+                ))
+
+        logger.info(f"Fitted {len(tasks)} ensemble tasks in {wall_time:.2f}s "
+                    f"({workers} workers x {threads} threads, "
+                    f"sequential {result.total_fit_time:.2f}s, "
+                    f"cached: {result.cached_models})")
+        return result
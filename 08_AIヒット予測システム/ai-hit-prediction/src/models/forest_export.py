@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+"""
+Forest Export
+学習済みモデル（HitPredictionModel / EnsembleModel / AutoML）を1つのコンパイル済みフォレストに変換し、
+scikit-learn・XGBoost・LightGBM を読み込まずに推論できるサービング用成果物として書き出す
+"""
+
+import argparse
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+
+# プロジェクトルートをパスに追加
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.compiled_forest import (
+    CompiledForest, HARD_VOTE, META, SOFT_VOTE
+)
+from src.ml.streaming_drift import StreamingDriftDetector, baseline_path
+
+logger = logging.getLogger(__name__)
+
+# EnsembleModel のアンサンブルタイプ -> グループ間の結合方法
+ENSEMBLE_COMBINERS = {
+    'advanced': HARD_VOTE,
+    'voting': SOFT_VOTE,
+    'stacking': META,
+    'blending': META
+}
+
+
+def forest_path(filepath: str) -> str:
+    """モデルファイルに対応するコンパイル済みフォレストのディレクトリ"""
+    return os.path.splitext(filepath)[0] + ".forest"
+
+
+def compile_estimator(estimator: Any, feature_names: Optional[List[str]] = None) -> CompiledForest:
+    """
+    単体の学習済み推定器を変換
+
+    Args:
+        estimator: RandomForest / ExtraTrees / GradientBoosting / XGBoost / LightGBM の分類器
+        feature_names: 特徴量名
+
+    Returns:
+        CompiledForest（グループ1つ）
+    """
+    from sklearn.ensemble import GradientBoostingClassifier
+
+    if hasattr(estimator, 'get_booster'):
+        return CompiledForest.from_xgboost(estimator, feature_names)
+    if hasattr(estimator, 'booster_'):
+        return CompiledForest.from_lightgbm(estimator, feature_names)
+    if isinstance(estimator, GradientBoostingClassifier):
+        return CompiledForest.from_sklearn_gbm(estimator, feature_names)
+    estimators = getattr(estimator, 'estimators_', None)
+    if estimators is not None and len(estimators) and hasattr(estimators[0], 'tree_'):
+        return CompiledForest.from_sklearn(estimator, feature_names=feature_names)
+    raise ValueError(f"Unsupported model for forest export: {type(estimator).__name__}")
+
+
+def _compile_group(named_estimators: Dict[str, Any], combiner: Dict[str, Any],
+                   feature_names: Optional[List[str]]) -> CompiledForest:
+    """複数のベースモデルを連結"""
+    forests = [(name, compile_estimator(est, feature_names))
+               for name, est in named_estimators.items()]
+    return CompiledForest.concatenate(forests, combiner)
+
+
+def _normalized_weights(names: List[str], weights: Optional[Dict[str, float]]) -> List[float]:
+    """重みを正規化（EnsemblePredictor と同じ）"""
+    vector = np.array([weights[name] for name in names] if weights else np.ones(len(names)),
+                      dtype=np.float64)
+    return (vector / vector.sum()).tolist()
+
+
+def _meta_combiner(meta_model: Any) -> Dict[str, Any]:
+    """ロジスティック回帰のメタ学習器を結合方法に変換"""
+    coef = getattr(meta_model, 'coef_', None)
+    if coef is None or coef.shape[0] != 1:
+        raise ValueError(f"Unsupported meta model for forest export: {type(meta_model).__name__}")
+    return {'method': META, 'coef': coef[0].tolist(), 'intercept': float(meta_model.intercept_[0])}
+
+
+def _compile_ensemble(ensemble: Any, feature_names: Optional[List[str]]) -> CompiledForest:
+    """EnsembleModel のアンサンブル（辞書形式、または旧形式の Voting/StackingClassifier）"""
+    if isinstance(ensemble, dict):
+        base_models = ensemble['base_models']
+        method = ENSEMBLE_COMBINERS[ensemble['type']]
+        if method == META:
+            combiner = _meta_combiner(ensemble['meta_model'])
+        else:
+            combiner = {'method': method,
+                        'weights': _normalized_weights(list(base_models), ensemble.get('weights'))}
+        return _compile_group(base_models, combiner, feature_names)
+
+    # scikit-learn の VotingClassifier / StackingClassifier
+    names = [name for name, _ in ensemble.estimators]
+    base_models = dict(zip(names, ensemble.estimators_))
+    final_estimator = getattr(ensemble, 'final_estimator_', None)
+    if final_estimator is not None:
+        if getattr(ensemble, 'passthrough', False):
+            raise ValueError("Stacking with passthrough features cannot be exported")
+        combiner = _meta_combiner(final_estimator)
+    else:
+        weights = ensemble.weights
+        method = SOFT_VOTE if ensemble.voting == 'soft' else HARD_VOTE
+        named_weights = dict(zip(names, weights)) if weights else None
+        combiner = {'method': method, 'weights': _normalized_weights(names, named_weights)}
+    return _compile_group(base_models, combiner, feature_names)
+
+
+def compile_model(model: Any, feature_names: Optional[List[str]] = None) -> CompiledForest:
+    """
+    学習済みモデルを1つのコンパイル済みフォレストに変換
+
+    Args:
+        model: HitPredictionModel / EnsembleModel / AutoML / HyperparameterOptimizer、
+            アンサンブル（VotingClassifier 等）または単体の木モデル
+        feature_names: 特徴量名（列順の確認に使う）
+
+    Returns:
+        CompiledForest
+    """
+    # HitPredictionModel（ラップしているモデルを変換）
+    if hasattr(model, 'get_compiled_forest') and hasattr(model, 'model'):
+        return compile_model(model.model, feature_names or model.feature_names)
+
+    # EnsembleModel
+    if hasattr(model, 'ensemble_model') and hasattr(model, 'base_models'):
+        if model.ensemble_model is None:
+            raise ValueError("Ensemble model is not trained")
+        return _compile_ensemble(model.ensemble_model, feature_names)
+
+    # AutoML / HyperparameterOptimizer
+    if hasattr(model, 'best_model'):
+        if model.best_model is None:
+            raise ValueError("No best model to export. Run fit() or optimize() first.")
+        return compile_model(model.best_model, feature_names)
+
+    # アンサンブルの辞書・VotingClassifier・StackingClassifier
+    if isinstance(model, dict) or (hasattr(model, 'estimators') and hasattr(model, 'estimators_')):
+        return _compile_ensemble(model, feature_names)
+
+    return compile_estimator(model, feature_names)
+
+
+def _underlying_model(model: Any) -> Any:
+    """成果物に保存するモデル（ラッパークラスではなく、compile_model で再変換できる推定器・辞書）"""
+    if hasattr(model, 'get_compiled_forest') and hasattr(model, 'model'):
+        return model.model
+    if hasattr(model, 'ensemble_model') and hasattr(model, 'base_models'):
+        return model.ensemble_model
+    if hasattr(model, 'best_model'):
+        return model.best_model
+    return model
+
+
+def export_serving_artifact(model: Any, filepath: str,
+                            feature_names: Optional[List[str]] = None,
+                            metrics: Optional[Dict[str, Any]] = None,
+                            version: str = '1.0',
+                            baseline_data: Optional[Any] = None) -> str:
+    """
+    サービング用の成果物を書き出す
+
+    HitPredictionModel.save_model と同じ形式（joblib + .forest ディレクトリ）のため、
+    HitPredictionModel.load_serving_model と API のモデルレジストリがそのまま読み込める。
+    API はコンパイル済みフォレストのみをメモリマップで読み込む。
+
+    Args:
+        model: 変換するモデル
+        filepath: 保存先の joblib ファイル
+        feature_names: 特徴量名
+        metrics: 評価指標
+        version: モデルバージョン
+        baseline_data: ドリフト監視のベースラインにする学習データ（省略時は API が最初の推論データから作る）
+
+    Returns:
+        保存したファイルパス
+    """
+    forest = compile_model(model, feature_names)
+    if feature_names is None:
+        feature_names = forest.feature_names
+    model_data = {
+        'model': _underlying_model(model),
+        'feature_names': feature_names,
+        'metrics': metrics or getattr(model, 'model_metrics', None)
+                   or getattr(model, 'performance_metrics', None) or {},
+        'version': version,
+        'trained_at': datetime.now().isoformat()
+    }
+    joblib.dump(model_data, filepath)
+
+    forest.metadata = {key: model_data[key]
+                       for key in ('feature_names', 'metrics', 'version', 'trained_at')}
+    forest.save(forest_path(filepath))
+    if baseline_data is not None:
+        baseline = StreamingDriftDetector()
+        baseline.fit_baseline(baseline_data)
+        baseline.save_baseline(baseline_path(filepath))
+    logger.info(f"Exported {forest.n_trees} trees in {forest.n_groups} group(s) to {filepath}")
+
+    return filepath
+
+
+def load_saved_model(filepath: str) -> Any:
+    """
+    各クラスの save_model で保存したファイルを読み込む
+
+    Args:
+        filepath: HitPredictionModel / EnsembleModel / HyperparameterOptimizer の保存ファイル
+
+    Returns:
+        変換可能なモデル
+    """
+    data = joblib.load(filepath)
+    if isinstance(data, dict) and 'ensemble_model' in data:
+        from src.models.ensemble_model import EnsembleModel
+        ensemble = EnsembleModel(data['ensemble_type'])
+        ensemble.load_model(filepath)
+        return ensemble
+    if isinstance(data, dict) and 'model' in data:
+        return data['model']
+    return data
+
+
+def main():
+    """保存済みモデルをサービング用成果物に変換"""
+    parser = argparse.ArgumentParser(description='Export a trained model as a compiled forest')
+    parser.add_argument('model',
+                        help='saved model file (HitPredictionModel / EnsembleModel / AutoML)')
+    parser.add_argument('output', help='serving artifact path (.pkl)')
+    parser.add_argument('--version', default='1.0', help='model version')
+    parser.add_argument('--baseline-data',
+                        help='training features (CSV) for the drift-monitoring baseline')
+    args = parser.parse_args()
+
+    baseline_data = None
+    if args.baseline_data:
+        import pandas as pd
+        baseline_data = pd.read_csv(args.baseline_data)
+    export_serving_artifact(load_saved_model(args.model), args.output, version=args.version,
+                            baseline_data=baseline_data)
+    print(f"Exported to {args.output} ({forest_path(args.output)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Out-of-Fold Cache
+ベースモデルの out-of-fold 予測とフォールドごとの学習済みモデルを
+（データセット, モデルパラメータ, フォールド分割）のキーで保存し、アンサンブル戦略間で共有する
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 学習結果に影響しないパラメータ（スレッド数）はキーに含めない
+IGNORED_PARAMS = ('n_jobs', 'thread_count', 'verbose', 'verbosity')
+
+CacheKey = Tuple[str, str, str]
+
+
+def dataset_fingerprint(X: pd.DataFrame, y: np.ndarray) -> str:
+    """
+    データセットの指紋（列名・型・値・ラベルのハッシュ）
+
+    Args:
+        X: 特徴量
+        y: ラベル
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c) for c in X.columns], [str(t) for t in X.dtypes]]).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def params_hash(estimator: Any) -> str:
+    """推定器のクラスとハイパーパラメータのハッシュ（スレッド数などは除く）"""
+    params = {
+        name: value for name, value in estimator.get_params(deep=False).items()
+        if name not in IGNORED_PARAMS
+    }
+    estimator_type = type(estimator)
+    payload = (f"{estimator_type.__module__}.{estimator_type.__qualname__}:"
+               f"{sorted(params.items())!r}")
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def fold_scheme(folds: Sequence[Tuple[np.ndarray, np.ndarray]]) -> str:
+    """フォールド分割の識別子（各フォールドの検証インデックスのハッシュ）"""
+    digest = hashlib.sha256()
+    for _, val_idx in folds:
+        digest.update(np.asarray(val_idx, dtype=np.int64).tobytes())
+        digest.update(b'|')
+    return f"{len(folds)}fold-{digest.hexdigest()[:12]}"
+
+
+@dataclass
+class OOFEntry:
+    """1つのベースモデルの out-of-fold 予測と学習済みモデル"""
+    oof_proba: np.ndarray
+    fold_models: List[Any]
+    full_model: Optional[Any] = None
+    fit_times: Dict[str, float] = field(default_factory=dict)
+
+
+class OOFCache:
+    """
+    out-of-fold 予測のキャッシュ
+
+    メモリ上のLRUに加え、cache_dir を指定した場合はディスクにも保存するため、
+    別プロセス・別セッションの戦略比較でもベースモデルを再学習しない。
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_entries: int = 64):
+        """
+        初期化
+
+        Args:
+            cache_dir: 保存先ディレクトリ（省略時はメモリのみ）
+            max_entries: メモリに保持するエントリ数
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[CacheKey, OOFEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(dataset: str, estimator: Any, scheme: str) -> CacheKey:
+        """キャッシュキー (データセットの指紋, パラメータハッシュ, フォールド分割)"""
+        return dataset, params_hash(estimator), scheme
+
+    def _path(self, key: CacheKey) -> Path:
+        return self.cache_dir / f"{'_'.join(key)}.joblib"
+
+    def get(self, key: CacheKey, require_full_model: bool = False) -> Optional[OOFEntry]:
+        """
+        エントリを取得
+
+        Args:
+            key: キャッシュキー
+            require_full_model: 全データの学習済みモデルを含むエントリのみ返す
+
+        Returns:
+            OOFEntry（無い場合はNone）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and self.cache_dir is not None and self._path(key).exists():
+            try:
+                entry = joblib.load(self._path(key))
+            except Exception as e:
+                logger.warning(f"Failed to load OOF cache entry {key}: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None or (require_full_model and entry.full_model is None):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: CacheKey, entry: OOFEntry):
+        """エントリを保存"""
+        self._remember(key, entry)
+        if self.cache_dir is not None:
+            path = self._path(key)
+            temp_path = path.with_suffix('.tmp')
+            joblib.dump(entry, temp_path)
+            temp_path.replace(path)
+
+    def _remember(self, key: CacheKey, entry: OOFEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """メモリ上のエントリを削除（ディスク上のエントリは残す）"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """統計情報"""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'cache_dir': str(self.cache_dir) if self.cache_dir is not None else None
+        }
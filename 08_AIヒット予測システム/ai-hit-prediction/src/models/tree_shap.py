@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+"""
+Tree SHAP
+コンパイル済みフォレストのノード配列に対する path-dependent TreeSHAP
+
+葉ごとに根からの経路を「特徴量ごとの区間・カバー比率」に展開しておき、
+予測時は行 × 葉をまとめたNumPy配列で SHAP 値を求める。
+経路上の特徴量のうち行が区間に入っているもの（hot）の組み合わせごとの値を事前に表にしておけば、
+行ごとの計算は表の参照だけになる（Fast TreeSHAP v2 と同じ考え方）。
+shap パッケージや元のモデルを読み込まずに、メモリマップしたサービング用フォレストだけで
+予測の根拠（特徴量ごとの寄与）を計算できる。
+"""
+
+import logging
+from math import factorial
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.compiled_forest import CompiledForest, MEAN, META, SINGLE
+
+# Numba（オプショナル）
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# SHAP値の単位
+PROBABILITY = 'probability'  # 正クラス確率への寄与（ランダムフォレスト・確率の重み付き平均）
+LOG_ODDS = 'log_odds'        # 対数オッズへの寄与（勾配ブースティング・メタ学習器）
+
+
+def _group_coefficients(forest: CompiledForest) -> Tuple[np.ndarray, float, str]:
+    """
+    グループの結合を線形結合として表す
+
+    Returns:
+        (グループごとの係数, 定数項, SHAP値の単位)
+    """
+    method = forest.combiner['method']
+    kinds = [group['kind'] for group in forest.groups]
+
+    if method == SINGLE:
+        if kinds[0] == MEAN:
+            return np.ones(1), 0.0, PROBABILITY
+        return np.ones(1), float(forest.groups[0]['base_score']), LOG_ODDS
+
+    # 複数グループは MEAN（確率の平均）同士のみ線形に結合できる
+    if any(kind != MEAN for kind in kinds):
+        raise ValueError("TreeSHAP over several groups requires "
+                         "probability-averaging (random forest) groups")
+    if method == META:
+        return (np.asarray(forest.combiner['coef'], dtype=np.float64),
+                float(forest.combiner['intercept']), LOG_ODDS)
+    return np.asarray(forest.combiner['weights'], dtype=np.float64), 0.0, PROBABILITY
+
+
+def _table_shap_rows(X, pos_feature, pos_lower, pos_upper, pos_nan_ok, pos_bit, pos_cold, pos_hot,
+                     segment_bounds, segment_offset, table, shap_values):
+    """行ごと・葉ごとにビットマスクを求めて表を参照する（Numba でコンパイルして使う）"""
+    for i in range(X.shape[0]):
+        for s in range(segment_offset.shape[0]):
+            begin, end = segment_bounds[s], segment_bounds[s + 1]
+            mask = 0
+            for p in range(begin, end):
+                x = X[i, pos_feature[p]]
+                if np.isnan(x):
+                    hot = pos_nan_ok[p]
+                else:
+                    hot = pos_lower[p] < x <= pos_upper[p]
+                if hot:
+                    mask += pos_bit[p]
+            base = segment_offset[s] + mask
+            for p in range(begin, end):
+                if mask & pos_bit[p]:
+                    shap_values[i, pos_feature[p]] += table[base - pos_bit[p]] * pos_hot[p]
+                else:
+                    shap_values[i, pos_feature[p]] += table[base] * pos_cold[p]
+
+
+if NUMBA_AVAILABLE:
+    _table_shap_numba = numba.njit(nogil=True, cache=True)(_table_shap_rows)
+
+
+class TreeShapExplainer:
+    """
+    コンパイル済みフォレストの path-dependent TreeSHAP
+
+    葉 l に至る経路上の特徴量 k について、行がその分岐の側にあるか（one_k ∈ {0, 1}）と
+    学習データのうちその側に進んだ割合（zero_k = カバーの比）から、
+    多項式 P(t) = Π_k (zero_k + one_k t) を作り、特徴量 i の因子を割り戻した係数の
+    Shapley 重み付き和で寄与を求める。経路の長さは最大の深さにそろえる
+    （zero = one = 1 の特徴量は Shapley 値に影響しない）。
+
+    hot な特徴量の集合 H に対して W(H) = Σ_s w(s) P_H[s] とおくと、葉の値 v について
+    区間外の特徴量 i の寄与は -v W(H)、区間内の特徴量 i の寄与は v (1 - zero_i) W(H - {i}) / zero_i。
+    葉ごとに全ての H の W(H) を表にしておけば（'table'）、行ごとの計算は 経路長 × 葉数 の参照で済む。
+    表が大きすぎる場合は行ごとに多項式を割り戻す（'polynomial'）。
+
+    shap.TreeExplainer と同じく shap_values / expected_value を持つ。
+    """
+
+    def __init__(self, forest: CompiledForest, algorithm: str = 'auto',
+                 max_table_entries: int = 2 ** 24, max_chunk_elements: int = 2_000_000):
+        """
+        初期化（葉ごとの経路を展開し、表を作成する）
+
+        Args:
+            forest: コンパイル済みフォレスト
+            algorithm: 'table' / 'polynomial' / 'auto'（表の大きさが上限以下なら 'table'）
+            max_table_entries: 'auto' で表を作る場合の要素数の上限（葉ごとに 2^経路長）
+            max_chunk_elements: 一度に処理する 行 × 葉 × 経路長 の要素数の上限
+        """
+        if algorithm not in ('auto', 'table', 'polynomial'):
+            raise ValueError(f"Unknown TreeSHAP algorithm: {algorithm}")
+        self.forest = forest
+        self.max_chunk_elements = max_chunk_elements
+        coefficients, constant, self.output = _group_coefficients(forest)
+
+        # 木ごとの係数（MEAN グループは木の本数で平均、LOGIT グループは和）
+        group_sizes = np.bincount(np.asarray(forest.tree_group), minlength=forest.n_groups)
+        tree_scale = np.empty(forest.n_trees, dtype=np.float64)
+        for g, group in enumerate(forest.groups):
+            members = np.asarray(forest.tree_group) == g
+            scale = coefficients[g] / group_sizes[g] if group['kind'] == MEAN else coefficients[g]
+            tree_scale[members] = scale
+
+        self._build_paths(tree_scale)
+        self.expected_value = float(constant + self._leaf_value @ self._leaf_weight)
+
+        table_entries = int((2 ** self._path_length.astype(np.int64)).sum())
+        if algorithm == 'auto':
+            algorithm = 'table' if table_entries <= max_table_entries else 'polynomial'
+        self.algorithm = algorithm
+        if algorithm == 'table':
+            self._build_table()
+
+    @property
+    def feature_names(self) -> Optional[List[str]]:
+        return self.forest.feature_names
+
+    def _build_paths(self, tree_scale: np.ndarray):
+        """葉ごとの経路（特徴量・区間・欠損値の向き・カバー比率）を配列に展開"""
+        left = np.asarray(self.forest.left)
+        right = np.asarray(self.forest.right)
+        feature = np.asarray(self.forest.feature)
+        threshold = np.asarray(self.forest.threshold)
+        cover = np.asarray(self.forest.cover, dtype=np.float64)
+        missing_left = np.asarray(self.forest.missing_left)
+        value = np.asarray(self.forest.value)
+
+        leaf_values, leaf_weights, paths = [], [], []
+        for t, root in enumerate(np.asarray(self.forest.roots).tolist()):
+            # 特徴量 -> [下限, 上限, 欠損値がこの経路に進むか, カバー比率]
+            stack = [(root, {})]
+            while stack:
+                node, path = stack.pop()
+                if left[node] == node:
+                    leaf_values.append(value[node] * tree_scale[t])
+                    leaf_weights.append(cover[node] / cover[root] if cover[root] > 0 else 0.0)
+                    paths.append(path)
+                    continue
+                for child, go_left in ((left[node], True), (right[node], False)):
+                    lo, hi, nan_ok, zero = path.get(feature[node], (-np.inf, np.inf, True, 1.0))
+                    if go_left:
+                        hi = min(hi, threshold[node])
+                    else:
+                        lo = max(lo, threshold[node])
+                    ratio = cover[child] / cover[node] if cover[node] > 0 else 0.0
+                    child_path = dict(path)
+                    child_nan_ok = nan_ok and bool(missing_left[node]) == go_left
+                    child_path[feature[node]] = (lo, hi, child_nan_ok, zero * ratio)
+                    stack.append((child, child_path))
+
+        n_leaves = len(paths)
+        depth = max(1, max((len(path) for path in paths), default=0))
+        self._feature = np.zeros((depth, n_leaves), dtype=np.int64)
+        self._lower = np.full((depth, n_leaves), -np.inf)
+        self._upper = np.full((depth, n_leaves), np.inf)
+        self._nan_ok = np.ones((depth, n_leaves), dtype=bool)
+        self._zero = np.ones((depth, n_leaves))
+        for l, path in enumerate(paths):
+            for d, (f, (lo, hi, nan_ok, zero)) in enumerate(path.items()):
+                self._feature[d, l] = f
+                self._lower[d, l] = lo
+                self._upper[d, l] = hi
+                self._nan_ok[d, l] = nan_ok
+                self._zero[d, l] = zero
+
+        self._path_length = np.array([len(path) for path in paths], dtype=np.int64)
+        self._leaf_value = np.asarray(leaf_values, dtype=np.float64)
+        self._leaf_weight = np.asarray(leaf_weights, dtype=np.float64)
+        self.depth = depth
+        self.n_leaves = n_leaves
+        # 部分集合の大きさ s の Shapley 重み s!(D-s-1)!/D!
+        self._shapley_weight = np.array([
+            factorial(s) * factorial(depth - s - 1) / factorial(depth) for s in range(depth)
+        ])[:, np.newaxis]
+        # 特徴量ごとの集計用（経路上の位置を特徴量順に並べる）
+        flat_feature = self._feature.ravel()
+        self._order = np.argsort(flat_feature, kind='stable')
+        self._present, self._starts = np.unique(flat_feature[self._order], return_index=True)
+
+    def _build_table(self, chunk_leaves: int = 256):
+        """葉ごと・hot な特徴量の組み合わせ（ビットマスク）ごとの W(H) の表を作成"""
+        lengths = self._path_length
+        self._table_offset = np.zeros(self.n_leaves, dtype=np.int64)
+        self._table_offset[1:] = np.cumsum(2 ** lengths)[:-1]
+        self._table = np.zeros(int((2 ** lengths).sum()))
+
+        # 行ごとの参照は経路上の実在する位置だけを葉の順に並べた1次元配列で行う
+        leaf, position = np.nonzero(np.arange(self.depth) < lengths[:, np.newaxis])
+        self._pos_feature = self._feature[position, leaf]
+        self._pos_lower = self._lower[position, leaf]
+        self._pos_upper = self._upper[position, leaf]
+        self._pos_nan_ok = self._nan_ok[position, leaf]
+        self._pos_bit = 2 ** position
+        # 葉ごとの区間（ビットマスクを np.add.reduceat で求める）と位置 -> 区間の対応
+        self._segment_starts = (np.flatnonzero(np.r_[True, leaf[1:] != leaf[:-1]])
+                                if len(leaf) else leaf)
+        self._segment_bounds = np.r_[self._segment_starts, len(leaf)]
+        self._segment_offset = self._table_offset[leaf[self._segment_starts]]
+        self._pos_segment = np.cumsum(np.r_[False, leaf[1:] != leaf[:-1]]) if len(leaf) else leaf
+        # 区間外の位置の係数 -v、区間内の位置の係数 v (1 - zero) / zero
+        # （カバーが0の分岐は極小値にして割り戻せるようにする）
+        zero = self._zero[position, leaf]
+        self._pos_cold = -self._leaf_value[leaf]
+        self._pos_hot = self._leaf_value[leaf] * (1.0 - zero) / np.maximum(zero, 1e-300)
+
+        # 経路長ごとに葉をまとめて計算する
+        for length in np.unique(lengths):
+            weights = np.array([factorial(s) * factorial(length - s - 1) / factorial(length)
+                                for s in range(length)]) if length else np.zeros(0)
+            leaves = np.flatnonzero(lengths == length)
+            for start in range(0, len(leaves), chunk_leaves):
+                batch = leaves[start:start + chunk_leaves]
+                z = np.maximum(self._zero[:length, batch].T, 1e-300)   # (葉, 経路長)
+                # 位置 k のビットが 0 なら zero_k、1 なら (zero_k + t) を掛ける
+                poly = np.ones((len(batch), 1, 1))
+                for k in range(length):
+                    cold = poly * z[:, k, np.newaxis, np.newaxis]
+                    hot = np.concatenate([cold, np.zeros((len(batch), cold.shape[1], 1))], axis=2)
+                    hot[:, :, 1:] += poly
+                    cold = np.concatenate([cold, np.zeros_like(cold[:, :, :1])], axis=2)
+                    poly = np.concatenate([cold, hot], axis=1)
+                values = poly[:, :, :length] @ weights if length else np.zeros((len(batch), 1))
+                index = self._table_offset[batch, np.newaxis] + np.arange(2 ** length)
+                self._table[index] = values
+
+    def _inside(self, X: np.ndarray) -> np.ndarray:
+        """行が経路の区間に入っているか (n_rows, depth, n_leaves)"""
+        x = X[:, self._feature]
+        inside = (x > self._lower) & (x <= self._upper)
+        nan = np.isnan(x)
+        if nan.any():
+            inside = np.where(nan, self._nan_ok, inside)
+        return inside
+
+    def _features_sum(self, contribution: np.ndarray) -> np.ndarray:
+        """(n_rows, depth, n_leaves) の寄与を特徴量ごとに集計"""
+        n_rows = contribution.shape[0]
+        contribution = contribution.reshape(n_rows, -1)[:, self._order]
+        shap_values = np.zeros((n_rows, self.forest.n_features))
+        shap_values[:, self._present] = np.add.reduceat(contribution, self._starts, axis=1)
+        return shap_values
+
+    def _chunk_table(self, X: np.ndarray) -> np.ndarray:
+        """表の参照による SHAP 値 (n_rows, n_features)"""
+        n_rows, n_features = X.shape
+        if not len(self._pos_feature):
+            return np.zeros((n_rows, n_features))
+
+        # 1行あたり 経路長 × 葉数 の要素を何度も走査するため、一時配列を作り直さずに更新する
+        x = np.take(X, self._pos_feature, axis=1)
+        inside = x > self._pos_lower
+        inside &= x <= self._pos_upper
+        nan = np.isnan(x)
+        if nan.any():
+            inside = np.where(nan, self._pos_nan_ok, inside)
+
+        # 葉ごとの hot な位置のビットマスク
+        bits = inside * self._pos_bit
+        base = np.add.reduceat(bits, self._segment_starts, axis=1)
+        base += self._segment_offset
+        # 区間内の位置は W(H - {i})、区間外の位置は W(H)
+        index = np.take(base, self._pos_segment, axis=1)
+        index -= bits
+        contribution = np.take(self._table, index)
+        contribution *= np.where(inside, self._pos_hot, self._pos_cold)
+
+        # 行ごと・特徴量ごとに集計
+        if n_rows == 1:
+            return np.bincount(self._pos_feature, weights=contribution[0],
+                               minlength=n_features)[np.newaxis]
+        index = np.arange(n_rows)[:, np.newaxis] * n_features + self._pos_feature
+        return np.bincount(index.ravel(), weights=contribution.ravel(),
+                           minlength=n_rows * n_features).reshape(n_rows, n_features)
+
+    def _chunk_table_numba(self, X: np.ndarray) -> np.ndarray:
+        """表の参照による SHAP 値（Numba）(n_rows, n_features)"""
+        shap_values = np.zeros(X.shape)
+        _table_shap_numba(np.ascontiguousarray(X), self._pos_feature, self._pos_lower,
+                          self._pos_upper, self._pos_nan_ok, self._pos_bit, self._pos_cold,
+                          self._pos_hot,
+                          self._segment_bounds, self._segment_offset, self._table, shap_values)
+        return shap_values
+
+    def _chunk_polynomial(self, X: np.ndarray) -> np.ndarray:
+        """多項式の割り戻しによる SHAP 値 (n_rows, n_features)"""
+        n_rows, depth = X.shape[0], self.depth
+        one = self._inside(X).transpose(1, 0, 2).reshape(depth, -1).astype(np.float64)
+        zero = np.tile(self._zero, (1, n_rows))
+
+        # P(t) = Π_k (zero_k + one_k t) の係数 (depth + 1, m)
+        poly = np.zeros((depth + 1, one.shape[1]))
+        poly[0] = 1.0
+        for k in range(depth):
+            poly[1:k + 2] = poly[1:k + 2] * zero[k] + poly[0:k + 1] * one[k]
+            poly[0] *= zero[k]
+
+        # 特徴量 i の因子を割り戻した多項式の Shapley 重み付き和
+        # one_i = 1 のときは (zero_i + t) で割る（上の次数から）
+        quotient = np.broadcast_to(poly[depth], zero.shape).copy()
+        hot = self._shapley_weight[depth - 1] * quotient
+        for j in range(depth - 1, 0, -1):
+            quotient = poly[j] - zero * quotient
+            hot += self._shapley_weight[j - 1] * quotient
+        # one_i = 0 のときは zero_i で割る
+        weighted = (self._shapley_weight * poly[:depth]).sum(axis=0)
+        cold = np.divide(weighted, zero, out=np.zeros_like(zero), where=zero > 0)
+
+        leaf_value = np.tile(self._leaf_value, n_rows)
+        contribution = leaf_value * (one - zero) * np.where(one > 0, hot, cold)
+
+        # (depth, n_rows, n_leaves) -> 行ごとに特徴量へ集計
+        contribution = contribution.reshape(depth, n_rows, self.n_leaves).transpose(1, 0, 2)
+        return self._features_sum(contribution)
+
+    def shap_values(self, X: Union[pd.DataFrame, np.ndarray],
+                    evaluator: str = 'auto') -> np.ndarray:
+        """
+        SHAP 値を計算
+
+        Args:
+            X: 特徴量データ
+            evaluator: 'table' の場合の計算方法 'numpy' / 'numba' / 'auto'（Numba があれば 'numba'）
+
+        Returns:
+            (n_samples, n_features) の SHAP 値（行ごとの和 + expected_value が予測値）
+        """
+        if evaluator == 'numba' and not NUMBA_AVAILABLE:
+            raise ImportError("numba is not installed")
+        X = self.forest._to_array(X)
+        if self.algorithm == 'table' and evaluator in ('numba', 'auto') and NUMBA_AVAILABLE:
+            return self._chunk_table_numba(X)
+        if self.algorithm == 'table':
+            compute, row_elements = self._chunk_table, len(self._pos_feature)
+        else:
+            compute, row_elements = self._chunk_polynomial, self.n_leaves * self.depth
+        chunk = max(1, self.max_chunk_elements // max(1, row_elements))
+        if X.shape[0] <= chunk:
+            return compute(X)
+        return np.vstack([compute(X[start:start + chunk]) for start in range(0, X.shape[0], chunk)])
+
+    def explain(self, X: Union[pd.DataFrame, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        SHAP 値と予測値（expected_value + SHAP 値の和）
+
+        Args:
+            X: 特徴量データ
+
+        Returns:
+            (SHAP 値, 予測値)
+        """
+        shap_values = self.shap_values(X)
+        return shap_values, self.expected_value + shap_values.sum(axis=1)
@@ -5,11 +5,15 @@ Centralized Logging and Monitoring Module
 """
 
 import logging
+import logging.handlers
+import atexit
 import json
+import queue
+import random
 import sys
 import traceback
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, TextIO
 from pathlib import Path
 import os
 
@@ -69,6 +73,12 @@ class MetricsCollector:
                 ['endpoint']
             )
             
+            self.api_stage_duration = Histogram(
+                'api_request_stage_seconds',
+                'API request time by processing stage',
+                ['endpoint', 'stage']
+            )
+            
             # ゲージメトリクス
             self.model_accuracy = Gauge(
                 'model_accuracy',
@@ -113,6 +123,25 @@ class MetricsCollector:
             ).inc()
             self.api_response_time.labels(endpoint=endpoint).observe(duration)
     
+    def record_request_timing(self, method: str, endpoint: str, status: int,
+                              duration: float, stages: Dict[str, float]):
+        """
+        リクエスト全体とステージ別の処理時間を記録
+        
+        Args:
+            method: HTTPメソッド
+            endpoint: ルートのパス
+            status: ステータスコード
+            duration: リクエスト全体の秒数
+            stages: ステージ名 -> 秒数
+        """
+        if PROMETHEUS_AVAILABLE:
+            self.record_api_request(method, endpoint, status, duration)
+            for stage, seconds in stages.items():
+                self.api_stage_duration.labels(endpoint=endpoint, stage=stage).observe(seconds)
+            if 'feature_extraction' in stages:
+                self.feature_extraction_time.observe(stages['feature_extraction'])
+    
     def record_error(self, error_type: str, severity: str = "error"):
         """エラーメトリクス記録"""
         if PROMETHEUS_AVAILABLE:
@@ -134,20 +163,77 @@ class MetricsCollector:
             self.cache_hit_ratio.set(ratio)
 
 
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """フォーマットをリスナースレッドに任せるQueueHandler"""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 同一プロセス内のキューなのでレコードをそのまま渡し、JSON化はリスナー側で行う
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # キューが溢れた場合はリクエストを待たせずに破棄する
+            self.dropped += 1
+
+
+# ロガー名 -> 非同期書き込み中のStructuredLogger（同名のロガーを再初期化した際に停止する）
+_active_loggers: Dict[str, 'StructuredLogger'] = {}
+
+
 class StructuredLogger:
     """構造化ログクラス"""
     
-    def __init__(self, name: str, log_level: str = "INFO"):
+    def __init__(self, name: str, log_level: str = "INFO",
+                 async_mode: Optional[bool] = None,
+                 queue_size: Optional[int] = None,
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 log_dir: str = "logs",
+                 stream: Optional[TextIO] = None):
         """
         初期化
         
+        async_mode の場合、呼び出し側はキューへの投入のみを行い、
+        JSON化と標準出力・ファイルへの書き込みはバックグラウンドのリスナースレッドで行う。
+        
         Args:
             name: ロガー名
             log_level: ログレベル
+            async_mode: キュー経由で非同期に書き込むか（省略時は環境変数 LOG_ASYNC）
+            queue_size: キューの上限（0で無制限、省略時は環境変数 LOG_QUEUE_SIZE）
+            sample_rates: 'debug' / 'prediction' ごとの記録率（省略時は環境変数 LOG_SAMPLE_*）
+            log_dir: ログファイルの出力先
+            stream: コンソール出力先（省略時は標準出力）
         """
+        self.name = name
         self.logger = logging.getLogger(name)
         self.logger.setLevel(getattr(logging, log_level))
-        self.logger.handlers.clear()
+        # ルートロガーの同期ハンドラーで二重に書き込まないようにする
+        self.logger.propagate = False
+        
+        if async_mode is None:
+            async_mode = os.getenv("LOG_ASYNC", "true").lower() == "true"
+        if queue_size is None:
+            queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.async_mode = async_mode
+        self.sample_rates = {
+            'debug': float(os.getenv("LOG_SAMPLE_DEBUG", "1.0")),
+            'prediction': float(os.getenv("LOG_SAMPLE_PREDICTION", "1.0"))
+        }
+        self.sample_rates.update(sample_rates or {})
+        self.sampled_out = 0
+        
+        # 全ログ共通のコンテキストは一度だけ作成する
+        self.static_context = {
+            'environment': os.getenv('ENVIRONMENT', 'development'),
+            'service': 'ai-hit-prediction',
+            'version': os.getenv('APP_VERSION', '1.0.0')
+        }
         
         # JSON形式のフォーマッター
         json_formatter = jsonlogger.JsonFormatter(
@@ -156,21 +242,40 @@ class StructuredLogger:
         )
         
         # コンソールハンドラー
-        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler = logging.StreamHandler(stream or sys.stdout)
         console_handler.setFormatter(json_formatter)
-        self.logger.addHandler(console_handler)
         
         # ファイルハンドラー
-        log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
+        log_path = Path(log_dir)
+        log_path.mkdir(exist_ok=True)
         
         file_handler = logging.handlers.RotatingFileHandler(
-            log_dir / f"{name}.log",
+            log_path / f"{name}.log",
             maxBytes=10 * 1024 * 1024,  # 10MB
             backupCount=5
         )
         file_handler.setFormatter(json_formatter)
-        self.logger.addHandler(file_handler)
+        self.output_handlers = [console_handler, file_handler]
+        
+        previous = _active_loggers.get(name)
+        if previous is not None:
+            previous.stop()
+        self.logger.handlers.clear()
+        
+        self.queue_handler = None
+        self.listener = None
+        if async_mode:
+            self.queue = queue.Queue(maxsize=max(queue_size, 0))
+            self.queue_handler = _DeferredQueueHandler(self.queue)
+            self.logger.addHandler(self.queue_handler)
+            self.listener = logging.handlers.QueueListener(
+                self.queue, *self.output_handlers, respect_handler_level=True
+            )
+            self.listener.start()
+            _active_loggers[name] = self
+        else:
+            for handler in self.output_handlers:
+                self.logger.addHandler(handler)
         
         # Sentry統合
         if SENTRY_AVAILABLE and os.getenv("SENTRY_DSN"):
@@ -185,19 +290,64 @@ class StructuredLogger:
                 environment=os.getenv("ENVIRONMENT", "development")
             )
     
+    @property
+    def dropped(self) -> int:
+        """キューが溢れて破棄したログ件数"""
+        return self.queue_handler.dropped if self.queue_handler is not None else 0
+    
+    def flush(self):
+        """キューに溜まったログを書き出すまで待機"""
+        if self.listener is not None:
+            self.queue.join()
+        self._flush_handlers()
+    
+    def stop(self):
+        """
+        リスナースレッドを停止
+        
+        キューに残ったログを書き出した後、以降のログは同期的に書き込む。
+        """
+        if self.listener is None:
+            return
+        if _active_loggers.get(self.name) is self:
+            del _active_loggers[self.name]
+        
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.output_handlers:
+            self.logger.addHandler(handler)
+        # 停止用の番兵を確実に投入できるよう、先にキューを空にする
+        self.queue.join()
+        self.listener.stop()
+        self.listener = None
+        self._flush_handlers()
+    
+    def _flush_handlers(self):
+        """出力ハンドラーをフラッシュ（終了処理中に閉じられた出力先は無視する）"""
+        for handler in self.output_handlers:
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                pass
+    
+    def _sampled(self, category: str) -> bool:
+        """サンプリング対象のログを記録するか判定"""
+        rate = self.sample_rates.get(category, 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+    
     def _add_context(self, extra: Dict[str, Any]) -> Dict[str, Any]:
         """コンテキスト情報追加"""
-        context = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'environment': os.getenv('ENVIRONMENT', 'development'),
-            'service': 'ai-hit-prediction',
-            'version': os.getenv('APP_VERSION', '1.0.0')
-        }
+        context = {'timestamp': datetime.utcnow().isoformat()}
+        context.update(self.static_context)
         context.update(extra)
         return context
     
     def debug(self, message: str, **kwargs):
-        """デバッグログ"""
+        """デバッグログ（無効なレベルやサンプリング対象外ではコンテキストを作成しない）"""
+        if not self.logger.isEnabledFor(logging.DEBUG) or not self._sampled('debug'):
+            return
         self.logger.debug(message, extra=self._add_context(kwargs))
     
     def info(self, message: str, **kwargs):
@@ -250,9 +400,12 @@ class StructuredLogger:
     
     def log_prediction(self, model_type: str, input_data: Dict,
                       prediction: Any, confidence: float, duration: float):
-        """予測ログ"""
+        """予測ログ（LOG_SAMPLE_PREDICTION の割合で記録）"""
+        if not self._sampled('prediction'):
+            return
         self.info(
             "Prediction completed",
+            sample_rate=self.sample_rates.get('prediction', 1.0),
             model_type=model_type,
             input_features=len(input_data),
             prediction=prediction,
@@ -338,10 +491,16 @@ class AuditLogger:
 class PerformanceMonitor:
     """パフォーマンス監視クラス"""
     
-    def __init__(self):
-        """初期化"""
+    def __init__(self, metrics: Optional[MetricsCollector] = None):
+        """
+        初期化
+        
+        Args:
+            metrics: 共有するメトリクスコレクター
+        """
         self.logger = StructuredLogger("performance", "INFO")
-        self.metrics = MetricsCollector()
+        # Prometheusのメトリクスはプロセス内で一度だけ登録できる
+        self.metrics = metrics or MetricsCollector()
         self.thresholds = {
             'api_response_time': 1.0,  # 1秒
             'prediction_time': 2.0,    # 2秒
@@ -422,11 +581,20 @@ class PerformanceMonitor:
             self.metrics.set_model_accuracy(model_type, metrics.get('accuracy', 0))
 
 
+def _stop_async_loggers():
+    """終了時にキューに残ったログを書き出す"""
+    for structured_logger in list(_active_loggers.values()):
+        structured_logger.stop()
+
+
+atexit.register(_stop_async_loggers)
+
+
 # グローバルインスタンス
 logger = StructuredLogger("ai-hit-prediction")
 audit_logger = AuditLogger()
-performance_monitor = PerformanceMonitor()
 metrics_collector = MetricsCollector()
+performance_monitor = PerformanceMonitor(metrics_collector)
 
 # コンテキストマネージャー
 class LogContext:
@@ -1,4 +1,17 @@
 # Multimodal Analysis Module
-from .image_analyzer import ImageAnalyzer, MultimodalAnalyzer
+# 公開クラスは初回参照時に読み込む（サブモジュールだけを使う場合の起動を軽くする）
+import importlib
 
-__all__ = ['ImageAnalyzer', 'MultimodalAnalyzer']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'ImageAnalyzer': '.image_analyzer',
+    'MultimodalAnalyzer': '.image_analyzer',
+}
+
+__all__ = ['ImageAnalyzer', 'MultimodalAnalyzer']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
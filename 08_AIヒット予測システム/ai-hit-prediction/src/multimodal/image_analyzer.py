@@ -14,20 +14,18 @@ import logging
 from pathlib import Path
 import json
 from datetime import datetime
+import sys
 
-# 画像処理とML
-try:
-    import torch
-    import torchvision.transforms as transforms
-    from transformers import (
-        CLIPProcessor, 
-        CLIPModel,
-        BlipProcessor,
-        BlipForConditionalGeneration
-    )
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import, is_available
+
+# 画像処理とML（torch/transformersは初回のモデル初期化時に読み込む）
+torch = lazy_import('torch')
+transformers = lazy_import('transformers')
+TRANSFORMERS_AVAILABLE = is_available('torch') and is_available('transformers')
+if not TRANSFORMERS_AVAILABLE:
     logging.warning("Transformers library not available. Using mock implementation.")
 
 # ロギング設定
@@ -48,7 +46,9 @@ class ImageAnalyzer:
         self.model_type = model_type if TRANSFORMERS_AVAILABLE else 'mock'
         self.model = None
         self.processor = None
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu' if TRANSFORMERS_AVAILABLE else 'mock'
+        self.device = 'mock'
+        if self.model_type != 'mock':
+            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         
         self._initialize_model()
     
@@ -56,8 +56,9 @@ class ImageAnalyzer:
         """モデルの初期化"""
         if self.model_type == 'clip' and TRANSFORMERS_AVAILABLE:
             try:
-                self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-                self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+                clip_name = "openai/clip-vit-base-patch32"
+                self.processor = transformers.CLIPProcessor.from_pretrained(clip_name)
+                self.model = transformers.CLIPModel.from_pretrained(clip_name)
                 if self.device != 'mock':
                     self.model.to(self.device)
                 logger.info("CLIP model loaded successfully")
@@ -67,8 +68,9 @@ class ImageAnalyzer:
         
         elif self.model_type == 'blip' and TRANSFORMERS_AVAILABLE:
             try:
-                self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-                self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+                blip_name = "Salesforce/blip-image-captioning-base"
+                self.processor = transformers.BlipProcessor.from_pretrained(blip_name)
+                self.model = transformers.BlipForConditionalGeneration.from_pretrained(blip_name)
                 if self.device != 'mock':
                     self.model.to(self.device)
                 logger.info("BLIP model loaded successfully")
@@ -1,4 +1,17 @@
 # Optimization Module
-from .hyperparameter_optimizer import HyperparameterOptimizer, AutoML
+# 公開クラスは初回参照時に読み込む（サブモジュールだけを使う場合の起動を軽くする）
+import importlib
 
-__all__ = ['HyperparameterOptimizer', 'AutoML']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'HyperparameterOptimizer': '.hyperparameter_optimizer',
+    'AutoML': '.hyperparameter_optimizer',
+}
+
+__all__ = ['HyperparameterOptimizer', 'AutoML']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,22 +4,29 @@ Hyperparameter Optimization Module
 Optunaを使用したベイズ最適化によるハイパーパラメータチューニング
 """
 
-import optuna
 import numpy as np
 import pandas as pd
 from typing import Dict, Any, Optional, Tuple, List
-from sklearn.model_selection import cross_val_score, StratifiedKFold
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-import xgboost as xgb
-import lightgbm as lgb
 import joblib
 import json
 import logging
+import os
+import sys
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.lazy_imports import lazy_import
+from src.optimization.parallel_study import CVObjective, ParallelStudyRunner, build_model
+from src.optimization.study_store import StudyStore
+
+# Optunaは最適化の実行時に読み込む
+optuna = lazy_import('optuna')
+
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,20 +35,45 @@ logger = logging.getLogger(__name__)
 class HyperparameterOptimizer:
     """ハイパーパラメータ最適化クラス"""
     
-    def __init__(self, model_type: str = 'random_forest', n_trials: int = 100):
+    def __init__(self, model_type: str = 'random_forest', n_trials: int = 100,
+                 n_workers: Optional[int] = 1, pruner: Optional[str] = 'median',
+                 storage: Optional[str] = None, cpu_limit: Optional[int] = None,
+                 persist: Optional[bool] = None, warm_start_top_k: int = 5,
+                 history_dir: Optional[str] = '.'):
         """
         初期化
         
         Args:
             model_type: モデルの種類 ('random_forest', 'xgboost', 'lightgbm')
             n_trials: Optunaの試行回数
+            n_workers: 試行を並列に実行するワーカープロセス数
+                （既定は1で同じプロセス内で逐次実行、None の場合はCPU予算と同じ数のプロセス）
+            pruner: 枝刈りの方法 ('median', 'hyperband', None)
+            storage: study のストレージ（'sqlite:///...' またはジャーナルファイルのパス、
+                省略時は環境変数 HPO_STORAGE）
+            cpu_limit: 探索に使うCPU数の上限（ワーカー数 × 試行ごとのスレッド数）
+            persist: study を永続化し、同じデータでは再開・新しいデータでは過去の上位パラメータから始める
+                （省略時は storage または環境変数 HPO_STORAGE が指定されている場合のみ）
+            warm_start_top_k: 新しい study に投入する過去の上位パラメータの数
+            history_dir: 最適化履歴のJSONの保存先ディレクトリ（Noneの場合は保存しない）
         """
         self.model_type = model_type
         self.n_trials = n_trials
+        self.history_dir = history_dir
+        if persist is None:
+            persist = bool(storage or os.getenv('HPO_STORAGE'))
+        self.study_store = StudyStore(storage, top_k=warm_start_top_k) if persist else None
+        self.runner = ParallelStudyRunner(
+            n_workers=n_workers,
+            storage=self.study_store.storage if self.study_store else storage,
+            pruner=pruner,
+            cpu_limit=cpu_limit
+        )
         self.study = None
         self.best_params = None
         self.best_model = None
         self.optimization_history = []
+        self.search_summary = None
         
     def create_objective(self, X: pd.DataFrame, y: np.ndarray, cv_folds: int = 5):
         """
@@ -53,83 +85,29 @@ class HyperparameterOptimizer:
             cv_folds: クロスバリデーションのfold数
         
         Returns:
-            目的関数
-        """
-        def objective(trial):
-            # モデルタイプに応じたパラメータ空間定義
-            if self.model_type == 'random_forest':
-                params = {
-                    'n_estimators': trial.suggest_int('n_estimators', 50, 500),
-                    'max_depth': trial.suggest_int('max_depth', 3, 30),
-                    'min_samples_split': trial.suggest_int('min_samples_split', 2, 20),
-                    'min_samples_leaf': trial.suggest_int('min_samples_leaf', 1, 10),
-                    'max_features': trial.suggest_categorical('max_features', ['sqrt', 'log2', None]),
-                    'bootstrap': trial.suggest_categorical('bootstrap', [True, False]),
-                    'class_weight': trial.suggest_categorical('class_weight', ['balanced', None])
-                }
-                model = RandomForestClassifier(**params, random_state=42, n_jobs=-1)
-                
-            elif self.model_type == 'xgboost':
-                params = {
-                    'n_estimators': trial.suggest_int('n_estimators', 50, 500),
-                    'max_depth': trial.suggest_int('max_depth', 3, 15),
-                    'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
-                    'subsample': trial.suggest_float('subsample', 0.6, 1.0),
-                    'colsample_bytree': trial.suggest_float('colsample_bytree', 0.6, 1.0),
-                    'gamma': trial.suggest_float('gamma', 0, 5),
-                    'reg_alpha': trial.suggest_float('reg_alpha', 0, 2),
-                    'reg_lambda': trial.suggest_float('reg_lambda', 0, 2),
-                }
-                model = xgb.XGBClassifier(
-                    **params,
-                    objective='binary:logistic',
-                    eval_metric='logloss',
-                    random_state=42,
-                    n_jobs=-1
-                )
-                
-            elif self.model_type == 'lightgbm':
-                params = {
-                    'n_estimators': trial.suggest_int('n_estimators', 50, 500),
-                    'num_leaves': trial.suggest_int('num_leaves', 10, 200),
-                    'max_depth': trial.suggest_int('max_depth', 3, 15),
-                    'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
-                    'feature_fraction': trial.suggest_float('feature_fraction', 0.5, 1.0),
-                    'bagging_fraction': trial.suggest_float('bagging_fraction', 0.5, 1.0),
-                    'bagging_freq': trial.suggest_int('bagging_freq', 1, 10),
-                    'lambda_l1': trial.suggest_float('lambda_l1', 0, 2),
-                    'lambda_l2': trial.suggest_float('lambda_l2', 0, 2),
-                }
-                model = lgb.LGBMClassifier(
-                    **params,
-                    objective='binary',
-                    metric='binary_logloss',
-                    random_state=42,
-                    n_jobs=-1,
-                    verbose=-1
-                )
-            else:
-                raise ValueError(f"Unsupported model type: {self.model_type}")
-            
-            # クロスバリデーションで評価
-            cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
-            scores = cross_val_score(model, X, y, cv=cv, scoring='f1', n_jobs=-1)
-            
-            # 平均F1スコアを返す（最大化）
-            return scores.mean()
-        
-        return objective
+            目的関数（フォールドごとに中間値を報告する）
+        """
+        return CVObjective(self.model_type, X, y, cv_folds=cv_folds, n_jobs=self.runner.plan()[1])
     
     def optimize(self, X_train: pd.DataFrame, y_train: np.ndarray, 
-                X_val: Optional[pd.DataFrame] = None, y_val: Optional[np.ndarray] = None) -> Dict:
+                X_val: Optional[pd.DataFrame] = None, y_val: Optional[np.ndarray] = None,
+                cv_folds: int = 5, initial_params: Optional[List[Dict[str, Any]]] = None,
+                refit: bool = True) -> Dict:
         """
         ハイパーパラメータ最適化を実行
         
+        永続化する場合、同じモデルタイプ・特徴量・データの study が既にあれば
+        n_trials に達するまでの残りだけを実行する。
+        
         Args:
             X_train: 訓練データの特徴量
             y_train: 訓練データのターゲット
             X_val: 検証データの特徴量（オプション）
             y_val: 検証データのターゲット（オプション）
+            cv_folds: クロスバリデーションのfold数
+            initial_params: 新しい study で最初に試すパラメータ（低コストの探索の上位など）
+            refit: 最良パラメータで訓練データ全体を学習し直すか（パラメータだけが必要な場合はFalse。
+                その場合 best_model は作らず、検証データでの評価も行わない）
         
         Returns:
             最適化結果
@@ -137,21 +115,37 @@ class HyperparameterOptimizer:
         logger.info(f"Starting hyperparameter optimization for {self.model_type}")
         logger.info(f"Training data shape: {X_train.shape}")
         
-        # Optuna Studyの作成
-        self.study = optuna.create_study(
-            direction='maximize',
-            study_name=f'{self.model_type}_optimization_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
-        )
-        
         # 目的関数の作成
-        objective = self.create_objective(X_train, y_train)
-        
-        # 最適化実行
-        self.study.optimize(
-            objective, 
-            n_trials=self.n_trials,
-            callbacks=[self._optimization_callback]
+        objective = self.create_objective(X_train, y_train, cv_folds=cv_folds)
+        
+        # 永続化した study の再開、または過去の上位パラメータによるウォームスタート
+        n_trials = self.n_trials
+        warm_started = 0
+        if self.study_store is not None:
+            study_name = self.study_store.study_name(self.model_type, X_train, y_train)
+            study = self.runner.create_study(study_name, n_folds=cv_folds)
+            if initial_params and not study.trials:
+                for params in initial_params:
+                    study.enqueue_trial(params, skip_if_exists=True)
+            warm_started = self.study_store.warm_start(study, self.model_type, X_train)
+            n_trials = self.study_store.remaining_trials(study, self.n_trials)
+            if n_trials < self.n_trials:
+                logger.info(f"Resuming study {study_name}: "
+                            f"{n_trials} of {self.n_trials} trials remaining")
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            study_name = f'{self.model_type}_optimization_{timestamp}'
+        
+        # 最適化実行（複数ワーカーの場合は共有ストレージ上で並列に実行）
+        self.study, self.search_summary = self.runner.run(
+            study_name,
+            objective,
+            n_trials=n_trials,
+            n_folds=cv_folds,
+            callbacks=[self._optimization_callback],
+            enqueue=initial_params
         )
+        self.optimization_history = self._collect_history()
         
         # 最良パラメータ取得
         self.best_params = self.study.best_params
@@ -159,23 +153,29 @@ class HyperparameterOptimizer:
         logger.info(f"Best F1 score: {self.study.best_value:.4f}")
         
         # 最良モデルの訓練
-        self.best_model = self._train_best_model(X_train, y_train)
+        if refit:
+            self.best_model = self._train_best_model(X_train, y_train)
         
         # 検証データでの評価
         results = {
             'best_params': self.best_params,
             'best_cv_score': self.study.best_value,
             'n_trials': len(self.study.trials),
+            'n_pruned': self.search_summary.pruned,
+            'n_warm_started': warm_started,
+            'study_name': self.study.study_name,
+            'search': self.search_summary.to_dict(),
             'model_type': self.model_type
         }
         
-        if X_val is not None and y_val is not None:
+        if refit and X_val is not None and y_val is not None:
             val_metrics = self._evaluate_model(self.best_model, X_val, y_val)
             results['validation_metrics'] = val_metrics
             logger.info(f"Validation metrics: {val_metrics}")
         
         # 最適化履歴の保存
-        self._save_optimization_history()
+        if self.history_dir is not None:
+            self._save_optimization_history()
         
         return results
     
@@ -190,28 +190,7 @@ class HyperparameterOptimizer:
         Returns:
             訓練済みモデル
         """
-        if self.model_type == 'random_forest':
-            model = RandomForestClassifier(**self.best_params, random_state=42, n_jobs=-1)
-        elif self.model_type == 'xgboost':
-            model = xgb.XGBClassifier(
-                **self.best_params,
-                objective='binary:logistic',
-                eval_metric='logloss',
-                random_state=42,
-                n_jobs=-1
-            )
-        elif self.model_type == 'lightgbm':
-            model = lgb.LGBMClassifier(
-                **self.best_params,
-                objective='binary',
-                metric='binary_logloss',
-                random_state=42,
-                n_jobs=-1,
-                verbose=-1
-            )
-        else:
-            raise ValueError(f"Unsupported model type: {self.model_type}")
-        
+        model = build_model(self.model_type, self.best_params)
         model.fit(X, y)
         return model
     
@@ -244,20 +223,40 @@ class HyperparameterOptimizer:
             study: Optunaのstudyオブジェクト
             trial: 現在のtrial
         """
-        self.optimization_history.append({
+        if trial.number % 10 == 0 and trial.value is not None:
+            logger.info(f"Trial {trial.number}: F1={trial.value:.4f}")
+    
+    def _collect_history(self) -> List[Dict]:
+        """study の全試行（他のワーカーの試行・枝刈りされた試行を含む）から履歴を作成"""
+        return [{
             'trial': trial.number,
             'value': trial.value,
+            'state': trial.state.name,
             'params': trial.params,
-            'datetime': datetime.now().isoformat()
-        })
+            'intermediate_values': trial.intermediate_values,
+            'datetime': trial.datetime_complete.isoformat() if trial.datetime_complete else None
+        } for trial in self.study.trials]
+    
+    def export_history(self, filepath: str) -> str:
+        """
+        最適化履歴を書き出す（.csv なら試行ごとの表、それ以外は JSON）
         
-        if trial.number % 10 == 0:
-            logger.info(f"Trial {trial.number}: F1={trial.value:.4f}")
+        Args:
+            filepath: 保存先パス
+        
+        Returns:
+            保存したファイルパス
+        """
+        if self.study is None:
+            raise ValueError("No study available. Run optimize() first.")
+        return StudyStore.export_history(self.study, filepath)
     
     def _save_optimization_history(self):
         """最適化履歴を保存"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"optimization_history_{self.model_type}_{timestamp}.json"
+        os.makedirs(self.history_dir, exist_ok=True)
+        filename = os.path.join(self.history_dir,
+                                f"optimization_history_{self.model_type}_{timestamp}.json")
         
         with open(filename, 'w') as f:
             json.dump({
@@ -291,10 +290,17 @@ class HyperparameterOptimizer:
         for model_type in model_types:
             logger.info(f"\nOptimizing {model_type}...")
             
-            # 新しいオプティマイザインスタンス作成
+            # 新しいオプティマイザインスタンス作成（並列・枝刈りの設定を引き継ぐ）
             optimizer = HyperparameterOptimizer(
                 model_type=model_type,
-                n_trials=self.n_trials
+                n_trials=self.n_trials,
+                n_workers=self.runner.n_workers,
+                pruner=self.runner.pruner,
+                storage=self.runner.storage,
+                cpu_limit=self.runner.cpu_limit,
+                persist=self.study_store is not None,
+                warm_start_top_k=self.study_store.top_k if self.study_store else 0,
+                history_dir=self.history_dir
             )
             
             # 最適化実行
@@ -308,7 +314,9 @@ class HyperparameterOptimizer:
                 'val_precision': opt_results['validation_metrics']['precision'],
                 'val_recall': opt_results['validation_metrics']['recall'],
                 'val_f1': opt_results['validation_metrics']['f1'],
-                'n_trials': opt_results['n_trials']
+                'n_trials': opt_results['n_trials'],
+                'n_pruned': opt_results['n_pruned'],
+                'search_seconds': opt_results['search']['wall_time']
             })
         
         # DataFrameに変換
@@ -447,14 +455,38 @@ class HyperparameterOptimizer:
 class AutoML:
     """自動機械学習クラス"""
     
-    def __init__(self, n_trials: int = 50):
+    def __init__(self, n_trials: int = 50, n_workers: Optional[int] = 1,
+                 pruner: Optional[str] = 'median', storage: Optional[str] = None,
+                 cpu_limit: Optional[int] = None, persist: Optional[bool] = None,
+                 warm_start_top_k: int = 5, strategy: str = 'successive_halving'):
         """
         初期化
         
         Args:
             n_trials: 各モデルの試行回数
+            n_workers: 試行を並列に実行するワーカープロセス数
+                （既定は1で同じプロセス内で逐次実行、None の場合はCPU予算と同じ数のプロセス）
+            pruner: 枝刈りの方法 ('median', 'hyperband', None)
+            storage: study のストレージ（'sqlite:///...' またはジャーナルファイルのパス）
+            cpu_limit: 探索に使うCPU数の上限
+            persist: study を永続化する（最良モデルの再探索は比較時の study の続きから行う。
+                省略時は storage または環境変数 HPO_STORAGE が指定されている場合のみ）
+            warm_start_top_k: 新しい study に投入する過去の上位パラメータの数
+            strategy: モデルの種類の選び方
+                ('successive_halving': 低コストのラウンドで絞り込む / 'full': 全種類を全データで探索)
         """
+        if strategy not in ('successive_halving', 'full'):
+            raise ValueError(f"Unsupported AutoML strategy: {strategy}")
         self.n_trials = n_trials
+        self.strategy = strategy
+        self.search_options = {
+            'n_workers': n_workers,
+            'pruner': pruner,
+            'storage': storage,
+            'cpu_limit': cpu_limit,
+            'persist': persist,
+            'warm_start_top_k': warm_start_top_k
+        }
         self.best_model = None
         self.best_model_type = None
         self.results = None
@@ -475,8 +507,11 @@ class AutoML:
         """
         logger.info("Starting AutoML process...")
         
+        if self.strategy == 'successive_halving':
+            return self._fit_successive_halving(X_train, y_train, X_val, y_val)
+        
         # 複数モデルの比較
-        optimizer = HyperparameterOptimizer(n_trials=self.n_trials)
+        optimizer = HyperparameterOptimizer(n_trials=self.n_trials, **self.search_options)
         comparison_df = optimizer.compare_models(X_train, y_train, X_val, y_val)
         
         # 最良モデルの選択
@@ -487,7 +522,8 @@ class AutoML:
         logger.info(f"\nRetraining best model ({self.best_model_type}) with more trials...")
         final_optimizer = HyperparameterOptimizer(
             model_type=self.best_model_type,
-            n_trials=self.n_trials * 2  # より詳細な最適化
+            n_trials=self.n_trials * 2,  # より詳細な最適化
+            **self.search_options
         )
         
         final_results = final_optimizer.optimize(X_train, y_train, X_val, y_val)
@@ -506,6 +542,49 @@ class AutoML:
         
         return self.results
     
+    def _fit_successive_halving(self, X_train: pd.DataFrame, y_train: np.ndarray,
+                                X_val: pd.DataFrame, y_val: np.ndarray) -> Dict:
+        """
+        低コストのラウンドでモデルの種類を絞り込み、残った種類だけを全データで探索
+        
+        Args:
+            X_train: 訓練データの特徴量
+            y_train: 訓練データのターゲット
+            X_val: 検証データの特徴量
+            y_val: 検証データのターゲット
+        
+        Returns:
+            最適化結果（comparison は種類ごとの指標、halving は種類ごとの計算量）
+        """
+        from src.optimization.successive_halving import SuccessiveHalvingScheduler
+        
+        scheduler = SuccessiveHalvingScheduler(n_trials=self.n_trials, **self.search_options)
+        schedule_results = scheduler.fit(X_train, y_train, X_val, y_val)
+        final_results = schedule_results['final_results']
+        
+        self.best_model_type = schedule_results['best_model_type']
+        self.best_model = scheduler.best_model
+        compute_df = scheduler.compute_frame()
+        comparison_df = scheduler.comparison_frame(final_results)
+        
+        self.results = {
+            'comparison': comparison_df.to_dict(),
+            'halving': compute_df.to_dict(),
+            'best_model_type': self.best_model_type,
+            'best_model_params': final_results['best_params'],
+            'best_model_metrics': final_results['validation_metrics'],
+            'rungs': schedule_results['rungs'],
+            'compute': schedule_results['compute'],
+            'wall_time': schedule_results['wall_time']
+        }
+        
+        logger.info("\nCompute per model family:")
+        logger.info(compute_df.to_string())
+        logger.info(f"\nAutoML completed. Best model: {self.best_model_type}")
+        logger.info(f"Best validation F1 score: {final_results['validation_metrics']['f1']:.4f}")
+        
+        return self.results
+    
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         """
         予測を実行
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+"""
+Parallel Study Runner
+Optunaのstudyを共有ストレージ（ジャーナルファイル / SQLite）上で複数のワーカープロセスから実行し、
+フォールドごとの中間値で見込みの無い試行を打ち切る
+"""
+
+import logging
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import
+from src.ml.retraining_worker import limit_worker_resources
+from src.models.ensemble_training import cpu_budget
+
+# Optuna・XGBoost・LightGBMは試行の実行時に読み込む
+optuna = lazy_import('optuna')
+xgb = lazy_import('xgboost')
+lgb = lazy_import('lightgbm')
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPES = ('random_forest', 'xgboost', 'lightgbm')
+PRUNERS = ('median', 'hyperband', None)
+
+
+def suggest_params(trial, model_type: str) -> Dict[str, Any]:
+    """
+    モデルタイプごとのパラメータ空間から値を選ぶ
+
+    Args:
+        trial: Optunaのtrial
+        model_type: モデルの種類 ('random_forest', 'xgboost', 'lightgbm')
+
+    Returns:
+        パラメータ
+    """
+    if model_type == 'random_forest':
+        return {
+            'n_estimators': trial.suggest_int('n_estimators', 50, 500),
+            'max_depth': trial.suggest_int('max_depth', 3, 30),
+            'min_samples_split': trial.suggest_int('min_samples_split', 2, 20),
+            'min_samples_leaf': trial.suggest_int('min_samples_leaf', 1, 10),
+            'max_features': trial.suggest_categorical('max_features', ['sqrt', 'log2', None]),
+            'bootstrap': trial.suggest_categorical('bootstrap', [True, False]),
+            'class_weight': trial.suggest_categorical('class_weight', ['balanced', None])
+        }
+    if model_type == 'xgboost':
+        return {
+            'n_estimators': trial.suggest_int('n_estimators', 50, 500),
+            'max_depth': trial.suggest_int('max_depth', 3, 15),
+            'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
+            'subsample': trial.suggest_float('subsample', 0.6, 1.0),
+            'colsample_bytree': trial.suggest_float('colsample_bytree', 0.6, 1.0),
+            'gamma': trial.suggest_float('gamma', 0, 5),
+            'reg_alpha': trial.suggest_float('reg_alpha', 0, 2),
+            'reg_lambda': trial.suggest_float('reg_lambda', 0, 2),
+        }
+    if model_type == 'lightgbm':
+        return {
+            'n_estimators': trial.suggest_int('n_estimators', 50, 500),
+            'num_leaves': trial.suggest_int('num_leaves', 10, 200),
+            'max_depth': trial.suggest_int('max_depth', 3, 15),
+            'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
+            'feature_fraction': trial.suggest_float('feature_fraction', 0.5, 1.0),
+            'bagging_fraction': trial.suggest_float('bagging_fraction', 0.5, 1.0),
+            'bagging_freq': trial.suggest_int('bagging_freq', 1, 10),
+            'lambda_l1': trial.suggest_float('lambda_l1', 0, 2),
+            'lambda_l2': trial.suggest_float('lambda_l2', 0, 2),
+        }
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def build_model(model_type: str, params: Dict[str, Any], n_jobs: int = -1):
+    """
+    パラメータからモデルを作成
+
+    Args:
+        model_type: モデルの種類
+        params: ハイパーパラメータ
+        n_jobs: モデルが使うスレッド数
+
+    Returns:
+        未学習のモデル
+    """
+    if model_type == 'random_forest':
+        return RandomForestClassifier(**params, random_state=42, n_jobs=n_jobs)
+    if model_type == 'xgboost':
+        return xgb.XGBClassifier(
+            **params,
+            objective='binary:logistic',
+            eval_metric='logloss',
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if model_type == 'lightgbm':
+        return lgb.LGBMClassifier(
+            **params,
+            objective='binary',
+            metric='binary_logloss',
+            random_state=42,
+            n_jobs=n_jobs,
+            verbose=-1
+        )
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def create_pruner(pruner: Optional[str], n_folds: int = 5):
+    """
+    枝刈りの方法を作成
+
+    Args:
+        pruner: 'median'（同じフォールドまでの中央値を下回れば打ち切り）/ 'hyperband' / None
+        n_folds: 中間値の最大ステップ数（フォールド数）
+    """
+    if pruner == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=0)
+    if pruner == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=n_folds,
+                                              reduction_factor=3)
+    if pruner is None:
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unsupported pruner: {pruner}")
+
+
+def create_storage(storage: Optional[str]):
+    """
+    ストレージを作成
+
+    Args:
+        storage: 'sqlite:///...' などのURL、ジャーナルファイルのパス、または None（メモリ上）
+    """
+    if storage is None:
+        return None
+    if '://' in storage:
+        return storage
+    from optuna.storages import JournalStorage
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:  # Optuna 3.x
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+    return JournalStorage(JournalFileBackend(storage))
+
+
+class CVObjective:
+    """
+    交差検証の目的関数
+
+    フォールドごとに F1 の累積平均を中間値として報告し、枝刈りされた試行は残りのフォールドを学習しない。
+    ワーカープロセスには pickle で渡すためクラスにしている。
+    """
+
+    def __init__(self, model_type: str, X: pd.DataFrame, y: np.ndarray,
+                 cv_folds: int = 5, n_jobs: int = -1, random_state: int = 42,
+                 estimator_scale: float = 1.0):
+        """
+        初期化
+
+        Args:
+            model_type: モデルの種類
+            X: 特徴量データ
+            y: ターゲット
+            cv_folds: クロスバリデーションのfold数
+            n_jobs: 試行ごとのスレッド数
+            random_state: フォールド分割の乱数シード
+            estimator_scale: 学習時に n_estimators に掛ける係数（低コストの評価に使う。
+                study には元の値を記録するため、そのまま全データの探索に引き継げる）
+        """
+        self.model_type = model_type
+        self.estimator_scale = estimator_scale
+        self.X = X
+        self.y = np.asarray(y)
+        self.cv_folds = cv_folds
+        self.n_jobs = n_jobs
+        cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=random_state)
+        self.folds = list(cv.split(X, self.y))
+
+    def __call__(self, trial) -> float:
+        params = suggest_params(trial, self.model_type)
+        # 低コストの評価のスコアは全データの評価と比べられないため、フィデリティを試行に記録する
+        trial.set_user_attr('estimator_scale', self.estimator_scale)
+        if self.estimator_scale != 1.0:
+            scaled = int(round(params['n_estimators'] * self.estimator_scale))
+            params['n_estimators'] = max(10, scaled)
+        scores = []
+
+        for step, (train_idx, val_idx) in enumerate(self.folds):
+            model = build_model(self.model_type, params, n_jobs=self.n_jobs)
+            model.fit(self.X.iloc[train_idx], self.y[train_idx])
+            scores.append(f1_score(self.y[val_idx], model.predict(self.X.iloc[val_idx])))
+
+            trial.report(float(np.mean(scores)), step)
+            if trial.should_prune():
+                trial.set_user_attr('folds_evaluated', len(scores))
+                raise optuna.TrialPruned()
+
+        trial.set_user_attr('folds_evaluated', len(scores))
+
+        # 平均F1スコアを返す（最大化）
+        return float(np.mean(scores))
+
+
+# ---------------------------------------------------------------------------
+# ワーカープロセス側の処理（spawnで起動するためモジュールレベルの関数にする）
+# ---------------------------------------------------------------------------
+
+def _run_study_worker(study_name: str, storage: str, pruner: Optional[str], n_folds: int,
+                      objective: Callable, n_trials: int, threads: int, seed: int) -> int:
+    """ワーカープロセスで共有ストレージ上の study に n_trials 回の試行を追加"""
+    limit_worker_resources(0, None, threads)
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=create_storage(storage),
+        sampler=optuna.samplers.TPESampler(seed=seed),
+        pruner=create_pruner(pruner, n_folds)
+    )
+    study.optimize(objective, n_trials=n_trials)
+    return n_trials
+
+
+@dataclass
+class StudyRunSummary:
+    """study の実行結果"""
+    n_trials: int
+    completed: int
+    pruned: int
+    failed: int
+    workers: int
+    threads_per_trial: int
+    wall_time: float
+    folds_evaluated: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class ParallelStudyRunner:
+    """
+    Optunaのstudyを複数プロセスで実行するランナー
+
+    ワーカーは共有ストレージ上の同じ study から試行を取り出すため、サンプラーは
+    他のワーカーの結果も参照する。CPU予算をワーカー数で割った値を試行ごとのスレッド数とする。
+    """
+
+    def __init__(self, n_workers: Optional[int] = None, storage: Optional[str] = None,
+                 pruner: Optional[str] = 'median', cpu_limit: Optional[int] = None,
+                 random_state: int = 42):
+        """
+        初期化
+
+        Args:
+            n_workers: ワーカープロセス数（省略時はCPU予算と同じ）
+            storage: 'sqlite:///...' またはジャーナルファイルのパス
+                （省略時は1ワーカーならメモリ上、複数ワーカーなら一時ジャーナルファイル）
+            pruner: 'median' / 'hyperband' / None
+            cpu_limit: 探索に使うCPU数の上限
+            random_state: サンプラーの乱数シード（ワーカーごとにずらす）
+        """
+        if pruner not in PRUNERS:
+            raise ValueError(f"Unsupported pruner: {pruner}")
+        self.n_workers = n_workers
+        self.storage = storage
+        self.pruner = pruner
+        self.cpu_limit = cpu_limit
+        self.random_state = random_state
+
+    def plan(self) -> Tuple[int, int]:
+        """(ワーカー数, 試行ごとのスレッド数)"""
+        budget = cpu_budget(self.cpu_limit)
+        workers = max(1, self.n_workers or budget)
+        return workers, max(1, budget // workers)
+
+    def create_study(self, study_name: str, n_folds: int = 5, direction: str = 'maximize',
+                     storage: Optional[str] = None):
+        """
+        study を作成（同名の study がストレージにあれば読み込む）
+
+        Args:
+            study_name: study名
+            n_folds: 中間値の最大ステップ数
+            direction: 最適化の方向
+            storage: ストレージ（省略時はランナーの設定）
+        """
+        return optuna.create_study(
+            study_name=study_name,
+            storage=create_storage(storage if storage is not None else self.storage),
+            direction=direction,
+            sampler=optuna.samplers.TPESampler(seed=self.random_state),
+            pruner=create_pruner(self.pruner, n_folds),
+            load_if_exists=True
+        )
+
+    @staticmethod
+    def _prepare(study, enqueue: Optional[List[Dict[str, Any]]]) -> set:
+        """新しい study にパラメータを投入し、実行前に終了済みの試行番号を返す"""
+        if enqueue and not study.trials:
+            for params in enqueue:
+                study.enqueue_trial(params, skip_if_exists=True)
+        return {trial.number for trial in study.trials
+                if trial.state != optuna.trial.TrialState.WAITING}
+
+    def run(self, study_name: str, objective: Callable, n_trials: int, n_folds: int = 5,
+            direction: str = 'maximize', callbacks: Optional[List[Callable]] = None,
+            enqueue: Optional[List[Dict[str, Any]]] = None):
+        """
+        study を実行
+
+        Args:
+            study_name: study名
+            objective: 目的関数（複数ワーカーの場合は pickle 可能であること）
+            n_trials: 試行回数（全ワーカーの合計）
+            n_folds: 中間値の最大ステップ数
+            direction: 最適化の方向
+            callbacks: 試行ごとのコールバック（1ワーカーの場合のみ）
+            enqueue: 新しい study で最初に試すパラメータ
+
+        Returns:
+            (study, StudyRunSummary)
+        """
+        workers, threads = self.plan()
+        workers = max(1, min(workers, n_trials))
+        if hasattr(objective, 'n_jobs'):
+            objective.n_jobs = threads
+        start = time.perf_counter()
+
+        if workers <= 1:
+            study = self.create_study(study_name, n_folds, direction)
+            finished_before = self._prepare(study, enqueue)
+            study.optimize(objective, n_trials=n_trials, callbacks=callbacks)
+        else:
+            temp_dir = None
+            storage = self.storage
+            if storage is None:
+                # 一時ジャーナルファイルで共有し、終了後にメモリ上へコピーする
+                temp_dir = tempfile.mkdtemp(prefix='optuna_')
+                storage = str(Path(temp_dir) / 'journal.log')
+            try:
+                study = self.create_study(study_name, n_folds, direction, storage=storage)
+                finished_before = self._prepare(study, enqueue)
+                shares = [n_trials // workers + (i < n_trials % workers) for i in range(workers)]
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    futures = [
+                        executor.submit(_run_study_worker, study_name, storage, self.pruner,
+                                        n_folds, objective, share, threads,
+                                        self.random_state + i + 1)
+                        for i, share in enumerate(shares)
+                    ]
+                    for future in futures:
+                        future.result()
+
+                study = optuna.load_study(study_name=study_name, storage=create_storage(storage),
+                                          pruner=create_pruner(self.pruner, n_folds))
+                if temp_dir is not None:
+                    in_memory = optuna.storages.InMemoryStorage()
+                    optuna.copy_study(from_study_name=study_name,
+                                      from_storage=create_storage(storage),
+                                      to_storage=in_memory)
+                    study = optuna.load_study(study_name=study_name, storage=in_memory,
+                                              pruner=create_pruner(self.pruner, n_folds))
+            finally:
+                if temp_dir is not None:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+
+        # 事前に投入した試行（WAITING）も今回の試行として数える
+        new_trials = [trial for trial in study.trials if trial.number not in finished_before]
+        states = [trial.state for trial in new_trials]
+        summary = StudyRunSummary(
+            n_trials=len(new_trials),
+            completed=states.count(optuna.trial.TrialState.COMPLETE),
+            pruned=states.count(optuna.trial.TrialState.PRUNED),
+            failed=states.count(optuna.trial.TrialState.FAIL),
+            workers=workers,
+            threads_per_trial=threads,
+            wall_time=time.perf_counter() - start,
+            folds_evaluated=sum(trial.user_attrs.get('folds_evaluated', 0) for trial in new_trials)
+        )
+        logger.info(
+            f"Study {study_name}: {summary.n_trials} trials ({summary.pruned} pruned) in "
+            f"{summary.wall_time:.2f}s ({workers} workers x {threads} threads)"
+        )
+        return study, summary
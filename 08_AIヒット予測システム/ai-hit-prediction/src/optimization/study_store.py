@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Study Store
+ハイパーパラメータ探索の study を（モデルタイプ, 特徴量セット, データセット）のキーで永続化し、
+同じデータでの再実行は中断した続きから、新しいデータでは過去の上位パラメータから探索を始める
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import
+from src.models.oof_cache import dataset_fingerprint
+
+# Optunaは探索の実行時に読み込む
+optuna = lazy_import('optuna')
+
+logger = logging.getLogger(__name__)
+
+
+def feature_fingerprint(X: pd.DataFrame) -> str:
+    """
+    特徴量セットの指紋（列名と型のハッシュ、値は含めない）
+
+    Args:
+        X: 特徴量データ
+    """
+    payload = json.dumps([[str(c) for c in X.columns], [str(t) for t in X.dtypes]])
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+
+class StudyStore:
+    """
+    永続化された study の管理
+
+    study名は "<モデルタイプ>_<特徴量セット>_<データセット>"。同じ特徴量セットの過去の study は
+    データが変わっても良いパラメータの候補になるため、新しい study の最初の試行として投入する。
+    """
+
+    def __init__(self, storage: Optional[str] = None, top_k: int = 5, max_source_studies: int = 3):
+        """
+        初期化
+
+        Args:
+            storage: 'sqlite:///...' またはジャーナルファイルのパス（省略時は環境変数 HPO_STORAGE）
+            top_k: 新しい study に投入する過去の上位パラメータの数
+            max_source_studies: 上位パラメータを集める過去の study の数（新しい順）
+
+        Raises:
+            ValueError: storage も環境変数 HPO_STORAGE も指定されていない場合
+        """
+        self.storage = storage or os.getenv('HPO_STORAGE')
+        if not self.storage:
+            raise ValueError("A study storage is required: pass storage or set HPO_STORAGE")
+        self.top_k = top_k
+        self.max_source_studies = max_source_studies
+        self._prepare_location()
+
+    def _prepare_location(self):
+        """SQLite・ジャーナルファイルの保存先ディレクトリを作成"""
+        if self.storage.startswith('sqlite:///'):
+            path = Path(self.storage[len('sqlite:///'):])
+        elif '://' not in self.storage:
+            path = Path(self.storage)
+        else:
+            return
+        if str(path) != ':memory:':
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _storage(self):
+        from src.optimization.parallel_study import create_storage
+        return create_storage(self.storage)
+
+    @staticmethod
+    def family_name(model_type: str, X: pd.DataFrame) -> str:
+        """同じモデルタイプ・特徴量セットの study に共通する接頭辞"""
+        return f"{model_type}_{feature_fingerprint(X)}"
+
+    def study_name(self, model_type: str, X: pd.DataFrame, y: np.ndarray) -> str:
+        """
+        study名
+
+        Args:
+            model_type: モデルの種類
+            X: 特徴量データ
+            y: ターゲット
+        """
+        return f"{self.family_name(model_type, X)}_{dataset_fingerprint(X, y)}"
+
+    def list_studies(self, prefix: Optional[str] = None) -> pd.DataFrame:
+        """
+        保存されている study の一覧（新しい順）
+
+        Args:
+            prefix: study名の接頭辞で絞り込む
+
+        Returns:
+            study名・試行数・最良値・開始日時のDataFrame
+        """
+        rows = []
+        for summary in optuna.get_all_study_summaries(self._storage(), include_best_trial=True):
+            if prefix and not summary.study_name.startswith(prefix):
+                continue
+            rows.append({
+                'study_name': summary.study_name,
+                'n_trials': summary.n_trials,
+                'best_value': summary.best_trial.value if summary.best_trial else None,
+                'datetime_start': summary.datetime_start
+            })
+        frame = pd.DataFrame(rows,
+                             columns=['study_name', 'n_trials', 'best_value', 'datetime_start'])
+        frame = frame.sort_values('datetime_start', ascending=False, na_position='last')
+        return frame.reset_index(drop=True)
+
+    def top_params(self, model_type: str, X: pd.DataFrame, exclude: Optional[str] = None,
+                   k: Optional[int] = None, estimator_scale: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        同じモデルタイプ・特徴量セットの過去の study の上位パラメータ
+
+        スコアはフィデリティ（木の本数の係数）が同じ試行の間でのみ比較する。
+
+        Args:
+            model_type: モデルの種類
+            X: 特徴量データ
+            exclude: 除外する study名（現在の study）
+            k: 件数（省略時は top_k）
+            estimator_scale: 比較する試行のフィデリティ（記録の無い試行は 1.0 とみなす）
+
+        Returns:
+            スコアの高い順のパラメータ（重複なし）
+        """
+        k = self.top_k if k is None else k
+        studies = self.list_studies(prefix=f"{self.family_name(model_type, X)}_")
+        studies = studies[studies['study_name'] != exclude].head(self.max_source_studies)
+
+        trials = []
+        for name in studies['study_name']:
+            study = optuna.load_study(study_name=name, storage=self._storage())
+            trials.extend(
+                trial for trial in study.get_trials(deepcopy=False,
+                                                    states=(optuna.trial.TrialState.COMPLETE,))
+                if trial.user_attrs.get('estimator_scale', 1.0) == estimator_scale
+            )
+        trials.sort(key=lambda trial: trial.value, reverse=True)
+
+        params, seen = [], set()
+        for trial in trials:
+            key = json.dumps(trial.params, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                params.append(trial.params)
+            if len(params) >= k:
+                break
+        return params
+
+    def warm_start(self, study, model_type: str, X: pd.DataFrame) -> int:
+        """
+        新しい study に過去の上位パラメータを投入（実行済みの試行がある study には何もしない）
+
+        Args:
+            study: 対象の study
+            model_type: モデルの種類
+            X: 特徴量データ
+
+        Returns:
+            投入したパラメータの数
+        """
+        started = [trial for trial in study.trials
+                   if trial.state != optuna.trial.TrialState.WAITING]
+        if started or not self.top_k:
+            return 0
+        params = self.top_params(model_type, X, exclude=study.study_name)
+        for values in params:
+            study.enqueue_trial(values, skip_if_exists=True)
+        if params:
+            logger.info(f"Warm-started {study.study_name} with {len(params)} parameter sets")
+        return len(params)
+
+    @staticmethod
+    def remaining_trials(study, n_trials: int) -> int:
+        """
+        試行回数に達するまでの残りの試行数（中断した study を再開する場合に使う）
+
+        Args:
+            study: 対象の study
+            n_trials: study 全体の試行回数
+        """
+        finished = study.get_trials(deepcopy=False, states=(
+            optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED))
+        return max(0, n_trials - len(finished))
+
+    @staticmethod
+    def export_history(study, filepath: str) -> str:
+        """
+        最適化履歴を書き出す（拡張子が .csv なら試行ごとの表、それ以外は JSON）
+
+        Args:
+            study: 対象の study
+            filepath: 保存先パス
+
+        Returns:
+            保存したファイルパス
+        """
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        if filepath.endswith('.csv'):
+            study.trials_dataframe().to_csv(filepath, index=False)
+        else:
+            completed = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+            with open(filepath, 'w') as f:
+                json.dump({
+                    'study_name': study.study_name,
+                    'best_params': study.best_params if completed else None,
+                    'best_value': study.best_value if completed else None,
+                    'trials': [{
+                        'number': trial.number,
+                        'state': trial.state.name,
+                        'value': trial.value,
+                        'params': trial.params,
+                        'intermediate_values': trial.intermediate_values,
+                        'user_attrs': trial.user_attrs,
+                        'datetime_start': trial.datetime_start,
+                        'datetime_complete': trial.datetime_complete
+                    } for trial in study.trials]
+                }, f, indent=2, default=str)
+        logger.info(f"Optimization history exported to {filepath}")
+        return filepath
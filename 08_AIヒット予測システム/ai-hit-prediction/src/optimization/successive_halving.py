@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""
+Successive Halving Scheduler
+モデルの種類ごとの探索を低コストのラウンド（行の間引き・少ない木の本数）から始め、
+下位の種類を打ち切って残った種類だけを全データで探索する
+"""
+
+import logging
+import math
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.lazy_imports import lazy_import
+from src.optimization.hyperparameter_optimizer import HyperparameterOptimizer
+from src.optimization.parallel_study import CVObjective, MODEL_TYPES, ParallelStudyRunner
+
+# Optunaは探索の実行時に読み込む
+optuna = lazy_import('optuna')
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FamilyCompute:
+    """モデルの種類ごとの計算量"""
+    model_type: str
+    rungs: List[Dict[str, Any]] = field(default_factory=list)
+    eliminated_at: Optional[int] = None
+
+    @property
+    def seconds(self) -> float:
+        return sum(rung['seconds'] for rung in self.rungs)
+
+    @property
+    def trials(self) -> int:
+        return sum(rung['trials'] for rung in self.rungs)
+
+    @property
+    def fold_fits(self) -> int:
+        return sum(rung['fold_fits'] for rung in self.rungs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'model_type': self.model_type,
+            'seconds': self.seconds,
+            'trials': self.trials,
+            'fold_fits': self.fold_fits,
+            'eliminated_at': self.eliminated_at,
+            'rungs': self.rungs
+        }
+
+
+class SuccessiveHalvingScheduler:
+    """
+    モデルの種類の successive halving
+
+    ラウンド r では行の割合・木の本数の係数を eta 倍ずつ増やし、上位 1/eta の種類だけを残す。
+    残った1種類は、低コストのラウンドの上位パラメータを最初の試行として全データで探索する。
+    """
+
+    def __init__(self, model_types: Sequence[str] = MODEL_TYPES, n_trials: int = 50,
+                 eta: int = 3, min_rows: int = 100, cheap_folds: int = 3,
+                 final_trial_factor: int = 2, seed_top_k: int = 3, random_state: int = 42,
+                 **search_options):
+        """
+        初期化
+
+        Args:
+            model_types: 比較するモデルの種類
+            n_trials: 全データでの探索の試行回数の基準（低コストのラウンドはその 1/eta^k）
+            eta: ラウンドごとに残す割合の逆数・フィデリティの増加率
+            min_rows: 低コストのラウンドで使う最小の行数
+            cheap_folds: 低コストのラウンドのクロスバリデーションのfold数
+            final_trial_factor: 全データでの探索の試行回数（n_trials の倍数）
+            seed_top_k: 次のラウンドに引き継ぐ上位パラメータの数
+            random_state: 行の間引きの乱数シード
+            **search_options: HyperparameterOptimizer に渡す探索設定（n_workers, pruner, storage 等）
+        """
+        self.model_types = list(model_types)
+        self.n_trials = n_trials
+        self.eta = eta
+        self.min_rows = min_rows
+        self.cheap_folds = cheap_folds
+        self.final_trial_factor = final_trial_factor
+        self.seed_top_k = seed_top_k
+        self.random_state = random_state
+        self.search_options = search_options
+        self.compute: Dict[str, FamilyCompute] = {}
+        self.best_optimizer: Optional[HyperparameterOptimizer] = None
+
+    @property
+    def n_cheap_rungs(self) -> int:
+        """1種類に絞るまでの低コストのラウンド数"""
+        n = len(self.model_types)
+        return math.ceil(math.log(n, self.eta) - 1e-9) if n > 1 else 0
+
+    def rung_schedule(self, n_samples: int) -> List[Dict[str, Any]]:
+        """
+        低コストのラウンドの設定
+
+        Args:
+            n_samples: 全データの行数
+
+        Returns:
+            ラウンドごとの {'fraction', 'n_trials'}
+        """
+        schedule = []
+        for rung in range(self.n_cheap_rungs):
+            scale = float(self.eta) ** (rung - self.n_cheap_rungs)
+            fraction = min(1.0, max(scale, self.min_rows / max(n_samples, 1)))
+            schedule.append({
+                'fraction': fraction,
+                'n_trials': max(2, int(self.n_trials * scale))
+            })
+        return schedule
+
+    def _subsample(self, X: pd.DataFrame, y: np.ndarray, fraction: float,
+                   rung: int) -> Tuple[pd.DataFrame, np.ndarray]:
+        """層化して行を間引く"""
+        if fraction >= 1.0:
+            return X, y
+        X_sub, _, y_sub, _ = train_test_split(
+            X, y, train_size=fraction, stratify=y, random_state=self.random_state + rung
+        )
+        return X_sub, np.asarray(y_sub)
+
+    def _run_cheap(self, model_type: str, X: pd.DataFrame, y: np.ndarray, rung: int,
+                   fraction: float, n_trials: int,
+                   seeds: List[Dict[str, Any]]) -> Tuple[float, List[Dict[str, Any]]]:
+        """低コストのラウンドを1種類分実行し、(最良スコア, 上位パラメータ) を返す"""
+        runner = ParallelStudyRunner(
+            n_workers=self.search_options.get('n_workers', 1),
+            pruner=self.search_options.get('pruner', 'median'),
+            cpu_limit=self.search_options.get('cpu_limit'),
+            random_state=self.random_state + rung
+        )
+        objective = CVObjective(model_type, X, y, cv_folds=self.cheap_folds,
+                                estimator_scale=fraction)
+        study, summary = runner.run(f'{model_type}_rung{rung}', objective, n_trials=n_trials,
+                                    n_folds=self.cheap_folds, enqueue=seeds)
+
+        self.compute[model_type].rungs.append({
+            'rung': rung,
+            'rows': len(X),
+            'estimator_scale': fraction,
+            'trials': summary.n_trials,
+            'pruned': summary.pruned,
+            'fold_fits': summary.folds_evaluated,
+            'seconds': summary.wall_time,
+            'best_cv_f1': study.best_value
+        })
+
+        completed = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+        completed.sort(key=lambda trial: trial.value, reverse=True)
+        return study.best_value, [trial.params for trial in completed[:self.seed_top_k]]
+
+    def fit(self, X_train: pd.DataFrame, y_train: np.ndarray,
+            X_val: Optional[pd.DataFrame] = None,
+            y_val: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        モデルの種類を絞り込み、残った種類を全データで探索
+
+        Args:
+            X_train: 訓練データの特徴量
+            y_train: 訓練データのターゲット
+            X_val: 検証データの特徴量
+            y_val: 検証データのターゲット
+
+        Returns:
+            {'best_model_type', 'final_results', 'rungs', 'compute', 'wall_time'}
+        """
+        start = time.perf_counter()
+        y_train = np.asarray(y_train)
+        self.compute = {model_type: FamilyCompute(model_type) for model_type in self.model_types}
+        survivors = list(self.model_types)
+        seeds: Dict[str, List[Dict[str, Any]]] = {model_type: [] for model_type in survivors}
+        rung_results = []
+
+        for rung, config in enumerate(self.rung_schedule(len(X_train))):
+            X_rung, y_rung = self._subsample(X_train, y_train, config['fraction'], rung)
+            scores = {}
+            for model_type in survivors:
+                scores[model_type], seeds[model_type] = self._run_cheap(
+                    model_type, X_rung, y_rung, rung, config['fraction'], config['n_trials'],
+                    seeds[model_type]
+                )
+
+            # 上位 1/eta を残す
+            ranked = sorted(survivors, key=lambda model_type: scores[model_type], reverse=True)
+            keep = max(1, math.ceil(len(survivors) / self.eta))
+            for model_type in ranked[keep:]:
+                self.compute[model_type].eliminated_at = rung
+            rung_results.append({**config, 'rows': len(X_rung), 'scores': scores,
+                                 'survivors': ranked[:keep]})
+            logger.info(f"Rung {rung} ({len(X_rung)} rows): {scores} -> {ranked[:keep]}")
+            survivors = ranked[:keep]
+
+        # 残った種類を全データ・全フォールドで探索（低コストのラウンドの上位から開始）
+        best_model_type = survivors[0]
+        self.best_optimizer = HyperparameterOptimizer(
+            model_type=best_model_type,
+            n_trials=self.n_trials * self.final_trial_factor,
+            **self.search_options
+        )
+        final_results = self.best_optimizer.optimize(
+            X_train, y_train, X_val, y_val, initial_params=seeds[best_model_type]
+        )
+        summary = final_results['search']
+        self.compute[best_model_type].rungs.append({
+            'rung': len(rung_results),
+            'rows': len(X_train),
+            'estimator_scale': 1.0,
+            'trials': summary['n_trials'],
+            'pruned': summary['pruned'],
+            'fold_fits': summary['folds_evaluated'],
+            'seconds': summary['wall_time'],
+            'best_cv_f1': final_results['best_cv_score']
+        })
+
+        return {
+            'best_model_type': best_model_type,
+            'final_results': final_results,
+            'rungs': rung_results,
+            'compute': {model_type: report.to_dict()
+                        for model_type, report in self.compute.items()},
+            'wall_time': time.perf_counter() - start
+        }
+
+    @property
+    def best_model(self):
+        return self.best_optimizer.best_model if self.best_optimizer is not None else None
+
+    def comparison_frame(self, final_results: Dict[str, Any]) -> pd.DataFrame:
+        """
+        種類ごとの指標の比較表（compare_models と同じ列）
+
+        打ち切られた種類の best_cv_f1 は最後に探索した低コストのラウンドの値で、
+        検証データでの指標は全データで探索した種類のみ。
+
+        Args:
+            final_results: 全データでの探索結果（HyperparameterOptimizer.optimize の戻り値）
+        """
+        validation = final_results.get('validation_metrics', {})
+        rows = []
+        for model_type, report in self.compute.items():
+            last = report.rungs[-1]
+            survived = report.eliminated_at is None
+            rows.append({
+                'model_type': model_type,
+                'best_cv_f1': last['best_cv_f1'],
+                'val_accuracy': validation.get('accuracy') if survived else None,
+                'val_precision': validation.get('precision') if survived else None,
+                'val_recall': validation.get('recall') if survived else None,
+                'val_f1': validation.get('f1') if survived else None,
+                'n_trials': report.trials,
+                'n_pruned': sum(rung['pruned'] for rung in report.rungs),
+                'search_seconds': report.seconds
+            })
+        frame = pd.DataFrame(rows)
+        # 打ち切った順（低いラウンドほど下）に並べ、同じラウンドの中はスコア順
+        frame['_rank'] = [len(self.compute[m].rungs) for m in frame['model_type']]
+        frame = frame.sort_values(['_rank', 'val_f1', 'best_cv_f1'], ascending=False,
+                                  na_position='last')
+        return frame.drop(columns='_rank').reset_index(drop=True)
+
+    def compute_frame(self) -> pd.DataFrame:
+        """種類ごとの計算量の表（秒・試行数・フォールドの学習回数・打ち切られたラウンド）"""
+        return pd.DataFrame([
+            {key: value for key, value in report.to_dict().items() if key != 'rungs'}
+            for report in self.compute.values()
+        ]).sort_values('seconds', ascending=False)
@@ -19,6 +19,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 
 from src.data_collection.academic_collector import AcademicPaperCollector
 from src.data_collection.news_collector import NewsCollector
+from src.data_collection.trend_feed import TREND_SNAPSHOT_TOPIC, snapshot_from_collected_data
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -30,16 +31,19 @@ class DataPipeline:
     
     def __init__(self, 
                  raw_data_path: str = "data/raw",
-                 processed_data_path: str = "data/processed"):
+                 processed_data_path: str = "data/processed",
+                 event_bus: Optional[Any] = None):
         """
         初期化
         
         Args:
             raw_data_path: 生データの保存先
             processed_data_path: 処理済みデータの保存先
+            event_bus: 収集結果のトレンドスナップショットを発行するイベントバス（オプション）
         """
         self.raw_data_path = raw_data_path
         self.processed_data_path = processed_data_path
+        self.event_bus = event_bus
         self._ensure_directories()
         
         # データコレクター初期化
@@ -107,6 +111,11 @@ class DataPipeline:
         # 3. データ保存
         self._save_collected_data(collected_data)
         
+        # 4. トレンドスナップショットを発行（購読側で即座に差分配信される）
+        if self.event_bus is not None:
+            snapshot = snapshot_from_collected_data(collected_data)
+            self.event_bus.publish(TREND_SNAPSHOT_TOPIC, snapshot)
+        
         return collected_data
     
     def _save_collected_data(self, data: Dict[str, Any]) -> str:
@@ -7,14 +7,13 @@ AIヒット予測システムのインタラクティブなWebインターフェ
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import os
 import sys
 import json
 import joblib
 from pathlib import Path
+from typing import Tuple
 
 # プロジェクトルートをパスに追加
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +24,11 @@ from src.preprocessing.feature_engineering import FeatureEngineer
 from src.analysis.model_explainer import ModelExplainer, InteractivePlotter
 from src.data_collection.news_collector import NewsCollector
 from src.data_collection.academic_collector import AcademicPaperCollector
+from src.lazy_imports import lazy_import
+
+# Plotlyはグラフ描画時に読み込む
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
 
 # ページ設定
 st.set_page_config(
@@ -285,16 +289,33 @@ def display_prediction_results(prediction_result, product_name):
     st.plotly_chart(fig_gauge, use_container_width=True)
 
 
+@st.cache_resource(max_entries=4)
+def get_explainer(model_version: str, _model, feature_names: Tuple[str, ...]) -> ModelExplainer:
+    """
+    モデルバージョンごとのExplainer（再描画のたびに作り直さず、SHAP値のキャッシュも引き継ぐ）
+    
+    Args:
+        model_version: モデルバージョン（キャッシュのキー）
+        _model: 学習済みモデル（ハッシュ対象外）
+        feature_names: 特徴量名
+    """
+    return ModelExplainer(
+        _model,
+        feature_names=list(feature_names),
+        model_version=model_version
+    )
+
+
 def display_shap_analysis(model, features, product_name):
     """SHAP分析結果を表示"""
     st.header("🔍 予測根拠の詳細分析（SHAP）")
     
     try:
-        # ModelExplainer初期化
-        explainer = ModelExplainer(
+        # ModelExplainer（モデルバージョンごとに再利用）
+        explainer = get_explainer(
+            model.model_version or "unversioned",
             model.model,
-            feature_names=features.columns.tolist(),
-            background_data=features  # 単一サンプルを背景データとして使用
+            tuple(features.columns)
         )
         
         # タブ作成
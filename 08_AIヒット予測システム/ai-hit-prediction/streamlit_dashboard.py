@@ -7,9 +7,6 @@ Real-time Dashboard for AI Hit Prediction System
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
 import altair as alt
 from datetime import datetime, timedelta
 import json
@@ -28,6 +25,12 @@ from src.preprocessing.feature_engineering import FeatureEngineer
 from src.models.basic_model import HitPredictionModel
 from src.analysis.model_explainer import ModelExplainer
 from src.optimization.hyperparameter_optimizer import HyperparameterOptimizer, AutoML
+from src.lazy_imports import lazy_import
+
+# Plotlyはグラフ描画時に読み込む
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
+subplots = lazy_import('plotly.subplots')
 
 # ページ設定
 st.set_page_config(
@@ -204,7 +207,7 @@ class DashboardManager:
                 color = "🟢" if score > 0.7 else "🟡" if score > 0.4 else "🔴"
                 st.markdown(f"{i}. {color} **{keyword}** ({score:.2f})")
     
-    def create_real_time_chart(self) -> go.Figure:
+    def create_real_time_chart(self) -> "go.Figure":
         """リアルタイムチャート作成"""
         # 時系列データ生成（最近1時間）
         now = datetime.now()
@@ -214,7 +217,7 @@ class DashboardManager:
         buzz_scores = np.cumsum(np.random.randn(60) * 0.01) + 0.5
         sentiment_scores = np.cumsum(np.random.randn(60) * 0.01) + 0.6
         
-        fig = make_subplots(
+        fig = subplots.make_subplots(
             rows=2, cols=1,
             subplot_titles=('バズスコア推移', 'センチメント推移'),
             vertical_spacing=0.15
@@ -0,0 +1,3253 @@
+#!/usr/bin/env python
+"""
+Phase 7 - Performance Test
+性能改善コンポーネントのテストとベンチマーク
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# テスト結果を記録
+test_results = {
+    "timestamp": datetime.now().isoformat(),
+    "phase": "Phase 7 - Performance Engineering",
+    "tests": [],
+    "benchmarks": []
+}
+
+
+def run_component(name, test_func):
+    """コンポーネントテスト実行"""
+    print(f"\n{'='*50}")
+    print(f"Testing: {name}")
+    print(f"{'='*50}")
+
+    try:
+        result = test_func()
+        test_results["tests"].append({
+            "name": name,
+            "status": "PASSED",
+            "result": result
+        })
+        print(f"✅ {name} - PASSED")
+        return True
+    except Exception as e:
+        test_results["tests"].append({
+            "name": name,
+            "status": "FAILED",
+            "error": str(e)
+        })
+        print(f"❌ {name} - FAILED: {e}")
+        return False
+
+
+def time_call(func, repeat: int = 5) -> float:
+    """関数の最短実行時間（秒）を計測"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ---------------------------------------------------------------------------
+# テスト
+# ---------------------------------------------------------------------------
+
+def test_prediction_cache():
+    """予測キャッシュテスト（LRU・TTL・正規化キー・共有バックエンド）"""
+    from src.api.prediction_cache import CacheBackend, PredictionCache, InMemoryCacheBackend
+
+    class RecordingMetrics:
+        ratio = None
+
+        def set_cache_hit_ratio(self, ratio):
+            self.ratio = ratio
+
+    product = {
+        "name": "Serum", "description": "d", "keywords": ["b", "a"], "price": 3000,
+        "brand_strength": 0.5, "ingredient_novelty": 0.5, "market_saturation": 0.3,
+        "image_url": None
+    }
+    metrics = RecordingMetrics()
+    cache = PredictionCache(max_entries=2, ttl_seconds=60, model_version="v1", metrics=metrics)
+
+    # ブランド力の違いは別キーになり、キーワード順序は無関係
+    key = cache.make_key(product)
+    assert key != cache.make_key(dict(product, brand_strength=0.9))
+    assert key == cache.make_key(dict(product, keywords=["a", "b"]))
+
+    # モデルバージョンが変わればキーも変わる
+    other_version = PredictionCache(model_version="v2").make_key(product)
+    assert key != other_version
+
+    # LRU退避
+    assert cache.get(key) is None
+    cache.set(key, {"hit_probability": 0.7})
+    cache.set("k2", {"hit_probability": 0.1})
+    assert cache.get(key) == {"hit_probability": 0.7}
+    cache.set("k3", {"hit_probability": 0.2})
+    assert cache.get("k2") is None and len(cache) == 2
+    assert metrics.ratio == cache.hit_ratio
+
+    # バイト上限
+    small = PredictionCache(max_entries=100, max_bytes=64)
+    for i in range(10):
+        small.set(f"k{i}", {"v": i})
+    assert small.get_stats()["bytes"] <= 64
+
+    # TTL失効
+    short = PredictionCache(ttl_seconds=0.01)
+    short.set("k", {"v": 1})
+    time.sleep(0.02)
+    assert short.expire() == 1 and short.get("k") is None
+
+    # 共有バックエンド経由で別ワーカーから参照
+    shared = InMemoryCacheBackend()
+    worker_a = PredictionCache(model_version="v1", backend=shared)
+    worker_b = PredictionCache(model_version="v1", backend=shared)
+    worker_a.set(key, {"hit_probability": 0.5})
+    assert worker_b.get(key) == {"hit_probability": 0.5}
+
+    # 共有バックエンドの障害はローカルキャッシュの操作を止めない
+    class FailingBackend(CacheBackend):
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value, ttl_seconds):
+            raise ConnectionError("down")
+
+        def delete(self, key):
+            raise ConnectionError("down")
+
+        def clear(self):
+            raise ConnectionError("down")
+
+    degraded = PredictionCache(backend=FailingBackend())
+    degraded.set("k", {"v": 1})
+    assert degraded.get("k") == {"v": 1}
+    degraded.invalidate("k")
+    assert degraded.get("k") is None
+    try:
+        CacheBackend()
+        raise AssertionError("CacheBackend is abstract")
+    except TypeError:
+        pass
+
+    return {
+        "canonical_keys": True,
+        "lru_eviction": True,
+        "ttl_expiry": True,
+        "shared_backend": True,
+        "hit_ratio": round(cache.hit_ratio, 3)
+    }
+
+
+def _train_forest_model(n_samples: int = 300, n_estimators: int = 100):
+    """テスト用のHitPredictionModelを学習"""
+    import numpy as np
+    from src.models.basic_model import HitPredictionModel, generate_dummy_data
+
+    np.random.seed(42)
+    data, labels = generate_dummy_data(n_samples)
+    model = HitPredictionModel(model_dir="data/models")
+    model.model.set_params(n_estimators=n_estimators)
+    X = model.prepare_features(data)
+    model.train(X, labels, validate=False)
+    return model, X
+
+
+def test_compiled_forest_confidence():
+    """コンパイル済みフォレストによる木ごとの確率計算テスト"""
+    import numpy as np
+
+    model, X = _train_forest_model()
+
+    # 従来の木ごとのループと一致すること
+    expected = np.array([tree.predict_proba(X.values)[:, 1] for tree in model.model.estimators_])
+    actual = model.get_compiled_forest().predict_tree_proba(X)
+    assert actual.shape == expected.shape
+    assert np.allclose(actual, expected)
+
+    results = model.predict_with_confidence(X)
+    assert np.allclose(results['hit_probability'], expected.mean(axis=0))
+    assert np.allclose(results['confidence'], 1 - expected.std(axis=0))
+
+    return {
+        "n_trees": model.get_compiled_forest().n_trees,
+        "n_nodes": model.get_compiled_forest().n_nodes,
+        "matches_per_tree_loop": True
+    }
+
+
+def test_mmap_model_artifact():
+    """メモリマップ可能なモデル成果物の保存・読み込みテスト"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from src.models.basic_model import HitPredictionModel
+
+    model, X = _train_forest_model(n_estimators=20)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model.model_dir = tmp_dir
+        filepath = model.save_model("mmap_model.pkl")
+        assert os.path.isdir(HitPredictionModel.get_forest_path(filepath))
+
+        # 推論専用の読み込みではscikit-learnのモデルを復元しない
+        serving = HitPredictionModel(model_dir=tmp_dir)
+        serving.load_serving_model(filepath)
+        assert isinstance(serving.compiled_forest.threshold, np.memmap)
+        assert serving._model is None
+        assert np.allclose(serving.predict(X), model.model.predict_proba(X)[:, 1])
+        assert serving._model is None
+
+        # scikit-learnのモデルが必要な操作では、その時点でモデルファイルから復元する
+        assert np.allclose(serving.model.feature_importances_, model.model.feature_importances_)
+        assert serving.compiled_forest is not None
+        assert isinstance(serving.compiled_forest.threshold, np.memmap)
+
+        # 通常の読み込みでも同じフォレストを共有する
+        full = HitPredictionModel(model_dir=tmp_dir)
+        full.load_model(filepath, mmap_mode='r')
+        assert isinstance(full.compiled_forest.children, np.memmap)
+        assert serving.model_version == full.model_version
+        assert np.allclose(full.predict_with_confidence(X)['hit_probability'],
+                           serving.predict_with_confidence(X)['hit_probability'])
+
+        # 成果物が無い場合は通常の読み込みにフォールバック
+        legacy = HitPredictionModel(model_dir=tmp_dir)
+        shutil.rmtree(HitPredictionModel.get_forest_path(filepath))
+        legacy.load_serving_model(filepath)
+        assert hasattr(legacy.model, "estimators_")
+
+        del serving, full
+
+    return {
+        "memory_mapped": True,
+        "serving_matches_sklearn": True,
+        "legacy_fallback": True
+    }
+
+
+def test_lazy_imports():
+    """遅延読み込みレジストリのテスト"""
+    from src.lazy_imports import lazy_import, is_available, get_import_profile, LazyInstance
+
+    # 同じ名前には同じプロキシ、属性アクセスまで読み込まない
+    module = lazy_import('json.decoder')
+    assert module is lazy_import('json.decoder')
+    assert module.available
+    assert module.JSONDecodeError.__name__ == 'JSONDecodeError'
+    assert module.loaded
+    assert 'json.decoder' in get_import_profile()['loaded']
+
+    # 未インストールのモジュールは読み込まずに判定できる
+    assert not is_available('module_that_does_not_exist')
+    missing = lazy_import('module_that_does_not_exist')
+    assert not missing.available
+    try:
+        missing.anything
+        raise AssertionError("ImportError expected")
+    except ImportError:
+        pass
+
+    # インスタンスは初回使用時に1回だけ生成
+    calls = []
+    holder = LazyInstance(lambda: calls.append(1) or object(), name="dummy")
+    assert not holder.is_initialized
+    assert holder.warm_up() and holder.get() is holder.get()
+    assert len(calls) == 1 and holder.init_seconds is not None
+
+    # API はイベントループを止めずにスレッドプールで初期化する（3.8 でも動く）
+    from src.api.realtime_api import run_in_thread
+    assert asyncio.run(run_in_thread(holder.get)) is holder.get()
+    assert asyncio.run(run_in_thread(dict, name="x")) == {"name": "x"}
+
+    return {"lazy_module": True, "lazy_instance": True}
+
+
+# 起動時に読み込まれるべきでない重いオプショナル依存の確認対象
+_IMPORT_PROFILE_TARGETS = [
+    'src.api.realtime_api',
+    'src.analysis.model_explainer',
+    'src.optimization.hyperparameter_optimizer',
+    'src.multimodal.image_analyzer',
+    'src.business.report_generator',
+]
+
+_IMPORT_PROFILE_SCRIPT = """
+import sys, json
+sys.path.insert(0, sys.argv[1])
+try:
+    __import__(sys.argv[2])
+    error = None
+except ImportError as e:
+    error = str(e)
+from src.lazy_imports import HEAVY_OPTIONAL_MODULES
+loaded = [m for m in HEAVY_OPTIONAL_MODULES if m in sys.modules]
+print(json.dumps({"error": error, "heavy_loaded": loaded}))
+"""
+
+
+def _profile_import(module_name: str) -> dict:
+    """-X importtime でモジュールの読み込み時間を計測"""
+    import subprocess
+
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_PROFILE_SCRIPT,
+         project_root, module_name],
+        capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    # "import time: self [us] | cumulative | imported package"
+    timings = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), name.strip()))
+
+    target = [us for us, name in timings if name == module_name]
+    result["import_ms"] = target[-1] / 1000 if target else None
+    result["slowest"] = [
+        {"module": name, "cumulative_ms": us / 1000}
+        for us, name in sorted(timings, reverse=True)[:5]
+    ]
+    return result
+
+
+def test_import_time_profile():
+    """起動時インポートのプロファイル（重い依存が読み込まれないこと）"""
+    report = {}
+    for module_name in _IMPORT_PROFILE_TARGETS:
+        result = _profile_import(module_name)
+        report[module_name] = result
+        if result["error"] is None:
+            assert result["heavy_loaded"] == [], f"{module_name} imported {result['heavy_loaded']}"
+
+    print(json.dumps({name: {"import_ms": r["import_ms"], "error": r["error"]}
+                      for name, r in report.items()}, indent=2, ensure_ascii=False))
+    return report
+
+
+def test_model_readiness():
+    """モデルのレディネス状態機械とバックグラウンド初期化のテスト"""
+    import tempfile
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+    import src.api.realtime_api as realtime_api
+
+    # 状態遷移
+    readiness = ModelReadiness()
+    assert not readiness.is_ready
+    try:
+        readiness.transition(ModelState.READY)
+        raise AssertionError("STARTING -> READY must be rejected")
+    except ValueError:
+        pass
+    readiness.transition(ModelState.LOADING, "model.pkl")
+    readiness.transition(ModelState.READY, "v1")
+    readiness.transition(ModelState.LOADING, "model_v2.pkl")
+    assert readiness.is_ready  # 再読み込み中も旧モデルで応答する
+
+    product = {"name": "Serum", "description": "d", "keywords": ["serum"], "price": 3000}
+    startup = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        original_env = {key: os.environ.get(key) for key in ("MODEL_PATH", "MODEL_FALLBACK_PATH")}
+        os.environ["MODEL_PATH"] = os.path.join(tmp_dir, "missing.pkl")
+        os.environ["MODEL_FALLBACK_PATH"] = os.path.join(tmp_dir, "fallback_model.pkl")
+
+        try:
+            # 1回目は暫定モデルを学習、2回目は保存済みの暫定モデルを読み込む
+            for run in ("train", "load"):
+                realtime_api.model_readiness = ModelReadiness()
+                realtime_api.model_instance = None
+
+                with TestClient(realtime_api.app) as client:
+                    assert client.get("/health").status_code == 200
+
+                    deadline = time.time() + 60
+                    while client.get("/health/ready").status_code != 200:
+                        assert time.time() < deadline, "model did not become ready"
+                        time.sleep(0.05)
+
+                    status = client.get("/health/ready").json()
+                    startup[run] = status["startup_seconds"]
+                    states = [entry["to"] for entry in status["history"]]
+                    expected = ["training", "ready"] if run == "train" else ["loading", "ready"]
+                    assert states == expected
+
+                    response = client.post("/api/v1/predict", json=product)
+                    assert response.status_code == 200
+                    assert 0 <= response.json()["hit_probability"] <= 1
+        finally:
+            for key, value in original_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    # 準備前の推論リクエストは503（モデル初期化を止めて確認）
+    async def pending_initialization():
+        pass
+
+    initialize_model = realtime_api.initialize_model
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.model_readiness = ModelReadiness()
+    realtime_api.model_instance = None
+    try:
+        with TestClient(realtime_api.app) as client:
+            assert client.get("/health").status_code == 200
+            assert client.get("/health/ready").status_code == 503
+            assert client.post("/api/v1/predict", json=product).status_code == 503
+    finally:
+        realtime_api.initialize_model = initialize_model
+
+    # 初期化に失敗（FAILED）した場合は間隔を倍にしながら再試行して READY に戻る
+    attempts = []
+
+    async def flaky_initialization():
+        attempts.append(time.perf_counter())
+        if len(attempts) < 3:
+            realtime_api.model_readiness.transition(ModelState.FAILED, "artifact store unavailable")
+        else:
+            realtime_api.model_readiness.transition(ModelState.LOADING, "model.pkl")
+            realtime_api.model_readiness.transition(ModelState.READY, "v1")
+
+    async def broken_initialization():
+        raise RuntimeError("unexpected")
+
+    realtime_api.initialize_model = flaky_initialization
+    realtime_api.model_readiness = ModelReadiness()
+    try:
+        asyncio.run(realtime_api.initialize_model_with_retry(max_attempts=5, backoff_seconds=0.02))
+        assert len(attempts) == 3 and realtime_api.model_readiness.state == ModelState.READY
+        assert attempts[2] - attempts[1] >= 0.04
+
+        # 起動時のタスクは参照が保持され、例外は終了時に取り出される
+        realtime_api.initialize_model = broken_initialization
+        realtime_api.model_readiness = ModelReadiness()
+        with TestClient(realtime_api.app):
+            task = realtime_api.model_init_task
+            deadline = time.time() + 10
+            while not task.done():
+                assert time.time() < deadline
+                time.sleep(0.01)
+            assert isinstance(task.exception(), RuntimeError)
+            assert task not in realtime_api.background_task_set
+    finally:
+        realtime_api.initialize_model = initialize_model
+
+    return {"startup_seconds": startup, "init_attempts": len(attempts)}
+
+
+class _FakeWebSocket:
+    """送信内容を記録するWebSocketのスタンドイン"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.messages = []
+        self.closed = False
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(text)
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, ensure_ascii=False))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+def test_broadcast_hub():
+    """WebSocketブロードキャストハブのテスト（チャンネル配信・低速クライアント）"""
+    from src.api.broadcast_hub import BroadcastHub
+
+    async def scenario():
+        hub = BroadcastHub(queue_size=16, max_consecutive_drops=3)
+        prediction_ws, trend_ws = _FakeWebSocket(), _FakeWebSocket()
+        slow_ws = _FakeWebSocket(delay=10)
+
+        prediction_client = await hub.connect(prediction_ws, {"predictions"})
+        await hub.connect(trend_ws, {"trends"})
+        slow_client = await hub.connect(slow_ws, {"predictions"})
+
+        # チャンネルごとに配信先が分かれる
+        assert hub.publish("trends", {"type": "trend_update"}) == 1
+        for i in range(30):
+            hub.publish("predictions", {"type": "new_prediction", "seq": i})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+
+        assert [json.loads(m)["seq"] for m in prediction_ws.messages] == list(range(30))
+        assert [json.loads(m)["type"] for m in trend_ws.messages] == ["trend_update"]
+
+        # 低速クライアントはメッセージを破棄した後に切断され、他を止めない
+        assert slow_client.closed and slow_ws.closed
+        assert slow_client.client_id not in hub.clients
+        assert hub.get_stats()["disconnected_slow"] == 1
+
+        # 半分の速さでしか送信できないクライアントも、キューが空にならなければ切断される
+        half_speed_ws = _FakeWebSocket(delay=0.01)
+        half_speed_client = await hub.connect(half_speed_ws, {"predictions"})
+        for i in range(60):
+            hub.publish("predictions", {"type": "new_prediction", "seq": i})
+            await asyncio.sleep(0.005)
+        assert half_speed_client.closed and 0 < len(half_speed_ws.messages) < 60
+        assert hub.get_stats()["disconnected_slow"] == 2
+
+        hub.unsubscribe(prediction_client, "predictions")
+        assert hub.publish("predictions", {"type": "new_prediction"}) == 0
+
+        stats = hub.get_stats()
+        await hub.close_all()
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    # WebSocketエンドポイント（購読の確認応答とハートビート）
+    from fastapi.testclient import TestClient
+    import src.api.realtime_api as realtime_api
+
+    async def pending_initialization():
+        pass
+
+    initialize_model = realtime_api.initialize_model
+    realtime_api.initialize_model = pending_initialization
+    try:
+        with TestClient(realtime_api.app) as client:
+            with client.websocket_connect("/ws") as websocket:
+                websocket.send_text(json.dumps({"type": "subscribe", "channel": "predictions"}))
+                assert websocket.receive_json() == {
+                    "type": "subscription_confirmed", "channel": "predictions"
+                }
+                websocket.send_text(json.dumps({"type": "ping"}))
+                assert websocket.receive_json() == {"type": "pong"}
+    finally:
+        realtime_api.initialize_model = initialize_model
+
+    return stats
+
+
+def test_trend_feed():
+    """イベント駆動トレンド配信のテスト（差分・シーケンス・再同期）"""
+    import threading
+    from src.data_collection.trend_feed import (
+        TREND_SNAPSHOT_TOPIC, TrendAggregator, TrendEventBus, snapshot_from_collected_data
+    )
+
+    # 収集データからスナップショットを作成
+    snapshot = snapshot_from_collected_data({
+        "timestamp": "2026-01-01T00:00:00",
+        "keywords": ["retinol", "cica"],
+        "academic": {"retinol": [{"year": 2023}, {"year": 2018}], "cica": []},
+        "news": {"articles": [{"search_keyword": "retinol"}] * 4 + [{"search_keyword": "cica"}] * 2}
+    })
+    assert snapshot["keywords"]["retinol"]["buzz_score"] == 1.0
+    assert snapshot["keywords"]["cica"]["mentions"] == 2
+
+    # 変化したキーワードのみ差分として発行
+    aggregator = TrendAggregator(smoothing=0.5, history_size=2)
+    aggregator.seed({"retinol": {"score": 0.5}, "cica": {"score": 0.3}, "cbd": {"score": 0.7}})
+    delta = aggregator.apply_snapshot(
+        {"keywords": {"retinol": {"score": 0.9}, "cica": {"score": 0.3}}}
+    )
+    assert delta["seq"] == 1 and delta["prev_seq"] == 0
+    assert set(delta["changes"]) == {"retinol"}
+    assert abs(delta["changes"]["retinol"]["score"] - 0.7) < 1e-9
+    assert aggregator.apply_snapshot({"keywords": {"cica": {"score": 0.3}}}) is None
+
+    aggregator.apply_snapshot({"keywords": {"cbd": {"score": 0.1}}})
+    aggregator.apply_snapshot({"keywords": {"cica": {"score": 0.9}}})
+    assert aggregator.top_keywords(1)[0]["keyword"] == "retinol"
+
+    # 再同期: 保持している差分で埋められる場合は差分、古すぎる場合はスナップショット
+    assert aggregator.resync(aggregator.sequence) == []
+    assert [m["seq"] for m in aggregator.resync(1)] == [2, 3]
+    full = aggregator.resync(0)
+    assert len(full) == 1 and full[0]["type"] == "trend_snapshot" and full[0]["seq"] == 3
+
+    # 別スレッドからの発行はイベントループ上で処理される
+    async def threaded_publish():
+        bus = TrendEventBus()
+        bus.attach_loop(asyncio.get_running_loop())
+        received = asyncio.Event()
+        handler_threads = []
+
+        def handler(event):
+            handler_threads.append(threading.current_thread())
+            received.set()
+
+        bus.subscribe(TREND_SNAPSHOT_TOPIC, handler)
+        threading.Thread(target=bus.publish, args=(TREND_SNAPSHOT_TOPIC, {"keywords": {}})).start()
+        await asyncio.wait_for(received.wait(), 1)
+        return handler_threads[0] is threading.main_thread()
+
+    assert asyncio.run(threaded_publish())
+
+    # API: 購読時にスナップショット、発行後に差分が届く
+    from fastapi.testclient import TestClient
+    import src.api.realtime_api as realtime_api
+
+    async def pending_initialization():
+        pass
+
+    initialize_model = realtime_api.initialize_model
+    realtime_api.initialize_model = pending_initialization
+    try:
+        with TestClient(realtime_api.app) as client:
+            with client.websocket_connect("/ws") as websocket:
+                websocket.send_text(json.dumps({"type": "subscribe", "channel": "trends"}))
+                assert websocket.receive_json()["type"] == "subscription_confirmed"
+                initial = websocket.receive_json()
+                assert initial["type"] == "trend_snapshot"
+
+                start = time.perf_counter()
+                response = client.post("/api/v1/trends/events", json={
+                    "source": "test", "keywords": {"ビタミンC": {"score": 0.1, "buzz_score": 0.2}}
+                })
+                assert response.status_code == 200
+                update = websocket.receive_json()
+                latency = time.perf_counter() - start
+
+                assert update["type"] == "trend_delta"
+                assert update["seq"] == initial["seq"] + 1
+                assert list(update["changes"]) == ["ビタミンC"]
+                assert latency < 1.0
+
+                websocket.send_text(json.dumps({"type": "resync", "last_seq": initial["seq"]}))
+                assert websocket.receive_json()["seq"] == update["seq"]
+
+            trends = client.get("/api/v1/trends?period_days=7").json()
+            assert trends["trend_sequence"] == update["seq"]
+    finally:
+        realtime_api.initialize_model = initialize_model
+
+    return {"delta_latency_ms": latency * 1000, "sequence": update["seq"]}
+
+
+def test_trend_store():
+    """トレンド時系列ストアのテスト（ロールアップ・解像度選択・列指向レスポンス）"""
+    from datetime import date, timedelta
+    import tempfile
+    from src.data_collection.trend_store import (
+        MAX_PERIOD_DAYS, TrendTimeSeriesStore, UNCATEGORIZED, choose_resolution
+    )
+
+    assert choose_resolution(30) == "daily"
+    assert choose_resolution(365) == "weekly"
+    assert choose_resolution(1825) == "monthly"
+
+    # 2026-01-05（月）〜 2026-02-03 の30日分を1日2件ずつ記録
+    store = TrendTimeSeriesStore()
+    first_day = date(2026, 1, 5)
+    for offset in range(30):
+        day = datetime.combine(first_day + timedelta(days=offset), datetime.min.time())
+        store.record("スキンケア", "retinol", float(offset), 0.5, day)
+        store.record("スキンケア", "retinol", float(offset) + 2, 0.7, day + timedelta(hours=1))
+
+    end = first_day + timedelta(days=29)
+    daily = store.query(["スキンケア"], 29, keyword="retinol", end=end)
+    assert daily["resolution"] == "daily" and len(daily["dates"]) == 30
+    assert daily["series"]["スキンケア"]["trend_score"][0] == 1.0
+    assert daily["series"]["スキンケア"]["buzz_score"][-1] == 0.6
+
+    # 週次は月曜始まり、初週（offset 0〜6）の平均は4.0
+    weekly = store.query(["スキンケア"], 29, keyword="retinol", resolution="weekly", end=end)
+    assert weekly["dates"][0] == "2026-01-05"
+    assert weekly["series"]["スキンケア"]["trend_score"][0] == 4.0
+
+    # 月次: 1月は offset 0〜26（平均14.0）
+    monthly = store.query(["スキンケア"], 29, resolution="monthly", end=end)
+    assert monthly["dates"] == ["2026-01-01", "2026-02-01"]
+    assert monthly["series"]["スキンケア"]["trend_score"][0] == 14.0
+
+    # 観測の無いバケットと未記録カテゴリはNone
+    gap = store.query(["スキンケア", "ヘアケア"], 10, end=end + timedelta(days=5))
+    assert gap["series"]["スキンケア"]["trend_score"][-1] is None
+    assert gap["series"]["ヘアケア"]["trend_score"] == [None] * len(gap["dates"])
+
+    # カテゴリ指定の無いスナップショットはキーワードごとにカテゴリを判定（判定できなければ「その他」）
+    classified = TrendTimeSeriesStore()
+    classified.record_snapshot({"timestamp": "2026-01-05T00:00:00", "keywords": {
+        "レチノール": {"score": 0.9}, "tint lip": {"score": 0.7}, "scalp serum": {"score": 0.5},
+        "CBD": {"score": 0.4}, "kombucha": {"score": 0.2}
+    }})
+    assert classified.keywords("スキンケア") == ["CBD", "レチノール"]
+    assert classified.keywords("メイクアップ") == ["tint lip"]
+    assert classified.keywords("ヘアケア") == ["scalp serum"]
+    assert classified.keywords(UNCATEGORIZED) == ["kombucha"]
+    classified.record_snapshot({"category": "メイクアップ", "keywords": {"retinol": {"score": 0.1}}})
+    assert "retinol" in classified.keywords("メイクアップ")
+
+    # 保持期間外の古い観測は無視され、リングバッファは上書きされる
+    small = TrendTimeSeriesStore(capacities={"daily": 7})
+    small.record("c", "k", 1.0, 0.0, datetime(2026, 1, 1))
+    small.record("c", "k", 3.0, 0.0, datetime(2026, 1, 20))
+    small.record("c", "k", 9.0, 0.0, datetime(2026, 1, 2))
+    recent = small.query(["c"], 19, keyword="k", resolution="daily", end=date(2026, 1, 20))
+    assert recent["series"]["c"]["trend_score"][-1] == 3.0
+    assert recent["series"]["c"]["trend_score"][0] is None
+
+    # 保持期間を超える期間はリングバッファの長さに収める（巨大な期間でも日付の計算が溢れない）
+    huge = small.query(["c"], 10 ** 9, keyword="k", resolution="daily", end=date(2026, 1, 20))
+    assert len(huge["dates"]) == 7 and huge["series"]["c"]["trend_score"][-1] == 3.0
+
+    # 保存したロールアップを読み込むと同じ系列を返す（保持期間が短いストアには収まる分だけ）
+    temp = tempfile.TemporaryDirectory()
+    temp_dir = temp.name
+    store.save(os.path.join(temp_dir, "trends.json"))
+    restored = TrendTimeSeriesStore()
+    assert restored.load(os.path.join(temp_dir, "trends.json"))
+    assert restored.query(["スキンケア"], 29, keyword="retinol", end=end) == daily
+    assert restored.query(["スキンケア"], 29, resolution="monthly", end=end) == monthly
+    assert restored.observations == store.observations
+    short = TrendTimeSeriesStore(capacities={"daily": 7})
+    short.load(os.path.join(temp_dir, "trends.json"))
+    assert (short.query(["スキンケア"], 6, keyword="retinol", end=end)["series"]
+            == store.query(["スキンケア"], 6, keyword="retinol", end=end)["series"])
+    assert not TrendTimeSeriesStore().load(os.path.join(temp_dir, "missing.json"))
+
+    # API: 期間に応じた解像度で列指向の配列を返す
+    from fastapi.testclient import TestClient
+    import src.api.realtime_api as realtime_api
+
+    async def pending_initialization():
+        pass
+
+    initialize_model = realtime_api.initialize_model
+    original_store, original_path = realtime_api.trend_store, realtime_api.trend_store_path
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.trend_store = TrendTimeSeriesStore()
+    realtime_api.trend_store_path = Path(temp_dir) / "api_trends.json"
+    try:
+        with TestClient(realtime_api.app) as client:
+            response = client.post("/api/v1/trends/events", json={
+                "source": "test", "category": "メイクアップ",
+                "keywords": {"tint": {"score": 0.8, "buzz_score": 0.6}}
+            })
+            assert response.status_code == 200
+
+            trends = client.get("/api/v1/trends?category=メイクアップ&period_days=7").json()["trends"]
+            assert trends["resolution"] == "daily" and len(trends["dates"]) == 8
+            assert trends["categories"]["メイクアップ"]["trend_score"][-1] == 0.8
+
+            long_period = client.get("/api/v1/trends?period_days=1825").json()["trends"]
+            assert long_period["resolution"] == "monthly"
+            assert len(long_period["dates"]) <= 62
+            assert {"スキンケア", "メイクアップ", "ヘアケア"} <= set(long_period["categories"])
+
+            assert client.get("/api/v1/trends?resolution=hourly").status_code == 422
+            assert client.get("/api/v1/trends?period_days=0").status_code == 422
+            too_long = client.get(f"/api/v1/trends?period_days={MAX_PERIOD_DAYS + 1}")
+            assert too_long.status_code == 422
+            assert client.get(f"/api/v1/trends?period_days={10 ** 12}").status_code == 422
+
+        # 停止時に保存した時系列を再起動後に復元する
+        assert realtime_api.trend_store_path.exists()
+        realtime_api.trend_store = TrendTimeSeriesStore()
+        with TestClient(realtime_api.app) as client:
+            trends = client.get("/api/v1/trends?category=メイクアップ&period_days=7").json()["trends"]
+            assert trends["categories"]["メイクアップ"]["trend_score"][-1] == 0.8
+    finally:
+        realtime_api.initialize_model = initialize_model
+        realtime_api.trend_store, realtime_api.trend_store_path = original_store, original_path
+        temp.cleanup()
+
+    return {"points_5y": len(long_period["dates"]), "observations": store.observations}
+
+
+class _StubModel:
+    """固定の確率を返す推論モデルのスタンドイン"""
+
+    model_version = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def predict_with_confidence(self, X):
+        import pandas as pd
+        if self.delay:
+            time.sleep(self.delay)
+        return pd.DataFrame({"hit_probability": [0.6] * len(X), "confidence": [0.9] * len(X)})
+
+
+def test_request_timing():
+    """リクエスト単位のレイテンシ計測のテスト（ステージ別スパン・Server-Timing・/metrics）"""
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+    from src.api.request_timing import RequestTiming, stage
+    import src.api.realtime_api as realtime_api
+
+    # スパンは同じステージで加算され、リクエスト外では記録されない
+    timing = RequestTiming()
+    with timing.span("inference"):
+        time.sleep(0.002)
+    with timing.span("inference"):
+        time.sleep(0.002)
+    assert timing.spans["inference"] >= 0.004
+    header = timing.server_timing_header()
+    assert header.startswith("inference;dur=") and "total;dur=" in header
+    with stage("inference"):
+        pass
+
+    async def pending_initialization():
+        pass
+
+    readiness = ModelReadiness()
+    readiness.transition(ModelState.LOADING, "stub")
+    readiness.transition(ModelState.READY, "stub")
+
+    initialize_model = realtime_api.initialize_model
+    original_readiness = realtime_api.model_readiness
+    original_model = realtime_api.model_instance
+    factors_enabled = realtime_api.PREDICTION_FACTORS_ENABLED
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.model_readiness = readiness
+    realtime_api.model_instance = _StubModel(delay=0.02)
+    realtime_api.prediction_cache.clear()
+    try:
+        with TestClient(realtime_api.app) as client:
+            product = {"name": "Timing Serum", "description": "d", "keywords": ["serum"],
+                       "price": 4200}
+            response = client.post("/api/v1/predict", json=product)
+            assert response.status_code == 200
+
+            spans = {}
+            for entry in response.headers["server-timing"].split(", "):
+                name, duration = entry.split(";dur=")
+                spans[name] = float(duration)
+            expected_spans = {"cache", "feature_extraction", "inference", "serialization", "total"}
+            assert expected_spans <= set(spans)
+            assert spans["inference"] >= 20
+            assert spans["total"] >= spans["inference"] + spans["feature_extraction"]
+
+            # キャッシュヒット時は推論のスパンが無い
+            cached = client.post("/api/v1/predict", json=product)
+            assert "inference" not in cached.headers["server-timing"]
+            assert "explanation" not in spans and response.json()["factors"] == {}
+
+            # 要因分析は PREDICTION_FACTORS_ENABLED の場合のみ
+            realtime_api.PREDICTION_FACTORS_ENABLED = True
+            explained = client.post("/api/v1/predict", json={**product, "name": "Explained Serum"})
+            assert "explanation" in explained.headers["server-timing"]
+
+            metrics = client.get("/metrics")
+            if realtime_api.PROMETHEUS_AVAILABLE:
+                assert metrics.status_code == 200
+                assert "server-timing" not in metrics.headers
+                assert ('api_request_stage_seconds_count'
+                        '{endpoint="/api/v1/predict",stage="inference"}') in metrics.text
+                assert 'api_response_time_seconds_count{endpoint="/api/v1/predict"}' in metrics.text
+                assert 'prediction_duration_seconds_count{model_type="_StubModel"}' in metrics.text
+            else:
+                assert metrics.status_code == 503
+    finally:
+        realtime_api.PREDICTION_FACTORS_ENABLED = factors_enabled
+        realtime_api.initialize_model = initialize_model
+        realtime_api.model_readiness = original_readiness
+        realtime_api.model_instance = original_model
+
+    return {"spans_ms": spans}
+
+
+class _ThreadRecordingStream:
+    """書き込んだスレッドを記録する出力先"""
+
+    def __init__(self):
+        self.lines = []
+        self.threads = set()
+
+    def write(self, text):
+        import threading
+        self.threads.add(threading.current_thread().name)
+        self.lines.append(text)
+
+    def flush(self):
+        pass
+
+
+def test_async_logging():
+    """キュー経由の非同期構造化ログのテスト（書き込みスレッド・静的コンテキスト・サンプリング）"""
+    import tempfile
+    import threading
+    from src.monitoring.logger import StructuredLogger
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stream = _ThreadRecordingStream()
+        structured = StructuredLogger("phase7-async", "DEBUG", async_mode=True, log_dir=tmp_dir,
+                                      stream=stream, sample_rates={"debug": 0.0, "prediction": 1.0})
+        try:
+            structured.info("request handled", endpoint="/api/v1/predict")
+            for _ in range(100):
+                structured.debug("noisy debug")
+            structured.log_prediction("random_forest", {"price": 3000}, 1, 0.9, 0.01)
+            structured.flush()
+
+            # JSON化と書き込みはリスナースレッドで行われる
+            assert threading.current_thread().name not in stream.threads
+            records = [json.loads(line) for line in open(os.path.join(tmp_dir, "phase7-async.log"))]
+            assert [r["message"] for r in records] == ["request handled", "Prediction completed"]
+            assert records[0]["service"] == "ai-hit-prediction"
+            assert records[0]["endpoint"] == "/api/v1/predict"
+            assert records[1]["sample_rate"] == 1.0
+            assert structured.sampled_out == 100
+        finally:
+            structured.stop()
+
+        # 停止後は同期書き込みに切り替わる
+        structured.info("after stop")
+        assert json.loads(stream.lines[-1])["message"] == "after stop"
+        assert threading.current_thread().name in stream.threads
+
+        # 無効なレベルのdebugはサンプリングも行わない
+        quiet = StructuredLogger("phase7-quiet", "INFO", async_mode=False, log_dir=tmp_dir,
+                                 stream=_ThreadRecordingStream(), sample_rates={"debug": 0.0})
+        quiet.debug("skipped")
+        assert quiet.sampled_out == 0
+
+    return {"records": len(records), "sampled_out": structured.sampled_out}
+
+
+def test_model_monitor_sketch():
+    """ModelMonitorのリングバッファと分位点スケッチのテスト（精度・マージ・一定メモリ）"""
+    import numpy as np
+    from src.ml.continuous_learning import ModelMonitor
+    from src.ml.streaming_stats import DDSketch, RingBuffer, WindowedDDSketch
+
+    rng = np.random.default_rng(0)
+    latencies = rng.lognormal(mean=-3, sigma=1, size=20000)
+
+    # 分位点は相対誤差1%以内
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in latencies[:10000]:
+        sketch.add(value)
+    other = DDSketch(relative_accuracy=0.01)
+    other.add_many(latencies[10000:])
+    sketch.merge(other)
+    assert sketch.count == len(latencies)
+    for q in (0.5, 0.95, 0.99):
+        exact = np.quantile(latencies, q)
+        assert abs(sketch.quantile(q) - exact) / exact < 0.02
+    restored = DDSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.quantile(0.95) == sketch.quantile(0.95)
+
+    # バケット数の上限を超えても高分位点は保たれる
+    bounded = DDSketch(relative_accuracy=0.01, max_buckets=64)
+    bounded.add_many(latencies)
+    assert len(bounded.bins) <= 64
+    exact_p99 = np.quantile(latencies, 0.99)
+    assert abs(bounded.quantile(0.99) - exact_p99) / exact_p99 < 0.02
+
+    # 時間窓付きスケッチは古い区間を捨て、現在のレイテンシに追従する
+    now = [0.0]
+    windowed = WindowedDDSketch(interval_seconds=60, n_intervals=5, clock=lambda: now[0])
+    windowed.add_many(np.full(1000, 0.01))
+    now[0] = 200.0
+    windowed.add_many(np.full(100, 0.5))
+    assert windowed.count == 1100 and abs(windowed.quantile(0.5) - 0.01) / 0.01 < 0.02
+    now[0] = 310.0  # 最初の区間（0〜60秒）は窓から外れる
+    assert windowed.count == 100 and abs(windowed.quantile(0.5) - 0.5) / 0.5 < 0.02
+    now[0] = 1000.0
+    assert windowed.count == 0 and windowed.quantile(0.95) is None
+
+    # リングバッファは古い順に直近の値を返す
+    ring = RingBuffer(5, ("latency",))
+    for i in range(12):
+        ring.append(latency=float(i))
+    assert len(ring) == 5 and ring.total == 12
+    assert ring.values("latency").tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert ring.values("latency", last=2).tolist() == [10.0, 11.0]
+
+    # 稼働期間が延びてもメモリは一定
+    monitor = ModelMonitor(history_size=1000, recent_window=100)
+    assert monitor.get_monitoring_summary() == {"status": "No predictions logged"}
+    nbytes = monitor.prediction_history.nbytes
+    for latency in latencies:
+        monitor.log_prediction({"price": 3000}, float(latency < 0.05), 0.8, float(latency))
+    assert monitor.prediction_history.nbytes == nbytes
+
+    summary = monitor.get_monitoring_summary()
+    assert summary["total_predictions"] == len(latencies)
+    assert summary["recent_predictions"] == 100
+    assert abs(summary["avg_latency"] - latencies[-100:].mean()) < 1e-12
+    assert set(summary["latency_percentiles"]) == {"p50", "p95", "p99"}
+    assert summary["p95_latency"] == summary["latency_percentiles"]["p95"]
+    assert abs(summary["confidence_percentiles"]["p50"] - 0.8) / 0.8 < 0.01
+
+    # 窓を過ぎた遅いリクエストは p95 に残らない
+    monitor.latency_sketch.clock = lambda: now[0]
+    for _ in range(100):
+        monitor.log_prediction({"price": 3000}, 1.0, 0.8, 5.0)
+    assert monitor.get_monitoring_summary()["p95_latency"] > 4.5
+    now[0] += monitor.latency_sketch.window_seconds
+    for latency in latencies[:1000]:
+        monitor.log_prediction({"price": 3000}, 1.0, 0.8, float(latency))
+    assert monitor.get_monitoring_summary()["p95_latency"] < 1.0
+    assert summary["latency_window_seconds"] == 300
+
+    start = time.perf_counter()
+    for _ in range(100):
+        monitor.get_monitoring_summary()
+    summary_ms = (time.perf_counter() - start) * 10
+
+    return {"p99_latency": summary["latency_percentiles"]["p99"], "summary_ms": summary_ms}
+
+
+def test_streaming_drift():
+    """ストリーミングドリフト検出のテスト（PSI/KS/JS・ウィンドウ判定・ベースライン保存）"""
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from src.ml.continuous_learning import DataDriftDetector
+    from src.ml.streaming_drift import FeatureHistogram, StreamingDriftDetector
+
+    rng = np.random.default_rng(0)
+    baseline = pd.DataFrame({
+        "price": rng.normal(5000, 1000, 5000),
+        "brand_strength": rng.uniform(0, 1, 5000),
+        "label": ["a"] * 5000
+    })
+
+    detector = StreamingDriftDetector(n_bins=10, window_size=500)
+    detector.fit_baseline(baseline)
+    assert detector.features == ["price", "brand_strength"]
+
+    # 同じ分布のウィンドウではドリフト無し、価格が上がるとPSI/KS/JSが上がる
+    for _ in range(499):
+        row = {"price": rng.normal(5000, 1000), "brand_strength": rng.uniform()}
+        assert detector.update(row) is None
+    stable = detector.update({"price": 5000.0, "brand_strength": 0.5})
+    assert stable is not None and not stable["drift_detected"]
+    assert detector.window_rows == 0
+
+    shifted = pd.DataFrame({"price": rng.normal(6500, 1000, 500),
+                            "brand_strength": rng.uniform(0, 1, 500)})
+    drifted = detector.update(shifted)
+    assert drifted["drifted_features"] == ["price"]
+    scores = drifted["scores"]["price"]
+    assert scores["psi"] > 0.2 and scores["ks"] > 0.2 and 0 < scores["js"] <= 1
+    assert drifted["scores"]["brand_strength"]["psi"] < 0.2
+
+    # ヒストグラムはマージでき、モーメントも保たれる
+    price_baseline = detector.baseline_histogram("price")
+    first, second = FeatureHistogram(price_baseline.edges), FeatureHistogram(price_baseline.edges)
+    first.update(baseline["price"].to_numpy()[:2500])
+    second.update(baseline["price"].to_numpy()[2500:])
+    first.merge(second)
+    assert first.counts.tolist() == price_baseline.counts.tolist()
+    assert abs(first.std - baseline["price"].std()) < 1e-6
+
+    # ベースラインを保存して別プロセス相当の検出器で復元
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "model.drift.json")
+        detector.save_baseline(path)
+        restored = StreamingDriftDetector(window_size=500)
+        restored.load_baseline(path)
+        assert restored.check_data(shifted)["scores"]["price"] == drifted["scores"]["price"]
+
+        # 学習した HitPredictionModel は保存時に学習データのベースラインを書き出す
+        from src.ml.streaming_drift import baseline_path
+        from src.models.basic_model import HitPredictionModel
+        from src.models.forest_export import export_serving_artifact
+        import src.api.realtime_api as realtime_api
+
+        model, X = _train_forest_model(n_samples=200, n_estimators=10)
+        model.model_dir = tmp_dir
+        model_path = model.save_model("trained.pkl")
+        assert baseline_path(model_path).exists()
+        assert realtime_api._load_drift_baseline(Path(model_path)).is_fitted
+        resaved = HitPredictionModel(model_dir=tmp_dir)
+        resaved.load_model(model_path)
+        assert baseline_path(resaved.save_model("resaved.pkl")).exists()
+
+        # ベースラインの無い成果物は、最初の推論データからベースラインを作る
+        exported = export_serving_artifact(model.model, os.path.join(tmp_dir, "exported.pkl"),
+                                           feature_names=list(X.columns))
+        assert not baseline_path(exported).exists()
+        reference = realtime_api._load_drift_baseline(Path(exported))
+        assert reference.collecting_reference and not reference.is_fitted
+        reference.start_reference(150)
+        for start in range(0, 150, 50):
+            assert reference.update(X.iloc[start:start + 50]) is None
+        assert reference.is_fitted and reference.features == list(X.columns)
+        assert not reference.collecting_reference
+        realtime_api._save_reference_baseline(reference, Path(exported))
+        assert realtime_api._load_drift_baseline(Path(exported)).is_fitted
+
+    # 推論時間のメトリクスにはドリフト監視の時間を含めない
+    class SlowDriftMonitor:
+        is_fitted, collecting_reference = True, False
+
+        def update(self, data):
+            time.sleep(0.05)
+
+    class RecordingMetrics:
+        durations = []
+
+        def record_prediction(self, model_type, status, duration):
+            self.durations.append(duration)
+
+    async def pending_initialization():
+        pass
+
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+
+    readiness = ModelReadiness()
+    readiness.transition(ModelState.LOADING, "stub")
+    readiness.transition(ModelState.READY, "stub")
+    originals = {name: getattr(realtime_api, name) for name in
+                 ("initialize_model", "model_readiness", "model_instance", "drift_monitor",
+                  "metrics_collector", "model_artifact_path")}
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.model_readiness = readiness
+    realtime_api.model_instance = _StubModel()
+    recorder = RecordingMetrics()
+    realtime_api.metrics_collector = recorder
+    try:
+        with TestClient(realtime_api.app) as client:
+            realtime_api.drift_monitor = SlowDriftMonitor()
+            product = {"name": "Drift Timing Serum", "description": "d", "keywords": ["serum"],
+                       "price": 4300}
+            assert client.post("/api/v1/predict", json=product).status_code == 200
+            assert len(recorder.durations) == 1 and recorder.durations[0] < 0.05
+
+        # バッチ予測の途中で推論データのベースラインが揃った場合も応答後に保存する
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact = Path(tmp_dir) / "batch.pkl"
+            collecting = StreamingDriftDetector(window_size=500)
+            collecting.start_reference(2)
+            with TestClient(realtime_api.app) as client:
+                realtime_api.drift_monitor = collecting
+                realtime_api.model_artifact_path = artifact
+                products = [dict(product, name=f"Drift Batch {i}") for i in range(2)]
+                response = client.post("/api/v1/batch-predict", json={"products": products})
+                assert response.status_code == 200
+            assert collecting.is_fitted and baseline_path(artifact).exists()
+    finally:
+        for name, value in originals.items():
+            setattr(realtime_api, name, value)
+
+    # DataDriftDetector: 統計量は一括計算、判定には分布スコアが加わる
+    legacy = DataDriftDetector()
+    stats = legacy.calculate_statistics(baseline)
+    assert set(stats) == {"price", "brand_strength"}
+    assert abs(stats["price"]["std"] - baseline["price"].std()) < 1e-6
+    assert abs(stats["price"]["q75"] - baseline["price"].quantile(0.75)) < 1e-6
+    legacy.update_baseline(baseline)
+    constant_price = shifted.assign(price=shifted["price"] * 0 + baseline["price"].mean())
+    result = legacy.detect_drift(constant_price, threshold=10)
+    assert result["drift_detected"] and "price" in result["distribution_scores"]
+
+    return {"psi_shifted": scores["psi"], "psi_stable": stable["scores"]["price"]["psi"]}
+
+
+def test_retraining_worker():
+    """バックグラウンド再学習のテスト（プロセスプール・並列評価・昇格判定・ホットスワップ）"""
+    import tempfile
+    import numpy as np
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+    from src.ml.model_registry import ModelRegistry
+    from src.ml.retraining_worker import (
+        JobStatus, RetrainingWorker, cancel_pending_futures, shutdown_worker_pool
+    )
+    from src.models.basic_model import HitPredictionModel, generate_dummy_data
+    import src.api.realtime_api as realtime_api
+
+    np.random.seed(0)
+    data, labels = generate_dummy_data(300)
+    X = HitPredictionModel(model_dir="data/models").prepare_features(data)
+
+    async def run_worker(model_dir):
+        production = {"path": None, "shadow": False}
+        promoted = []
+
+        async def on_promote(path, job):
+            if production["shadow"]:
+                return JobStatus.SHADOWING
+            promoted.append(job.job_id)
+            production["path"] = path
+
+        worker = RetrainingWorker(model_dir=model_dir, max_workers=2, cpu_limit=1,
+                                  production_path=lambda: production["path"], on_promote=on_promote)
+        await worker.start()
+
+        # 学習中もイベントループは応答し続ける
+        max_gap = 0.0
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            nonlocal max_gap
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                max_gap = max(max_gap, time.perf_counter() - start)
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            # 本番モデルが無ければ昇格
+            first = worker.submit(X, labels, estimator_params={"n_estimators": 20})
+            assert first.status == JobStatus.QUEUED
+            await worker.wait(first.job_id, timeout=120)
+            assert first.status == JobStatus.PROMOTED, first.error
+            assert promoted == [first.job_id]
+            assert first.candidate_metrics["n_samples"] == 60 and first.production_metrics is None
+            assert os.path.exists(first.candidate_path.replace(".pkl", ".drift.json"))
+
+            # 本番モデルと同じホールドアウトで並列評価し、改善幅が足りなければ昇格しない
+            worker.min_improvement = 1.0
+            worker.model_dir = Path(model_dir) / "rejected"
+            second = worker.submit(X, labels, promote=True, estimator_params={"n_estimators": 20})
+            await worker.wait(second.job_id, timeout=120)
+            assert second.status == JobStatus.REJECTED
+            assert second.production_metrics["model_version"] == first.candidate_version
+            assert "improvement" in second.decision
+            assert promoted == [first.job_id]
+
+            # 不採用・失敗した候補の成果物（モデル・フォレスト・ドリフトベースライン）は残らない
+            failed = worker.submit(X, labels, estimator_params={"n_estimators": 0})
+            await worker.wait(failed.job_id, timeout=120)
+            assert failed.status == JobStatus.FAILED
+            assert os.listdir(worker.model_dir) == []
+            worker.model_dir = Path(model_dir)
+
+            # シャドー評価に回したジョブは判定が出るまで終了しない
+            worker.min_improvement = -1.0
+            production["shadow"] = True
+            third = worker.submit(X, labels, estimator_params={"n_estimators": 20})
+            deadline = time.monotonic() + 120
+            while (third.status != JobStatus.SHADOWING and not third.is_finished
+                   and time.monotonic() < deadline):
+                await asyncio.sleep(0.05)
+            assert third.status == JobStatus.SHADOWING and not third.is_finished, third.error
+            assert third.job_id not in worker._payloads
+            assert not worker.complete_job(second.job_id, JobStatus.PROMOTED)
+            assert worker.complete_job(third.job_id, JobStatus.PROMOTED, decision="shadow promote")
+            assert third.status == JobStatus.PROMOTED
+            assert third.decision.endswith("; shadow promote")
+        finally:
+            stop.set()
+            await beat
+            await worker.stop()
+
+        jobs = worker.list_jobs()
+        expected_order = [third.job_id, failed.job_id, second.job_id, first.job_id]
+        assert [job["job_id"] for job in jobs] == expected_order
+        assert worker.get_stats()["jobs"] == {"promoted": 2, "rejected": 1, "failed": 1}
+        json.dumps(jobs)
+        return first, max_gap
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        first, max_gap = asyncio.run(run_worker(tmp_dir))
+    assert max_gap < 0.5
+
+    # プールの終了時は開始前のタスクを取り消し、実行中のタスクは待つ（3.8 は cancel_futures が無い）
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    running = executor.submit(release.wait, 10)
+    queued = [executor.submit(time.sleep, 0) for _ in range(3)]
+    assert cancel_pending_futures(executor) == 3 and all(f.cancelled() for f in queued)
+    release.set()
+    shutdown_worker_pool(executor)
+    assert running.result() is True
+
+    # API: 再学習ジョブを投入し、昇格したモデルに再起動なしで切り替わる
+    async def pending_initialization():
+        pass
+
+    readiness = ModelReadiness()
+    readiness.transition(ModelState.LOADING, "stub")
+    readiness.transition(ModelState.READY, "stub")
+
+    rng = np.random.default_rng(1)
+    products = [
+        {"name": f"Retrain Product {i}", "description": "d", "keywords": ["serum"],
+         "price": int(rng.integers(1000, 20000)), "brand_strength": float(rng.uniform())}
+        for i in range(80)
+    ]
+    retrain_labels = [int(p["brand_strength"] > 0.6) for p in products]
+
+    initialize_model = realtime_api.initialize_model
+    original_readiness = realtime_api.model_readiness
+    original_model = realtime_api.model_instance
+    original_path = realtime_api.model_artifact_path
+    original_dir = realtime_api.retraining_worker.model_dir
+    original_registry = realtime_api.model_registry
+    original_drift = realtime_api.drift_monitor
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.model_readiness = readiness
+    realtime_api.model_instance = _StubModel()
+    realtime_api.model_artifact_path = None
+    realtime_api.prediction_cache.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir, TestClient(realtime_api.app) as client:
+            realtime_api.retraining_worker.model_dir = Path(tmp_dir) / "candidates"
+            realtime_api.model_registry = ModelRegistry(Path(tmp_dir) / "registry")
+            invalid = client.post("/api/v1/retrain",
+                                  json={"products": products, "labels": [0] * 80})
+            assert invalid.status_code == 422
+
+            response = client.post("/api/v1/retrain", json={"products": products,
+                                                           "labels": retrain_labels,
+                                                           "n_estimators": 20})
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            deadline = time.time() + 120
+            while time.time() < deadline:
+                # 学習中も推論は旧モデルで応答する
+                assert client.get("/health/ready").status_code == 200
+                job = client.get(f"/api/v1/retrain/jobs/{job_id}").json()
+                if job["status"] in ("promoted", "rejected", "failed"):
+                    break
+                time.sleep(0.1)
+            assert job["status"] == "promoted", job
+
+            # 昇格したモデルはレジストリに登録され、そこから読み込まれる
+            ready = client.get("/health/ready").json()
+            assert ready["model_version"] == job["candidate_version"]
+            current = client.get("/api/v1/models/current").json()
+            assert current["metadata"]["job_id"] == job_id and current["generation"] == 1
+            assert realtime_api.model_artifact_path == Path(current["model_file"])
+            prediction = client.post("/api/v1/predict", json=products[0])
+            assert prediction.status_code == 200
+            assert client.get("/api/v1/retrain/jobs").json()["jobs"][0]["job_id"] == job_id
+            assert client.get("/api/v1/retrain/jobs/missing").status_code == 404
+    finally:
+        realtime_api.initialize_model = initialize_model
+        realtime_api.model_readiness = original_readiness
+        realtime_api.model_instance = original_model
+        realtime_api.model_artifact_path = original_path
+        realtime_api.retraining_worker.model_dir = original_dir
+        realtime_api.model_registry = original_registry
+        realtime_api.drift_monitor = original_drift
+
+    return {
+        "training_time": first.training_time,
+        "candidate_auc": first.candidate_metrics["auc"],
+        "max_event_loop_gap_ms": max_gap * 1000
+    }
+
+
+def test_model_registry():
+    """モデルレジストリのテスト（重複排除・同時昇格・セグメント別の本番モデル・変更カウンター）"""
+    import tempfile
+    import threading
+    import joblib
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+    from src.ml.continuous_learning import ModelVersionManager
+    from src.ml.model_registry import ModelRegistry
+    from src.ml.streaming_drift import StreamingDriftDetector, baseline_path
+    import src.api.realtime_api as realtime_api
+
+    model, X = _train_forest_model(n_samples=200, n_estimators=10)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # コンパイル済みフォレストとドリフトベースラインも一緒に保存される
+        model.model_dir = tmp_dir
+        model_path = model.save_model("candidate.pkl")
+        detector = StreamingDriftDetector()
+        detector.fit_baseline(X)
+        detector.save_baseline(baseline_path(model_path))
+
+        # ディレクトリとDBは最初の登録時に作成する（生成しただけではファイルを作らない）
+        registry = ModelRegistry(os.path.join(tmp_dir, "registry"))
+        assert not registry.exists and not os.path.exists(registry.root_dir)
+        first = registry.register(model_path, {"auc": 0.7}, segment="skincare")
+        assert registry.exists
+        second = registry.register(model_path, {"auc": 0.7}, segment="skincare")
+        stats = registry.get_stats()
+        assert stats["versions"] == 2 and stats["artifacts"] == 1
+        info = registry.get(first)
+        assert info["artifact_hash"] == registry.get(second)["artifact_hash"]
+        artifact_dir = Path(info["model_file"]).parent
+        assert sorted(p.name for p in artifact_dir.iterdir()) == [
+            "model.drift.json", "model.forest", "model.pkl"
+        ]
+
+        # 昇格はセグメントごと、世代番号は昇格のたびに増える
+        assert registry.current("skincare") is None and registry.generation() == 0
+        assert registry.promote(first)["generation"] == 1
+        assert registry.promote(second)["generation"] == 2
+        assert registry.current("skincare")["version_id"] == second
+        assert registry.get(first)["status"] == "archived"
+        assert registry.current("makeup") is None
+        assert registry.rollback("skincare")["version_id"] == first
+        production = registry.list_versions(segment="skincare", status="production")
+        assert production[0]["version_id"] == first
+
+        # 複数スレッド（別接続）から同時に登録・昇格しても壊れない
+        errors = []
+
+        def promote_many(worker_id):
+            try:
+                worker_registry = ModelRegistry(registry.root_dir)
+                for i in range(5):
+                    path = os.path.join(tmp_dir, f"model_{worker_id}_{i}.pkl")
+                    joblib.dump({"worker": worker_id, "i": i}, path)
+                    version_id = worker_registry.register(path, segment=f"segment_{worker_id % 2}")
+                    worker_registry.promote(version_id)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=promote_many, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors
+        assert registry.generation() == 3 + 30
+        assert registry.count() == 2 + 30
+        assert set(registry.segments()) == {"skincare", "segment_0", "segment_1"}
+        assert registry.get_stats()["artifacts"] == 1 + 30
+
+        # 旧形式の versions.json を取り込む
+        legacy_dir = os.path.join(tmp_dir, "legacy")
+        os.makedirs(legacy_dir)
+        legacy_models = []
+        for version_id, status, promoted_at in [("v_first", "archived", "2024-01-02T00:00:00"),
+                                                ("v_old", "production", "2024-02-01T00:00:00"),
+                                                ("v_staged", "staged", None)]:
+            legacy_file = os.path.join(legacy_dir, f"model_{version_id}.pkl")
+            joblib.dump({"legacy": version_id}, legacy_file)
+            entry = {"version_id": version_id, "timestamp": "2024-01-01T00:00:00",
+                     "model_file": legacy_file, "metrics": {"accuracy": 0.8},
+                     "metadata": {}, "status": status}
+            if promoted_at:
+                entry["promoted_at"] = promoted_at
+            legacy_models.append(entry)
+        with open(os.path.join(legacy_dir, "versions.json"), "w") as f:
+            json.dump({"models": legacy_models, "current": "v_old"}, f)
+        manager = ModelVersionManager(legacy_dir)
+        assert manager.current_version == "v_old"
+        assert manager.load_model()[0] == {"legacy": "v_old"}
+        assert os.path.exists(os.path.join(legacy_dir, "versions.json.migrated"))
+        # 状態・日時・昇格履歴を引き継ぐ
+        imported = {v["version_id"]: v for v in manager.registry.list_versions()}
+        assert {k: v["status"] for k, v in imported.items()} == {
+            "v_first": "archived", "v_old": "production", "v_staged": "staged"}
+        assert imported["v_first"]["promoted_at"] == "2024-01-02T00:00:00"
+        assert imported["v_staged"]["timestamp"] == "2024-01-01T00:00:00"
+        new_version = manager.save_model({"legacy": False}, {"accuracy": 0.9}, {})
+        assert manager.promote_model(new_version) and manager.current_version == new_version
+        assert manager.rollback_model() and manager.current_version == "v_old"
+        assert manager.rollback_model(steps=2) and manager.current_version == "v_first"
+        assert not manager.promote_model("missing")
+
+        # API: 別のワーカーが昇格すると変更カウンターで検知して差し替える
+        async def pending_initialization():
+            pass
+
+        readiness = ModelReadiness()
+        readiness.transition(ModelState.LOADING, "stub")
+        readiness.transition(ModelState.READY, "stub")
+
+        api_registry = ModelRegistry(os.path.join(tmp_dir, "api_registry"))
+        initialize_model = realtime_api.initialize_model
+        original_readiness = realtime_api.model_readiness
+        original_model = realtime_api.model_instance
+        original_registry = realtime_api.model_registry
+        original_generation = realtime_api.model_generation
+        original_path = realtime_api.model_artifact_path
+        original_drift = realtime_api.drift_monitor
+        original_poll = os.environ.get("REGISTRY_POLL_SECONDS")
+        realtime_api.initialize_model = pending_initialization
+        realtime_api.model_readiness = readiness
+        realtime_api.model_instance = _StubModel()
+        realtime_api.model_registry = api_registry
+        realtime_api.model_generation = None
+        os.environ["REGISTRY_POLL_SECONDS"] = "0.05"
+        try:
+            with TestClient(realtime_api.app) as client:
+                assert client.get("/api/v1/models/current").status_code == 404
+                other_worker = ModelRegistry(api_registry.root_dir)
+                promoted = other_worker.promote(other_worker.register(model_path, {"auc": 0.7}))
+
+                deadline = time.time() + 10
+                while time.time() < deadline:
+                    if client.get("/health/ready").json()["model_version"] != "stub":
+                        break
+                    time.sleep(0.05)
+                assert client.get("/health/ready").json()["model_version"] == model.model_version
+                listing = client.get("/api/v1/models").json()
+                assert listing["serving"]["generation"] == promoted["generation"]
+                assert listing["versions"][0]["version_id"] == promoted["version_id"]
+                assert realtime_api.drift_monitor.features == list(X.columns)
+        finally:
+            realtime_api.initialize_model = initialize_model
+            realtime_api.model_readiness = original_readiness
+            realtime_api.model_instance = original_model
+            realtime_api.model_registry = original_registry
+            realtime_api.model_generation = original_generation
+            realtime_api.model_artifact_path = original_path
+            realtime_api.drift_monitor = original_drift
+            if original_poll is None:
+                os.environ.pop("REGISTRY_POLL_SECONDS", None)
+            else:
+                os.environ["REGISTRY_POLL_SECONDS"] = original_poll
+
+    return {"generation": promoted["generation"], "artifacts": stats["artifacts"],
+            "versions": stats["versions"]}
+
+
+def test_shadow_evaluation():
+    """候補モデルのシャドー評価のテスト（サンプリング・一致率・キャリブレーション・A/Bテスト・昇格）"""
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from fastapi.testclient import TestClient
+    from src.api.readiness import ModelReadiness, ModelState
+    from src.api.shadow_evaluation import ShadowEvaluator
+    from src.business.ab_testing import ABTestManager
+    from src.ml.model_registry import ModelRegistry
+    from src.models.basic_model import HitPredictionModel
+    import src.api.realtime_api as realtime_api
+
+    class FixedModel:
+        def __init__(self, probability):
+            self.probability = probability
+
+        def predict_with_confidence(self, X):
+            return pd.DataFrame({"hit_probability": [self.probability] * len(X),
+                                 "confidence": [0.9] * len(X)})
+
+    features = pd.DataFrame({"x": [1.0]})
+
+    async def run_shadow(candidate, labels, **options):
+        promoted = []
+
+        async def on_promote(evaluator):
+            promoted.append(evaluator.candidate_version)
+
+        manager = ABTestManager()
+        evaluator = ShadowEvaluator("candidate", "production", ab_test_manager=manager,
+                                    on_promote=on_promote, **options)
+        await evaluator.start(model=candidate)
+        try:
+            for i, label in enumerate(labels):
+                evaluator.submit(f"p{i}", features, 0.3 if label == 0 else 0.7, 0.001)
+            await evaluator.drain()
+            for i, label in enumerate(labels):
+                evaluator.record_outcome(f"p{i}", label)
+            return evaluator, evaluator.evaluate(), promoted
+        finally:
+            await evaluator.stop()
+
+    # 本番と同じ判断をする候補はラベル無しでも一致率で昇格する
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, 200).tolist()
+    evaluator, evaluation, promoted = asyncio.run(run_shadow(
+        FixedModel(0.3), [0] * 50, sample_rate=1.0, min_samples=50, min_labeled=100,
+        auto_promote=True
+    ))
+    assert evaluation["agreement_rate"] == 1.0 and evaluation["decision"] == "promote"
+    assert promoted == ["candidate"] and evaluator.promoted
+    assert len(evaluator.recent(10)) == 10
+    # 停止したA/Bテストは管理側から破棄され、結果だけが履歴に残る
+    assert not evaluator.ab_test_manager.active_tests
+    assert len(evaluator.ab_test_manager.test_history) == 1
+
+    # 常に0.95を返す候補はキャリブレーションとA/Bテストで却下される
+    _, evaluation, promoted = asyncio.run(run_shadow(
+        FixedModel(0.95), labels, sample_rate=1.0, min_samples=100, min_labeled=100
+    ))
+    assert evaluation["decision"] == "reject" and promoted == []
+    calibration = evaluation["calibration"]
+    assert calibration["candidate"]["ece"] > calibration["production"]["ece"]
+    assert evaluation["ab_test"]["variant_a"]["conversion_rate"] == 1.0
+
+    # 昇格処理が失敗した場合は昇格済みにならず、自動判定は evaluation_interval ごとに限る
+    async def failing_promotion():
+        calls = {"promote": 0, "evaluate": 0, "reject": 0}
+
+        async def on_promote(evaluator):
+            calls["promote"] += 1
+            if calls["promote"] == 1:
+                raise RuntimeError("registry unavailable")
+
+        async def on_reject(evaluator):
+            calls["reject"] += 1
+
+        evaluator = ShadowEvaluator("candidate", sample_rate=1.0, batch_size=1, min_samples=1,
+                                    auto_promote=True, evaluation_interval=3600,
+                                    on_promote=on_promote, on_reject=on_reject)
+        evaluate = evaluator.evaluate
+
+        def counting_evaluate():
+            calls["evaluate"] += 1
+            return evaluate()
+
+        evaluator.evaluate = counting_evaluate
+        await evaluator.start(model=FixedModel(0.3))
+        try:
+            for i in range(20):
+                evaluator.submit(f"p{i}", features, 0.3, 0.001)
+            await evaluator.drain()
+            assert calls == {"promote": 1, "evaluate": 1, "reject": 0} and not evaluator.promoted
+            assert evaluator.is_running
+            await evaluator.promote()
+            assert calls["promote"] == 2 and evaluator.promoted and not evaluator.is_running
+            await evaluator.reject()
+            assert calls["reject"] == 0 and not evaluator.rejected
+        finally:
+            await evaluator.stop()
+
+        rejected = ShadowEvaluator("other", on_reject=on_reject)
+        await rejected.reject()
+        assert calls["reject"] == 1 and rejected.rejected and rejected.evaluate()["rejected"]
+
+    asyncio.run(failing_promotion())
+
+    # 正解ラベル無しではキャリブレーションを判定できないため min_labeled は 1 以上
+    try:
+        ShadowEvaluator("candidate", min_labeled=0)
+        raise AssertionError("min_labeled=0 should be rejected")
+    except ValueError:
+        pass
+
+    # サンプリング率どおりにキューへ積み、呼び出し側のコストはマイクロ秒単位
+    async def sample_overhead():
+        evaluator = ShadowEvaluator("candidate", sample_rate=0.1, queue_size=100000)
+        await evaluator.start(model=FixedModel(0.5))
+        try:
+            n = 20000
+            start = time.perf_counter()
+            for i in range(n):
+                evaluator.submit(str(i), features, 0.5, 0.001)
+            return evaluator.sampled / n, (time.perf_counter() - start) / n
+        finally:
+            await evaluator.stop()
+
+    sampled_fraction, submit_seconds = asyncio.run(sample_overhead())
+    assert 0.08 < sampled_fraction < 0.12
+    assert submit_seconds < 100e-6
+
+    # API: 登録済みの候補を別プロセスでシャドー採点し、判定を経て昇格する
+    async def pending_initialization():
+        pass
+
+    readiness = ModelReadiness()
+    readiness.transition(ModelState.LOADING, "stub")
+    readiness.transition(ModelState.READY, "stub")
+
+    products = [
+        {"name": f"Shadow Product {i}", "description": "d", "keywords": ["serum"],
+         "price": int(rng.integers(1000, 20000)), "brand_strength": float(rng.uniform())}
+        for i in range(60)
+    ]
+
+    initialize_model = realtime_api.initialize_model
+    original_readiness = realtime_api.model_readiness
+    original_model = realtime_api.model_instance
+    original_registry = realtime_api.model_registry
+    original_generation = realtime_api.model_generation
+    original_path = realtime_api.model_artifact_path
+    original_drift = realtime_api.drift_monitor
+    realtime_api.initialize_model = pending_initialization
+    realtime_api.model_readiness = readiness
+    realtime_api.model_instance = _StubModel()
+    realtime_api.prediction_cache.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir, TestClient(realtime_api.app) as client:
+            X = realtime_api._build_feature_matrix(products)
+            model = HitPredictionModel(model_dir=tmp_dir)
+            model.train(X, [int(p["brand_strength"] > 0.5) for p in products], validate=False)
+            model_path = model.save_model("candidate.pkl")
+            realtime_api.model_registry = ModelRegistry(os.path.join(tmp_dir, "registry"))
+            version_id = realtime_api.model_registry.register(model_path, {"auc": 0.8})
+            realtime_api.model_instance = realtime_api._load_model_artifact(Path(model_path))
+
+            assert client.get("/api/v1/shadow").status_code == 404
+            assert client.post("/api/v1/shadow", json={"version_id": "missing"}).status_code == 404
+            response = client.post("/api/v1/shadow", json={"version_id": version_id,
+                                                           "sample_rate": 1.0,
+                                                           "min_samples": 20, "min_labeled": 20,
+                                                           "require_outcomes": True})
+            assert response.status_code == 200 and response.json()["decision"] == "collecting"
+
+            outcomes = []
+            for product in products[:20]:
+                prediction = client.post("/api/v1/predict", json=product).json()
+                outcomes.append({"prediction_id": prediction["prediction_id"],
+                                 "label": int(prediction["hit_probability"] >= 0.5)})
+
+            deadline = time.time() + 60
+            while time.time() < deadline and client.get("/api/v1/shadow").json()["samples"] < 20:
+                time.sleep(0.1)
+            status = client.get("/api/v1/shadow").json()
+            assert status["samples"] == 20 and status["agreement_rate"] == 1.0
+            assert status["decision"] == "awaiting_outcomes"
+            assert client.post("/api/v1/shadow/promote").status_code == 409
+
+            log = client.get("/api/v1/shadow/log", params={"limit": 5}).json()["records"]
+            assert len(log) == 5 and log[0]["candidate"]["model_version"] == version_id
+            unmatched = {"prediction_id": "missing", "label": 1}
+            recorded = client.post("/api/v1/shadow/outcomes",
+                                   json={"outcomes": outcomes + [unmatched]}).json()
+            assert recorded == {"recorded": 20, "unmatched": 1}
+            status = client.get("/api/v1/shadow").json()
+            assert status["decision"] == "promote", status["reasons"]
+
+            promoted = client.post("/api/v1/shadow/promote").json()
+            assert promoted["promoted"] == version_id and promoted["generation"] == 1
+            assert realtime_api.model_registry.current()["version_id"] == version_id
+            assert client.get("/api/v1/shadow").status_code == 404
+
+            # キャッシュから返す予測にも毎回新しい予測IDを発行する
+            repeated = [client.post("/api/v1/predict", json=products[-1]).json()["prediction_id"]
+                        for _ in range(2)]
+            assert repeated[0] != repeated[1]
+    finally:
+        realtime_api.initialize_model = initialize_model
+        realtime_api.model_readiness = original_readiness
+        realtime_api.model_instance = original_model
+        realtime_api.model_registry = original_registry
+        realtime_api.model_generation = original_generation
+        realtime_api.model_artifact_path = original_path
+        realtime_api.drift_monitor = original_drift
+
+    return {
+        "sampled_fraction": sampled_fraction,
+        "submit_us": submit_seconds * 1e6,
+        "candidate_latency_p50_ms": status["latency_seconds"]["candidate"]["p50"] * 1000
+    }
+
+
+def _ensemble_data(n_samples: int = 300, n_features: int = 10, seed: int = 0):
+    """アンサンブル用の2値分類データ"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_samples, n_features)),
+                     columns=[f"feature_{i}" for i in range(n_features)])
+    noise = rng.normal(0, 0.5, n_samples)
+    logits = X["feature_0"] + 0.5 * X["feature_1"] - 0.5 * X["feature_2"] + noise
+    return X, (logits > 0).astype(int).to_numpy()
+
+
+def _small_ensemble(ensemble_type: str = "advanced", n_estimators: int = 20, **kwargs):
+    """ベースモデルの木の本数を減らしたアンサンブル"""
+    from src.models.ensemble_model import EnsembleModel
+
+    model = EnsembleModel(ensemble_type=ensemble_type, **kwargs)
+    for base_model in model.base_models.values():
+        base_model.set_params(n_estimators=n_estimators)
+    return model
+
+
+def test_parallel_ensemble_training():
+    """アンサンブル学習のテスト（モデル×フォールドの並列学習・CPU予算・out-of-fold予測の再利用）"""
+    import numpy as np
+    from sklearn.metrics import f1_score
+    from src.models.ensemble_training import EnsembleTrainer, cpu_budget
+
+    X, y = _ensemble_data()
+    base_models = _small_ensemble().base_models
+
+    # CPU予算はワーカー数 × タスクあたりスレッド数に割り当てる
+    assert EnsembleTrainer(cpu_limit=8, max_workers=4).plan(25)[1] == max(1, cpu_budget(8) // 4)
+    assert EnsembleTrainer(cpu_limit=1).plan(25) == (1, 1)
+
+    # プロセスプールでも逐次実行と同じout-of-fold予測になる
+    sequential = EnsembleTrainer(cpu_limit=1).fit(base_models, X, y)
+    parallel = EnsembleTrainer(max_workers=2).fit(base_models, X, y)
+    assert parallel.workers == 2 and sequential.workers == 1
+    assert parallel.oof_proba.shape == (len(X), len(base_models))
+    for name in ("rf", "gb"):
+        column = parallel.model_names.index(name)
+        assert np.allclose(parallel.oof_proba[:, column], sequential.oof_proba[:, column])
+    assert all(len(models) == 5 and all(m is not None for m in models)
+               for models in parallel.fold_models.values())
+    assert parallel.full_models["rf"].get_params()["n_jobs"] == -1
+    assert base_models["rf"].get_params()["n_jobs"] == -1
+    assert not hasattr(base_models["rf"], "estimators_")
+
+    # 高度なアンサンブルはフォールドの学習結果から重みを決め、再学習しない
+    model = _small_ensemble(cpu_limit=1)
+    results = model.train(X, y)
+    oof = model.oof_predictions
+    assert list(oof.columns) == list(model.base_models)
+    rf_predicted = (oof["rf"].to_numpy() >= 0.5).astype(int)
+    fold_f1 = [f1_score(y[val_idx], rf_predicted[val_idx])
+               for _, val_idx in model.trainer.make_folds(X, y)]
+    assert np.isclose(results["model_specializations"]["rf"]["mean_performance"], np.mean(fold_f1))
+    assert np.isclose(sum(model.model_weights.values()), 1.0)
+    assert results["train"]["auc"] > 0.5
+
+    return {
+        "sequential_fit_seconds": sequential.total_fit_time,
+        "parallel_wall_seconds": parallel.wall_time,
+        "tasks": len(parallel.fit_times)
+    }
+
+
+def test_oof_cache():
+    """out-of-foldキャッシュのテスト（戦略間の共有・パラメータ変更時の部分再学習・ディスク保存）"""
+    import tempfile
+    import numpy as np
+    from src.models.oof_cache import OOFCache, dataset_fingerprint, params_hash
+
+    X, y = _ensemble_data()
+    X_train, y_train, X_val, y_val = X.iloc[:240], y[:240], X.iloc[240:], y[240:]
+
+    # キーはデータ・パラメータで変わり、スレッド数では変わらない
+    model = _small_ensemble("voting", cpu_limit=1)
+    rf = model.base_models["rf"]
+    assert params_hash(rf) == params_hash(rf.__class__(**{**rf.get_params(), "n_jobs": 1}))
+    assert params_hash(rf) != params_hash(rf.__class__(**{**rf.get_params(), "max_depth": 3}))
+    assert dataset_fingerprint(X_train, y_train) != dataset_fingerprint(X_train, 1 - y_train)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = OOFCache(cache_dir=tmp_dir)
+        model = _small_ensemble("voting", cpu_limit=1, oof_cache=cache)
+        results = model.compare_strategies(X_train, y_train, X_val, y_val)
+
+        # ベースモデルの学習は最初の戦略のみ
+        assert results["voting"]["training_time"]["cached_models"] == []
+        for strategy in ("stacking", "blending", "advanced"):
+            cached_models = results[strategy]["training_time"]["cached_models"]
+            assert sorted(cached_models) == sorted(model.base_models)
+            assert results[strategy]["training_time"]["sequential_time"] == 0
+            assert 0.5 < results[strategy]["validation"]["auc"] <= 1.0
+        assert cache.get_stats()["hits"] == 3 * len(model.base_models)
+        assert model.predict(X_val).shape == (len(X_val),)
+
+        # 別のモデル（別セッション）でもディスクから再利用し、パラメータを変えたモデルだけ学習する
+        other = _small_ensemble("stacking", cpu_limit=1, oof_cache=OOFCache(cache_dir=tmp_dir))
+        other.base_models["gb"].set_params(max_depth=2)
+        stacking = other.train(X_train, y_train, X_val, y_val)
+        cached_models = stacking["training_time"]["cached_models"]
+        assert sorted(cached_models) == sorted(set(other.base_models) - {"gb"})
+        assert np.allclose(other.oof_predictions["rf"], model.oof_predictions["rf"])
+        assert not np.allclose(other.oof_predictions["gb"], model.oof_predictions["gb"])
+
+    return {
+        "first_strategy_seconds": results["voting"]["training_time"]["wall_time"],
+        "cached_strategy_seconds": results["advanced"]["training_time"]["wall_time"]
+    }
+
+
+def _legacy_advanced_predict(ensemble_model, X):
+    """行ごとのPythonループによる重み付き多数決（従来の _predict_advanced）"""
+    import numpy as np
+
+    predictions = np.array([model.predict(X) for model in ensemble_model["base_models"].values()]).T
+    weights = np.array([ensemble_model["weights"][name] for name in ensemble_model["base_models"]])
+    return np.array([1 if np.sum(row * weights) > 0.5 else 0 for row in predictions])
+
+
+def _legacy_advanced_proba(ensemble_model, X):
+    """モデルごとに predict_proba を呼ぶ重み付き平均（従来の _predict_proba_advanced）"""
+    import numpy as np
+
+    probabilities = np.array([model.predict_proba(X)[:, 1]
+                              for model in ensemble_model["base_models"].values()]).T
+    weights = np.array([ensemble_model["weights"][name] for name in ensemble_model["base_models"]])
+    weighted = np.average(probabilities, axis=1, weights=weights)
+    return np.column_stack([1 - weighted, weighted])
+
+
+def test_ensemble_inference():
+    """アンサンブル推論エンジンのテスト（行列演算の結果一致・確率行列のキャッシュ・並行呼び出し）"""
+    import numpy as np
+    from src.models.ensemble_inference import EnsemblePredictor
+    from src.models.oof_cache import OOFCache
+
+    X, y = _ensemble_data()
+    X_train, y_train, X_val = X.iloc[:240], y[:240], X.iloc[240:]
+    cache = OOFCache()
+
+    # 従来の行ループ・モデルごとの呼び出しと同じ結果
+    advanced = _small_ensemble("advanced", cpu_limit=1, oof_cache=cache)
+    advanced.train(X_train, y_train)
+    labels, proba = advanced.predict_with_proba(X_val)
+    assert np.array_equal(labels, _legacy_advanced_predict(advanced.ensemble_model, X_val))
+    assert np.allclose(proba, _legacy_advanced_proba(advanced.ensemble_model, X_val))
+
+    blending = _small_ensemble("blending", cpu_limit=1, oof_cache=cache)
+    blending.train(X_train, y_train)
+    meta_input = np.column_stack([m.predict_proba(X_val)[:, 1]
+                                  for m in blending.base_models.values()])
+    meta_model = blending.ensemble_model["meta_model"]
+    assert np.array_equal(blending.predict(X_val), meta_model.predict(meta_input))
+    assert np.allclose(blending.predict_proba(X_val), meta_model.predict_proba(meta_input))
+
+    # ベースモデルは入力ごとに1回だけ呼ばれ、predict と predict_proba で確率行列を共有する
+    predictor = EnsemblePredictor.from_ensemble(advanced.ensemble_model)
+    predictor.predict(X_val)
+    predictor.predict_proba(X_val)
+    predictor.predict(X_val.copy())
+    assert predictor.model_calls == len(advanced.base_models)
+    predictor.predict(X_val.iloc[:10])
+    assert predictor.model_calls == 2 * len(advanced.base_models)
+    assert not predictor.base_probabilities(X_val).flags.writeable
+
+    # スレッドで並行に呼び出しても同じ結果
+    parallel = EnsemblePredictor.from_ensemble(advanced.ensemble_model, max_workers=4, cache_size=0)
+    try:
+        assert np.array_equal(parallel.predict(X_val), labels)
+        assert np.allclose(parallel.predict_proba(X_val), proba)
+    finally:
+        parallel.close()
+
+    # 学習し直すとエンジンも作り直される
+    first_engine = advanced.predictor
+    advanced.ensemble_type = "voting"
+    advanced.train(X_train, y_train)
+    assert advanced.predictor is not first_engine and advanced.predictor.method == "soft_vote"
+
+    return {"base_model_calls": predictor.model_calls}
+
+
+def test_forest_export():
+    """フォレスト変換のテスト（各ライブラリ・アンサンブルとの一致、欠損値、サービング用成果物の読み込み）"""
+    import tempfile
+    import time
+    import numpy as np
+    import xgboost as xgb
+    import lightgbm as lgb
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from src.models.basic_model import HitPredictionModel
+    from src.models.compiled_forest import CompiledForest, NUMBA_AVAILABLE
+    from src.models.forest_export import compile_model, export_serving_artifact
+    from src.models.oof_cache import OOFCache
+    from src.optimization.hyperparameter_optimizer import AutoML
+
+    X, y = _ensemble_data()
+    X_train, y_train, X_val = X.iloc[:240], y[:240], X.iloc[240:]
+    X_missing = X_val.copy()
+    X_missing.iloc[::3, 0] = np.nan
+
+    # 単体モデル（XGBoost は float32 で比較するため許容誤差内）
+    estimators = {
+        "rf": RandomForestClassifier(n_estimators=30, random_state=0),
+        "gb": GradientBoostingClassifier(n_estimators=30, random_state=0),
+        "xgb": xgb.XGBClassifier(n_estimators=30, max_depth=4),
+        "lgb": lgb.LGBMClassifier(n_estimators=30, verbose=-1),
+    }
+    for name, estimator in estimators.items():
+        estimator.fit(X_train, y_train)
+        forest = compile_model(estimator)
+        for data in ([X_val] if name == "gb" else [X_val, X_missing]):
+            assert np.allclose(forest.predict_proba(data), estimator.predict_proba(data),
+                               atol=1e-6), name
+            assert np.array_equal(forest.predict(data), estimator.predict(data)), name
+
+    # 全てのアンサンブルタイプ（ベースモデルの木を1つのノード配列に連結）
+    cache = OOFCache()
+    for ensemble_type in ("voting", "stacking", "blending", "advanced"):
+        ensemble = _small_ensemble(ensemble_type, cpu_limit=1, oof_cache=cache)
+        ensemble.train(X_train, y_train)
+        forest = compile_model(ensemble)
+        assert forest.n_groups == len(ensemble.base_models)
+        assert np.allclose(forest.predict_proba(X_val), ensemble.predict_proba(X_val),
+                           atol=1e-6), ensemble_type
+        assert np.array_equal(forest.predict(X_val), ensemble.predict(X_val)), ensemble_type
+
+    # AutoML の最良モデル
+    automl = AutoML(n_trials=1)
+    automl.best_model = estimators["xgb"]
+    assert np.allclose(compile_model(automl).predict_proba(X_val), automl.predict_proba(X_val),
+                       atol=1e-6)
+
+    # Numba は任意依存（未インストール時は NumPy の評価器のみ）
+    if NUMBA_AVAILABLE:
+        assert np.array_equal(forest.apply(X_missing, evaluator="numba"), forest.apply(X_missing))
+    else:
+        try:
+            forest.apply(X_val, evaluator="numba")
+            raise AssertionError("numba evaluator should require numba")
+        except ImportError:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # サービング用成果物は HitPredictionModel（API のワーカー）がフォレストのみで読み込む
+        filepath = export_serving_artifact(ensemble, os.path.join(tmp_dir, "ensemble.pkl"),
+                                           feature_names=list(X.columns))
+        start = time.perf_counter()
+        serving = HitPredictionModel(model_dir=tmp_dir)
+        serving.load_serving_model(filepath)
+        load_seconds = time.perf_counter() - start
+        assert serving.compiled_forest.n_groups == len(ensemble.base_models)
+        results = serving.predict_with_confidence(X_val)
+        expected = ensemble.predict_proba(X_val)[:, 1]
+        assert np.allclose(results["hit_probability"], expected, atol=1e-6)
+        assert np.array_equal(results["prediction"], (expected >= 0.5).astype(int))
+        assert (results["confidence"] <= 1).all()
+
+        # フォレストの無い成果物でも全体の読み込みから変換できる
+        fallback = HitPredictionModel(model_dir=tmp_dir)
+        fallback.load_model(filepath)
+        fallback.compiled_forest = None
+        assert np.allclose(fallback.predict(X_val), results["hit_probability"])
+
+        # 旧形式（グループ情報なし）のフォレストも読み込める
+        rf_forest = compile_model(estimators["rf"])
+        rf_dir = rf_forest.save(os.path.join(tmp_dir, "rf.forest"))
+        os.remove(os.path.join(rf_dir, "tree_group.npy"))
+        legacy = CompiledForest.load(rf_dir)
+        assert np.allclose(legacy.predict_proba(X_val), estimators["rf"].predict_proba(X_val))
+
+    return {
+        "ensemble_trees": int(forest.n_trees),
+        "ensemble_nodes": int(forest.n_nodes),
+        "serving_load_ms": load_seconds * 1000
+    }
+
+
+def test_parallel_study():
+    """並列・枝刈り付きハイパーパラメータ探索のテスト（共有ストレージ・フォールドごとの中間値・CPU予算）"""
+    import tempfile
+    import optuna
+    from src.models.ensemble_training import cpu_budget
+    from src.optimization.hyperparameter_optimizer import AutoML, HyperparameterOptimizer
+    from src.optimization.parallel_study import CVObjective, ParallelStudyRunner
+
+    X, y = _ensemble_data(n_samples=200)
+
+    # CPU予算はワーカー数 × 試行ごとのスレッド数に割り当てる
+    assert ParallelStudyRunner(n_workers=4, cpu_limit=8).plan()[1] == max(1, cpu_budget(8) // 4)
+    assert ParallelStudyRunner(cpu_limit=1).plan() == (1, 1)
+    # 並列実行は明示的に指定した場合のみ（既定は同じプロセス内で逐次実行）
+    assert HyperparameterOptimizer("lightgbm", cpu_limit=8).runner.plan()[0] == 1
+    assert AutoML(n_trials=2).search_options["n_workers"] == 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # SQLite に保存し、フォールドごとの中間値で枝刈りする
+        storage = f"sqlite:///{tmp_dir}/study.db"
+        optimizer = HyperparameterOptimizer("lightgbm", n_trials=10, n_workers=1, storage=storage)
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            results = optimizer.optimize(X, y)
+        finally:
+            os.chdir(cwd)
+        assert results["n_trials"] == 10 and results["search"]["completed"] >= 1
+        for record in optimizer.optimization_history:
+            assert 1 <= len(record["intermediate_values"]) <= 5
+            if record["state"] == "COMPLETE":
+                assert len(record["intermediate_values"]) == 5
+        assert results["search"]["folds_evaluated"] == 5 * 10 - sum(
+            5 - len(r["intermediate_values"]) for r in optimizer.optimization_history)
+        stored = optuna.load_study(study_name=optimizer.study.study_name, storage=storage)
+        assert len(stored.trials) == 10
+
+        # 複数のワーカープロセスがジャーナルファイル上の同じ study に試行を追加する
+        runner = ParallelStudyRunner(n_workers=2, pruner="hyperband",
+                                     storage=os.path.join(tmp_dir, "journal.log"))
+        study, summary = runner.run("parallel", CVObjective("lightgbm", X, y), n_trials=6)
+        assert summary.workers == 2 and summary.n_trials == 6 and len(study.trials) == 6
+        assert summary.completed + summary.pruned == 6
+
+    # AutoML と compare_models は同じ探索設定を使う
+    automl = AutoML(n_trials=2, n_workers=2, pruner="hyperband")
+    assert automl.search_options["pruner"] == "hyperband"
+
+    return {
+        "sequential_trials": results["n_trials"],
+        "pruned_trials": results["n_pruned"],
+        "parallel_seconds": summary.wall_time
+    }
+
+
+def test_study_warm_start():
+    """永続化した study のテスト（同じデータでの再開・新しいデータへのウォームスタート・履歴の書き出し）"""
+    import tempfile
+    import pandas as pd
+    import optuna
+    from src.optimization.hyperparameter_optimizer import HyperparameterOptimizer
+    from src.optimization.parallel_study import CVObjective, ParallelStudyRunner
+    from src.optimization.study_store import StudyStore
+
+    X, y = _ensemble_data(n_samples=200)
+    X_new, y_new = _ensemble_data(n_samples=200, seed=1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = f"sqlite:///{tmp_dir}/studies.db"
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            def optimize(X_train, y_train, n_trials=6):
+                optimizer = HyperparameterOptimizer("lightgbm", n_trials=n_trials, n_workers=1,
+                                                    storage=storage, warm_start_top_k=3)
+                return optimizer, optimizer.optimize(X_train, y_train)
+
+            first_optimizer, first = optimize(X, y)
+            assert first["n_warm_started"] == 0 and first["search"]["n_trials"] == 6
+
+            # 同じデータでは study を再開し、試行回数に達していれば探索しない
+            _, resumed = optimize(X, y)
+            assert resumed["study_name"] == first["study_name"]
+            assert resumed["search"]["n_trials"] == 0
+            assert resumed["best_params"] == first["best_params"]
+            _, extended = optimize(X, y, n_trials=8)
+            assert extended["search"]["n_trials"] == 2 and extended["n_trials"] == 8
+
+            # 新しいデータでは過去の上位パラメータを最初に試す
+            store = StudyStore(storage, top_k=3)
+            expected = store.top_params("lightgbm", X_new, exclude=None)
+            assert expected[0] == extended["best_params"]
+            warm_optimizer, warm = optimize(X_new, y_new)
+            assert warm["study_name"] != first["study_name"] and warm["n_warm_started"] == 3
+            assert [t.params for t in warm_optimizer.study.trials[:3]] == expected
+
+            # 特徴量セットが変わると別の系列になる
+            _, other = optimize(X_new.iloc[:, :5], y_new, n_trials=2)
+            assert other["n_warm_started"] == 0
+            assert len(store.list_studies(prefix=StudyStore.family_name("lightgbm", X))) == 2
+
+            # 最適化履歴の書き出し
+            csv_path = warm_optimizer.export_history(os.path.join(tmp_dir, "history", "warm.csv"))
+            json_path = warm_optimizer.export_history(os.path.join(tmp_dir, "history", "warm.json"))
+            assert len(pd.read_csv(csv_path)) == 6
+            with open(json_path) as f:
+                assert json.load(f)["best_params"] == warm["best_params"]
+
+            # 低コストの試行（木の本数の係数が異なる）は全データの試行と混ぜて順位付けしない
+            all_studies = StudyStore(storage, top_k=10, max_source_studies=10)
+            full_fidelity = all_studies.top_params("lightgbm", X_new)
+            cheap_name = f"{StudyStore.family_name('lightgbm', X)}_cheap"
+            ParallelStudyRunner(n_workers=1, storage=storage).run(
+                cheap_name, CVObjective("lightgbm", X, y, cv_folds=2, estimator_scale=0.25),
+                n_trials=2)
+            cheap = optuna.load_study(study_name=cheap_name, storage=storage).trials
+            assert all(t.user_attrs["estimator_scale"] == 0.25 for t in cheap)
+            assert all_studies.top_params("lightgbm", X_new) == full_fidelity
+            assert all_studies.top_params("lightgbm", X_new, estimator_scale=0.25) == [
+                t.params for t in sorted(cheap, key=lambda t: t.value, reverse=True)]
+
+            # パラメータだけを求める場合は学習し直さず、履歴は指定したディレクトリにのみ保存する
+            params_only = HyperparameterOptimizer("lightgbm", n_trials=2, n_workers=1,
+                                                  storage=storage,
+                                                  history_dir=os.path.join(tmp_dir, "models"))
+            params_results = params_only.optimize(X_new, y_new, X_new, y_new, refit=False)
+            assert params_only.best_model is None and "validation_metrics" not in params_results
+            assert len(os.listdir(os.path.join(tmp_dir, "models"))) == 1
+            before = sorted(os.listdir(tmp_dir))
+            unsaved = HyperparameterOptimizer("lightgbm", n_trials=1, persist=False,
+                                              history_dir=None)
+            unsaved.optimize(X, y)
+            assert sorted(os.listdir(tmp_dir)) == before
+        finally:
+            os.chdir(cwd)
+
+    # ストレージを指定しない場合は永続化しない（作業ディレクトリにDBを作らない）
+    if not os.getenv("HPO_STORAGE"):
+        assert HyperparameterOptimizer("lightgbm").study_store is None
+        try:
+            StudyStore()
+            raise AssertionError("StudyStore without storage should fail")
+        except ValueError:
+            pass
+
+    return {"warm_started": warm["n_warm_started"], "best_cv_f1": warm["best_cv_score"]}
+
+
+def test_successive_halving_automl():
+    """successive halving による AutoML のテスト（低コストのラウンドでの絞り込み・上位パラメータの引き継ぎ・計算量の報告）"""
+    import tempfile
+    import pandas as pd
+    from src.optimization.hyperparameter_optimizer import AutoML
+    from src.optimization.successive_halving import SuccessiveHalvingScheduler
+
+    X, y = _ensemble_data(n_samples=400)
+    X_train, y_train, X_val, y_val = X.iloc[:300], y[:300], X.iloc[300:], y[300:]
+
+    # 3種類 / eta=3 では1ラウンドで1種類に絞る（行・木の本数は 1/3）
+    schedule = SuccessiveHalvingScheduler(n_trials=9).rung_schedule(3000)
+    assert schedule == [{"fraction": 1 / 3, "n_trials": 3}]
+    small_schedule = SuccessiveHalvingScheduler(n_trials=9, min_rows=100).rung_schedule(150)
+    assert small_schedule[0]["fraction"] == 100 / 150
+    assert SuccessiveHalvingScheduler(model_types=["a", "b", "c", "d"], eta=2).n_cheap_rungs == 2
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            automl = AutoML(n_trials=3, n_workers=1, storage=f"sqlite:///{tmp_dir}/studies.db")
+            results = automl.fit(X_train, y_train, X_val, y_val)
+        finally:
+            os.chdir(cwd)
+
+    # 打ち切られた種類は低コストのラウンドのみ、残った種類は全データで探索
+    compute = results["compute"]
+    winner = results["best_model_type"]
+    assert sorted(compute) == ["lightgbm", "random_forest", "xgboost"]
+    for model_type, report in compute.items():
+        assert report["rungs"][0]["rows"] == 100 and report["seconds"] > 0
+        if model_type == winner:
+            assert report["eliminated_at"] is None and report["rungs"][-1]["rows"] == 300
+            assert report["rungs"][-1]["trials"] == 6
+        else:
+            assert report["eliminated_at"] == 0 and len(report["rungs"]) == 1
+    assert results["rungs"][0]["survivors"] == [winner]
+    assert automl.predict(X_val).shape == (len(X_val),)
+
+    # comparison は full と同じ指標の比較表、計算量の表は halving に入る
+    comparison = pd.DataFrame(results["comparison"])
+    assert list(comparison.columns) == ["model_type", "best_cv_f1", "val_accuracy",
+                                        "val_precision", "val_recall", "val_f1", "n_trials",
+                                        "n_pruned", "search_seconds"]
+    assert comparison.iloc[0]["model_type"] == winner
+    assert comparison.iloc[0]["val_f1"] == results["best_model_metrics"]["f1"]
+    assert comparison["val_f1"].isna().sum() == 2
+    assert sorted(pd.DataFrame(results["halving"])["model_type"]) == sorted(compute)
+
+    return {
+        "best_model_type": winner,
+        "seconds_per_family": {model_type: report["seconds"]
+                               for model_type, report in compute.items()}
+    }
+
+
+class _OcclusionExplainer:
+    """shap.TreeExplainer のスタンドイン（特徴量を背景の平均に置き換えた確率の差を寄与とする）"""
+
+    def __init__(self, model, background):
+        self.model = model
+        self.means = background.mean().to_numpy()
+        self.expected_value = float(model.predict_proba(background)[:, 1].mean())
+        self.rows_computed = 0
+
+    def shap_values(self, X):
+        import numpy as np
+
+        self.rows_computed += len(X)
+        values = X.to_numpy(dtype=np.float64)
+        proba = self.model.predict_proba(values)[:, 1]
+        contributions = np.empty_like(values)
+        for j in range(values.shape[1]):
+            occluded = values.copy()
+            occluded[:, j] = self.means[j]
+            contributions[:, j] = proba - self.model.predict_proba(occluded)[:, 1]
+        return [-contributions, contributions]
+
+
+def _occlusion_explainer(model, X, **kwargs):
+    """背景データを要約した ModelExplainer に _OcclusionExplainer を設定"""
+    from src.analysis.model_explainer import ModelExplainer
+
+    explainer = ModelExplainer(model, feature_names=X.columns.tolist(), background_data=X, **kwargs)
+    explainer.explainer = _OcclusionExplainer(model, explainer.background_data)
+    return explainer
+
+
+def test_shap_cache():
+    """SHAP値のキャッシュのテスト（行単位の再利用・未計算行のバッチ計算・背景データの要約・モデルバージョン）"""
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from src.analysis.model_explainer import ShapValueCache, summarize_background
+
+    X, y = _ensemble_data(n_samples=300)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+
+    # 背景データは max_samples 行に要約される
+    assert len(summarize_background(X, 20, "kmeans")) == 20
+    sampled = summarize_background(X, 20, "sample")
+    assert len(sampled) == 20 and sampled.index.isin(X.index).all()
+    small_background = summarize_background(X.iloc[:10], 20)
+    assert small_background is not None and len(small_background) == 10
+
+    cache = ShapValueCache()
+    explainer = _occlusion_explainer(model, X, model_version="v1", max_background=20,
+                                     batch_size=64, cache=cache)
+    assert len(explainer.background_data) == 20
+    fake = explainer.explainer
+    expected = fake.shap_values(X.iloc[:200])[1]
+    fake.rows_computed = 0
+
+    # 200行は 64 行ずつ4回で計算し、以降のプロット用データはすべてキャッシュから
+    values = explainer.explain_prediction(X.iloc[:200])
+    assert np.allclose(values, expected)
+    assert explainer.shap_calls == 4 and fake.rows_computed == 200
+    explainer.create_summary_plot_data(X.iloc[:200])
+    explainer.create_dependence_plot_data(X.iloc[:200], "feature_0")
+    explainer.get_feature_importance_ranking(X.iloc[:200])
+    explainer.generate_explanation_report(X.iloc[[5]])
+    assert explainer.shap_calls == 4 and fake.rows_computed == 200
+
+    # 新しい行・重複する行は未計算の分だけを1回で計算
+    batch = X.iloc[[0, 250, 250, 1, 251]]
+    assert np.allclose(explainer.explain_prediction(batch)[[1, 2]],
+                       fake.shap_values(X.iloc[[250, 250]])[1])
+    assert explainer.shap_calls == 5 and fake.rows_computed == 200 + 2 + 2
+
+    # 同じモデルバージョンの Explainer はキャッシュを共有し、別バージョンは再計算
+    shared = _occlusion_explainer(model, X, model_version="v1", max_background=20, cache=cache)
+    shared.explain_prediction(X.iloc[:200])
+    assert shared.shap_calls == 0
+    retrained = _occlusion_explainer(model, X, model_version="v2", max_background=20, cache=cache)
+    retrained.explain_prediction(X.iloc[:10])
+    assert retrained.shap_calls == 1
+    stats = cache.get_stats()
+    cache.clear("v2")
+    assert len(cache) == 202
+
+    # 上限を超えた行は古い順に削除
+    small = _occlusion_explainer(model, X, max_background=20, cache=ShapValueCache(max_rows=50))
+    assert small.explain_prediction(X.iloc[:100]).shape == (100, 10)
+    assert len(small.cache) == 50
+
+    return {"cache_stats": stats, "background_rows": len(explainer.background_data)}
+
+
+def _legacy_summary_plot_data(explainer, X, max_features: int = 20):
+    """旧実装のサマリープロット用データ（特徴量 × 行の二重ループ）"""
+    import numpy as np
+    import pandas as pd
+
+    shap_values = explainer.explain_prediction(X)
+    feature_importance = pd.DataFrame({
+        'feature': explainer.feature_names,
+        'importance': np.abs(shap_values).mean(axis=0)
+    }).nlargest(max_features, 'importance')
+    selected_indices = [explainer.feature_names.index(f) for f in feature_importance['feature']]
+    plot_data = []
+    for idx in selected_indices:
+        feature_name = explainer.feature_names[idx]
+        for i in range(len(X)):
+            plot_data.append({
+                'feature': feature_name,
+                'shap_value': float(shap_values[i, idx]),
+                'feature_value': float(X.iloc[i, idx]),
+                'importance': float(feature_importance.loc[
+                    feature_importance['feature'] == feature_name, 'importance'].iloc[0])
+            })
+    return {'data': plot_data, 'features': feature_importance['feature'].tolist(),
+            'importances': feature_importance['importance'].tolist()}
+
+
+def test_summary_plot_data():
+    """サマリープロット用データのテスト（列形式・旧実装との一致・描画行の間引き）"""
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = _ensemble_data(n_samples=300)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    explainer = _occlusion_explainer(model, X, max_background=20)
+
+    # 旧実装の点のリストと同じ順序・値
+    summary = explainer.create_summary_plot_data(X.iloc[:50], max_features=5)
+    legacy = _legacy_summary_plot_data(explainer, X.iloc[:50], max_features=5)
+    assert summary["features"] == legacy["features"]
+    assert np.allclose(summary["importances"], legacy["importances"])
+    features = np.asarray(summary["features"])[summary["feature_index"]]
+    assert features.tolist() == [point["feature"] for point in legacy["data"]]
+    assert np.allclose(summary["shap_values"], [point["shap_value"] for point in legacy["data"]])
+    assert np.allclose(summary["feature_values"],
+                       [point["feature_value"] for point in legacy["data"]])
+    assert summary["n_samples"] == summary["n_plotted"] == 50
+
+    # 間引いても重要度は全行から計算し、点は選ばれた行の値
+    full = explainer.create_summary_plot_data(X, max_features=3)
+    sampled = explainer.create_summary_plot_data(X, max_features=3, max_samples=40)
+    assert sampled["features"] == full["features"] and sampled["importances"] == full["importances"]
+    assert sampled["n_samples"] == 300 and sampled["n_plotted"] == 40
+    assert len(sampled["shap_values"]) == len(sampled["feature_values"]) == 3 * 40
+    first = X[full["features"][0]].to_numpy()
+    assert np.isin(sampled["feature_values"][:40], first).all()
+    assert np.bincount(sampled["feature_index"]).tolist() == [40, 40, 40]
+
+    return {"features": summary["features"], "points": len(summary["shap_values"])}
+
+
+def _brute_force_tree_shap(forest_model, x, n_features: int):
+    """path-dependent の条件付き期待値から全ての部分集合で Shapley 値を直接計算（小さなRF用）"""
+    import itertools
+    from math import factorial
+    import numpy as np
+
+    def expectation(tree, subset, node=0):
+        if tree.children_left[node] == -1:
+            value = tree.value[node, 0]
+            return value[1] / value.sum()
+        left, right = tree.children_left[node], tree.children_right[node]
+        if tree.feature[node] in subset:
+            go_left = x[tree.feature[node]] <= tree.threshold[node]
+            return expectation(tree, subset, left if go_left else right)
+        cover = tree.weighted_n_node_samples
+        return (cover[left] * expectation(tree, subset, left)
+                + cover[right] * expectation(tree, subset, right)) / cover[node]
+
+    def value(subset):
+        return np.mean([expectation(estimator.tree_, subset)
+                        for estimator in forest_model.estimators_])
+
+    phi = np.zeros(n_features)
+    for i in range(n_features):
+        others = [j for j in range(n_features) if j != i]
+        for size in range(n_features):
+            weight = factorial(size) * factorial(n_features - size - 1) / factorial(n_features)
+            for subset in itertools.combinations(others, size):
+                phi[i] += weight * (value(set(subset) | {i}) - value(set(subset)))
+    return phi
+
+
+def test_tree_shap():
+    """TreeSHAP のテスト（加法性・全部分集合の Shapley 値・XGBoost/LightGBM との一致・表と多項式・API の要因分析）"""
+    import numpy as np
+    import xgboost as xgb
+    import lightgbm as lgb
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from src.analysis.model_explainer import ModelExplainer
+    from src.api import realtime_api
+    from src.models.forest_export import compile_model
+    from src.models.tree_shap import (
+        LOG_ODDS, NUMBA_AVAILABLE, PROBABILITY, TreeShapExplainer, _table_shap_rows
+    )
+
+    X, y = _ensemble_data()
+    X_train, y_train, X_val = X.iloc[:240], y[:240], X.iloc[240:]
+    X_missing = X_val.copy()
+    X_missing.iloc[::3, 0] = np.nan
+
+    # 予測値 = expected_value + SHAP値の和（確率・対数オッズ）
+    estimators = {
+        "rf": RandomForestClassifier(n_estimators=30, max_depth=8, random_state=0),
+        "gb": GradientBoostingClassifier(n_estimators=30, random_state=0),
+        "xgb": xgb.XGBClassifier(n_estimators=30, max_depth=4),
+        "lgb": lgb.LGBMClassifier(n_estimators=30, verbose=-1),
+    }
+    for name, estimator in estimators.items():
+        estimator.fit(X_train, y_train)
+        explainer = TreeShapExplainer(compile_model(estimator))
+        data = X_val if name == "gb" else X_missing
+        shap_values, predicted = explainer.explain(data)
+        proba = estimator.predict_proba(data)[:, 1]
+        expected = proba if explainer.output == PROBABILITY else np.log(proba / (1 - proba))
+        assert shap_values.shape == data.shape
+        assert np.allclose(predicted, expected, atol=1e-5), name
+
+        # 表と多項式の割り戻しは同じ値
+        polynomial = TreeShapExplainer(explainer.forest, algorithm="polynomial")
+        assert np.allclose(polynomial.shap_values(data), shap_values, atol=1e-10), name
+
+    # Numba のカーネル（コンパイル前の同じループ）も NumPy の表の参照と同じ値
+    rf_explainer = TreeShapExplainer(compile_model(estimators["rf"]), algorithm="table")
+    rows = rf_explainer.forest._to_array(X_missing.iloc[:10])
+    looped = np.zeros(rows.shape)
+    _table_shap_rows(rows, rf_explainer._pos_feature, rf_explainer._pos_lower,
+                     rf_explainer._pos_upper, rf_explainer._pos_nan_ok, rf_explainer._pos_bit,
+                     rf_explainer._pos_cold, rf_explainer._pos_hot, rf_explainer._segment_bounds,
+                     rf_explainer._segment_offset, rf_explainer._table, looped)
+    assert np.allclose(looped, rf_explainer.shap_values(rows, evaluator="numpy"), atol=1e-12)
+    if NUMBA_AVAILABLE:
+        assert np.allclose(rf_explainer.shap_values(rows, evaluator="numba"), looped, atol=1e-12)
+    else:
+        try:
+            rf_explainer.shap_values(rows, evaluator="numba")
+            raise AssertionError("numba evaluator should require numba")
+        except ImportError:
+            pass
+
+    # ライブラリ組み込みの TreeSHAP と一致（最後の列はバイアス）
+    xgb_contribs = estimators["xgb"].get_booster().predict(xgb.DMatrix(X_missing),
+                                                           pred_contribs=True)
+    xgb_explainer = TreeShapExplainer(compile_model(estimators["xgb"]))
+    assert xgb_explainer.output == LOG_ODDS
+    assert np.allclose(xgb_explainer.shap_values(X_missing), xgb_contribs[:, :-1], atol=1e-4)
+    assert abs(xgb_explainer.expected_value - xgb_contribs[0, -1]) < 1e-4
+    lgb_contribs = estimators["lgb"].predict(X_missing, pred_contrib=True)
+    lgb_explainer = TreeShapExplainer(compile_model(estimators["lgb"]))
+    assert np.allclose(lgb_explainer.shap_values(X_missing), lgb_contribs[:, :-1], atol=1e-8)
+
+    # 小さなRFでは全ての部分集合から計算した Shapley 値と一致
+    X_small = X_train.iloc[:, :4]
+    small = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0)
+    small.fit(X_small, y_train)
+    small_explainer = TreeShapExplainer(compile_model(small))
+    for row in X_small.to_numpy()[:3]:
+        assert np.allclose(small_explainer.shap_values(row[None, :])[0],
+                           _brute_force_tree_shap(small, row, 4), atol=1e-10)
+
+    # 行数が多い場合は分割して計算しても同じ
+    chunked = TreeShapExplainer(explainer.forest, max_chunk_elements=1000)
+    assert np.allclose(chunked.shap_values(X_val), explainer.shap_values(X_val))
+
+    # 確率の平均以外のグループを含むアンサンブルは線形に分解できない
+    ensemble = _small_ensemble("voting", cpu_limit=1)
+    ensemble.train(X_train, y_train)
+    try:
+        TreeShapExplainer(compile_model(ensemble))
+        raise AssertionError("mixed ensembles should not be explained")
+    except ValueError:
+        pass
+
+    # ModelExplainer は shap パッケージ無しでもコンパイル済みフォレストで計算
+    model_explainer = ModelExplainer(estimators["rf"], feature_names=X.columns.tolist(),
+                                     backend="native")
+    assert np.allclose(model_explainer.explain_prediction(X_val),
+                       TreeShapExplainer(compile_model(estimators["rf"])).shap_values(X_val))
+    try:
+        ModelExplainer(estimators["rf"], feature_names=X.columns.tolist(), backend="unknown")
+        raise AssertionError("unknown backend should be rejected")
+    except ValueError:
+        pass
+
+    # API の要因分析: HitPredictionModel の Explainer はフォレストが変わるまで再利用し、要因の和は予測値 - 基準値
+    model, X_model = _train_forest_model(n_samples=200, n_estimators=50)
+    hit_explainer = model.get_shap_explainer()
+    assert model.get_shap_explainer() is hit_explainer
+    row = X_model.iloc[[0]]
+    factors = realtime_api.explain_factors(model, row)
+    assert set(factors) == set(realtime_api.FACTOR_KEYWORDS) | {"other_impact"}
+    probability = model.predict_with_confidence(row)["hit_probability"].iloc[0]
+    assert abs(sum(factors.values()) - (probability - hit_explainer.expected_value)) < 1e-9
+    assert realtime_api.explain_factors(_StubModel(), row) == {}
+
+    # 説明できないモデル（混在アンサンブル）は空の要因を返し、モデルごとに1回だけ警告する
+    class _Warnings(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.WARNING)
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    mixed = _StubModel()
+    mixed.get_shap_explainer = lambda: TreeShapExplainer(compile_model(ensemble))
+    warnings = _Warnings()
+    realtime_api.logger.addHandler(warnings)
+    try:
+        assert realtime_api.explain_factors(mixed, row) == {}
+        assert realtime_api.explain_factors(mixed, row) == {}
+        assert realtime_api.explain_factors(_StubModel(), row) == {}
+    finally:
+        realtime_api.logger.removeHandler(warnings)
+    assert len(warnings.messages) == 1 and "factors will be empty" in warnings.messages[0]
+
+    model.compiled_forest = None
+    assert model.get_shap_explainer() is not hit_explainer
+
+    return {
+        "table_entries": (int(len(hit_explainer._table))
+                          if hit_explainer.algorithm == "table" else 0),
+        "leaves": int(hit_explainer.n_leaves),
+        "factors": factors
+    }
+
+
+# ---------------------------------------------------------------------------
+# ベンチマーク
+# ---------------------------------------------------------------------------
+
+def benchmark_prediction_cache():
+    """予測キャッシュのget/setスループット"""
+    from src.api.prediction_cache import PredictionCache
+
+    cache = PredictionCache(max_entries=1000)
+    value = {"hit_probability": 0.5, "recommendations": ["a", "b", "c"]}
+    n = 20000
+
+    set_time = time_call(lambda: [cache.set(f"k{i % 2000}", value) for i in range(n)], repeat=3)
+    get_time = time_call(lambda: [cache.get(f"k{i % 2000}") for i in range(n)], repeat=3)
+
+    return {
+        "set_us_per_op": set_time / n * 1e6,
+        "get_us_per_op": get_time / n * 1e6,
+        "entries": len(cache)
+    }
+
+
+def benchmark_forest_confidence():
+    """predict_with_confidence: 木ごとのループ vs コンパイル済みフォレスト"""
+    import numpy as np
+
+    model, X = _train_forest_model(n_samples=1000, n_estimators=200)
+    forest = model.get_compiled_forest()
+    results = {}
+
+    for batch_size in (1, 100, 10000):
+        X_batch = X.sample(batch_size, replace=True, random_state=0)
+        legacy = time_call(lambda: np.array(
+            [tree.predict_proba(X_batch)[:, 1] for tree in model.model.estimators_]
+        ), repeat=3)
+        compiled = time_call(lambda: forest.predict_tree_proba(X_batch), repeat=3)
+        results[f"batch_{batch_size}"] = {
+            "legacy_ms": legacy * 1000,
+            "compiled_ms": compiled * 1000,
+            "speedup": legacy / compiled
+        }
+
+    return results
+
+
+# ワーカープロセスのコールドロードを再現するスクリプト
+_LOAD_WORKER_SCRIPT = """
+import sys, time, json, os
+sys.path.insert(0, sys.argv[1])
+from src.models.basic_model import HitPredictionModel
+start = time.perf_counter()
+model = HitPredictionModel(model_dir=os.path.dirname(sys.argv[2]))
+getattr(model, sys.argv[3])(sys.argv[2])
+elapsed = time.perf_counter() - start
+try:
+    import psutil
+    info = psutil.Process().memory_full_info()
+    rss, uss = info.rss, info.uss
+except ImportError:
+    import resource
+    rss, uss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, None
+print(json.dumps({"load_seconds": elapsed, "rss_bytes": rss, "uss_bytes": uss}))
+"""
+
+
+def benchmark_model_loading():
+    """コールドロード時間とワーカーごとのメモリ: joblib全体読み込み vs メモリマップ"""
+    import subprocess
+    import tempfile
+
+    model, _ = _train_forest_model(n_samples=2000, n_estimators=500)
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model.model_dir = tmp_dir
+        filepath = model.save_model("bench_model.pkl")
+        results["artifact_mb"] = os.path.getsize(filepath) / 1024 / 1024
+
+        for method in ("load_model", "load_serving_model"):
+            runs = []
+            for _ in range(3):
+                output = subprocess.run(
+                    [sys.executable, "-c", _LOAD_WORKER_SCRIPT, project_root, filepath, method],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            best = min(runs, key=lambda r: r["load_seconds"])
+            results[method] = {
+                "load_ms": best["load_seconds"] * 1000,
+                "rss_mb": best["rss_bytes"] / 1024 / 1024,
+                "uss_mb": best["uss_bytes"] / 1024 / 1024 if best["uss_bytes"] else None
+            }
+
+    return results
+
+
+def benchmark_websocket_fanout():
+    """WebSocket配信: 逐次send_json vs ブロードキャストハブ（1k/10k接続、1%が低速）"""
+    from src.api.broadcast_hub import BroadcastHub
+
+    message = {"type": "new_prediction", "data": {"product_name": "Serum", "hit_probability": 0.72}}
+    slow_delay = 0.05
+
+    async def legacy(clients):
+        start = time.perf_counter()
+        for client in clients:
+            await client.send_json(message)
+        return time.perf_counter() - start
+
+    async def hub_fanout(clients):
+        hub = BroadcastHub(queue_size=100)
+        for client in clients:
+            await hub.connect(client, {"predictions"})
+        fast = [c for c in clients if not c.delay]
+
+        start = time.perf_counter()
+        hub.publish("predictions", message)
+        publish_seconds = time.perf_counter() - start
+        while any(not c.messages for c in fast):
+            await asyncio.sleep(0)
+        delivered_seconds = time.perf_counter() - start
+
+        await hub.close_all()
+        return publish_seconds, delivered_seconds
+
+    def make_clients(n):
+        return [_FakeWebSocket(delay=slow_delay if i % 100 == 0 else 0.0) for i in range(n)]
+
+    results = {}
+    for n in (1000, 10000):
+        legacy_seconds = asyncio.run(legacy(make_clients(n)))
+        publish_seconds, delivered_seconds = asyncio.run(hub_fanout(make_clients(n)))
+        results[f"connections_{n}"] = {
+            "legacy_all_delivered_ms": legacy_seconds * 1000,
+            "hub_publish_ms": publish_seconds * 1000,
+            "hub_fast_clients_delivered_ms": delivered_seconds * 1000
+        }
+
+    return results
+
+
+def benchmark_trend_query():
+    """トレンド取得: 行辞書の都度生成 vs 時系列ストアの列指向クエリ（30日/1年/5年）"""
+    from datetime import timedelta
+    import numpy as np
+    import pandas as pd
+    from src.data_collection.trend_store import TrendTimeSeriesStore
+
+    categories = ["スキンケア", "メイクアップ", "ヘアケア"]
+    store = TrendTimeSeriesStore()
+    now = datetime.now()
+    rng = np.random.default_rng(0)
+    for offset in range(730):
+        for category in categories:
+            for keyword in ("retinol", "cica", "niacinamide"):
+                store.record(category, keyword, float(rng.uniform(0, 1)), float(rng.uniform(0, 1)),
+                             now - timedelta(days=offset))
+
+    def legacy(period_days):
+        dates = pd.date_range(end=now, periods=period_days + 1, freq="D")
+        rows = []
+        for category in categories:
+            values = np.cumsum(np.random.randn(len(dates)) * 2) + 50
+            for day, value in zip(dates, values):
+                rows.append({"date": day.isoformat(), "category": category,
+                             "trend_score": float(max(0, value)),
+                             "buzz_score": float(np.random.uniform(0.3, 0.9))})
+        return rows
+
+    results = {}
+    for period_days in (30, 365, 1825):
+        legacy_rows = legacy(period_days)
+        columnar = store.query(categories, period_days)
+        results[f"period_{period_days}d"] = {
+            "legacy_ms": time_call(lambda: legacy(period_days)) * 1000,
+            "store_ms": time_call(lambda: store.query(categories, period_days)) * 1000,
+            "legacy_payload_bytes": len(json.dumps(legacy_rows, ensure_ascii=False)),
+            "store_payload_bytes": len(json.dumps(columnar, ensure_ascii=False)),
+            "resolution": columnar["resolution"]
+        }
+
+    return results
+
+
+def benchmark_structured_logging():
+    """構造化ログ: 同期書き込み vs キュー経由（呼び出し側の1件あたりオーバーヘッドとlogs/秒）"""
+    import tempfile
+    from src.monitoring.logger import StructuredLogger
+
+    n_logs = 20000
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, "w") as devnull:
+        for mode, async_mode in (("sync", False), ("queue", True)):
+            structured = StructuredLogger(f"phase7-bench-{mode}", "INFO", async_mode=async_mode,
+                                          queue_size=0, log_dir=tmp_dir, stream=devnull)
+            start = time.perf_counter()
+            for i in range(n_logs):
+                structured.info("Prediction served", endpoint="/api/v1/predict", request_id=i)
+            caller_seconds = time.perf_counter() - start
+            structured.flush()
+            total_seconds = time.perf_counter() - start
+            structured.stop()
+
+            results[mode] = {
+                "caller_us_per_log": caller_seconds / n_logs * 1e6,
+                "logs_per_second": n_logs / total_seconds
+            }
+
+        sampled = StructuredLogger("phase7-bench-sampled", "INFO", async_mode=True,
+                                   sample_rates={"prediction": 0.1}, log_dir=tmp_dir,
+                                   stream=devnull)
+        start = time.perf_counter()
+        for _ in range(n_logs):
+            sampled.log_prediction("random_forest", {"price": 3000}, 1, 0.9, 0.01)
+        results["queue_prediction_sampled_10pct"] = {
+            "caller_us_per_log": (time.perf_counter() - start) / n_logs * 1e6
+        }
+        sampled.stop()
+
+    return results
+
+
+def benchmark_model_monitor():
+    """ModelMonitor: リスト+MD5+np.percentile vs リングバッファ+スケッチ（記録とサマリー）"""
+    import hashlib
+    import numpy as np
+    from src.ml.continuous_learning import ModelMonitor
+
+    product = {"name": "Serum", "description": "d" * 200, "keywords": ["serum", "vitamin c"],
+               "price": 3000}
+    latencies = np.random.default_rng(0).lognormal(mean=-3, sigma=1, size=200000)
+
+    legacy_history = []
+
+    def legacy_log(latency):
+        legacy_history.append({
+            "timestamp": datetime.now().isoformat(),
+            "input_hash": hashlib.md5(json.dumps(product, sort_keys=True).encode()).hexdigest(),
+            "prediction": 1.0, "confidence": 0.8, "latency": latency
+        })
+
+    def legacy_summary():
+        return np.percentile([p["latency"] for p in legacy_history], [50, 95, 99])
+
+    monitor = ModelMonitor()
+    results = {}
+
+    start = time.perf_counter()
+    for latency in latencies.tolist():
+        legacy_log(latency)
+    results["legacy_log_us"] = (time.perf_counter() - start) / len(latencies) * 1e6
+
+    start = time.perf_counter()
+    for latency in latencies.tolist():
+        monitor.log_prediction(product, 1.0, 0.8, latency)
+    results["ring_log_us"] = (time.perf_counter() - start) / len(latencies) * 1e6
+
+    # 全履歴の分位点（旧実装で同等の値を得るには全件をなめる必要がある）
+    results["legacy_full_percentile_ms"] = time_call(legacy_summary) * 1000
+    results["ring_summary_ms"] = time_call(monitor.get_monitoring_summary) * 1000
+    results["ring_buffer_bytes"] = monitor.prediction_history.nbytes
+    results["sketch_buckets"] = len(monitor.latency_sketch.merged().bins)
+
+    return results
+
+
+def benchmark_drift_detection():
+    """ドリフト検出: 列ごとのpandas統計 vs ヒストグラムスケッチ（10万行×30特徴量）"""
+    import numpy as np
+    import pandas as pd
+    from src.ml.streaming_drift import StreamingDriftDetector
+
+    rng = np.random.default_rng(0)
+    columns = [f"f{i}" for i in range(30)]
+    baseline = pd.DataFrame(rng.normal(size=(100000, 30)), columns=columns)
+    live = pd.DataFrame(rng.normal(0.2, 1.0, size=(100000, 30)), columns=columns)
+
+    def legacy_statistics(data):
+        return {
+            column: {
+                "mean": data[column].mean(), "std": data[column].std(),
+                "min": data[column].min(), "max": data[column].max(),
+                "q25": data[column].quantile(0.25), "q50": data[column].quantile(0.50),
+                "q75": data[column].quantile(0.75), "null_rate": data[column].isnull().mean()
+            }
+            for column in data.columns
+        }
+
+    detector = StreamingDriftDetector(window_size=10 ** 9)
+    detector.fit_baseline(baseline)
+
+    rows = live.iloc[:2000].to_dict("records")
+    start = time.perf_counter()
+    for row in rows:
+        detector.update(row)
+    per_row_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+    detector.update(live.iloc[2000:])
+    return {
+        "legacy_full_recompute_ms": time_call(lambda: legacy_statistics(live), repeat=3) * 1000,
+        "sketch_update_per_prediction_us": per_row_us,
+        "sketch_check_ms": time_call(detector.check) * 1000,
+        "max_psi": detector.check()["max_psi"]
+    }
+
+
+def benchmark_ensemble_training():
+    """高度なアンサンブルの学習: モデルごとの逐次学習+フォールド再学習 vs モデル×フォールドの並列学習"""
+    from sklearn.base import clone
+    from sklearn.model_selection import StratifiedKFold
+    from src.models.ensemble_training import EnsembleTrainer, cpu_budget
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    base_models = _small_ensemble(n_estimators=100).base_models
+
+    def legacy():
+        for model in base_models.values():
+            clone(model).fit(X, y)
+            for train_idx, val_idx in StratifiedKFold(5, shuffle=True, random_state=42).split(X, y):
+                fold_model = clone(model).fit(X.iloc[train_idx], y[train_idx])
+                fold_model.predict(X.iloc[val_idx])
+
+    legacy_time = time_call(legacy, repeat=1)
+    result = EnsembleTrainer().fit(base_models, X, y)
+    return {
+        "cpus": cpu_budget(),
+        "legacy_seconds": legacy_time,
+        "scheduled_seconds": result.wall_time,
+        "workers": result.workers,
+        "threads_per_task": result.threads_per_task,
+        "speedup": legacy_time / result.wall_time
+    }
+
+
+def benchmark_ensemble_inference():
+    """高度なアンサンブルの推論: 行ループ+モデルごとの呼び出し vs 確率行列の行列演算（predict + predict_proba）"""
+    from src.models.ensemble_inference import EnsemblePredictor
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    model = _small_ensemble("advanced", n_estimators=100, cpu_limit=1)
+    model.train(X, y)
+    results = {}
+
+    for batch_size in (1, 100, 10000):
+        X_batch = X.sample(batch_size, replace=True, random_state=0)
+        legacy = time_call(lambda: (_legacy_advanced_predict(model.ensemble_model, X_batch),
+                                    _legacy_advanced_proba(model.ensemble_model, X_batch)),
+                           repeat=3)
+        engine = EnsemblePredictor.from_ensemble(model.ensemble_model, cache_size=0)
+        vectorized = time_call(lambda: engine.predict_with_proba(X_batch), repeat=3)
+        threaded = EnsemblePredictor.from_ensemble(model.ensemble_model, cache_size=0,
+                                                   max_workers=4)
+        concurrent = time_call(lambda: threaded.predict_with_proba(X_batch), repeat=3)
+        threaded.close()
+        results[f"batch_{batch_size}"] = {
+            "legacy_ms": legacy * 1000,
+            "engine_ms": vectorized * 1000,
+            "engine_threaded_ms": concurrent * 1000,
+            "speedup": legacy / vectorized
+        }
+
+    return results
+
+
+def benchmark_forest_export():
+    """アンサンブルの推論: ライブラリのモデルを呼ぶエンジン vs コンパイル済みフォレスト（NumPy）"""
+    from src.models.ensemble_inference import EnsemblePredictor
+    from src.models.forest_export import compile_model
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    model = _small_ensemble("voting", n_estimators=100, cpu_limit=1)
+    model.train(X, y)
+    forest = compile_model(model)
+    engine = EnsemblePredictor.from_ensemble(model.ensemble_model, cache_size=0)
+    results = {"trees": int(forest.n_trees), "nodes": int(forest.n_nodes)}
+
+    for batch_size in (1, 100, 10000):
+        X_batch = X.sample(batch_size, replace=True, random_state=0)
+        library = time_call(lambda: engine.predict_proba(X_batch), repeat=3)
+        compiled = time_call(lambda: forest.predict_proba(X_batch), repeat=3)
+        results[f"batch_{batch_size}"] = {
+            "library_ms": library * 1000,
+            "compiled_ms": compiled * 1000,
+            "speedup": library / compiled
+        }
+
+    return results
+
+
+def benchmark_parallel_study():
+    """ハイパーパラメータ探索: 逐次・枝刈りなし vs 並列ワーカー + 枝刈り（同じ試行回数）"""
+    import optuna
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+    from src.optimization.parallel_study import (
+        CVObjective, ParallelStudyRunner, build_model, suggest_params
+    )
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    n_trials = 30
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    # 従来の目的関数（cross_val_score で全フォールドを評価）
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+    def legacy_objective(trial):
+        model = build_model("lightgbm", suggest_params(trial, "lightgbm"))
+        return cross_val_score(model, X, y, cv=cv, scoring="f1", n_jobs=-1).mean()
+
+    start = time.perf_counter()
+    legacy = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=42))
+    legacy.optimize(legacy_objective, n_trials=n_trials)
+    legacy_time = time.perf_counter() - start
+
+    study, summary = ParallelStudyRunner(pruner="median").run(
+        "benchmark", CVObjective("lightgbm", X, y), n_trials=n_trials)
+
+    return {
+        "legacy_seconds": legacy_time,
+        "parallel_pruned_seconds": summary.wall_time,
+        "speedup": legacy_time / summary.wall_time,
+        "legacy_best_f1": legacy.best_value,
+        "parallel_best_f1": study.best_value,
+        "pruned_trials": summary.pruned,
+        "workers": summary.workers
+    }
+
+
+def benchmark_study_warm_start():
+    """再学習時の探索: 新規 study vs 前回の上位パラメータでウォームスタート（最良値の99.5%に達する試行数）"""
+    import tempfile
+    import optuna
+    from src.optimization.hyperparameter_optimizer import HyperparameterOptimizer
+
+    X_old, y_old = _ensemble_data(n_samples=1000, n_features=20, seed=0)
+    X, y = _ensemble_data(n_samples=1000, n_features=20, seed=1)
+    n_trials = 20
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    def trials_to_target(study, target):
+        best = -1.0
+        for trial in study.trials:
+            if trial.value is not None:
+                best = max(best, trial.value)
+            if best >= target:
+                return trial.number + 1
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            cold = HyperparameterOptimizer("lightgbm", n_trials=n_trials, persist=False,
+                                           pruner=None)
+            cold.optimize(X, y)
+
+            storage = f"sqlite:///{tmp_dir}/studies.db"
+            previous = HyperparameterOptimizer("lightgbm", n_trials=n_trials, storage=storage,
+                                               pruner=None)
+            previous.optimize(X_old, y_old)
+            warm = HyperparameterOptimizer("lightgbm", n_trials=n_trials, storage=storage,
+                                           pruner=None)
+            warm.optimize(X, y)
+        finally:
+            os.chdir(cwd)
+
+    target = 0.995 * max(cold.study.best_value, warm.study.best_value)
+    return {
+        "cold_trials_to_target": trials_to_target(cold.study, target),
+        "warm_trials_to_target": trials_to_target(warm.study, target),
+        "cold_best_f1": cold.study.best_value,
+        "warm_best_f1": warm.study.best_value
+    }
+
+
+def benchmark_successive_halving():
+    """AutoML: 全種類を全データで探索 vs successive halving（同じ試行回数の設定）"""
+    import tempfile
+    import optuna
+    from src.optimization.hyperparameter_optimizer import AutoML
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    X_train, y_train, X_val, y_val = X.iloc[:1600], y[:1600], X.iloc[1600:], y[1600:]
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            for strategy in ("full", "successive_halving"):
+                automl = AutoML(n_trials=9, strategy=strategy,
+                                storage=f"sqlite:///{tmp_dir}/{strategy}.db")
+                start = time.perf_counter()
+                fitted = automl.fit(X_train, y_train, X_val, y_val)
+                results[strategy] = {
+                    "seconds": time.perf_counter() - start,
+                    "best_model_type": fitted["best_model_type"],
+                    "val_f1": fitted["best_model_metrics"]["f1"]
+                }
+                if strategy == "successive_halving":
+                    results[strategy]["seconds_per_family"] = {
+                        model_type: report["seconds"]
+                        for model_type, report in fitted["compute"].items()
+                    }
+        finally:
+            os.chdir(cwd)
+
+    results["speedup"] = results["full"]["seconds"] / results["successive_halving"]["seconds"]
+    return results
+
+
+def benchmark_shap_cache():
+    """SHAPの再描画: キャッシュ無し vs 行単位のキャッシュ（Streamlitのパネル1行分・1000行の依存プロット+重要度）"""
+    from sklearn.ensemble import RandomForestClassifier
+    from src.analysis.model_explainer import ShapValueCache
+
+    X, y = _ensemble_data(n_samples=2000, n_features=20)
+    model = RandomForestClassifier(n_estimators=50, random_state=0).fit(X, y)
+    X_view, X_single = X.iloc[:1000], X.iloc[[0]]
+
+    def panel(explainer):
+        # display_shap_analysis と同じ呼び出し
+        explainer.create_waterfall_plot(X_single)
+        explainer.create_force_plot_data(X_single)
+        explainer.generate_explanation_report(X_single)
+
+    def analysis(explainer):
+        explainer.create_dependence_plot_data(X_view, "feature_0", "feature_1")
+        explainer.get_feature_importance_ranking(X_view)
+
+    results = {}
+    for name, render in (("panel", panel), ("analysis_1000_rows", analysis)):
+        uncached = _occlusion_explainer(model, X, cache=ShapValueCache(max_rows=0))
+        cached = _occlusion_explainer(model, X)
+        results[name] = {
+            "uncached_ms": time_call(lambda: render(uncached), repeat=3) * 1000,
+            "first_ms": time_call(lambda: render(cached), repeat=1) * 1000,
+            "repeat_ms": time_call(lambda: render(cached), repeat=3) * 1000,
+            "shap_calls_uncached": uncached.shap_calls,
+            "shap_calls_cached": cached.shap_calls
+        }
+        results[name]["repeat_speedup"] = results[name]["uncached_ms"] / results[name]["repeat_ms"]
+
+    return results
+
+def benchmark_summary_plot_data():
+    """サマリープロット用データ（20特徴量・SHAP値はキャッシュ済み）: 二重ループ vs 列形式"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = _ensemble_data(n_samples=5000, n_features=20)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    explainer = _occlusion_explainer(model, X, max_background=50)
+    results = {}
+
+    for n_rows in (500, 2000, 5000):
+        X_view = X.iloc[:n_rows]
+        explainer.explain_prediction(X_view)
+        legacy = time_call(lambda: _legacy_summary_plot_data(explainer, X_view), repeat=1)
+        columnar = time_call(lambda: explainer.create_summary_plot_data(X_view), repeat=3)
+        results[f"rows_{n_rows}"] = {
+            "legacy_ms": legacy * 1000,
+            "columnar_ms": columnar * 1000,
+            "columnar_downsampled_ms": time_call(
+                lambda: explainer.create_summary_plot_data(X_view, max_samples=500),
+                repeat=3) * 1000,
+            "speedup": legacy / columnar
+        }
+
+    return results
+
+def benchmark_tree_shap():
+    """予測1行の要因分析: 多項式の割り戻し vs 表の参照（HitPredictionModel の葉数別）"""
+    from src.models.tree_shap import NUMBA_AVAILABLE, TreeShapExplainer
+
+    results = {}
+    for n_estimators in (100, 400):
+        model, X = _train_forest_model(n_samples=1000, n_estimators=n_estimators)
+        forest = model.get_compiled_forest()
+        table = TreeShapExplainer(forest, algorithm="table")
+        polynomial = TreeShapExplainer(forest, algorithm="polynomial")
+        row, batch = X.iloc[[0]], X.iloc[:100]
+        timings = {
+            "leaves": int(table.n_leaves),
+            "polynomial_row_ms": time_call(lambda: polynomial.shap_values(row), repeat=20) * 1000,
+            "table_row_ms": time_call(
+                lambda: table.shap_values(row, evaluator="numpy"), repeat=20) * 1000,
+            "table_100_rows_ms": time_call(
+                lambda: table.shap_values(batch, evaluator="numpy"), repeat=3) * 1000,
+            "predict_row_ms": time_call(
+                lambda: model.predict_with_confidence(row), repeat=20) * 1000
+        }
+        if NUMBA_AVAILABLE:
+            table.shap_values(row, evaluator="numba")  # コンパイル
+            timings["table_numba_row_ms"] = time_call(
+                lambda: table.shap_values(row, evaluator="numba"), repeat=20) * 1000
+        timings["speedup"] = timings["polynomial_row_ms"] / timings["table_row_ms"]
+        results[f"trees_{n_estimators}"] = timings
+
+    return results
+
+
+
+def main():
+    """メインテスト実行"""
+    print("""
+    ╔══════════════════════════════════════════════════════╗
+    ║   AI Hit Prediction System - Phase 7 Performance     ║
+    ║         性能改善コンポーネントのテスト               ║
+    ╚══════════════════════════════════════════════════════╝
+    """)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    tests = [
+        ("Prediction Cache", test_prediction_cache),
+        ("Compiled Forest Confidence", test_compiled_forest_confidence),
+        ("Memory-Mapped Model Artifact", test_mmap_model_artifact),
+        ("Lazy Import Registry", test_lazy_imports),
+        ("Import Time Profile", test_import_time_profile),
+        ("Model Readiness", test_model_readiness),
+        ("WebSocket Broadcast Hub", test_broadcast_hub),
+        ("Event-Driven Trend Feed", test_trend_feed),
+        ("Trend Time-Series Store", test_trend_store),
+        ("Request Timing Middleware", test_request_timing),
+        ("Async Structured Logging", test_async_logging),
+        ("Model Monitor Sketches", test_model_monitor_sketch),
+        ("Streaming Drift Detection", test_streaming_drift),
+        ("Background Retraining Worker", test_retraining_worker),
+        ("Model Registry", test_model_registry),
+        ("Shadow Evaluation", test_shadow_evaluation),
+        ("Parallel Ensemble Training", test_parallel_ensemble_training),
+        ("Out-of-Fold Cache", test_oof_cache),
+        ("Ensemble Inference Engine", test_ensemble_inference),
+        ("Compiled Forest Export", test_forest_export),
+        ("Parallel Pruned Study", test_parallel_study),
+        ("Warm-Started Study", test_study_warm_start),
+        ("Successive-Halving AutoML", test_successive_halving_automl),
+        ("SHAP Value Cache", test_shap_cache),
+        ("Columnar Summary Plot Data", test_summary_plot_data),
+        ("Native TreeSHAP", test_tree_shap),
+    ]
+
+    benchmarks = [
+        ("Prediction Cache Throughput", benchmark_prediction_cache),
+        ("Forest Confidence (batch 1/100/10k)", benchmark_forest_confidence),
+        ("Model Cold Load (joblib vs mmap)", benchmark_model_loading),
+        ("WebSocket Fan-out (1k/10k)", benchmark_websocket_fanout),
+        ("Trend Query (30d/1y/5y)", benchmark_trend_query),
+        ("Structured Logging (sync vs queue)", benchmark_structured_logging),
+        ("Model Monitor (list vs ring buffer)", benchmark_model_monitor),
+        ("Drift Detection (pandas vs sketches)", benchmark_drift_detection),
+        ("Ensemble Training (sequential vs model x fold)", benchmark_ensemble_training),
+        ("Ensemble Inference (batch 1/100/10k)", benchmark_ensemble_inference),
+        ("Forest Export (library vs compiled)", benchmark_forest_export),
+        ("Hyperparameter Search (serial vs parallel + pruning)", benchmark_parallel_study),
+        ("Retraining Search (cold vs warm start)", benchmark_study_warm_start),
+        ("AutoML (full vs successive halving)", benchmark_successive_halving),
+        ("SHAP Panel Render (uncached vs cached)", benchmark_shap_cache),
+        ("Summary Plot Data (loops vs columnar)", benchmark_summary_plot_data),
+        ("Prediction Factors (polynomial vs table TreeSHAP)", benchmark_tree_shap),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for name, test_func in tests:
+        if run_component(name, test_func):
+            passed += 1
+        else:
+            failed += 1
+
+    if "--benchmark" in sys.argv:
+        for name, bench_func in benchmarks:
+            print(f"\n⏱  Benchmark: {name}")
+            result = bench_func()
+            test_results["benchmarks"].append({"name": name, "result": result})
+            print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+
+    # テストサマリー
+    print(f"\n{'='*50}")
+    print("TEST SUMMARY")
+    print(f"{'='*50}")
+    print(f"Total Tests: {passed + failed}")
+    print(f"Passed: {passed} ✅")
+    print(f"Failed: {failed} ❌")
+
+    # 結果保存
+    report_dir = Path("tests")
+    report_dir.mkdir(exist_ok=True)
+
+    report_file = report_dir / f"phase7_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(test_results, f, indent=2, ensure_ascii=False, default=str)
+
+    print(f"📄 Test results saved: {report_file}")
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
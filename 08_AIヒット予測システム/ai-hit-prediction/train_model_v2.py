@@ -20,7 +20,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from src.models.basic_model import HitPredictionModel
 from src.preprocessing.data_pipeline import DataPipeline
 from src.preprocessing.feature_engineering import FeatureEngineer, create_model_ready_features
-from sklearn.model_selection import cross_val_score, GridSearchCV
+from src.optimization.hyperparameter_optimizer import HyperparameterOptimizer
+from sklearn.model_selection import cross_val_score
 from sklearn.metrics import classification_report, confusion_matrix
 import warnings
 warnings.filterwarnings('ignore')
@@ -36,14 +37,20 @@ logger = logging.getLogger(__name__)
 class EnhancedModelTrainer:
     """拡張版モデルトレーナー"""
     
-    def __init__(self, model_dir: str = "data/models"):
+    def __init__(self, model_dir: str = "data/models", n_trials: int = 30,
+                 hpo_storage: Optional[str] = None):
         """
         初期化
         
         Args:
             model_dir: モデル保存先ディレクトリ
+            n_trials: ハイパーパラメータ探索の試行回数
+            hpo_storage: 探索の study を保存するストレージ
+                （省略時は環境変数 HPO_STORAGE、それも無ければ model_dir/hpo_studies.db）
         """
         self.model_dir = model_dir
+        self.n_trials = n_trials
+        self.hpo_storage = hpo_storage
         self.pipeline = DataPipeline()
         self.feature_engineer = FeatureEngineer()
         self.model = None
@@ -150,7 +157,10 @@ class EnhancedModelTrainer:
                                 y: np.ndarray,
                                 cv: int = 5) -> Dict:
         """
-        ハイパーパラメータを最適化（グリッドサーチ）
+        ハイパーパラメータを最適化（永続化した study によるベイズ最適化）
+        
+        同じ特徴量セットの過去の study の上位パラメータから探索を始めるため、
+        日次の再学習では少ない試行で収束する。
         
         Args:
             X: 特徴量
@@ -162,32 +172,26 @@ class EnhancedModelTrainer:
         """
         logger.info("Starting hyperparameter optimization...")
         
-        # パラメータグリッド
-        param_grid = {
-            'n_estimators': [50, 100, 200],
-            'max_depth': [5, 10, 15, None],
-            'min_samples_split': [2, 5, 10],
-            'min_samples_leaf': [1, 2, 4]
-        }
-        
-        # グリッドサーチ
-        from sklearn.ensemble import RandomForestClassifier
-        base_model = RandomForestClassifier(random_state=42)
-        
-        grid_search = GridSearchCV(
-            base_model,
-            param_grid,
-            cv=cv,
-            scoring='f1',
-            n_jobs=-1,
-            verbose=1
+        os.makedirs(self.model_dir, exist_ok=True)
+        storage = (self.hpo_storage or os.getenv('HPO_STORAGE')
+                   or f"sqlite:///{os.path.join(self.model_dir, 'hpo_studies.db')}")
+        optimizer = HyperparameterOptimizer(
+            model_type='random_forest',
+            n_trials=self.n_trials,
+            storage=storage,
+            history_dir=self.model_dir
         )
+        # モデルは train_model で学習するため、探索では最良パラメータのみを求める
+        results = optimizer.optimize(X, y, cv_folds=cv, refit=False)
         
-        grid_search.fit(X, y)
+        # 最適化履歴を学習結果と一緒に保存
+        optimizer.export_history(os.path.join(self.model_dir, "hpo_history.csv"))
         
-        self.best_params = grid_search.best_params_
+        self.best_params = results['best_params']
         logger.info(f"Best parameters: {self.best_params}")
-        logger.info(f"Best CV score: {grid_search.best_score_:.3f}")
+        logger.info(f"Best CV score: {results['best_cv_score']:.3f} "
+                    f"({results['search']['n_trials']} new trials, "
+                    f"{results['n_warm_started']} warm-started)")
         
         return self.best_params
     